@@ -0,0 +1,31 @@
+"""add table_versions counters for conditional GET
+
+Revision ID: 0006_table_versions
+Revises: 0005_reports_user_set_null
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006_table_versions"
+down_revision = "0005_reports_user_set_null"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "table_versions",
+        sa.Column("table_name", sa.String(length=64), primary_key=True),
+        sa.Column("version", sa.Integer, nullable=False, server_default="0"),
+    )
+    op.bulk_insert(
+        sa.table("table_versions", sa.column("table_name", sa.String), sa.column("version", sa.Integer)),
+        [{"table_name": "devices", "version": 0}, {"table_name": "geofences", "version": 0}],
+    )
+
+
+def downgrade():
+    op.drop_table("table_versions")
@@ -0,0 +1,84 @@
+"""add substring search indexes for events, reports and logs
+
+SQLite gets FTS5 trigram shadow tables kept in sync by triggers; PostgreSQL
+gets pg_trgm GIN indexes.
+
+Revision ID: 0007_search_indexes
+Revises: 0006_table_versions
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007_search_indexes"
+down_revision = "0006_table_versions"
+branch_labels = None
+depends_on = None
+
+
+# DDL is inlined: migrations must not import application code, which changes after they are written
+SEARCH_COLUMNS = {
+    "events": ("event_type",),
+    "reports": ("resolution", "notes"),
+    "logs": ("table_name", "action"),
+}
+
+SQLITE_UPGRADE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(event_type, content='events', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS events_fts_ai AFTER INSERT ON events BEGIN "
+    "INSERT INTO events_fts(rowid, event_type) VALUES (new.id, new.event_type); END",
+    "CREATE TRIGGER IF NOT EXISTS events_fts_ad AFTER DELETE ON events BEGIN "
+    "INSERT INTO events_fts(events_fts, rowid, event_type) VALUES ('delete', old.id, old.event_type); END",
+    "CREATE TRIGGER IF NOT EXISTS events_fts_au AFTER UPDATE ON events BEGIN "
+    "INSERT INTO events_fts(events_fts, rowid, event_type) VALUES ('delete', old.id, old.event_type); "
+    "INSERT INTO events_fts(rowid, event_type) VALUES (new.id, new.event_type); END",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5(resolution, notes, content='reports', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS reports_fts_ai AFTER INSERT ON reports BEGIN "
+    "INSERT INTO reports_fts(rowid, resolution, notes) VALUES (new.id, new.resolution, new.notes); END",
+    "CREATE TRIGGER IF NOT EXISTS reports_fts_ad AFTER DELETE ON reports BEGIN "
+    "INSERT INTO reports_fts(reports_fts, rowid, resolution, notes) VALUES ('delete', old.id, old.resolution, old.notes); END",
+    "CREATE TRIGGER IF NOT EXISTS reports_fts_au AFTER UPDATE ON reports BEGIN "
+    "INSERT INTO reports_fts(reports_fts, rowid, resolution, notes) VALUES ('delete', old.id, old.resolution, old.notes); "
+    "INSERT INTO reports_fts(rowid, resolution, notes) VALUES (new.id, new.resolution, new.notes); END",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS logs_fts USING fts5(table_name, action, content='logs', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS logs_fts_ai AFTER INSERT ON logs BEGIN "
+    "INSERT INTO logs_fts(rowid, table_name, action) VALUES (new.id, new.table_name, new.action); END",
+    "CREATE TRIGGER IF NOT EXISTS logs_fts_ad AFTER DELETE ON logs BEGIN "
+    "INSERT INTO logs_fts(logs_fts, rowid, table_name, action) VALUES ('delete', old.id, old.table_name, old.action); END",
+    "CREATE TRIGGER IF NOT EXISTS logs_fts_au AFTER UPDATE ON logs BEGIN "
+    "INSERT INTO logs_fts(logs_fts, rowid, table_name, action) VALUES ('delete', old.id, old.table_name, old.action); "
+    "INSERT INTO logs_fts(rowid, table_name, action) VALUES (new.id, new.table_name, new.action); END",
+    # index the rows that already exist
+    "INSERT INTO events_fts(events_fts) VALUES ('rebuild')",
+    "INSERT INTO reports_fts(reports_fts) VALUES ('rebuild')",
+    "INSERT INTO logs_fts(logs_fts) VALUES ('rebuild')",
+]
+
+POSTGRESQL_UPGRADE = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_events_event_type_trgm ON events USING gin (event_type gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_reports_resolution_trgm ON reports USING gin (resolution gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_reports_notes_trgm ON reports USING gin (notes gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_logs_table_name_trgm ON logs USING gin (table_name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_logs_action_trgm ON logs USING gin (action gin_trgm_ops)",
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for stmt in {"sqlite": SQLITE_UPGRADE, "postgresql": POSTGRESQL_UPGRADE}.get(dialect, []):
+        op.execute(stmt)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table, columns in SEARCH_COLUMNS.items():
+        if dialect == "sqlite":
+            for suffix in ("ai", "ad", "au"):
+                op.execute(f"DROP TRIGGER IF EXISTS {table}_fts_{suffix}")
+            op.execute(f"DROP TABLE IF EXISTS {table}_fts")
+        elif dialect == "postgresql":
+            for col in columns:
+                op.execute(f"DROP INDEX IF EXISTS ix_{table}_{col}_trgm")
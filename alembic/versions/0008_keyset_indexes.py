@@ -0,0 +1,27 @@
+"""add (timestamp, id) indexes for keyset pagination
+
+Revision ID: 0008_keyset_indexes
+Revises: 0007_search_indexes
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008_keyset_indexes"
+down_revision = "0007_search_indexes"
+branch_labels = None
+depends_on = None
+
+TABLES = ("events", "reports", "logs")
+
+
+def upgrade():
+    for table in TABLES:
+        op.create_index(f"ix_{table}_timestamp_id", table, ["timestamp", "id"])
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_index(f"ix_{table}_timestamp_id", table_name=table)
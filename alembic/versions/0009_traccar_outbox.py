@@ -0,0 +1,42 @@
+"""add traccar_outbox for asynchronous Traccar sync
+
+Revision ID: 0009_traccar_outbox
+Revises: 0008_keyset_indexes
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009_traccar_outbox"
+down_revision = "0008_keyset_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "traccar_outbox",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("entity_type", sa.String, nullable=False),
+        sa.Column("entity_id", sa.Integer, nullable=False),
+        sa.Column("op", sa.String, nullable=False),
+        sa.Column("payload", sa.JSON, nullable=True),
+        sa.Column("status", sa.String, nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("last_error", sa.Text, nullable=True),
+        sa.Column("next_attempt_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_traccar_outbox_id", "traccar_outbox", ["id"])
+    op.create_index("ix_traccar_outbox_status_id", "traccar_outbox", ["status", "id"])
+    op.create_index("ix_traccar_outbox_entity", "traccar_outbox", ["entity_type", "entity_id", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_traccar_outbox_entity", table_name="traccar_outbox")
+    op.drop_index("ix_traccar_outbox_status_id", table_name="traccar_outbox")
+    op.drop_index("ix_traccar_outbox_id", table_name="traccar_outbox")
+    op.drop_table("traccar_outbox")
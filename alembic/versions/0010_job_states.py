@@ -0,0 +1,28 @@
+"""add job_states checkpoints for maintenance jobs
+
+Revision ID: 0010_job_states
+Revises: 0009_traccar_outbox
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0010_job_states"
+down_revision = "0009_traccar_outbox"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "job_states",
+        sa.Column("name", sa.String, primary_key=True),
+        sa.Column("last_run_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("details", sa.JSON, nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_table("job_states")
@@ -0,0 +1,63 @@
+"""add trips and per-device trip segmenter state
+
+Revision ID: 0011_trips
+Revises: 0010_job_states
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0011_trips"
+down_revision = "0010_job_states"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "trips",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("device_id", sa.Integer, sa.ForeignKey("devices.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("status", sa.String, nullable=False, server_default="open"),
+        sa.Column("end_reason", sa.String, nullable=True),
+        sa.Column("start_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("end_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("start_latitude", sa.Float, nullable=False),
+        sa.Column("start_longitude", sa.Float, nullable=False),
+        sa.Column("end_latitude", sa.Float, nullable=True),
+        sa.Column("end_longitude", sa.Float, nullable=True),
+        sa.Column("distance_m", sa.Float, nullable=False, server_default="0"),
+        sa.Column("max_speed", sa.Float, nullable=True),
+        sa.Column("min_latitude", sa.Float, nullable=False),
+        sa.Column("min_longitude", sa.Float, nullable=False),
+        sa.Column("max_latitude", sa.Float, nullable=False),
+        sa.Column("max_longitude", sa.Float, nullable=False),
+        sa.Column("point_count", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_trips_id", "trips", ["id"])
+    op.create_index("ix_trips_device_start", "trips", ["device_id", "start_at", "id"])
+    op.create_index("ix_trips_start_id", "trips", ["start_at", "id"])
+    op.create_table(
+        "trip_states",
+        sa.Column("device_id", sa.Integer, sa.ForeignKey("devices.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("home_latitude", sa.Float, nullable=True),
+        sa.Column("home_longitude", sa.Float, nullable=True),
+        sa.Column("last_latitude", sa.Float, nullable=True),
+        sa.Column("last_longitude", sa.Float, nullable=True),
+        sa.Column("last_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("dwell_latitude", sa.Float, nullable=True),
+        sa.Column("dwell_longitude", sa.Float, nullable=True),
+        sa.Column("dwell_since", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("open_trip_id", sa.Integer, sa.ForeignKey("trips.id", ondelete="SET NULL"), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_table("trip_states")
+    op.drop_index("ix_trips_start_id", table_name="trips")
+    op.drop_index("ix_trips_device_start", table_name="trips")
+    op.drop_index("ix_trips_id", table_name="trips")
+    op.drop_table("trips")
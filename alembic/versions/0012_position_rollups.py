@@ -0,0 +1,52 @@
+"""add hourly/daily position rollups and a per-device position time index
+
+Revision ID: 0012_position_rollups
+Revises: 0011_trips
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0012_position_rollups"
+down_revision = "0011_trips"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_positions_device_timestamp", "positions", ["device_id", "timestamp"])
+    op.create_table(
+        "position_rollups",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("device_id", sa.Integer, sa.ForeignKey("devices.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("bucket", sa.String, nullable=False),
+        sa.Column("bucket_start", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("count", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("distance_m", sa.Float, nullable=False, server_default="0"),
+        sa.Column("speed_sum", sa.Float, nullable=False, server_default="0"),
+        sa.Column("speed_count", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("max_speed", sa.Float, nullable=True),
+        sa.Column("min_battery", sa.Float, nullable=True),
+        sa.Column("min_latitude", sa.Float, nullable=False),
+        sa.Column("min_longitude", sa.Float, nullable=False),
+        sa.Column("max_latitude", sa.Float, nullable=False),
+        sa.Column("max_longitude", sa.Float, nullable=False),
+        sa.Column("first_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("first_latitude", sa.Float, nullable=False),
+        sa.Column("first_longitude", sa.Float, nullable=False),
+        sa.Column("last_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("last_latitude", sa.Float, nullable=False),
+        sa.Column("last_longitude", sa.Float, nullable=False),
+        sa.UniqueConstraint("device_id", "bucket", "bucket_start", name="uq_position_rollups_bucket"),
+    )
+    op.create_index("ix_position_rollups_id", "position_rollups", ["id"])
+    op.create_index("ix_position_rollups_bucket_start", "position_rollups", ["bucket", "bucket_start"])
+
+
+def downgrade():
+    op.drop_index("ix_position_rollups_bucket_start", table_name="position_rollups")
+    op.drop_index("ix_position_rollups_id", table_name="position_rollups")
+    op.drop_table("position_rollups")
+    op.drop_index("ix_positions_device_timestamp", table_name="positions")
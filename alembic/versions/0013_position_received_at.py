@@ -0,0 +1,24 @@
+"""record when each position reached the server
+
+Revision ID: 0013_position_received_at
+Revises: 0012_position_rollups
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0013_position_received_at"
+down_revision = "0012_position_rollups"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("positions", sa.Column("received_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("positions") as batch:
+        batch.drop_column("received_at")
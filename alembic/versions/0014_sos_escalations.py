@@ -0,0 +1,36 @@
+"""track escalation and acknowledgement of SOS alarms
+
+Revision ID: 0014_sos_escalations
+Revises: 0013_position_received_at
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0014_sos_escalations"
+down_revision = "0013_position_received_at"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "sos_escalations",
+        sa.Column("event_id", sa.Integer, sa.ForeignKey("events.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("device_id", sa.Integer, sa.ForeignKey("devices.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("level", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("opened_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("next_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_broadcast_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("acknowledged_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("acknowledged_by", sa.Integer, sa.ForeignKey("users.id", ondelete="SET NULL"), nullable=True),
+        sa.Column("ack_seconds", sa.Float, nullable=True),
+    )
+    op.create_index("ix_sos_escalations_open", "sos_escalations", ["acknowledged_at", "next_at"])
+
+
+def downgrade():
+    op.drop_index("ix_sos_escalations_open", table_name="sos_escalations")
+    op.drop_table("sos_escalations")
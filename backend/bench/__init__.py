@@ -0,0 +1 @@
+"""Benchmarks for the Bantay backend; run them from backend/ with `python -m bench.<name>`."""
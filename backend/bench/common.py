@@ -0,0 +1,194 @@
+"""Shared helpers for the benchmark scripts.
+
+Each benchmark prints or writes one JSON document: `benchmark`, `meta` (git
+commit, Python, platform, database), `config` (the arguments), and then its
+measurements. Keys are stable between runs, so two result files can be
+compared with `--baseline old.json`, which lists every numeric value that
+changed.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+BACKEND = Path(__file__).resolve().parents[1]
+ROOT = BACKEND.parent
+
+BENCH_PASSWORD = "benchpass"
+BENCH_ADMIN = "bench-admin@example.com"
+BENCH_COAST_GUARD = "bench-cg@example.com"
+TRACCAR_ID_BASE = 900000
+
+# roughly the waters between Mindoro, Batangas and Marinduque
+AREA = ((12.5, 14.0), (120.5, 122.5))
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(values: Iterable[float], digits: int = 2) -> dict:
+    """count/mean/p50/p95/p99/max of a list of values (milliseconds by convention)."""
+    ordered = sorted(values)
+    if not ordered:
+        return {"count": 0}
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), digits),
+        "p50": round(percentile(ordered, 0.50), digits),
+        "p95": round(percentile(ordered, 0.95), digits),
+        "p99": round(percentile(ordered, 0.99), digits),
+        "max": round(ordered[-1], digits),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def meta(database_url: Optional[str] = None) -> dict:
+    return {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "database": database_url.split("://", 1)[0] if database_url else None,
+    }
+
+
+def _numeric_leaves(node, path: str = "") -> Iterator[Tuple[str, float]]:
+    if isinstance(node, dict):
+        for key, value in node.items():
+            yield from _numeric_leaves(value, f"{path}.{key}" if path else str(key))
+    elif isinstance(node, (int, float)) and not isinstance(node, bool):
+        yield path, float(node)
+
+
+def compare(results: dict, baseline: dict) -> List[dict]:
+    """Numeric values that differ from the baseline, with their relative change."""
+    old = dict(_numeric_leaves({k: v for k, v in baseline.items() if k not in ("meta", "config")}))
+    rows = []
+    for path, value in _numeric_leaves({k: v for k, v in results.items() if k not in ("meta", "config")}):
+        before = old.get(path)
+        if before is None or before == value:
+            continue
+        change = None if before == 0 else round((value - before) / abs(before) * 100, 1)
+        rows.append({"metric": path, "baseline": before, "current": value, "change_pct": change})
+    return rows
+
+
+def emit(results: dict, output: Optional[str], baseline: Optional[str]) -> None:
+    """Write the results (file or stdout); with a baseline, print the differences to stderr."""
+    text = json.dumps(results, indent=2, default=str)
+    if output:
+        Path(output).write_text(text + "\n")
+        print(f"[bench] results written to {output}", file=sys.stderr)
+    else:
+        print(text)
+    if baseline:
+        rows = compare(results, json.loads(Path(baseline).read_text()))
+        print(f"[bench] {len(rows)} values differ from {baseline}", file=sys.stderr)
+        for row in rows:
+            change = "n/a" if row["change_pct"] is None else f"{row['change_pct']:+.1f}%"
+            print(f"  {row['metric']}: {row['baseline']:g} -> {row['current']:g} ({change})", file=sys.stderr)
+
+
+def db_size(engine) -> Optional[int]:
+    """Bytes used by the database (SQLite file plus WAL, or pg_database_size); None when unknown."""
+    from sqlalchemy import text
+
+    if engine.dialect.name == "sqlite":
+        path = engine.url.database
+        if not path or path == ":memory:":
+            return None
+        return sum(os.path.getsize(p) for p in (path, f"{path}-wal") if os.path.exists(p))
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            return int(conn.execute(text("SELECT pg_database_size(current_database())")).scalar())
+    return None
+
+
+def random_start(rng: random.Random) -> Tuple[float, float]:
+    (lat0, lat1), (lon0, lon1) = AREA
+    return rng.uniform(lat0, lat1), rng.uniform(lon0, lon1)
+
+
+def seed_fleet(db, devices: int, fishers: int) -> dict:
+    """Create bench roles, users and `devices` devices (idempotent).
+
+    Devices are `BENCH-00000`.. with Traccar ids from `TRACCAR_ID_BASE`, owned
+    round-robin by `fishers` fisherfolk users. Everyone's password is
+    `BENCH_PASSWORD`, hashed once. Returns the ids the benchmarks need.
+    """
+    from sqlalchemy import insert
+
+    from core.security import hash_password
+    from db.seed import seed_roles
+    from models.device import Device
+    from models.user import User
+
+    roles = seed_roles(db)
+
+    fishers = max(1, fishers)
+    wanted = [("Bench Admin", BENCH_ADMIN, "administrator"), ("Bench Coast Guard", BENCH_COAST_GUARD, "coast_guard")]
+    wanted += [(f"Bench Fisher {i}", f"bench-fisher-{i}@example.com", "fisherfolk") for i in range(fishers)]
+    existing = {email: uid for uid, email in db.query(User.id, User.email).filter(User.email.like("bench-%@example.com"))}
+    missing = [w for w in wanted if w[1] not in existing]
+    if missing:
+        password_hash = hash_password(BENCH_PASSWORD)
+        db.execute(insert(User.__table__), [
+            {"name": name, "email": email, "password_hash": password_hash, "role_id": roles[role], "is_active": True}
+            for name, email, role in missing
+        ])
+        existing = {email: uid for uid, email in db.query(User.id, User.email).filter(User.email.like("bench-%@example.com"))}
+    fisher_ids = [existing[f"bench-fisher-{i}@example.com"] for i in range(fishers)]
+
+    have = {tid for (tid,) in db.query(Device.traccar_device_id).filter(Device.unique_id.like("BENCH-%"))}
+    rows = [
+        {"traccar_device_id": TRACCAR_ID_BASE + i, "unique_id": f"BENCH-{i:05d}", "name": f"Bench {i}", "user_id": fisher_ids[i % fishers]}
+        for i in range(devices)
+        if TRACCAR_ID_BASE + i not in have
+    ]
+    if rows:
+        db.execute(insert(Device.__table__), rows)
+    db.commit()
+
+    device_rows = (
+        db.query(Device.id, Device.traccar_device_id, Device.user_id)
+        .filter(Device.traccar_device_id >= TRACCAR_ID_BASE, Device.traccar_device_id < TRACCAR_ID_BASE + devices)
+        .order_by(Device.traccar_device_id)
+        .all()
+    )
+    return {
+        "admin_email": BENCH_ADMIN,
+        "coast_guard_email": BENCH_COAST_GUARD,
+        "fisher_emails": [f"bench-fisher-{i}@example.com" for i in range(fishers)],
+        "devices": [{"id": did, "traccar_id": tid, "user_id": uid} for did, tid, uid in device_rows],
+    }
+
+
+def load_models() -> None:
+    """Register every table before the first query (manage.py's list plus fisherfolk settings) and the search indexes."""
+    if str(BACKEND) not in sys.path:
+        sys.path.insert(0, str(BACKEND))
+    from manage import _load_models
+
+    _load_models()
+    import models.fisherfolk_settings  # noqa: F401
+    # the FTS5 / pg_trgm indexes the q= cases are meant to measure
+    import db.search  # noqa: F401
@@ -0,0 +1,155 @@
+"""Import-time and time-to-first-request report for an API worker.
+
+Usage examples (from backend/):
+    python -m bench.importtime                          # 5 fresh interpreters importing main
+    python -m bench.importtime --top 40 --output imports.json
+    python -m bench.importtime --baseline imports.json
+
+Each run starts a fresh interpreter that records:
+- `import main` time;
+- the time from entering the interpreter to the end of the first request.
+  The request is `GET /metrics`, sent straight to the ASGI app, so no HTTP
+  client library is imported.
+
+Wall times across `--repeat` runs are summarized. `--trace-runs` more runs
+under `python -X importtime` are broken down by top-level package (summed
+self time) and by module (cumulative time). Each module keeps its fastest
+run, which filters out scheduler noise. That shows which dependencies a
+worker pays for before it can serve anything.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from bench.common import BACKEND, emit, meta, summarize
+
+# runs in the child interpreter; prints one JSON line
+_PROBE = r"""
+import time
+started = time.perf_counter()
+import asyncio, json, sys
+import main
+imported = time.perf_counter()
+
+async def first_request():
+    sent = []
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+             "path": "/metrics", "raw_path": b"/metrics", "query_string": b"", "root_path": "", "headers": [],
+             "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80)}
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        sent.append(message)
+    await main.app(scope, receive, send)
+    return sent[0]["status"]
+
+status = asyncio.run(first_request())
+done = time.perf_counter()
+print(json.dumps({"import_ms": (imported - started) * 1000, "first_request_ms": (done - started) * 1000,
+                  "status": status, "modules": len(sys.modules)}))
+"""
+
+
+def _env(database_url: str) -> dict:
+    env = os.environ.copy()
+    env["DATABASE_URL"] = database_url
+    env.setdefault("BANTAY_SKIP_TRACCAR", "1")
+    env.setdefault("SECRET_KEY", "bench-secret-key")
+    env.pop("TESTING", None)
+    return env
+
+
+def _probe(env: dict) -> dict:
+    out = subprocess.run([sys.executable, "-c", _PROBE], cwd=BACKEND, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def parse_importtime(stderr: str) -> List[dict]:
+    """Rows of `-X importtime` output: module, self and cumulative microseconds, nesting depth."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            rows.append({
+                "module": name.strip(),
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+                "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+            })
+        except ValueError:
+            continue
+    return rows
+
+
+def fastest(runs: List[List[dict]]) -> List[dict]:
+    """Per module, the row with the lowest self time across traced runs."""
+    best: Dict[str, dict] = {}
+    for rows in runs:
+        for row in rows:
+            kept = best.get(row["module"])
+            if kept is None:
+                best[row["module"]] = dict(row)
+            else:
+                kept["self_us"] = min(kept["self_us"], row["self_us"])
+                kept["cumulative_us"] = min(kept["cumulative_us"], row["cumulative_us"])
+    return list(best.values())
+
+
+def breakdown(rows: List[dict], top: int) -> dict:
+    by_package: Dict[str, int] = defaultdict(int)
+    for row in rows:
+        by_package[row["module"].split(".", 1)[0]] += row["self_us"]
+    packages = sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[:top]
+    modules = sorted(rows, key=lambda r: r["cumulative_us"], reverse=True)[:top]
+    return {
+        "total_ms": round(sum(r["self_us"] for r in rows) / 1000, 1),
+        "modules_imported": len(rows),
+        "by_package_ms": {name: round(us / 1000, 1) for name, us in packages},
+        "slowest_cumulative_ms": {r["module"]: round(r["cumulative_us"] / 1000, 1) for r in modules},
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure worker import time and time to first request")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters to time")
+    parser.add_argument("--trace-runs", type=int, default=3, help="runs under -X importtime")
+    parser.add_argument("--top", type=int, default=25, help="packages/modules to list")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="bantay-bench-") as tmpdir:
+        database_url = f"sqlite:///{tmpdir}/import.db"
+        env = _env(database_url)
+        runs = [_probe(env) for _ in range(max(1, args.repeat))]
+        traced = [
+            parse_importtime(subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", "import main"], cwd=BACKEND, env=env, capture_output=True, text=True, check=True
+            ).stderr)
+            for _ in range(max(1, args.trace_runs))
+        ]
+    results = {
+        "benchmark": "importtime",
+        "meta": meta(database_url),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "import_main_ms": summarize(r["import_ms"] for r in runs),
+        "first_request_ms": summarize(r["first_request_ms"] for r in runs),
+        "modules_loaded": runs[-1]["modules"],
+        "importtime": breakdown(fastest(traced), args.top),
+    }
+    emit(results, args.output, args.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
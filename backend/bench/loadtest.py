@@ -0,0 +1,429 @@
+"""Ingest load test: a synthetic Traccar forwarder plus websocket clients.
+
+Usage examples (from backend/):
+    python -m bench.loadtest                                   # 200 vessels, 10 s interval, 60 s, own server
+    python -m bench.loadtest --devices 1000 --interval 5 --sos-per-minute 6 --ws-clients 50
+    python -m bench.loadtest --output after.json --baseline before.json
+    python -m bench.loadtest --url http://127.0.0.1:8000 --database-url postgresql://...  # running server
+
+By default the script creates a fresh SQLite database in a temporary
+directory, seeds bench users and devices (see `bench.common.seed_fleet`) and
+starts uvicorn on a free port. With `--url` it targets a running server
+instead. `--database-url` must then point at that server's database (for
+seeding and size growth), and the server must share the forwarder's
+`TRACCAR_SHARED_SECRET`.
+
+Every vessel follows its own track and reports every `--interval` seconds,
+with the phases spread over the interval. Each report is one POST to
+`/api/traccar/positions`, as Traccar's JSON forwarder sends it. After a
+report, an SOS alarm follows with the probability that yields
+`--sos-per-minute` across the fleet. Alarms are posted to
+`/api/traccar/events` in the forwarder's wrapper format. Meanwhile,
+`--ws-clients` websocket clients (mixed by `--ws-mix`) listen on
+`/api/ws/socket`.
+
+Reported (JSON, see `bench.common`):
+- ingest: requests, errors, items saved, throughput, and latency
+  measured from the scheduled send time. A server that falls behind
+  shows up here, not only in service time.
+- fanout: time from the server's `server_received_at` to arrival at the
+  client, per role, plus the initial snapshot time. Both clocks are the
+  same when the server is local.
+- db: bytes and rows before and after, and bytes per stored position.
+- server: the server's own `GET /api/admin/ingest/latency` stages.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import heapq
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from bench.common import BACKEND, BENCH_PASSWORD, emit, load_models, meta, random_start, seed_fleet, summarize
+
+KNOT_DEGREES_PER_SECOND = 1852.0 / 3600.0 / 111_320.0
+
+
+class Vessel:
+    """A boat drifting along a slowly turning heading; speeds in knots like Traccar."""
+
+    def __init__(self, traccar_id: int, rng: random.Random):
+        self.traccar_id = traccar_id
+        self.rng = rng
+        self.lat, self.lon = random_start(rng)
+        self.course = rng.uniform(0, 360)
+        self.speed = rng.uniform(0, 8)
+        self.battery = rng.uniform(40, 100)
+        self.seq = 0
+
+    def step(self, seconds: float) -> None:
+        self.course = (self.course + self.rng.gauss(0, 15)) % 360
+        self.speed = min(12.0, max(0.0, self.speed + self.rng.gauss(0, 0.5)))
+        distance = self.speed * seconds * KNOT_DEGREES_PER_SECOND
+        self.lat += distance * math.cos(math.radians(self.course))
+        self.lon += distance * math.sin(math.radians(self.course)) / max(0.1, math.cos(math.radians(self.lat)))
+        self.battery = max(5.0, self.battery - self.rng.uniform(0, 0.05))
+
+    def position(self) -> dict:
+        now = datetime.now(timezone.utc)
+        # the device buffers/transmits for a moment before Traccar stamps serverTime
+        fix = now - timedelta(seconds=self.rng.uniform(0.5, 3.0))
+        self.seq += 1
+        return {
+            "id": self.seq,
+            "deviceId": self.traccar_id,
+            "fixTime": fix.isoformat(),
+            "serverTime": (now - timedelta(seconds=self.rng.uniform(0.02, 0.2))).isoformat(),
+            "latitude": round(self.lat, 6),
+            "longitude": round(self.lon, 6),
+            "speed": round(self.speed, 2),
+            "course": round(self.course, 1),
+            "attributes": {"batteryLevel": round(self.battery, 1), "motion": self.speed > 0.5},
+        }
+
+    def sos(self, position: dict) -> dict:
+        return {
+            "event": {
+                "id": self.seq,
+                "deviceId": self.traccar_id,
+                "type": "alarm",
+                "eventTime": position["serverTime"],
+                "attributes": {"alarm": "sos"},
+            },
+            "position": position,
+            "device": {"id": self.traccar_id},
+        }
+
+
+class IngestStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.saved = 0
+        self.latency_ms: List[float] = []
+        self.service_ms: List[float] = []
+
+    def report(self, seconds: float) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "saved": self.saved,
+            "throughput_per_s": round(self.saved / seconds, 2) if seconds else 0.0,
+            "latency_ms": summarize(self.latency_ms),
+            "service_ms": summarize(self.service_ms),
+        }
+
+
+class FanoutStats:
+    def __init__(self):
+        self.clients = 0
+        self.disconnects = 0
+        self.messages = 0
+        self.items = 0
+        self.snapshot_ms: List[float] = []
+        self.delay_ms: List[float] = []
+
+    def report(self) -> dict:
+        return {
+            "clients": self.clients,
+            "disconnects": self.disconnects,
+            "messages": self.messages,
+            "items": self.items,
+            "snapshot_ms": summarize(self.snapshot_ms),
+            "delay_ms": summarize(self.delay_ms),
+        }
+
+
+def _parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        role, _, weight = part.partition("=")
+        if role.strip() not in ("administrator", "coast_guard", "fisherfolk"):
+            raise argparse.ArgumentTypeError(f"unknown role {role!r} in --ws-mix")
+        mix[role.strip()] = float(weight or 1)
+    return mix
+
+
+def _assign_roles(clients: int, mix: Dict[str, float]) -> List[str]:
+    """Split `clients` by weight (largest remainder), in a stable order."""
+    total = sum(mix.values())
+    shares = {role: clients * weight / total for role, weight in mix.items()}
+    counts = {role: int(share) for role, share in shares.items()}
+    for role in sorted(shares, key=lambda r: shares[r] - counts[r], reverse=True)[: clients - sum(counts.values())]:
+        counts[role] += 1
+    return [role for role in mix for _ in range(counts[role])]
+
+
+async def _login(client, email: str) -> str:
+    resp = await client.post("/api/auth/login", json={"email": email, "password": BENCH_PASSWORD})
+    resp.raise_for_status()
+    return resp.json()["access_token"]
+
+
+async def _ws_client(url: str, stats: FanoutStats, stop: asyncio.Event) -> None:
+    from websockets.asyncio.client import connect
+    from websockets.exceptions import WebSocketException
+
+    started = time.perf_counter()
+    try:
+        async with connect(url, max_size=None) as ws:
+            stats.clients += 1
+            await ws.recv()
+            stats.snapshot_ms.append((time.perf_counter() - started) * 1000)
+            while not stop.is_set():
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=0.25)
+                except asyncio.TimeoutError:
+                    continue
+                now = time.time()
+                msg = json.loads(raw)
+                items = (msg.get("positions") or []) + (msg.get("events") or [])
+                stats.messages += 1
+                stats.items += len(items)
+                for item in items:
+                    stamp = item.get("server_received_at")
+                    if stamp:
+                        stats.delay_ms.append((now - datetime.fromisoformat(stamp).timestamp()) * 1000)
+    except (OSError, WebSocketException):
+        stats.disconnects += 1
+
+
+async def _forward(client, args, vessels: List[Vessel], stats: Dict[str, IngestStats], rng: random.Random, secret: str) -> float:
+    loop = asyncio.get_running_loop()
+    headers = {"Authorization": f"Bearer {secret}"}
+    limit = asyncio.Semaphore(args.concurrency)
+    reports_per_minute = len(vessels) * 60.0 / args.interval
+    sos_probability = min(1.0, args.sos_per_minute / reports_per_minute) if reports_per_minute else 0.0
+    tasks = set()
+
+    async def post(kind: str, body: dict, due: float):
+        async with limit:
+            sent = loop.time()
+            entry = stats[kind]
+            entry.requests += 1
+            try:
+                resp = await client.post(f"/api/traccar/{kind}", json=body, headers=headers)
+                result = resp.json() if resp.status_code == 200 else {}
+            except Exception:
+                result = {}
+            done = loop.time()
+            if not result.get("ok"):
+                entry.errors += 1
+            entry.saved += int(result.get("saved") or 0)
+            entry.latency_ms.append((done - due) * 1000)
+            entry.service_ms.append((done - sent) * 1000)
+
+    def spawn(kind: str, body: dict, due: float):
+        task = asyncio.create_task(post(kind, body, due))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    started = loop.time()
+    deadline = started + args.duration
+    schedule = [(started + rng.uniform(0, args.interval), i) for i in range(len(vessels))]
+    heapq.heapify(schedule)
+    while schedule and schedule[0][0] < deadline:
+        due, i = heapq.heappop(schedule)
+        wait = due - loop.time()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        vessel = vessels[i]
+        vessel.step(args.interval)
+        position = vessel.position()
+        spawn("positions", position, due)
+        if rng.random() < sos_probability:
+            spawn("events", vessel.sos(position), due)
+        heapq.heappush(schedule, (due + args.interval, i))
+    if tasks:
+        await asyncio.gather(*tasks)
+    return loop.time() - started
+
+
+async def run(args, fleet: dict, base_url: str, secret: str) -> dict:
+    import httpx
+
+    rng = random.Random(args.seed)
+    vessels = [Vessel(d["traccar_id"], rng) for d in fleet["devices"]]
+    ingest = {"positions": IngestStats(), "events": IngestStats()}
+    roles = _assign_roles(args.ws_clients, args.ws_mix)
+    fanout = {role: FanoutStats() for role in dict.fromkeys(roles)}
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        emails = {"administrator": [fleet["admin_email"]], "coast_guard": [fleet["coast_guard_email"]], "fisherfolk": fleet["fisher_emails"]}
+        tokens = {}
+        stop = asyncio.Event()
+        listeners = []
+        ws_base = base_url.replace("http", "ws", 1)
+        for n, role in enumerate(roles):
+            email = emails[role][n % len(emails[role])]
+            if email not in tokens:
+                tokens[email] = await _login(client, email)
+            url = f"{ws_base}/api/ws/socket?token={tokens[email]}"
+            listeners.append(asyncio.create_task(_ws_client(url, fanout[role], stop)))
+        # let the clients connect and take their snapshot before the load starts
+        await asyncio.sleep(min(2.0, 0.2 + 0.01 * len(listeners)))
+
+        elapsed = await _forward(client, args, vessels, ingest, rng, secret)
+        await asyncio.sleep(args.drain)
+        stop.set()
+        await asyncio.gather(*listeners)
+
+        admin = tokens.get(fleet["admin_email"]) or await _login(client, fleet["admin_email"])
+        resp = await client.get("/api/admin/ingest/latency", headers={"Authorization": f"Bearer {admin}"})
+        server = resp.json() if resp.status_code == 200 else None
+
+    all_delays = [d for stats in fanout.values() for d in stats.delay_ms]
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "ingest": {kind: stats.report(elapsed) for kind, stats in ingest.items()},
+        "fanout": {"delay_ms": summarize(all_delays), "by_role": {role: stats.report() for role, stats in fanout.items()}},
+        "server": server,
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(port: int, workers: int) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    if workers > 1:
+        cmd += ["--workers", str(workers)]
+    return subprocess.Popen(cmd, cwd=BACKEND, env=os.environ.copy())
+
+
+def _wait_ready(base_url: str, server: subprocess.Popen, timeout: float = 30.0) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"[bench] server exited with code {server.returncode}")
+        try:
+            if httpx.get(f"{base_url}/metrics", timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit("[bench] server did not become ready")
+
+
+def _row_counts(db) -> dict:
+    from models.event import Event
+    from models.position import Position
+
+    return {"positions": db.query(Position).count(), "events": db.query(Event).count()}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test Traccar ingest and websocket fan-out")
+    parser.add_argument("--devices", type=int, default=200, help="fleet size")
+    parser.add_argument("--interval", type=float, default=10.0, help="seconds between reports of one vessel")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds of load")
+    parser.add_argument("--sos-per-minute", type=float, default=2.0, help="SOS alarms per minute across the fleet")
+    parser.add_argument("--ws-clients", type=int, default=20, help="websocket clients")
+    parser.add_argument("--ws-mix", type=_parse_mix, default="coast_guard=3,fisherfolk=6,administrator=1", help="role weights")
+    parser.add_argument("--fishers", type=int, default=0, help="fisherfolk owners (default: one per 10 devices)")
+    parser.add_argument("--concurrency", type=int, default=32, help="maximum requests in flight")
+    parser.add_argument("--timeout", type=float, default=30.0, help="request timeout in seconds")
+    parser.add_argument("--drain", type=float, default=1.0, help="seconds to keep listening after the last request")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for tracks and alarms")
+    parser.add_argument("--url", help="target a running server instead of starting one")
+    parser.add_argument("--database-url", help="database to seed and measure (default: a temporary SQLite file)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers of the started server")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary database directory")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    tmpdir = None
+    database_url = args.database_url
+    if args.url is None and database_url is None:
+        tmpdir = tempfile.mkdtemp(prefix="bantay-bench-")
+        database_url = f"sqlite:///{tmpdir}/bench.db"
+    if database_url is None:
+        parser.error("--url needs --database-url (the server's database) for seeding and size growth")
+
+    # before the first backend import: core.config reads the environment once
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("TRACCAR_SHARED_SECRET", "bench-traccar-secret")
+    os.environ.setdefault("SECRET_KEY", "bench-secret-key")
+    os.environ.setdefault("BANTAY_SKIP_TRACCAR", "1")
+    os.environ.setdefault("ADMIN_CREATE_ON_STARTUP", "false")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    load_models()
+    from db.base import Base
+    from db.session import SessionLocal, engine
+    from bench.common import db_size
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        fleet = seed_fleet(db, args.devices, args.fishers or math.ceil(args.devices / 10))
+        rows_before = _row_counts(db)
+    finally:
+        db.close()
+    bytes_before = db_size(engine)
+
+    server = None
+    base_url = (args.url or "").rstrip("/")
+    try:
+        if args.url is None:
+            port = _free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            server = _start_server(port, args.workers)
+            _wait_ready(base_url, server)
+        print(f"[bench] {len(fleet['devices'])} vessels every {args.interval:g}s for {args.duration:g}s against {base_url}", file=sys.stderr)
+        measured = asyncio.run(run(args, fleet, base_url, os.environ["TRACCAR_SHARED_SECRET"]))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    db = SessionLocal()
+    try:
+        rows_after = _row_counts(db)
+    finally:
+        db.close()
+    bytes_after = db_size(engine)
+    added = rows_after["positions"] - rows_before["positions"]
+    growth = None if bytes_before is None or bytes_after is None else bytes_after - bytes_before
+    results = {
+        "benchmark": "ingest-loadtest",
+        "meta": {**meta(database_url), "url": base_url},
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        **measured,
+        "db": {
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "growth_bytes": growth,
+            "bytes_per_position": round(growth / added, 1) if growth is not None and added else None,
+            "positions_added": added,
+            "events_added": rows_after["events"] - rows_before["events"],
+        },
+    }
+    engine.dispose()
+    if tmpdir and not args.keep:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    emit(results, args.output, args.baseline)
+    errors = sum(stats["errors"] for stats in measured["ingest"].values())
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
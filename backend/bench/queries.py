@@ -0,0 +1,244 @@
+"""Micro-benchmarks for the history, snapshot and listing endpoints, with query plans.
+
+Usage examples (from backend/):
+    python -m bench.datagen --database-url sqlite:///./bench_data.db
+    python -m bench.queries --database-url sqlite:///./bench_data.db --output before.json
+    python -m bench.queries --database-url sqlite:///./bench_data.db --baseline before.json --case ws_snapshot
+
+Runs the app in-process (TestClient, no lifespan) against a database filled
+by `bench.datagen`. Each case warms up, then runs `--iterations` times.
+Cases: coast guard and fisherfolk history, the websocket snapshot, alert
+search with `q=`, the user list and the log list (plain and with `q=`).
+
+Per case the results hold:
+- latency and database time per call (ms), and the query count;
+- response size and row count of the last call;
+- the plan of every distinct SELECT it ran. SQLite gives
+  `EXPLAIN QUERY PLAN`; PostgreSQL gives `EXPLAIN (ANALYZE, BUFFERS)`,
+  which runs the statement once more.
+
+History windows end at the newest fix in the database, so results stay
+comparable while the dataset ages.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional
+
+from bench.common import BENCH_ADMIN, BENCH_COAST_GUARD, BENCH_PASSWORD, emit, load_models, meta, summarize
+
+_PLAN_STATEMENT_CHARS = 600
+
+
+class QueryCapture:
+    """Counts and times statements on an engine; keeps the first parameters of each SELECT."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.engine = engine
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Dict[str, object] = {}
+        self._started: List[float] = []
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        self._started.append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        if not self._started:
+            return
+        self.count += 1
+        self.seconds += time.perf_counter() - self._started.pop()
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")) and statement not in self.statements:
+            self.statements[statement] = parameters
+
+    def reset(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def plans(self) -> List[dict]:
+        out = []
+        dialect = self.engine.dialect.name
+        for statement, parameters in self.statements.items():
+            if dialect == "sqlite":
+                prefix = "EXPLAIN QUERY PLAN "
+            elif dialect == "postgresql":
+                prefix = "EXPLAIN (ANALYZE, BUFFERS) "
+            else:
+                prefix = "EXPLAIN "
+            try:
+                with self.engine.connect() as conn:
+                    rows = conn.exec_driver_sql(prefix + statement, parameters).fetchall()
+                plan = [row[-1] if dialect == "sqlite" else row[0] for row in rows]
+            except Exception as e:
+                plan = [f"EXPLAIN failed: {e}"]
+            out.append({"statement": " ".join(statement.split())[:_PLAN_STATEMENT_CHARS], "plan": plan})
+        return out
+
+
+class Context:
+    def __init__(self, client, db):
+        from sqlalchemy import func
+
+        from models.device import Device
+        from models.position import Position
+        from models.user import User
+
+        self.client = client
+        self.tokens: Dict[str, str] = {}
+        # the busiest bench device and its owner; history windows end at its newest fix
+        device_id, _ = (
+            db.query(Position.device_id, func.count(Position.id))
+            .group_by(Position.device_id)
+            .order_by(func.count(Position.id).desc())
+            .first()
+            or (None, 0)
+        )
+        if device_id is None:
+            raise SystemExit("[bench] no positions; fill the database with `python -m bench.datagen` first")
+        self.device_id = device_id
+        device = db.query(Device).filter(Device.id == device_id).one()
+        self.device_name = device.name or ""
+        self.owner_email = db.query(User.email).filter(User.id == device.user_id).scalar()
+        self.latest = db.query(func.max(Position.timestamp)).filter(Position.device_id == device_id).scalar()
+
+    def headers(self, email: str) -> dict:
+        if email not in self.tokens:
+            resp = self.client.post("/api/auth/login", json={"email": email, "password": BENCH_PASSWORD})
+            if resp.status_code != 200:
+                raise SystemExit(f"[bench] login as {email} failed ({resp.status_code}); was the database made by bench.datagen?")
+            self.tokens[email] = resp.json()["access_token"]
+        return {"Authorization": f"Bearer {self.tokens[email]}"}
+
+
+def _window(ctx: Context, hours: float) -> dict:
+    end = ctx.latest
+    return {"start": (end - timedelta(hours=hours)).isoformat(), "end": end.isoformat()}
+
+
+def _get(ctx: Context, path: str, email: str, **params):
+    resp = ctx.client.get(path, params=params, headers=ctx.headers(email))
+    if resp.status_code != 200:
+        raise SystemExit(f"[bench] GET {path} returned {resp.status_code}: {resp.text[:200]}")
+    return resp.content, len(resp.json())
+
+
+def _ws_snapshot(ctx: Context):
+    import json
+
+    token = ctx.headers(BENCH_COAST_GUARD)["Authorization"].split(" ", 1)[1]
+    with ctx.client.websocket_connect(f"/api/ws/socket?token={token}") as ws:
+        raw = ws.receive_text()
+    msg = json.loads(raw)
+    return raw.encode(), len(msg.get("positions") or []) + len(msg.get("events") or [])
+
+
+def cases(args) -> Dict[str, Callable[[Context], tuple]]:
+    return {
+        "coastguard_history": lambda ctx: _get(
+            ctx, "/api/coastguard/history", BENCH_COAST_GUARD, device_id=ctx.device_id, **_window(ctx, args.history_hours)
+        ),
+        "fisherfolk_history": lambda ctx: _get(
+            ctx, "/api/fisherfolk/history", ctx.owner_email, device_id=ctx.device_id, **_window(ctx, args.history_hours)
+        ),
+        "ws_snapshot": _ws_snapshot,
+        "list_alerts_q_device": lambda ctx: _get(ctx, "/api/admin/alerts", BENCH_ADMIN, q=ctx.device_name, limit=args.limit),
+        "list_alerts_q_type": lambda ctx: _get(ctx, "/api/admin/alerts", BENCH_ADMIN, q="sos", limit=args.limit),
+        "list_users": lambda ctx: _get(ctx, "/api/admin/users", BENCH_ADMIN),
+        "list_logs": lambda ctx: _get(ctx, "/api/admin/logs", BENCH_ADMIN, limit=args.limit),
+        "list_logs_q": lambda ctx: _get(ctx, "/api/admin/logs", BENCH_ADMIN, q="device", limit=args.limit),
+    }
+
+
+def run_case(name: str, fn, ctx: Context, capture: QueryCapture, args) -> dict:
+    for _ in range(args.warmup):
+        fn(ctx)
+    capture.statements.clear()
+    latency, db_ms, queries = [], [], []
+    body, rows = b"", 0
+    for _ in range(args.iterations):
+        capture.reset()
+        started = time.perf_counter()
+        body, rows = fn(ctx)
+        latency.append((time.perf_counter() - started) * 1000)
+        db_ms.append(capture.seconds * 1000)
+        queries.append(capture.count)
+    print(f"[bench] {name}: p50 {summarize(latency)['p50']} ms", file=sys.stderr)
+    return {
+        "latency_ms": summarize(latency),
+        "db_ms": summarize(db_ms),
+        "queries": max(queries) if queries else 0,
+        "rows": rows,
+        "response_bytes": len(body),
+        "plans": capture.plans() if args.plans else [],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark history, snapshot and listing queries")
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL"), help="database made by bench.datagen")
+    parser.add_argument("--case", action="append", help="run only this case (repeatable)")
+    parser.add_argument("--iterations", type=int, default=20, help="measured calls per case")
+    parser.add_argument("--warmup", type=int, default=2, help="unmeasured calls per case")
+    parser.add_argument("--history-hours", type=float, default=12.0, help="history window")
+    parser.add_argument("--limit", type=int, default=200, help="page size for the list endpoints")
+    parser.add_argument("--no-plans", dest="plans", action="store_false", help="skip EXPLAIN")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+    if not args.database_url:
+        parser.error("--database-url (or DATABASE_URL) is required")
+
+    # before the first backend import: core.config reads the environment once
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("BANTAY_SKIP_TRACCAR", "1")
+    os.environ.setdefault("TIMING_ENABLED", "false")
+    load_models()
+    from fastapi.testclient import TestClient
+
+    from db.search import search_backend
+    from db.session import SessionLocal, engine
+    from main import app
+
+    selected = cases(args)
+    unknown = set(args.case or ()) - set(selected)
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(sorted(unknown))}; choose from {', '.join(selected)}")
+    db = SessionLocal()
+    try:
+        ctx = Context(TestClient(app), db)
+        backend = search_backend(db)
+    finally:
+        db.close()
+    if backend == "like":
+        print("[bench] no search indexes in this database: the q= cases measure the LIKE fallback", file=sys.stderr)
+    capture = QueryCapture(engine)
+    results = {}
+    for name, fn in selected.items():
+        if args.case and name not in args.case:
+            continue
+        results[name] = run_case(name, fn, ctx, capture, args)
+    emit(
+        {
+            "benchmark": "queries",
+            "meta": meta(args.database_url),
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+            "search_backend": backend,
+            "cases": results,
+        },
+        args.output,
+        args.baseline,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
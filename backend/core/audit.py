@@ -0,0 +1,203 @@
+"""Shared audit log writer.
+
+`log_action` records a `Log` entry for a mutation without committing on its
+own. Two durability modes are supported via `AUDIT_MODE`:
+
+- `transaction` (default): the `Log` row is added to the caller's session and
+  becomes durable with the business commit (one transaction per mutation).
+- `buffered`: entries are staged on the session, handed to an in-memory
+  buffer once the caller commits (dropped on rollback) and written in batches
+  by a background thread. A crash can lose up to one flush interval of entries.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.metrics import REGISTRY
+from models.log import Log
+
+logger = logging.getLogger(__name__)
+
+_PENDING_KEY = "audit_pending"
+
+
+class AuditMetrics:
+    """Write-latency counters for the audit path (guarded by a lock; updates are tiny)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.entries = 0
+            self.enlist_seconds_total = 0.0
+            self.batches = 0
+            self.batch_entries = 0
+            self.flush_seconds_total = 0.0
+            self.flush_seconds_max = 0.0
+            self.queue_delay_seconds_max = 0.0
+            self.failed_batches = 0
+
+    def record_enlist(self, seconds: float):
+        with self._lock:
+            self.entries += 1
+            self.enlist_seconds_total += seconds
+
+    def record_flush(self, size: int, seconds: float, oldest_delay: float, ok: bool = True):
+        with self._lock:
+            if not ok:
+                self.failed_batches += 1
+                return
+            self.batches += 1
+            self.batch_entries += size
+            self.flush_seconds_total += seconds
+            self.flush_seconds_max = max(self.flush_seconds_max, seconds)
+            self.queue_delay_seconds_max = max(self.queue_delay_seconds_max, oldest_delay)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "mode": audit_mode(),
+                "entries": self.entries,
+                "enlist_seconds_avg": (self.enlist_seconds_total / self.entries) if self.entries else 0.0,
+                "batches": self.batches,
+                "batch_size_avg": (self.batch_entries / self.batches) if self.batches else 0.0,
+                "flush_seconds_avg": (self.flush_seconds_total / self.batches) if self.batches else 0.0,
+                "flush_seconds_max": self.flush_seconds_max,
+                "queue_delay_seconds_max": self.queue_delay_seconds_max,
+                "failed_batches": self.failed_batches,
+                "buffered": writer.pending(),
+            }
+
+
+class BufferedAuditWriter:
+    """Collect committed audit entries and insert them in batches from a daemon thread."""
+
+    def __init__(self):
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def submit(self, rows: list):
+        self._buffer.extend(rows)
+        self._ensure_started()
+        if len(self._buffer) >= settings.AUDIT_BATCH_SIZE:
+            self._wake.set()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        interval = max(settings.AUDIT_FLUSH_INTERVAL_MS, 10) / 1000.0
+        while not self._stop.is_set():
+            self._wake.wait(interval)
+            self._wake.clear()
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        """Write everything currently buffered; safe to call from any thread."""
+        from db.session import SessionLocal
+
+        while self._buffer:
+            batch = []
+            while self._buffer and len(batch) < settings.AUDIT_BATCH_SIZE:
+                batch.append(self._buffer.popleft())
+            oldest = min(row.pop("_enqueued_at") for row in batch)
+            start = time.perf_counter()
+            db = SessionLocal()
+            try:
+                db.execute(insert(Log), batch)
+                db.commit()
+                metrics.record_flush(len(batch), time.perf_counter() - start, time.monotonic() - oldest)
+            except Exception:
+                db.rollback()
+                metrics.record_flush(len(batch), time.perf_counter() - start, 0.0, ok=False)
+                logger.exception("Failed to write %d audit entries", len(batch))
+            finally:
+                db.close()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+
+metrics = AuditMetrics()
+writer = BufferedAuditWriter()
+
+
+def audit_mode() -> str:
+    return (getattr(settings, "AUDIT_MODE", "transaction") or "transaction").lower()
+
+
+def log_action(db: Session, table: str, record_id: int, action: str, actor_user_id: Optional[int] = None, details: Optional[dict] = None):
+    """Record an audit entry as part of the caller's unit of work. Never commits."""
+    start = time.perf_counter()
+    if audit_mode() == "buffered":
+        # make sure a rollback of the surrounding unit of work fires and discards the entry
+        if not db.in_transaction():
+            db.begin()
+        db.info.setdefault(_PENDING_KEY, []).append({
+            "table_name": table,
+            "record_id": record_id,
+            "action": action,
+            "actor_user_id": actor_user_id,
+            "details": details,
+            "timestamp": datetime.now(timezone.utc),
+            "_enqueued_at": time.monotonic(),
+        })
+    else:
+        db.add(Log(table_name=table, record_id=record_id, action=action, actor_user_id=actor_user_id, details=details))
+    metrics.record_enlist(time.perf_counter() - start)
+
+
+@event.listens_for(Session, "after_commit")
+def _release_pending(session):
+    rows = session.info.pop(_PENDING_KEY, None)
+    if rows:
+        writer.submit(rows)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session, previous_transaction):
+    # a savepoint rolling back (begin_nested) leaves the outer transaction and its entries alive
+    if previous_transaction.nested:
+        return
+    session.info.pop(_PENDING_KEY, None)
+
+
+@REGISTRY.collector
+def _collect_audit():
+    snap = metrics.snapshot()
+    return [
+        ("bantay_audit_entries_total", "counter", "Audit entries recorded.", [({}, snap["entries"])]),
+        ("bantay_audit_batches_total", "counter", "Buffered audit batches written.", [({}, snap["batches"])]),
+        ("bantay_audit_failed_batches_total", "counter", "Buffered audit batches that failed to write.", [({}, snap["failed_batches"])]),
+        ("bantay_audit_buffered", "gauge", "Audit entries waiting in the buffer.", [({}, snap["buffered"])]),
+        ("bantay_audit_flush_seconds_max", "gauge", "Slowest buffered audit flush so far.", [({}, snap["flush_seconds_max"])]),
+    ]
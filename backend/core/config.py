@@ -38,6 +38,80 @@ if _USING_PYDANTIC_SETTINGS:
         # Password scheme preference: 'bcrypt', 'argon2', 'plaintext', or 'auto'
         # 'auto' will try bcrypt then argon2 and fall back to plaintext.
         PASSWORD_SCHEME: str = "auto"
+        # Audit log durability: 'transaction' writes the log row with the business commit,
+        # 'buffered' batches committed entries in memory and writes them from a background thread.
+        AUDIT_MODE: str = "transaction"
+        AUDIT_BATCH_SIZE: int = 200
+        AUDIT_FLUSH_INTERVAL_MS: int = 500
+        # Outbound Traccar API client: pool size, per-call timeout, retries for idempotent
+        # calls and the circuit breaker that fails fast while Traccar is unreachable.
+        TRACCAR_TIMEOUT_SECONDS: float = 10.0
+        TRACCAR_MAX_CONNECTIONS: int = 8
+        TRACCAR_MAX_RETRIES: int = 3
+        TRACCAR_RETRY_BACKOFF_SECONDS: float = 0.2
+        TRACCAR_BREAKER_THRESHOLD: int = 5
+        TRACCAR_BREAKER_RESET_SECONDS: float = 30.0
+        # Outbox worker that applies device/geofence changes to Traccar after the admin commit.
+        TRACCAR_SYNC_POLL_SECONDS: float = 2.0
+        TRACCAR_SYNC_BATCH_SIZE: int = 50
+        TRACCAR_SYNC_CONCURRENCY: int = 4
+        TRACCAR_SYNC_MAX_ATTEMPTS: int = 10
+        TRACCAR_SYNC_BACKOFF_SECONDS: float = 1.0
+        TRACCAR_SYNC_BACKOFF_MAX_SECONDS: float = 300.0
+        # Bulk fisherfolk/device onboarding (/api/admin/register/bulk)
+        BULK_IMPORT_MAX_ROWS: int = 5000
+        BULK_IMPORT_BATCH_SIZE: int = 200
+        BULK_IMPORT_HASH_WORKERS: int = 4
+        # Raise a geofenceApproach event when a position comes within this many metres of its
+        # device's geofence boundary (either side). 0 disables the check.
+        GEOFENCE_APPROACH_METERS: float = 200.0
+        # Nearest-vessel lookups (/api/coastguard/nearby and SOS enrichment) ignore devices whose
+        # latest fix is older than this; SOS events list this many nearby vessels.
+        NEARBY_MAX_AGE_SECONDS: int = 3600
+        SOS_NEARBY_COUNT: int = 5
+        # Trip segmentation on ingest (speeds in knots). Dwell is long on purpose: boats also
+        # sit still while fishing, and only a long stop away from home counts as a new port.
+        TRIP_MOVING_KNOTS: float = 1.5
+        TRIP_HOME_RADIUS_METERS: float = 300.0
+        TRIP_DWELL_MINUTES: float = 240.0
+        TRIP_GAP_MINUTES: float = 120.0
+        # Position retention: raw fixes for RAW_DAYS, then one fix per DOWNSAMPLE_SECONDS (plus alarm
+        # points) until ARCHIVE_DAYS, then gzipped NDJSON under ARCHIVE_DIR. 0 days disables a tier.
+        # Off by default: ARCHIVE_DIR must be persistent storage before enabling. A run holds the
+        # retention lease (a job_states row) for at most LEASE_SECONDS so one worker runs at a time.
+        RETENTION_ENABLED: bool = False
+        RETENTION_RAW_DAYS: int = 30
+        RETENTION_DOWNSAMPLE_SECONDS: int = 60
+        RETENTION_ARCHIVE_DAYS: int = 180
+        RETENTION_ARCHIVE_DIR: str = "./archive"
+        RETENTION_BATCH_SIZE: int = 5000
+        RETENTION_INTERVAL_SECONDS: int = 3600
+        RETENTION_LEASE_SECONDS: int = 21600
+        # Logging: LOG_FORMAT is "text" or "json". Per-item ingest debug lines are sampled 1 in
+        # LOG_SAMPLE_EVERY; ingest totals are logged at INFO at most every LOG_SUMMARY_INTERVAL_SECONDS.
+        LOG_LEVEL: str = "INFO"
+        LOG_FORMAT: str = "text"
+        LOG_SAMPLE_EVERY: int = 100
+        LOG_SUMMARY_INTERVAL_SECONDS: float = 60.0
+        # GET /metrics (Prometheus) is served only when a token is set; scrapers send it as a bearer token.
+        METRICS_TOKEN: str = ""
+        # Request timing (Server-Timing header, /api/admin/timing/*). Statements and requests slower
+        # than these thresholds are logged with their route.
+        TIMING_ENABLED: bool = True
+        TIMING_SAMPLES_PER_ROUTE: int = 1000
+        SLOW_QUERY_MS: float = 200.0
+        SLOW_REQUEST_MS: float = 1000.0
+        # Admin sampling profiler (POST /api/admin/profile): longest run and pause between runs.
+        PROFILER_ENABLED: bool = True
+        PROFILER_MAX_SECONDS: float = 30.0
+        PROFILER_COOLDOWN_SECONDS: float = 60.0
+        # Schema handling at startup: 'create' runs create_all and seeds roles/admin (dev, tests);
+        # 'verify' only checks the Alembic revision (run migrations and `manage.py seed` at deploy).
+        SCHEMA_MODE: str = "create"
+        # SOS escalation: an unacknowledged alarm:sos is re-sent to responders after each of these
+        # intervals (seconds, comma-separated), one level higher each time; the last one repeats.
+        SOS_ESCALATION_ENABLED: bool = True
+        SOS_ESCALATION_INTERVALS_SECONDS: str = "60,120,300,600"
 
     # configure env file for pydantic-settings
     Settings.model_config = SettingsConfigDict(env_file=".env")
@@ -64,6 +138,80 @@ else:
         # Password scheme preference: 'bcrypt', 'argon2', 'plaintext', or 'auto'
         # 'auto' will try bcrypt then argon2 and fall back to plaintext.
         PASSWORD_SCHEME: str = "auto"
+        # Audit log durability: 'transaction' writes the log row with the business commit,
+        # 'buffered' batches committed entries in memory and writes them from a background thread.
+        AUDIT_MODE: str = "transaction"
+        AUDIT_BATCH_SIZE: int = 200
+        AUDIT_FLUSH_INTERVAL_MS: int = 500
+        # Outbound Traccar API client: pool size, per-call timeout, retries for idempotent
+        # calls and the circuit breaker that fails fast while Traccar is unreachable.
+        TRACCAR_TIMEOUT_SECONDS: float = 10.0
+        TRACCAR_MAX_CONNECTIONS: int = 8
+        TRACCAR_MAX_RETRIES: int = 3
+        TRACCAR_RETRY_BACKOFF_SECONDS: float = 0.2
+        TRACCAR_BREAKER_THRESHOLD: int = 5
+        TRACCAR_BREAKER_RESET_SECONDS: float = 30.0
+        # Outbox worker that applies device/geofence changes to Traccar after the admin commit.
+        TRACCAR_SYNC_POLL_SECONDS: float = 2.0
+        TRACCAR_SYNC_BATCH_SIZE: int = 50
+        TRACCAR_SYNC_CONCURRENCY: int = 4
+        TRACCAR_SYNC_MAX_ATTEMPTS: int = 10
+        TRACCAR_SYNC_BACKOFF_SECONDS: float = 1.0
+        TRACCAR_SYNC_BACKOFF_MAX_SECONDS: float = 300.0
+        # Bulk fisherfolk/device onboarding (/api/admin/register/bulk)
+        BULK_IMPORT_MAX_ROWS: int = 5000
+        BULK_IMPORT_BATCH_SIZE: int = 200
+        BULK_IMPORT_HASH_WORKERS: int = 4
+        # Raise a geofenceApproach event when a position comes within this many metres of its
+        # device's geofence boundary (either side). 0 disables the check.
+        GEOFENCE_APPROACH_METERS: float = 200.0
+        # Nearest-vessel lookups (/api/coastguard/nearby and SOS enrichment) ignore devices whose
+        # latest fix is older than this; SOS events list this many nearby vessels.
+        NEARBY_MAX_AGE_SECONDS: int = 3600
+        SOS_NEARBY_COUNT: int = 5
+        # Trip segmentation on ingest (speeds in knots). Dwell is long on purpose: boats also
+        # sit still while fishing, and only a long stop away from home counts as a new port.
+        TRIP_MOVING_KNOTS: float = 1.5
+        TRIP_HOME_RADIUS_METERS: float = 300.0
+        TRIP_DWELL_MINUTES: float = 240.0
+        TRIP_GAP_MINUTES: float = 120.0
+        # Position retention: raw fixes for RAW_DAYS, then one fix per DOWNSAMPLE_SECONDS (plus alarm
+        # points) until ARCHIVE_DAYS, then gzipped NDJSON under ARCHIVE_DIR. 0 days disables a tier.
+        # Off by default: ARCHIVE_DIR must be persistent storage before enabling. A run holds the
+        # retention lease (a job_states row) for at most LEASE_SECONDS so one worker runs at a time.
+        RETENTION_ENABLED: bool = False
+        RETENTION_RAW_DAYS: int = 30
+        RETENTION_DOWNSAMPLE_SECONDS: int = 60
+        RETENTION_ARCHIVE_DAYS: int = 180
+        RETENTION_ARCHIVE_DIR: str = "./archive"
+        RETENTION_BATCH_SIZE: int = 5000
+        RETENTION_INTERVAL_SECONDS: int = 3600
+        RETENTION_LEASE_SECONDS: int = 21600
+        # Logging: LOG_FORMAT is "text" or "json". Per-item ingest debug lines are sampled 1 in
+        # LOG_SAMPLE_EVERY; ingest totals are logged at INFO at most every LOG_SUMMARY_INTERVAL_SECONDS.
+        LOG_LEVEL: str = "INFO"
+        LOG_FORMAT: str = "text"
+        LOG_SAMPLE_EVERY: int = 100
+        LOG_SUMMARY_INTERVAL_SECONDS: float = 60.0
+        # GET /metrics (Prometheus) is served only when a token is set; scrapers send it as a bearer token.
+        METRICS_TOKEN: str = ""
+        # Request timing (Server-Timing header, /api/admin/timing/*). Statements and requests slower
+        # than these thresholds are logged with their route.
+        TIMING_ENABLED: bool = True
+        TIMING_SAMPLES_PER_ROUTE: int = 1000
+        SLOW_QUERY_MS: float = 200.0
+        SLOW_REQUEST_MS: float = 1000.0
+        # Admin sampling profiler (POST /api/admin/profile): longest run and pause between runs.
+        PROFILER_ENABLED: bool = True
+        PROFILER_MAX_SECONDS: float = 30.0
+        PROFILER_COOLDOWN_SECONDS: float = 60.0
+        # Schema handling at startup: 'create' runs create_all and seeds roles/admin (dev, tests);
+        # 'verify' only checks the Alembic revision (run migrations and `manage.py seed` at deploy).
+        SCHEMA_MODE: str = "create"
+        # SOS escalation: an unacknowledged alarm:sos is re-sent to responders after each of these
+        # intervals (seconds, comma-separated), one level higher each time; the last one repeats.
+        SOS_ESCALATION_ENABLED: bool = True
+        SOS_ESCALATION_INTERVALS_SECONDS: str = "60,120,300,600"
 
         class Config:
             env_file = ".env"
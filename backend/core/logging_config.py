@@ -0,0 +1,133 @@
+"""Logging setup and helpers for hot paths.
+
+`configure_logging` installs a single `QueueHandler` on the root logger. The
+request thread or event loop only enqueues the record, and a `QueueListener`
+thread formats it and writes it to stderr, so slow log sinks never stall
+ingest. `LOG_FORMAT=json` emits one JSON object per line and includes the
+`fields` passed to `log_fields`.
+
+Code that runs once per ingested item should log through a `Sampler` (at most
+1 in `LOG_SAMPLE_EVERY` debug lines). It should also fold its counts into a
+`SummaryCounter`, which logs totals at INFO no more than once per interval.
+When DEBUG is off, the per-item cost is an `isEnabledFor` check plus a few
+integer additions.
+"""
+
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from core import config
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.Handler] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; `fields` from `log_fields` are merged in."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if isinstance(fields, dict):
+            out.update(fields)
+        if record.exc_info:
+            out["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(out, default=str)
+
+
+class _InProcessQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the stock handler formats here (in the caller) so records can be pickled;
+        # ours never leave the process, so formatting is left to the listener thread
+        return record
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None, stream=None) -> None:
+    """Route the root logger through a queue to a background writer (idempotent)."""
+    global _listener, _queue_handler
+    shutdown_logging()
+    s = config.settings
+    target = logging.StreamHandler(stream or sys.stderr)
+    if (fmt or s.LOG_FORMAT).lower() == "json":
+        target.setFormatter(JsonFormatter())
+    else:
+        target.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    _queue_handler = _InProcessQueueHandler(records)
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel((level or s.LOG_LEVEL).upper())
+    _listener = logging.handlers.QueueListener(records, target, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and detach the queue handler."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+
+
+def log_fields(logger: logging.Logger, level: int, event: str, **fields) -> None:
+    """Log `event k=v ...`; JSON output carries the fields as separate keys."""
+    if not logger.isEnabledFor(level):
+        return
+    text = " ".join(f"{k}={v}" for k, v in fields.items())
+    logger.log(level, "%s %s", event, text, extra={"fields": {"event": event, **fields}})
+
+
+class Sampler:
+    """True for one call in `every` (the first call included); `every` defaults to LOG_SAMPLE_EVERY."""
+
+    def __init__(self, every: Optional[int] = None):
+        self._every = every
+        self._calls = itertools.count()
+
+    def __call__(self) -> bool:
+        every = self._every or config.settings.LOG_SAMPLE_EVERY
+        return every <= 1 or next(self._calls) % every == 0
+
+
+class SummaryCounter:
+    """Accumulates counts and logs their totals at INFO at most once per interval.
+
+    The check happens on `add`, so nothing is logged (and no thread runs)
+    while there is no traffic.
+    """
+
+    def __init__(self, logger: logging.Logger, event: str, interval_seconds: Optional[float] = None):
+        self._logger = logger
+        self._event = event
+        self._interval = interval_seconds
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+        self._since = time.monotonic()
+
+    def add(self, **counts: int) -> None:
+        with self._lock:
+            for key, value in counts.items():
+                self._counts[key] = self._counts.get(key, 0) + value
+            now = time.monotonic()
+            interval = self._interval if self._interval is not None else config.settings.LOG_SUMMARY_INTERVAL_SECONDS
+            if now - self._since < interval:
+                return
+            totals, self._counts = self._counts, {}
+            elapsed, self._since = now - self._since, now
+        log_fields(self._logger, logging.INFO, self._event, seconds=round(elapsed, 1), **totals)
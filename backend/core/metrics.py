@@ -0,0 +1,263 @@
+"""In-process metrics in the Prometheus text format.
+
+Counters and histograms keep one cell per live thread. The owning thread
+updates its cell without taking a lock, and `render()` sums the cells when
+`/metrics` is scraped. A finished thread's cell is folded into a shared one. A scrape racing an update may miss that one observation, which is
+fine for monitoring. Gauges that describe current state (connections, pool
+usage, buffers) come from collector callbacks evaluated at scrape time, so
+the hot paths pay nothing for them.
+
+Each process has its own registry, so scrape every API worker separately
+(or run one worker per scrape target).
+"""
+
+import math
+import threading
+import weakref
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (labels, value) pairs of one metric family
+Samples = List[Tuple[Dict[str, str], float]]
+# (name, type, help, samples) as returned by collectors
+Family = Tuple[str, str, str, Samples]
+
+
+class _CellRef:
+    """Thread-local holder of a cell; dropped with its thread, which retires the cell."""
+
+    __slots__ = ("cell", "__weakref__")
+
+    def __init__(self, cell: list):
+        self.cell = cell
+
+
+class _Cells:
+    """Per-thread float vectors of one metric child, summed on read.
+
+    When a thread exits, its cell is folded into a shared base cell, so
+    short-lived pool threads do not leave cells behind.
+    """
+
+    __slots__ = ("_local", "_cells", "_base", "_lock", "_size")
+
+    def __init__(self, size: int):
+        self._local = threading.local()
+        self._cells: Dict[int, list] = {}
+        self._base = [0.0] * size
+        self._lock = threading.Lock()
+        self._size = size
+
+    def cell(self) -> list:
+        try:
+            return self._local.ref.cell
+        except AttributeError:
+            cell = [0.0] * self._size
+            ref = _CellRef(cell)
+            # only a thread's first update takes the lock
+            with self._lock:
+                self._cells[id(cell)] = cell
+            weakref.finalize(ref, self._retire, cell)
+            self._local.ref = ref
+            return cell
+
+    def _retire(self, cell: list):
+        with self._lock:
+            self._cells.pop(id(cell), None)
+            for i, value in enumerate(cell):
+                self._base[i] += value
+
+    def live_cells(self) -> int:
+        with self._lock:
+            return len(self._cells)
+
+    def total(self) -> list:
+        with self._lock:
+            cells = list(self._cells.values())
+            out = list(self._base)
+        for cell in cells:
+            for i, value in enumerate(cell):
+                out[i] += value
+        return out
+
+
+class _CounterChild:
+    __slots__ = ("_cells",)
+
+    def __init__(self):
+        self._cells = _Cells(1)
+
+    def inc(self, amount: float = 1.0):
+        self._cells.cell()[0] += amount
+
+    def value(self) -> float:
+        return self._cells.total()[0]
+
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "_cells")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._bounds = bounds
+        # one slot per bucket (the last is +Inf), then sum and count
+        self._cells = _Cells(len(bounds) + 2)
+
+    def observe(self, value: float):
+        cell = self._cells.cell()
+        cell[bisect_left(self._bounds, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    def snapshot(self) -> Tuple[List[float], float, float]:
+        """Cumulative bucket counts, sum and count."""
+        total = self._cells.total()
+        cumulative, running = [], 0.0
+        for count in total[:-2]:
+            running += count
+            cumulative.append(running)
+        return cumulative, total[-2], total[-1]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Optional["Registry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            # unlabelled metrics are exported (as zero) before their first update
+            self.labels()
+        (registry or REGISTRY).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._children[key] = self._new_child()
+        return child
+
+    def _items(self):
+        with self._lock:
+            return [(dict(zip(self.labelnames, key)), child) for key, child in self._children.items()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def collect(self) -> List[Family]:
+        return [(self.name, self.kind, self.documentation, [(labels, child.value()) for labels, child in self._items()])]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS, registry=None):
+        bounds = tuple(sorted(float(b) for b in buckets))
+        self.bounds = bounds if bounds and math.isinf(bounds[-1]) else bounds + (math.inf,)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def collect(self) -> List[Family]:
+        samples: Samples = []
+        for labels, child in self._items():
+            cumulative, total, count = child.snapshot()
+            for bound, value in zip(self.bounds, cumulative):
+                samples.append(({**labels, "le": _format_value(bound)}, value))
+            samples.append(({**labels, "__suffix__": "_sum"}, total))
+            samples.append(({**labels, "__suffix__": "_count"}, count))
+        return [(self.name, self.kind, self.documentation, samples)]
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+
+    def collector(self, fn: Callable[[], Iterable[Family]]):
+        """Register a scrape-time callback returning metric families; usable as a decorator."""
+        with self._lock:
+            self._collectors.append(fn)
+        return fn
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def collect(self) -> List[Family]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        families: List[Family] = []
+        for metric in metrics:
+            families.extend(metric.collect())
+        for fn in collectors:
+            families.extend(fn())
+        return families
+
+    def render(self) -> str:
+        lines = []
+        for name, kind, documentation, samples in self.collect():
+            lines.append(f"# HELP {name} {_escape_help(documentation)}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                labels = dict(labels)
+                suffix = labels.pop("__suffix__", "_bucket" if "le" in labels else "")
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+REGISTRY = Registry()
@@ -0,0 +1,116 @@
+"""On-demand sampling profiler for the running worker.
+
+`profile(seconds, interval)` starts a daemon thread that wakes every
+`interval` seconds, reads every other thread's current stack with
+`sys._current_frames()` and counts identical stacks. Nothing is hooked into
+the interpreter (no `sys.setprofile`, no signals), so there is no cost while
+no profile is running. During a run the cost is one stack walk per thread
+per sample.
+
+Results use the collapsed format understood by flamegraph.pl and speedscope.
+Each line is `thread;module:function;...;module:function count`, root first.
+Stacks of threads parked in a wait (idle pool workers, the selector of an
+idle event loop) are left out unless `include_idle` is set.
+
+Only one profile runs at a time, and a new one may start only
+`PROFILER_COOLDOWN_SECONDS` after the previous one finished. `ProfilerBusy`
+carries the seconds to wait.
+"""
+
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from core import config
+
+# (module, function) leaves that mean "waiting for work"
+_IDLE_LEAVES = {
+    ("threading", "wait"),
+    ("threading", "_wait_for_tstate_lock"),
+    ("selectors", "select"),
+    ("queue", "get"),
+    ("concurrent.futures.thread", "_worker"),
+    ("anyio._backends._asyncio", "run"),
+}
+
+
+class ProfilerBusy(Exception):
+    """A profile is running or the cooldown has not passed."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _label(frame, lines: bool) -> str:
+    module = frame.f_globals.get("__name__", "?")
+    name = frame.f_code.co_name
+    return f"{module}:{name}:{frame.f_lineno}" if lines else f"{module}:{name}"
+
+
+def _is_idle(frame) -> bool:
+    return (frame.f_globals.get("__name__"), frame.f_code.co_name) in _IDLE_LEAVES
+
+
+def collapse(frame, thread_name: str, lines: bool = False) -> str:
+    parts = []
+    while frame is not None:
+        parts.append(_label(frame, lines))
+        frame = frame.f_back
+    parts.append(thread_name)
+    return ";".join(reversed(parts))
+
+
+class StackSampler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._finished_at: Optional[float] = None
+
+    def profile(self, seconds: float, interval: float = 0.01, include_idle: bool = False, lines: bool = False) -> dict:
+        """Sample all threads for `seconds`; blocks the caller (run it off the event loop)."""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running", retry_after=seconds)
+        try:
+            cooldown = float(config.settings.PROFILER_COOLDOWN_SECONDS)
+            if self._finished_at is not None:
+                wait = self._finished_at + cooldown - time.monotonic()
+                if wait > 0:
+                    raise ProfilerBusy("Profiler cooling down", retry_after=wait)
+            result: Dict = {}
+            sampler = threading.Thread(
+                target=self._run, args=(seconds, interval, include_idle, lines, result), name="stack-sampler", daemon=True
+            )
+            sampler.start()
+            sampler.join()
+            self._finished_at = time.monotonic()
+            return result
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _run(seconds: float, interval: float, include_idle: bool, lines: bool, result: dict):
+        own = threading.get_ident()
+        stacks: Counter = Counter()
+        samples = 0
+        started = time.perf_counter()
+        deadline = started + seconds
+        while True:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (not include_idle and _is_idle(frame)):
+                    continue
+                stacks[collapse(frame, names.get(ident, f"thread-{ident}"), lines)] += 1
+            samples += 1
+            if time.perf_counter() + interval > deadline:
+                break
+            time.sleep(interval)
+        result.update({"seconds": round(time.perf_counter() - started, 3), "samples": samples, "stacks": stacks})
+
+
+def to_collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+sampler = StackSampler()
@@ -1,10 +1,10 @@
 from datetime import datetime, timedelta, timezone
 import logging
 import os
+import threading
 from typing import Optional
 
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
@@ -17,11 +17,14 @@ from core.config import settings
 # Create a CryptContext but be defensive: some environments may have a broken
 # bcrypt installation. Respect the `PASSWORD_SCHEME` setting which can be
 # 'bcrypt', 'argon2', 'plaintext' or 'auto'. In 'auto' mode we try bcrypt
-# first, then argon2, then fall back to plaintext.
+# first, then argon2, then fall back to plaintext. The context (and passlib
+# with its backends) is only built on the first hash/verify, not at import.
 logger = logging.getLogger(__name__)
 
 
 def _init_pwd_context():
+    from passlib.context import CryptContext
+
     scheme = getattr(settings, "PASSWORD_SCHEME", "auto") or "auto"
     scheme = scheme.lower()
 
@@ -32,8 +35,9 @@ def _init_pwd_context():
     def try_scheme(name):
         try:
             ctx = CryptContext(schemes=[name], deprecated="auto")
-            # smoke-test with a short string to force backend finalization
-            ctx.hash("__passlib_init_check__")
+            # load the backend now (passlib runs its own cheap self-checks) rather than
+            # hashing a throwaway password at full cost
+            ctx.handler(name).get_backend()
             logger.debug("Using password scheme: %s", name)
             return ctx
         except Exception as e:
@@ -70,7 +74,20 @@ def _init_pwd_context():
     return CryptContext(schemes=["plaintext"], deprecated="auto")
 
 
-pwd_context = _init_pwd_context()
+# tests may assign their own CryptContext here
+pwd_context = None
+_pwd_context_lock = threading.Lock()
+
+
+def _get_pwd_context():
+    global pwd_context
+    if pwd_context is None:
+        with _pwd_context_lock:
+            if pwd_context is None:
+                pwd_context = _init_pwd_context()
+    return pwd_context
+
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
 
@@ -86,7 +103,7 @@ def hash_password(password: str) -> str:
         pw = b.decode("utf-8", errors="ignore")
     else:
         pw = b.decode("utf-8")
-    return pwd_context.hash(pw)
+    return _get_pwd_context().hash(pw)
 
 
 def verify_password(plain: str, hashed: str) -> bool:
@@ -100,7 +117,7 @@ def verify_password(plain: str, hashed: str) -> bool:
         plain_trunc = b.decode("utf-8", errors="ignore")
     else:
         plain_trunc = b.decode("utf-8")
-    return pwd_context.verify(plain_trunc, hashed)
+    return _get_pwd_context().verify(plain_trunc, hashed)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -0,0 +1,283 @@
+"""Per-request timing: route latency, database time and serialization time.
+
+`TimingMiddleware` (pure ASGI) opens a `RequestTiming` for every HTTP request
+and keeps it in a context variable. That context follows the request into
+the threadpool that runs sync endpoints and dependencies. Three hooks fill it:
+
+- the `before_cursor_execute`/`after_cursor_execute` listeners installed by
+  `instrument_engine` count queries and their time;
+- `TimedJSONResponse`, the app's default response class, times JSON
+  rendering;
+- the middleware itself times the whole request.
+
+When the response starts, the middleware adds a `Server-Timing` header
+(`db;dur=..;desc="N queries", serialize;dur=.., total;dur=..`). After the
+request ends, it records the latency under the route template
+(`GET /api/admin/users/{user_id}`), both in a bounded sample for percentiles
+and in the `bantay_http_request_seconds` histogram.
+
+Statement timings are aggregated by SQL text, with expanded `IN (...)` lists
+and multi-row `VALUES` collapsed so batch sizes do not split a statement into
+many keys; background threads record them under the route "-". Statements slower than `SLOW_QUERY_MS` and
+requests slower than `SLOW_REQUEST_MS` are logged with their route. The
+admin endpoints read `route_stats()` and `query_stats()`.
+"""
+
+import contextvars
+import heapq
+import logging
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Deque, Dict, List, Optional
+
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+
+from core import config
+from core.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+HTTP_SECONDS = Histogram("bantay_http_request_seconds", "HTTP request latency by route.", ["method", "route"])
+
+MAX_STATEMENTS = 500
+# statements kept above MAX_STATEMENTS before a sweep drops the cheapest
+_STATEMENT_SLACK = MAX_STATEMENTS // 4
+_STATEMENT_CHARS = 2000
+
+# bound parameters in the DBAPI styles SQLAlchemy emits: ?, %s, %(name)s, :name, $1
+_PARAM = r"(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)"
+_PARAM_LIST = rf"\(\s*{_PARAM}(?:\s*,\s*{_PARAM})*\s*\)"
+_IN_LIST = re.compile(rf"\b(IN|VALUES)\s*{_PARAM_LIST}", re.IGNORECASE)
+_MORE_ROWS = re.compile(rf"(VALUES \(\.\.\.\))(?:\s*,\s*{_PARAM_LIST})+", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def statement_key(statement: str) -> str:
+    """`statement` with expanded IN lists and VALUES rows collapsed to `(...)`."""
+    return _MORE_ROWS.sub(r"\1, ...", _IN_LIST.sub(r"\1 (...)", statement))
+
+
+class RequestTiming:
+    __slots__ = ("scope", "db_count", "db_seconds", "serialize_seconds")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.db_count = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        # the router stores the matched route on the (shared) scope before calling the endpoint
+        route = self.scope.get("route")
+        return f"{self.scope.get('method', '')} {getattr(route, 'path', None) or 'unmatched'}"
+
+
+_current: contextvars.ContextVar[Optional[RequestTiming]] = contextvars.ContextVar("request_timing", default=None)
+
+
+def current() -> Optional[RequestTiming]:
+    return _current.get()
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class _RouteStats:
+    __slots__ = ("count", "seconds_total", "seconds_max", "db_count", "db_seconds", "serialize_seconds", "samples")
+
+    def __init__(self, sample_size: int):
+        self.count = 0
+        self.seconds_total = 0.0
+        self.seconds_max = 0.0
+        self.db_count = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.samples: Deque[float] = deque(maxlen=sample_size)
+
+
+class _StatementStats:
+    __slots__ = ("count", "seconds_total", "seconds_max", "slowest_route")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds_total = 0.0
+        self.seconds_max = 0.0
+        self.slowest_route = None
+
+
+class TimingStore:
+    """Route and statement aggregates; updates take one short lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[str, _RouteStats] = {}
+        self._statements: Dict[str, _StatementStats] = {}
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+            self._statements.clear()
+
+    def record_request(self, route: str, seconds: float, timing: RequestTiming):
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = _RouteStats(max(1, int(config.settings.TIMING_SAMPLES_PER_ROUTE)))
+            stats.count += 1
+            stats.seconds_total += seconds
+            stats.seconds_max = max(stats.seconds_max, seconds)
+            stats.db_count += timing.db_count
+            stats.db_seconds += timing.db_seconds
+            stats.serialize_seconds += timing.serialize_seconds
+            stats.samples.append(seconds)
+
+    def record_statement(self, statement: str, seconds: float, route: str):
+        statement = statement_key(statement)
+        with self._lock:
+            stats = self._statements.get(statement)
+            if stats is None:
+                if len(self._statements) >= MAX_STATEMENTS + _STATEMENT_SLACK:
+                    # keep the statements that cost the most; one sweep per _STATEMENT_SLACK new keys
+                    keep = heapq.nlargest(MAX_STATEMENTS, self._statements.items(), key=lambda item: item[1].seconds_total)
+                    self._statements = dict(keep)
+                stats = self._statements[statement] = _StatementStats()
+            stats.count += 1
+            stats.seconds_total += seconds
+            if seconds >= stats.seconds_max:
+                stats.seconds_max = seconds
+                stats.slowest_route = route
+
+    def route_stats(self, limit: int = 20, sort: str = "p95") -> List[dict]:
+        with self._lock:
+            rows = [(route, s, sorted(s.samples)) for route, s in self._routes.items()]
+        out = []
+        for route, s, ordered in rows:
+            out.append({
+                "route": route,
+                "count": s.count,
+                "avg_ms": round(s.seconds_total / s.count * 1000, 2),
+                "p50_ms": round(_percentile(ordered, 0.50) * 1000, 2),
+                "p95_ms": round(_percentile(ordered, 0.95) * 1000, 2),
+                "p99_ms": round(_percentile(ordered, 0.99) * 1000, 2),
+                "max_ms": round(s.seconds_max * 1000, 2),
+                "total_ms": round(s.seconds_total * 1000, 2),
+                "queries_avg": round(s.db_count / s.count, 2),
+                "db_avg_ms": round(s.db_seconds / s.count * 1000, 2),
+                "serialize_avg_ms": round(s.serialize_seconds / s.count * 1000, 2),
+            })
+        out.sort(key=lambda r: r[f"{sort}_ms"], reverse=True)
+        return out[:limit]
+
+    def query_stats(self, limit: int = 20, sort: str = "total") -> List[dict]:
+        with self._lock:
+            rows = [
+                {
+                    "statement": statement,
+                    "count": s.count,
+                    "avg_ms": round(s.seconds_total / s.count * 1000, 3),
+                    "max_ms": round(s.seconds_max * 1000, 3),
+                    "total_ms": round(s.seconds_total * 1000, 3),
+                    "slowest_route": s.slowest_route,
+                }
+                for statement, s in self._statements.items()
+            ]
+        rows.sort(key=lambda r: r[f"{sort}_ms"], reverse=True)
+        return rows[:limit]
+
+
+store = TimingStore()
+
+ROUTE_SORTS = ("p50", "p95", "p99", "max", "avg", "total")
+QUERY_SORTS = ("total", "max", "avg")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("timing_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("timing_started")
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    timing = _current.get()
+    route = timing.route if timing is not None else "-"
+    if timing is not None:
+        timing.db_count += 1
+        timing.db_seconds += seconds
+    store.record_statement(statement, seconds, route)
+    if seconds * 1000 >= config.settings.SLOW_QUERY_MS:
+        logger.warning("Slow query (%.1f ms) on %s: %s", seconds * 1000, route, " ".join(statement.split())[:_STATEMENT_CHARS])
+
+
+def _handle_error(exception_context):
+    # a failed statement never reaches after_cursor_execute; drop its start time
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("timing_started"):
+        conn.info["timing_started"].pop()
+
+
+def instrument_engine(engine) -> None:
+    """Attach the query timing listeners to an engine (once)."""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that adds its rendering time to the current request's timing."""
+
+    def render(self, content) -> bytes:
+        started = time.perf_counter()
+        body = super().render(content)
+        timing = _current.get()
+        if timing is not None:
+            timing.serialize_seconds += time.perf_counter() - started
+        return body
+
+
+class TimingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not config.settings.TIMING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        timing = RequestTiming(scope)
+        token = _current.set(timing)
+        started = time.perf_counter()
+
+        async def send_with_header(message):
+            if message["type"] == "http.response.start":
+                total = (time.perf_counter() - started) * 1000
+                value = (
+                    f'db;dur={timing.db_seconds * 1000:.1f};desc="{timing.db_count} queries", '
+                    f"serialize;dur={timing.serialize_seconds * 1000:.1f}, total;dur={total:.1f}"
+                )
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", value.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_header)
+        finally:
+            _current.reset(token)
+            seconds = time.perf_counter() - started
+            route = timing.route
+            store.record_request(route, seconds, timing)
+            HTTP_SECONDS.labels(*route.split(" ", 1)).observe(seconds)
+            if seconds * 1000 >= config.settings.SLOW_REQUEST_MS:
+                logger.warning(
+                    "Slow request (%.1f ms) %s: %d queries, db %.1f ms, serialize %.1f ms",
+                    seconds * 1000, route, timing.db_count, timing.db_seconds * 1000, timing.serialize_seconds * 1000,
+                )
@@ -1,4 +1,14 @@
+from sqlalchemy import event
 from sqlalchemy.orm import declarative_base
 
 
 Base = declarative_base()
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _after_create(target, connection, **kw):
+    # registered here rather than in db.search, so every create_all gets the search
+    # indexes whether or not db.search was imported first
+    from db.search import create_search_indexes
+
+    create_search_indexes(connection)
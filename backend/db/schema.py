@@ -0,0 +1,71 @@
+"""Schema handling at startup, selected by `SCHEMA_MODE`.
+
+- `create` (default): `create_all`, the legacy SQLite column fix-up, and the
+  role and admin seed. This suits development and test databases that never
+  see Alembic.
+- `verify`: one `SELECT` of `alembic_version`, compared with
+  `HEAD_REVISION`. There is no DDL and no seeding, so a worker restart costs
+  one round trip. Deploys run `alembic upgrade head` and
+  `python manage.py seed` once. A missing or different revision stops the
+  worker with `SchemaOutOfDate` instead of serving a half-migrated schema.
+
+`HEAD_REVISION` must name the newest file in `alembic/versions`; a test
+checks it. The API image ships without the migrations, so the head is
+recorded here rather than read from disk.
+"""
+
+import logging
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from db.base import Base
+
+logger = logging.getLogger(__name__)
+
+HEAD_REVISION = "0014_sos_escalations"
+SCHEMA_MODES = ("create", "verify")
+
+
+class SchemaOutOfDate(RuntimeError):
+    """The database is not at the Alembic revision this code expects."""
+
+
+def current_revision(engine) -> Optional[str]:
+    """The database's Alembic revision, or None without an `alembic_version` table."""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT version_num FROM alembic_version")).scalar()
+    except DBAPIError:
+        return None
+
+
+def verify_head(engine) -> str:
+    revision = current_revision(engine)
+    if revision != HEAD_REVISION:
+        raise SchemaOutOfDate(
+            f"database revision is {revision or 'missing'}, expected {HEAD_REVISION}; run `alembic upgrade head`"
+        )
+    return revision
+
+
+def _ensure_legacy_columns(engine) -> None:
+    # SQLite databases created before geofences.traccar_id existed; other dialects are migrated by Alembic
+    if engine.dialect.name != "sqlite":
+        return
+    try:
+        with engine.connect() as conn:
+            cols = {row[1] for row in conn.execute(text("PRAGMA table_info(geofences)")).fetchall()}
+            if "traccar_id" not in cols:
+                conn.execute(text("ALTER TABLE geofences ADD COLUMN traccar_id INTEGER"))
+                conn.commit()
+    except Exception:
+        # non-fatal; keep running if migrations aren't available
+        logger.warning("Failed to ensure geofences.traccar_id column exists")
+
+
+def create_schema(engine) -> None:
+    """Create missing tables (all models must be imported) and patch legacy SQLite columns."""
+    Base.metadata.create_all(bind=engine)
+    _ensure_legacy_columns(engine)
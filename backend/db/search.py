@@ -0,0 +1,135 @@
+"""Indexed substring search for the events, reports and logs tables.
+
+The large, append-only tables get a dialect specific index:
+
+- SQLite: an external-content FTS5 table per source table using the
+  `trigram` tokenizer (case-insensitive substring matching), kept in sync by
+  insert/update/delete triggers.
+- PostgreSQL: `pg_trgm` GIN indexes, which `ILIKE '%...%'` uses directly.
+
+Joined dimension tables (devices, users) are small, so name matches are
+resolved to a set of ids first and the big table is filtered with `IN (...)`.
+Queries shorter than three characters cannot use trigrams and fall back to a
+plain `ILIKE`.
+"""
+
+from sqlalchemy import or_, text
+
+MIN_TRIGRAM_LENGTH = 3
+
+# source table -> indexed text columns
+SEARCH_COLUMNS = {
+    "events": ("event_type",),
+    "reports": ("resolution", "notes"),
+    "logs": ("table_name", "action"),
+}
+
+
+def _fts_ddl(table: str, columns: tuple) -> list:
+    fts = f"{table}_fts"
+    cols = ", ".join(columns)
+    new_vals = ", ".join(f"new.{c}" for c in columns)
+    old_vals = ", ".join(f"old.{c}" for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{table}', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_fts_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_fts_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_fts_au AFTER UPDATE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END",
+    ]
+
+
+def _pg_ddl(table: str, columns: tuple) -> list:
+    stmts = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"]
+    for col in columns:
+        stmts.append(f"CREATE INDEX IF NOT EXISTS ix_{table}_{col}_trgm ON {table} USING gin ({col} gin_trgm_ops)")
+    return stmts
+
+
+def search_ddl(dialect_name: str) -> list:
+    stmts = []
+    for table, columns in SEARCH_COLUMNS.items():
+        if dialect_name == "sqlite":
+            stmts.extend(_fts_ddl(table, columns))
+        elif dialect_name == "postgresql":
+            stmts.extend(_pg_ddl(table, columns))
+    return stmts
+
+
+def rebuild_ddl(dialect_name: str, tables=None) -> list:
+    """Statements that (re)populate the SQLite shadow tables (all, or those of `tables`) from existing rows."""
+    if dialect_name != "sqlite":
+        return []
+    return [f"INSERT INTO {t}_fts({t}_fts) VALUES ('rebuild')" for t in SEARCH_COLUMNS if tables is None or t in tables]
+
+
+def _missing_shadow_tables(connection) -> list:
+    existing = {
+        row[0] for row in connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE '%_fts'"))
+    }
+    return [t for t in SEARCH_COLUMNS if f"{t}_fts" not in existing]
+
+
+def create_search_indexes(connection):
+    """Create the search indexes; called after every `create_all` (see db.base) so fresh dev/test databases
+    get the same indexes as migrated ones."""
+    dialect = connection.dialect.name
+    try:
+        with connection.begin_nested():
+            # shadow tables added to an existing database must index the rows already there
+            created = _missing_shadow_tables(connection) if dialect == "sqlite" else []
+            for stmt in search_ddl(dialect) + rebuild_ddl(dialect, created):
+                connection.execute(text(stmt))
+    except Exception:
+        # FTS5 / pg_trgm unavailable: searches fall back to ILIKE
+        pass
+    # a cached "like" may predate the shadow tables
+    _backend_cache.clear()
+
+
+_backend_cache = {}
+
+
+def search_backend(db) -> str:
+    """Return 'fts5', 'trgm' or 'like' for the session's database."""
+    bind = db.get_bind()
+    key = id(bind)
+    if key in _backend_cache:
+        return _backend_cache[key]
+    backend = "like"
+    if bind.dialect.name == "postgresql":
+        backend = "trgm"
+    elif bind.dialect.name == "sqlite":
+        row = db.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'events_fts'")).first()
+        # "like" is cached too; create_search_indexes clears the cache when it adds the tables
+        # (a migration run by another process takes effect at the next restart)
+        if row:
+            backend = "fts5"
+    _backend_cache[key] = backend
+    return backend
+
+
+def _fts_phrase(q: str) -> str:
+    return '"' + q.replace('"', '""') + '"'
+
+
+def text_match(db, table: str, id_column, columns: list, q: str):
+    """Predicate matching `q` as a substring of any of `columns` of `table`.
+
+    `columns` are the model attributes matching SEARCH_COLUMNS[table].
+    """
+    if search_backend(db) == "fts5" and len(q) >= MIN_TRIGRAM_LENGTH:
+        fts = f"{table}_fts"
+        sub = text(f"SELECT rowid FROM {fts} WHERE {fts} MATCH :phrase").bindparams(phrase=_fts_phrase(q))
+        return id_column.in_(sub.columns(rowid=id_column.type))
+    like = f"%{q}%"
+    return or_(*[c.ilike(like) for c in columns])
+
+
+def matching_ids(db, id_column, columns: list, q: str) -> list:
+    """Ids of a small dimension table (devices, users) whose `columns` contain `q`."""
+    like = f"%{q}%"
+    return [row[0] for row in db.query(id_column).filter(or_(*[c.ilike(like) for c in columns])).all()]
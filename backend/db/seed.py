@@ -0,0 +1,52 @@
+"""Default rows every deployment needs: the three roles and, optionally, the first admin.
+
+Runs in the API's startup only with `SCHEMA_MODE=create`. Migrated
+deployments run it once with `python manage.py seed`, so worker boots skip
+the lookups and the password hash.
+"""
+
+import logging
+from typing import Dict
+
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.security import hash_password
+from models.role import Role
+from models.user import User
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROLES = (("administrator", "Administrator"), ("coast_guard", "Coast guard"), ("fisherfolk", "Fisherfolk"))
+
+
+def seed_roles(db: Session) -> Dict[str, int]:
+    """Create missing default roles; returns role name -> id (committed)."""
+    existing = {r.name: r for r in db.query(Role).filter(Role.name.in_([name for name, _ in DEFAULT_ROLES]))}
+    for name, desc in DEFAULT_ROLES:
+        if name not in existing:
+            existing[name] = Role(name=name, description=desc)
+            db.add(existing[name])
+    db.commit()
+    return {name: role.id for name, role in existing.items()}
+
+
+def seed_defaults(db: Session, create_admin: bool = True) -> dict:
+    """Default roles, plus the `ADMIN_*` user when `create_admin` is set and it does not exist yet."""
+    roles = seed_roles(db)
+    admin = "skipped"
+    if create_admin and settings.ADMIN_EMAIL and settings.ADMIN_PASSWORD:
+        if db.query(User.id).filter(User.email == settings.ADMIN_EMAIL).first() is None:
+            db.add(User(
+                name=settings.ADMIN_NAME,
+                email=settings.ADMIN_EMAIL,
+                password_hash=hash_password(settings.ADMIN_PASSWORD),
+                role_id=roles["administrator"],
+            ))
+            db.commit()
+            admin = "created"
+            logger.info("Created default admin user %s", settings.ADMIN_EMAIL)
+        else:
+            admin = "exists"
+            logger.debug("Default admin user already exists: %s", settings.ADMIN_EMAIL)
+    return {"roles": sorted(roles), "admin": admin, "admin_email": settings.ADMIN_EMAIL if admin != "skipped" else None}
@@ -1,6 +1,7 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from core.config import settings
+from core.metrics import REGISTRY
 
 engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False} if settings.DATABASE_URL.startswith("sqlite") else {})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -11,3 +12,20 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+@REGISTRY.collector
+def _collect_pool():
+    """Connection pool usage; pools without a fixed size (SQLite memory/static) report what they can."""
+    pool = engine.pool
+    families = []
+    for name, attr, doc in (
+        ("bantay_db_pool_size", "size", "Configured size of the database connection pool."),
+        ("bantay_db_pool_checked_out", "checkedout", "Database connections currently in use."),
+        ("bantay_db_pool_checked_in", "checkedin", "Idle database connections held by the pool."),
+        ("bantay_db_pool_overflow", "overflow", "Connections open beyond the pool size."),
+    ):
+        fn = getattr(pool, attr, None)
+        if callable(fn):
+            families.append((name, "gauge", doc, [({}, float(fn()))]))
+    return families
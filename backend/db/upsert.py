@@ -0,0 +1,13 @@
+"""`INSERT ... ON CONFLICT` for the dialects that support it."""
+
+
+def dialect_insert(db, purpose: str):
+    """The dialect's `insert` construct (with `on_conflict_do_*`); `purpose` names the caller in the error."""
+    name = db.get_bind().dialect.name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"{purpose} needs INSERT ... ON CONFLICT support (dialect {name!r})")
+    return insert
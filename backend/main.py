@@ -1,24 +1,32 @@
 from fastapi import FastAPI
 from db.session import engine
-from db.base import Base
 from contextlib import asynccontextmanager
 
-from routers import auth, admin, fisherfolk, devices, traccar, websocket, coastguard
+from routers import auth, admin, fisherfolk, devices, traccar, websocket, coastguard, export, metrics
 from core.config import settings
-from core.security import hash_password
+from core.audit import writer as audit_writer
+from core.logging_config import configure_logging, shutdown_logging
+from core.timing import TimedJSONResponse, TimingMiddleware, instrument_engine
+from utils.traccar_sync import traccar_enabled, worker as traccar_outbox_worker
+from utils.retention import scheduler as retention_scheduler
+from utils.sos_escalation import escalations as sos_escalations
+from db.schema import SCHEMA_MODES, create_schema, verify_head
+from db.seed import seed_defaults
 from db.session import SessionLocal
-from models.user import User
 import logging
-from models.role import Role
-from sqlalchemy import text
+import time
 
 logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # ensure all model modules are imported so their tables are registered
-    # before creating metadata (prevents FK "table not found" errors)
+    started = time.perf_counter()
+    # leveled, queue-backed logging for the app; see core/logging_config.py
+    configure_logging()
+
+    # ensure all model modules are imported so their tables and relationships are
+    # registered before creating metadata or the first query (prevents FK "table not found" errors)
     import models.device
     import models.geofence
     import models.position
@@ -28,63 +36,58 @@ async def lifespan(app: FastAPI):
     import models.fisherfolk_settings
     import models.report
     import models.geofence
-
-    # startup: create tables
-    Base.metadata.create_all(bind=engine)
-
-    # ensure legacy SQLite DBs have the traccar_id column on geofences
-    try:
-        with engine.connect() as conn:
-            res = conn.execute(text("PRAGMA table_info(geofences)")).fetchall()
-            cols = {row[1] for row in res}
-            if "traccar_id" not in cols:
-                conn.execute(text("ALTER TABLE geofences ADD COLUMN traccar_id INTEGER"))
-                conn.commit()
-    except Exception:
-        # non-fatal; keep running if migrations aren't available
-        logger.warning("Failed to ensure geofences.traccar_id column exists")
-
-    # create default admin user if configured and enabled
-    try:
-        db = SessionLocal()
+    import models.table_version
+    import models.traccar_outbox
+    import models.job_state
+    import models.trip
+    import models.trip_state
+    import models.position_rollup
+    import models.sos_escalation
+
+    # startup: verify the migrated schema, or create tables and seed defaults (see db/schema.py)
+    if settings.SCHEMA_MODE not in SCHEMA_MODES:
+        raise ValueError(f"SCHEMA_MODE must be one of {', '.join(SCHEMA_MODES)}")
+    if settings.SCHEMA_MODE == "verify":
+        revision = verify_head(engine)
+        logger.info("Schema at revision %s", revision)
+    else:
+        create_schema(engine)
         try:
-            # ensure default roles exist
-            for rn, desc in [("administrator", "Administrator"), ("coast_guard", "Coast guard"), ("fisherfolk", "Fisherfolk")]:
-                r = db.query(Role).filter(Role.name == rn).first()
-                if not r:
-                    r = Role(name=rn, description=desc)
-                    db.add(r)
-            db.commit()
-
-            if settings.ADMIN_CREATE_ON_STARTUP and settings.ADMIN_EMAIL and settings.ADMIN_PASSWORD:
-                existing = db.query(User).filter(User.email == settings.ADMIN_EMAIL).first()
-                if not existing:
-                    admin_role = db.query(Role).filter(Role.name == "administrator").first()
-                    admin = User(
-                        name=settings.ADMIN_NAME,
-                        email=settings.ADMIN_EMAIL,
-                        password_hash=hash_password(settings.ADMIN_PASSWORD),
-                        role_id=admin_role.id if admin_role else None,
-                    )
-                    db.add(admin)
-                    db.commit()
-                    logger.info("Created default admin user %s", settings.ADMIN_EMAIL)
-                else:
-                    logger.debug("Default admin user already exists: %s", settings.ADMIN_EMAIL)
-        finally:
-            db.close()
-    except Exception:
-        # don't fail startup if admin creation fails; log the traceback
-        import traceback
-
-        logger.warning("Failed to create default admin on startup")
-        logger.debug(traceback.format_exc())
-
+            db = SessionLocal()
+            try:
+                seed_defaults(db, create_admin=settings.ADMIN_CREATE_ON_STARTUP)
+            finally:
+                db.close()
+        except Exception:
+            # don't fail startup if admin creation fails; log the traceback
+            logger.warning("Failed to create default roles/admin on startup", exc_info=True)
+
+    # apply queued device/geofence changes to Traccar in the background
+    if traccar_enabled():
+        traccar_outbox_worker.start()
+
+    # downsample/archive old positions periodically
+    if settings.RETENTION_ENABLED:
+        retention_scheduler.start()
+
+    # re-send unacknowledged SOS alarms; reloads the open ones from the database
+    if settings.SOS_ESCALATION_ENABLED:
+        sos_escalations.start()
+
+    logger.info("Startup finished in %.0f ms (schema mode %s)", (time.perf_counter() - started) * 1000, settings.SCHEMA_MODE)
     yield
-    # shutdown: nothing for now
+    # shutdown: drain any buffered audit entries
+    sos_escalations.stop()
+    retention_scheduler.stop()
+    traccar_outbox_worker.stop()
+    audit_writer.stop()
+    shutdown_logging()
 
 
-app = FastAPI(title="Fisherfolk Safety System API", lifespan=lifespan)
+app = FastAPI(title="Fisherfolk Safety System API", lifespan=lifespan, default_response_class=TimedJSONResponse)
+# per-route latency, query counts and Server-Timing headers; see core/timing.py
+app.add_middleware(TimingMiddleware)
+instrument_engine(engine)
 
 
 app.include_router(auth.router, prefix="/api/auth")
@@ -94,6 +97,8 @@ app.include_router(devices.router, prefix="/api/devices")
 app.include_router(coastguard.router, prefix="/api/coastguard")
 app.include_router(traccar.router, prefix="/api/traccar")
 app.include_router(websocket.router, prefix="/api/ws")
+app.include_router(export.router, prefix="/api/export")
+app.include_router(metrics.router)
 
 
 # @app.get("/")
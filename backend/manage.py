@@ -0,0 +1,146 @@
+"""Maintenance commands for the Bantay backend.
+
+Usage examples (from backend/):
+    python manage.py reconcile-traccar --dry-run      # report drift against Traccar
+    python manage.py reconcile-traccar --incremental  # fix drift; only re-check changed devices' permissions
+    python manage.py backfill-rollups                 # rebuild hourly/daily position rollups from raw positions
+    python manage.py backfill-rollups --since 2026-01-01 --device-id 3
+    python manage.py retention --dry-run              # count what downsampling/archiving would remove
+    python manage.py seed                             # default roles and the ADMIN_* user (after `alembic upgrade head`)
+
+Commands print a JSON report to stdout and exit non-zero when errors occurred.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+
+
+def _load_models() -> None:
+    # register every table/relationship before the first query
+    import models.device  # noqa: F401
+    import models.event  # noqa: F401
+    import models.fisherfolk  # noqa: F401
+    import models.geofence  # noqa: F401
+    import models.job_state  # noqa: F401
+    import models.log  # noqa: F401
+    import models.position  # noqa: F401
+    import models.position_rollup  # noqa: F401
+    import models.report  # noqa: F401
+    import models.role  # noqa: F401
+    import models.sos_escalation  # noqa: F401
+    import models.table_version  # noqa: F401
+    import models.traccar_outbox  # noqa: F401
+    import models.trip  # noqa: F401
+    import models.trip_state  # noqa: F401
+    import models.user  # noqa: F401
+
+
+def reconcile_traccar(args: argparse.Namespace) -> int:
+    from db.session import SessionLocal
+    from utils.traccar_reconcile import reconcile
+
+    db = SessionLocal()
+    try:
+        report = reconcile(db, dry_run=args.dry_run, incremental=args.incremental, delete_orphans=args.delete_orphans)
+    finally:
+        db.close()
+    print(json.dumps(report, indent=2, default=str))
+    return 1 if report["errors"] else 0
+
+
+def backfill_rollups(args: argparse.Namespace) -> int:
+    from datetime import datetime, timezone
+
+    from db.session import SessionLocal
+    from utils.rollups import backfill
+
+    since = None
+    if args.since:
+        since = datetime.fromisoformat(args.since)
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+    db = SessionLocal()
+    try:
+        report = backfill(db, device_ids=args.device_id or None, since=since, chunk_size=args.chunk_size)
+    finally:
+        db.close()
+    print(json.dumps(report, indent=2, default=str))
+    return 0
+
+
+def retention(args: argparse.Namespace) -> int:
+    from db.session import SessionLocal
+    from utils.retention import LeaseLost, acquire_lease, lease_owner, run_retention
+
+    db = SessionLocal()
+    try:
+        if args.dry_run:
+            report = run_retention(db, dry_run=True)
+        else:
+            lease = acquire_lease(db, lease_owner())
+            if lease is None:
+                print(json.dumps({"skipped": True, "reason": "retention lease held by another worker"}))
+                return 1
+            try:
+                report = run_retention(db, lease=lease)
+            except LeaseLost as e:
+                print(json.dumps({"stopped": True, "reason": str(e)}))
+                return 1
+            finally:
+                lease.release()
+    finally:
+        db.close()
+    print(json.dumps(report, indent=2, default=str))
+    return 0
+
+
+def seed(args: argparse.Namespace) -> int:
+    from db.schema import HEAD_REVISION, current_revision
+    from db.seed import seed_defaults
+    from db.session import SessionLocal, engine
+
+    db = SessionLocal()
+    try:
+        report = seed_defaults(db, create_admin=not args.no_admin)
+    finally:
+        db.close()
+    report["schema_revision"] = current_revision(engine)
+    report["schema_head"] = HEAD_REVISION
+    print(json.dumps(report, indent=2, default=str))
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Bantay maintenance commands")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("reconcile-traccar", help="diff devices/geofences/permissions against Traccar and fix drift")
+    p.add_argument("--dry-run", action="store_true", help="report only; change nothing")
+    p.add_argument("--incremental", action="store_true", help="only re-check permissions of devices changed since the last run")
+    p.add_argument("--delete-orphans", action="store_true", help="delete Traccar records no local row points at")
+    p.set_defaults(func=reconcile_traccar)
+
+    p = sub.add_parser("backfill-rollups", help="rebuild hourly/daily position rollups from raw positions")
+    p.add_argument("--since", help="only rebuild from this UTC day on (ISO date/time)")
+    p.add_argument("--device-id", type=int, action="append", help="limit to a device (repeatable)")
+    p.add_argument("--chunk-size", type=int, default=5000, help="positions read and committed per step")
+    p.set_defaults(func=backfill_rollups)
+
+    p = sub.add_parser("retention", help="downsample old positions and archive the oldest to gzipped NDJSON")
+    p.add_argument("--dry-run", action="store_true", help="report only; change nothing")
+    p.set_defaults(func=retention)
+
+    p = sub.add_parser("seed", help="create the default roles and the ADMIN_* user (for SCHEMA_MODE=verify deployments)")
+    p.add_argument("--no-admin", action="store_true", help="only create the roles")
+    p.set_defaults(func=seed)
+
+    args = parser.parse_args(argv)
+    _load_models()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
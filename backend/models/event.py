@@ -1,10 +1,12 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.sql import func
 from db.base import Base
 
 
 class Event(Base):
     __tablename__ = "events"
+    # keyset pagination walks (timestamp, id) newest first
+    __table_args__ = (Index("ix_events_timestamp_id", "timestamp", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     device_id = Column(Integer, ForeignKey("devices.id"), nullable=False)
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, String, DateTime, JSON
+from db.base import Base
+
+
+class JobState(Base):
+    __tablename__ = "job_states"
+
+    # one row per background/maintenance job; holds its checkpoint between runs
+    name = Column(String, primary_key=True)
+    last_run_at = Column(DateTime(timezone=True), nullable=True)
+    details = Column(JSON, nullable=True)
@@ -1,10 +1,12 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.sql import func
 from db.base import Base
 
 
 class Log(Base):
     __tablename__ = "logs"
+    # keyset pagination walks (timestamp, id) newest first
+    __table_args__ = (Index("ix_logs_timestamp_id", "timestamp", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     table_name = Column(String, nullable=False)
@@ -1,10 +1,12 @@
-from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.sql import func
 from db.base import Base
 
 
 class Position(Base):
     __tablename__ = "positions"
+    # history, rollup backfill and retention all read one device's fixes in time order
+    __table_args__ = (Index("ix_positions_device_timestamp", "device_id", "timestamp"),)
 
     id = Column(Integer, primary_key=True, index=True)
     device_id = Column(Integer, ForeignKey("devices.id"), nullable=False)
@@ -13,5 +15,7 @@ class Position(Base):
     speed = Column(Float, nullable=True)
     course = Column(Float, nullable=True)
     timestamp = Column(DateTime(timezone=True), nullable=True)
+    # when the Traccar forward reached us (fix -> server staleness)
+    received_at = Column(DateTime(timezone=True), nullable=True)
     battery_percent = Column(Integer, nullable=True)
     attributes = Column(JSON, nullable=True)
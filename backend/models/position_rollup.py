@@ -0,0 +1,32 @@
+from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Index, UniqueConstraint
+from db.base import Base
+
+
+class PositionRollup(Base):
+    __tablename__ = "position_rollups"
+    # one row per device and UTC hour/day bucket; ingest upserts on the unique key
+    __table_args__ = (
+        UniqueConstraint("device_id", "bucket", "bucket_start", name="uq_position_rollups_bucket"),
+        Index("ix_position_rollups_bucket_start", "bucket", "bucket_start"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    device_id = Column(Integer, ForeignKey("devices.id", ondelete="CASCADE"), nullable=False)
+    bucket = Column(String, nullable=False)  # 'hour' or 'day'
+    bucket_start = Column(DateTime(timezone=True), nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    distance_m = Column(Float, nullable=False, default=0.0)
+    speed_sum = Column(Float, nullable=False, default=0.0)
+    speed_count = Column(Integer, nullable=False, default=0)
+    max_speed = Column(Float, nullable=True)
+    min_battery = Column(Float, nullable=True)
+    min_latitude = Column(Float, nullable=False)
+    min_longitude = Column(Float, nullable=False)
+    max_latitude = Column(Float, nullable=False)
+    max_longitude = Column(Float, nullable=False)
+    first_at = Column(DateTime(timezone=True), nullable=False)
+    first_latitude = Column(Float, nullable=False)
+    first_longitude = Column(Float, nullable=False)
+    last_at = Column(DateTime(timezone=True), nullable=False)
+    last_latitude = Column(Float, nullable=False)
+    last_longitude = Column(Float, nullable=False)
@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.sql import func
 
 from db.base import Base
@@ -8,6 +8,8 @@ from db.base import Base
 
 class Report(Base):
     __tablename__ = "reports"
+    # keyset pagination walks (timestamp, id) newest first
+    __table_args__ = (Index("ix_reports_timestamp_id", "timestamp", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     event_id = Column(Integer, ForeignKey("events.id"), nullable=False, unique=True)
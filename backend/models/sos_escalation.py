@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, Index
+from db.base import Base
+
+
+class SosEscalation(Base):
+    __tablename__ = "sos_escalations"
+    # open alarms are reloaded once at startup; acknowledged rows stay for time-to-acknowledge reporting
+    __table_args__ = (Index("ix_sos_escalations_open", "acknowledged_at", "next_at"),)
+
+    # escalation state of one alarm:sos event, so the timers survive a restart
+    event_id = Column(Integer, ForeignKey("events.id", ondelete="CASCADE"), primary_key=True)
+    device_id = Column(Integer, ForeignKey("devices.id", ondelete="CASCADE"), nullable=False)
+    level = Column(Integer, nullable=False, default=0)
+    opened_at = Column(DateTime(timezone=True), nullable=False)
+    next_at = Column(DateTime(timezone=True), nullable=True)
+    last_broadcast_at = Column(DateTime(timezone=True), nullable=True)
+    acknowledged_at = Column(DateTime(timezone=True), nullable=True)
+    acknowledged_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    ack_seconds = Column(Float, nullable=True)
@@ -0,0 +1,10 @@
+from sqlalchemy import Column, Integer, String
+from db.base import Base
+
+
+class TableVersion(Base):
+    __tablename__ = "table_versions"
+
+    # one row per tracked table; bumped inside the same transaction as the mutation
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Text, Index
+from sqlalchemy.sql import func
+from db.base import Base
+
+
+class TraccarOutbox(Base):
+    __tablename__ = "traccar_outbox"
+    # the worker scans pending rows by id and checks for older rows of the same entity
+    __table_args__ = (
+        Index("ix_traccar_outbox_status_id", "status", "id"),
+        Index("ix_traccar_outbox_entity", "entity_type", "entity_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    entity_type = Column(String, nullable=False)  # 'device' or 'geofence'
+    entity_id = Column(Integer, nullable=False)  # local id; the row may be gone for deletes
+    op = Column(String, nullable=False)  # 'upsert', 'delete' or 'link' (device geofence permission)
+    payload = Column(JSON, nullable=True)
+    status = Column(String, nullable=False, default="pending")  # pending, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Index
+from sqlalchemy.sql import func
+from db.base import Base
+
+
+class Trip(Base):
+    __tablename__ = "trips"
+    # per-device and fleet-wide listings walk (start_at, id) newest first
+    __table_args__ = (
+        Index("ix_trips_device_start", "device_id", "start_at", "id"),
+        Index("ix_trips_start_id", "start_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    device_id = Column(Integer, ForeignKey("devices.id", ondelete="CASCADE"), nullable=False)
+    status = Column(String, nullable=False, default="open")  # 'open' while at sea, then 'closed'
+    end_reason = Column(String, nullable=True)  # 'returned', 'dwell' or 'gap'
+    start_at = Column(DateTime(timezone=True), nullable=False)
+    end_at = Column(DateTime(timezone=True), nullable=True)
+    start_latitude = Column(Float, nullable=False)
+    start_longitude = Column(Float, nullable=False)
+    end_latitude = Column(Float, nullable=True)
+    end_longitude = Column(Float, nullable=True)
+    distance_m = Column(Float, nullable=False, default=0.0)
+    max_speed = Column(Float, nullable=True)  # knots, as reported by Traccar
+    min_latitude = Column(Float, nullable=False)
+    min_longitude = Column(Float, nullable=False)
+    max_latitude = Column(Float, nullable=False)
+    max_longitude = Column(Float, nullable=False)
+    point_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
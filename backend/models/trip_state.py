@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey
+from db.base import Base
+
+
+class TripState(Base):
+    __tablename__ = "trip_states"
+
+    # segmenter checkpoint per device: the last point seen, home port and the dwell anchor,
+    # so each new position is classified without rereading history
+    device_id = Column(Integer, ForeignKey("devices.id", ondelete="CASCADE"), primary_key=True)
+    home_latitude = Column(Float, nullable=True)
+    home_longitude = Column(Float, nullable=True)
+    last_latitude = Column(Float, nullable=True)
+    last_longitude = Column(Float, nullable=True)
+    last_at = Column(DateTime(timezone=True), nullable=True)
+    dwell_latitude = Column(Float, nullable=True)
+    dwell_longitude = Column(Float, nullable=True)
+    dwell_since = Column(DateTime(timezone=True), nullable=True)
+    open_trip_id = Column(Integer, ForeignKey("trips.id", ondelete="SET NULL"), nullable=True)
@@ -1,16 +1,22 @@
-from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+import logging
+import math
 import os
 import json
-import xml.etree.ElementTree as ET
-from sqlalchemy import or_
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session, aliased
 from pydantic import BaseModel, ConfigDict, EmailStr
 from typing import Optional
-import requests
 
 from core.security import require_admin, get_db, hash_password, can_view_medical, get_current_user
 from core.config import settings
+from core.audit import log_action, metrics as audit_metrics
+from core.profiler import ProfilerBusy, sampler as stack_sampler, to_collapsed
+from core.timing import QUERY_SORTS, ROUTE_SORTS, store as timing_store
 from schemas.user import UserOut
 from models.user import User
 from models.device import Device
@@ -20,22 +26,32 @@ from models.geofence import Geofence
 from models.report import Report
 from models.log import Log
 from models.role import Role
-from schemas.geofence import GeofenceOut, GeofenceCreate, GeofenceUpdate
+from models.sos_escalation import SosEscalation
+from schemas.geofence import GeofenceOut, GeofenceCreate, GeofenceSyncOut, GeofenceUpdate
 from schemas.report import ReportWithDevice
+from db.search import matching_ids, text_match
+from utils.bulk_import import hash_passwords as hash_bulk_passwords, parse_rows as parse_bulk_rows, validate_rows as validate_bulk_rows
+from utils.etag import bump_version, not_modified, table_etag
+from utils.ingest_latency import tracker as ingest_latency
+from utils.geometry import geofence_cache, geojson_to_wkt, gpx_to_wkt, normalize_wkt_polygon
+from utils.nearby import vessel_index
+from utils.sos_escalation import escalations as sos_escalations
+from utils.pagination import paginate_by_id, paginate_by_time, parse_time_filter
+from utils.traccar_client import TraccarError, get_client as get_traccar_client
+from utils.traccar_reconcile import reconcile as reconcile_with_traccar
+from utils.traccar_sync import (
+    ENTITY_TYPES as SYNC_ENTITY_TYPES,
+    enqueue as enqueue_traccar,
+    entity_status as traccar_status,
+    queue_summary as traccar_queue_summary,
+    retry_failed as retry_traccar_sync,
+    traccar_enabled as _traccar_enabled,
+)
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
-def _log_action(db: Session, table: str, record_id: int, action: str, actor_user_id: Optional[int] = None, details: Optional[dict] = None):
-    try:
-        entry = Log(table_name=table, record_id=record_id, action=action, actor_user_id=actor_user_id, details=details)
-        db.add(entry)
-        db.flush()
-        db.commit()
-    except Exception:
-        db.rollback()
-        raise
-
 class RegisterDeviceIn(BaseModel):
     traccar_device_id: Optional[int] = None
     unique_id: Optional[str]
@@ -64,199 +80,33 @@ class PasswordResetIn(BaseModel):
     new_password: str
 
 
-def _traccar_enabled():
-    env_testing = os.environ.get("TESTING") in ("1", "true", "True")
-    env_skip = os.environ.get("BANTAY_SKIP_TRACCAR") in ("1", "true", "True")
-    return not (settings.TESTING or env_testing or env_skip)
-
-
-def _sync_device_geofence(traccar_device_id: Optional[int], new_geofence_id: Optional[int] = None, previous_geofence_id: Optional[int] = None, db: Session = None):
-    if not traccar_device_id or db is None:
-        return
-    if not settings.TRACCAR_API_URL or not settings.TRACCAR_API_TOKEN:
-        return
-    if not _traccar_enabled():
+def _enqueue_geofence_link(db: Session, device_id: int, geofence_id: Optional[int], previous_geofence_id: Optional[int] = None):
+    """Queue the Traccar permission change moving a device to `geofence_id`."""
+    if not geofence_id and not previous_geofence_id:
         return
-
-    new_traccar_id = None
-    old_traccar_id = None
-    if previous_geofence_id:
-        old = db.query(Geofence).filter(Geofence.id == int(previous_geofence_id)).first()
-        old_traccar_id = old.traccar_id if old else None
-    if new_geofence_id:
-        new = db.query(Geofence).filter(Geofence.id == int(new_geofence_id)).first()
-        new_traccar_id = new.traccar_id if new else None
-
-    headers = {"Authorization": f"Bearer {settings.TRACCAR_API_TOKEN}"}
-    base = settings.TRACCAR_API_URL.rstrip("/")
-
-    try:
-        # remove old assignment if changed
-        if old_traccar_id and old_traccar_id != new_traccar_id:
-            requests.delete(
-                f"{base}/api/permissions",
-                params={"deviceId": traccar_device_id, "geofenceId": old_traccar_id},
-                headers=headers,
-                timeout=10,
-            ).raise_for_status()
-
-        # add new assignment
-        if new_traccar_id:
-            requests.post(
-                f"{base}/api/permissions",
-                json={"deviceId": traccar_device_id, "geofenceId": new_traccar_id},
-                headers=headers,
-                timeout=10,
-            ).raise_for_status()
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Failed to sync geofence with Traccar: {e}")
+    previous = db.get(Geofence, int(previous_geofence_id)) if previous_geofence_id else None
+    enqueue_traccar(db, "device", device_id, "link", {
+        "geofence_id": geofence_id,
+        "previous_geofence_id": previous_geofence_id,
+        "previous_traccar_geofence_id": previous.traccar_id if previous else None,
+    })
 
 
-def _sync_traccar_device(device: Device, db: Session, previous_unique_id: Optional[str] = None):
-    if db is None:
-        return
-    if not _traccar_enabled():
-        return
-    if not settings.TRACCAR_API_URL or not settings.TRACCAR_API_TOKEN:
-        return
+def _device_out(device: Device) -> dict:
+    return {
+        "id": device.id,
+        "traccar_device_id": device.traccar_device_id,
+        "unique_id": device.unique_id,
+        "sim_number": device.sim_number,
+        "user_id": device.user_id,
+        "geofence_id": device.geofence_id,
+    }
 
-    # unique_id is required to manage Traccar devices
-    if not device.unique_id:
-        return
 
-    headers = {"Authorization": f"Bearer {settings.TRACCAR_API_TOKEN}"}
-    base = settings.TRACCAR_API_URL.rstrip("/")
-    payload = {
-        "name": device.name or device.unique_id,
-        "uniqueId": device.unique_id,
-    }
-    try:
-        if device.traccar_device_id:
-            requests.put(
-                f"{base}/api/devices/{device.traccar_device_id}",
-                json=payload,
-                headers=headers,
-                timeout=10,
-            ).raise_for_status()
-        else:
-            resp = requests.post(
-                f"{base}/api/devices",
-                json=payload,
-                headers=headers,
-                timeout=10,
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            if isinstance(data, dict) and data.get("id"):
-                device.traccar_device_id = data.get("id")
-                db.flush()
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Failed to sync device with Traccar: {e}")
-
-
-def _geojson_polygon_to_wkt(payload: dict) -> Optional[str]:
-    def _extract_coords(obj):
-        if not isinstance(obj, dict):
-            return None
-        t = obj.get("type")
-        if t == "FeatureCollection":
-            for feat in obj.get("features", []):
-                coords = _extract_coords(feat)
-                if coords:
-                    return coords
-        if t == "Feature":
-            return _extract_coords(obj.get("geometry"))
-        if t == "Polygon":
-            coords = obj.get("coordinates") or []
-            return coords[0] if coords else None
-        if t == "MultiPolygon":
-            coords = obj.get("coordinates") or []
-            if coords and coords[0]:
-                return coords[0][0]
-        return None
-
-    coords = _extract_coords(payload)
-    if not coords:
-        return None
-    if not isinstance(coords, list) or len(coords) < 3:
-        return None
-    if coords[0] != coords[-1]:
-        coords = coords + [coords[0]]
-    parts = []
-    for pt in coords:
-        if not isinstance(pt, (list, tuple)) or len(pt) < 2:
-            return None
-        lon, lat = pt[0], pt[1]
-        # Traccar expects (lat lon) ordering
-        parts.append(f"{lat:.6f} {lon:.6f}")
-    return f"POLYGON(({', '.join(parts)}))"
-
-
-def _normalize_wkt_polygon(area_wkt: Optional[str]) -> Optional[str]:
-    if not area_wkt:
-        return None
-    s = area_wkt.strip()
-    if "polygon" not in s.lower():
-        return None
-    start = s.find("(")
-    end = s.rfind(")")
-    if start == -1 or end == -1 or end <= start:
-        return None
-    inner = s[start:end].strip().lstrip("(").rstrip(")")
-    tokens = [t for t in inner.replace("\n", " ").split(",") if t.strip()]
-    coords = []
-    for tok in tokens:
-        parts = [p for p in tok.strip().split(" ") if p]
-        if len(parts) < 2:
-            continue
-        try:
-            lon = float(parts[0])
-            lat = float(parts[1])
-        except ValueError:
-            return None
-        # heuristic: if first looks like lat (<=90) and second looks like lon (>90), swap
-        if abs(lon) <= 90 and abs(lat) > 90:
-            lon, lat = lat, lon
-        # else if lon clearly >90 and lat within range, keep; otherwise assume lon,lat
-        coords.append((lon, lat))
-    if len(coords) < 3:
-        return None
-    # close ring if needed
-    if abs(coords[0][0] - coords[-1][0]) > 1e-9 or abs(coords[0][1] - coords[-1][1]) > 1e-9:
-        coords.append(coords[0])
-    coord_str = ", ".join([f"{lat:.6f} {lon:.6f}" for lon, lat in coords])
-    return f"POLYGON(({coord_str}))"
-
-
-def _gpx_to_wkt(text: str) -> Optional[str]:
-    if not text or "<gpx" not in text.lower():
-        return None
-    try:
-        root = ET.fromstring(text)
-    except Exception:
-        return None
-    ns = ""
-    if root.tag.startswith("{") and "}" in root.tag:
-        ns = root.tag.split("}")[0] + "}"
-    pts = []
-    for tag in ["trkpt", "rtept", "wpt"]:
-        for el in root.findall(f".//{ns}{tag}"):
-            lat = el.attrib.get("lat")
-            lon = el.attrib.get("lon")
-            if lat is None or lon is None:
-                continue
-            try:
-                latf = float(lat)
-                lonf = float(lon)
-            except ValueError:
-                continue
-            pts.append((latf, lonf))
-    if len(pts) < 3:
-        return None
-    if abs(pts[0][0] - pts[-1][0]) > 1e-9 or abs(pts[0][1] - pts[-1][1]) > 1e-9:
-        pts.append(pts[0])
-    coord_str = ", ".join([f"{lat:.6f} {lon:.6f}" for lat, lon in pts])
-    return f"POLYGON(({coord_str}))"
+def _geofence_out(db: Session, g: Geofence) -> GeofenceSyncOut:
+    out = GeofenceSyncOut.model_validate(g)
+    out.sync = traccar_status(db, "geofence", g.id)
+    return out
 
 
 @router.post("/register")
@@ -316,13 +166,16 @@ def register(data: RegisterDeviceIn, db: Session = Depends(get_db), current_user
     db.add(device)
     db.flush()
 
-    # Register or sync device with Traccar (auto-assign traccar_device_id)
+    # queue the Traccar device (traccar_device_id is filled in by the outbox worker)
     if data.unique_id is None and _traccar_enabled():
         db.rollback()
         raise HTTPException(status_code=400, detail="unique_id is required to register device with Traccar")
     try:
-        _sync_traccar_device(device, db=db)
-        _sync_device_geofence(traccar_device_id=device.traccar_device_id, new_geofence_id=device.geofence_id, db=db)
+        enqueue_traccar(db, "device", device.id, "upsert")
+        _enqueue_geofence_link(db, device.id, device.geofence_id)
+        bump_version(db, "devices")
+        log_action(db, "devices", device.id, "create", actor_user_id=current_user.id, details={"fisher_id": fisher.id})
+        log_action(db, "users", fisher.id, "create", actor_user_id=current_user.id, details={"role": "fisherfolk"})
         db.commit()
     except Exception:
         db.rollback()
@@ -333,20 +186,11 @@ def register(data: RegisterDeviceIn, db: Session = Depends(get_db), current_user
     ff = db.query(Fisherfolk).filter(Fisherfolk.user_id == fisher.id).first()
     med = ff.medical_record if ff else None
 
-    _log_action(db, "devices", device.id, "create", actor_user_id=current_user.id, details={"fisher_id": fisher.id})
-    _log_action(db, "users", fisher.id, "create", actor_user_id=current_user.id, details={"role": "fisherfolk"})
-
     return {
         "ok": True,
-        "device": {
-            "id": device.id,
-            "traccar_device_id": device.traccar_device_id,
-            "unique_id": device.unique_id,
-            "sim_number": device.sim_number,
-            "user_id": device.user_id,
-            "geofence_id": device.geofence_id,
-        },
+        "device": _device_out(device),
         "fisherfolk": {"id": fisher.id, "email": fisher.email, "medical_record": med},
+        "sync": traccar_status(db, "device", device.id),
     }
 
 
@@ -357,6 +201,86 @@ def register_fisher(data: RegisterDeviceIn, db: Session = Depends(get_db), curre
     return register(data, db, current_user)  # type: ignore[arg-type]
 
 
+@router.post("/register/bulk")
+def register_bulk(
+    file: UploadFile = File(...),
+    dry_run: bool = Form(False),
+    skip_invalid: bool = Form(False),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin),
+):
+    """Register many fisherfolk and their devices from a CSV or JSON file.
+
+    Columns match `/register` (unique_id, name, sim_number, fisher_name,
+    fisher_email, fisher_password, medical_record, geofence_id). Every row is
+    validated before anything is written; unless `skip_invalid` is set, one bad
+    row aborts the whole import. `dry_run` only validates. Devices are pushed to
+    Traccar by the outbox worker after the commit.
+    """
+    if _traccar_enabled() and (not settings.TRACCAR_API_URL or not settings.TRACCAR_API_TOKEN):
+        raise HTTPException(status_code=400, detail="Traccar API URL and token must be configured to register devices")
+    try:
+        rows = parse_bulk_rows(file.file.read(), file.filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not rows:
+        raise HTTPException(status_code=400, detail="No rows to import")
+    if len(rows) > settings.BULK_IMPORT_MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"Too many rows; the limit is {settings.BULK_IMPORT_MAX_ROWS}")
+
+    report, valid = validate_bulk_rows(db, rows, RegisterDeviceIn, require_unique_id=_traccar_enabled())
+    invalid = len(rows) - len(valid)
+    summary = {"dry_run": dry_run, "total": len(rows), "valid": len(valid), "invalid": invalid}
+    if dry_run or (invalid and not skip_invalid) or not valid:
+        return {"ok": invalid == 0, "created": 0, **summary, "rows": report}
+
+    hashes = hash_bulk_passwords([data.fisher_password for _, data in valid], settings.BULK_IMPORT_HASH_WORKERS)
+
+    fisher_role = db.query(Role).filter(Role.name == "fisherfolk").first()
+    if not fisher_role:
+        fisher_role = Role(name="fisherfolk", description="Default fisherfolk role")
+        db.add(fisher_role)
+        db.flush()
+
+    batch_size = max(1, settings.BULK_IMPORT_BATCH_SIZE)
+    try:
+        for start in range(0, len(valid), batch_size):
+            batch = valid[start:start + batch_size]
+            user_ids = db.scalars(
+                insert(User).returning(User.id, sort_by_parameter_order=True),
+                [
+                    {"name": data.fisher_name, "email": data.fisher_email, "password_hash": pw, "role_id": fisher_role.id}
+                    for (_, data), pw in zip(batch, hashes[start:start + batch_size])
+                ],
+            ).all()
+            db.execute(insert(Fisherfolk), [
+                {"user_id": uid, "allow_history_access": False, "medical_record": data.medical_record}
+                for (_, data), uid in zip(batch, user_ids)
+            ])
+            device_ids = db.scalars(
+                insert(Device).returning(Device.id, sort_by_parameter_order=True),
+                [
+                    {"unique_id": data.unique_id, "name": data.name, "sim_number": data.sim_number, "user_id": uid, "geofence_id": data.geofence_id}
+                    for (_, data), uid in zip(batch, user_ids)
+                ],
+            ).all()
+            for (index, data), uid, did in zip(batch, user_ids, device_ids):
+                enqueue_traccar(db, "device", did, "upsert")
+                _enqueue_geofence_link(db, did, data.geofence_id)
+                log_action(db, "devices", did, "create", actor_user_id=current_user.id, details={"fisher_id": uid, "bulk": True})
+                log_action(db, "users", uid, "create", actor_user_id=current_user.id, details={"role": "fisherfolk", "bulk": True})
+                report[index].update({"status": "created", "user_id": uid, "device_id": did})
+        bump_version(db, "devices")
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=f"Import conflicts with existing records; nothing was imported: {e.orig}")
+    except Exception:
+        db.rollback()
+        raise
+    return {"ok": invalid == 0, "created": len(valid), **summary, "rows": report}
+
+
 @router.post("/register_coastguard")
 def register_coastguard(data: CoastGuardCreateIn, db: Session = Depends(get_db), current_user: User = Depends(require_admin)):
     """Create a coast guard user. This endpoint requires administrator privileges."""
@@ -373,9 +297,10 @@ def register_coastguard(data: CoastGuardCreateIn, db: Session = Depends(get_db),
 
     user = User(name=data.name, email=data.email, password_hash=hash_password(data.password), role_id=role_obj.id)
     db.add(user)
+    db.flush()
+    log_action(db, "users", user.id, "create", actor_user_id=current_user.id, details={"role": "coast_guard"})
     db.commit()
     db.refresh(user)
-    _log_action(db, "users", user.id, "create", actor_user_id=current_user.id, details={"role": "coast_guard"})
     return {"ok": True, "user": {"id": user.id, "email": user.email, "role": user.role}}
 
 
@@ -393,9 +318,10 @@ def register_admin(data: AdminCreateIn, db: Session = Depends(get_db), current_u
         db.flush()
     user = User(name=data.name, email=data.email, password_hash=hash_password(data.password), role_id=role_obj.id)
     db.add(user)
+    db.flush()
+    log_action(db, "users", user.id, "create", actor_user_id=current_user.id, details={"role": "administrator"})
     db.commit()
     db.refresh(user)
-    _log_action(db, "users", user.id, "create", actor_user_id=current_user.id, details={"role": "administrator"})
     return {"ok": True, "user": {"id": user.id, "email": user.email, "role": "administrator"}}
 
 
@@ -466,9 +392,8 @@ def create_user(data: UserCreateIn, db: Session = Depends(get_db), current_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     user = User(name=data.name, email=data.email, password_hash=hash_password(data.password), role=data.role)
     db.add(user)
-    db.commit()
-    db.refresh(user)
-    _log_action(db, "users", user.id, "create", actor_user_id=current_user.id, details={"role": user.role})
+    db.flush()
+    log_action(db, "users", user.id, "create", actor_user_id=current_user.id, details={"role": user.role})
 
     # if created user is a fisherfolk and a medical_record was provided, create fisherfolk record
     if (data.role or user.role) == "fisherfolk":
@@ -476,7 +401,8 @@ def create_user(data: UserCreateIn, db: Session = Depends(get_db), current_user:
         if not existing_ff:
             ff = Fisherfolk(user_id=user.id, allow_history_access=False, medical_record=data.medical_record)
             db.add(ff)
-            db.commit()
+    db.commit()
+    db.refresh(user)
     return user
 
 
@@ -508,9 +434,9 @@ def update_user(user_id: int, data: UserUpdateIn, db: Session = Depends(get_db),
         else:
             ff.medical_record = data.medical_record
 
+    log_action(db, "users", user.id, "update", actor_user_id=current_user.id, details=data.model_dump(exclude_none=True))
     db.commit()
     db.refresh(user)
-    _log_action(db, "users", user.id, "update", actor_user_id=current_user.id, details=data.model_dump(exclude_none=True))
     return user
 
 
@@ -528,11 +454,12 @@ def delete_user(user_id: int, delete_devices: bool = False, db: Session = Depend
             # retain devices but detach ownership to avoid FK issues
             db.query(Device).filter(Device.user_id == user.id).update({Device.user_id: None}, synchronize_session=False)
         db.delete(user)
+        bump_version(db, "devices")
+        log_action(db, "users", user_id, "delete", actor_user_id=current_user.id, details={"deleted_devices": deleted_devices})
         db.commit()
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete user: {e}")
-    _log_action(db, "users", user_id, "delete", actor_user_id=current_user.id, details={"deleted_devices": deleted_devices})
     return {"ok": True, "deleted_devices": deleted_devices}
 
 
@@ -542,14 +469,27 @@ def reset_password(user_id: int, data: PasswordResetIn, db: Session = Depends(ge
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     user.password_hash = hash_password(data.new_password)
+    log_action(db, "users", user.id, "update", actor_user_id=current_user.id, details={"reset_password": True})
     db.commit()
-    _log_action(db, "users", user.id, "update", actor_user_id=current_user.id, details={"reset_password": True})
     return {"ok": True}
 
 
 @router.get("/devices")
-def list_devices(device_id: Optional[int] = None, traccar_device_id: Optional[int] = None, unique_id: Optional[str] = None, db: Session = Depends(get_db), _=Depends(require_admin)):
-    """List devices or fetch a single device by id, traccar_device_id or unique_id."""
+def list_devices(
+    request: Request,
+    response: Response,
+    device_id: Optional[int] = None,
+    traccar_device_id: Optional[int] = None,
+    unique_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    db: Session = Depends(get_db),
+    _=Depends(require_admin),
+):
+    """List devices or fetch a single device by id, traccar_device_id or unique_id.
+
+    Listing supports keyset pagination (`cursor`/`limit`) and `If-None-Match`.
+    """
     if device_id is not None:
         d = db.query(Device).filter(Device.id == int(device_id)).first()
         if not d:
@@ -565,8 +505,12 @@ def list_devices(device_id: Optional[int] = None, traccar_device_id: Optional[in
         if not d:
             raise HTTPException(status_code=404, detail="Device not found")
         return d
-    devices = db.query(Device).all()
-    return devices
+    etag = table_etag(db, "devices", request)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+    return paginate_by_id(db.query(Device), Device.id, cursor, limit, response)
 
 
 class DeviceCreateIn(BaseModel):
@@ -635,29 +579,16 @@ def create_device(data: DeviceCreateIn, db: Session = Depends(get_db), current_u
     db.flush()
 
     try:
-        _sync_traccar_device(device, db=db)
-        _sync_device_geofence(traccar_device_id=device.traccar_device_id, new_geofence_id=device.geofence_id, db=db)
+        enqueue_traccar(db, "device", device.id, "upsert")
+        _enqueue_geofence_link(db, device.id, device.geofence_id)
+        bump_version(db, "devices")
+        log_action(db, "devices", device.id, "create", actor_user_id=current_user.id, details=data.model_dump(exclude_none=True))
         db.commit()
     except Exception:
         db.rollback()
         raise
     db.refresh(device)
-    _log_action(db, "devices", device.id, "create", actor_user_id=current_user.id, details=data.model_dump(exclude_none=True))
-    try:
-        _sync_device_geofence(traccar_device_id=device.traccar_device_id, new_geofence_id=device.geofence_id, db=db)
-    except Exception:
-        pass
-    return {
-        "ok": True,
-        "device": {
-            "id": device.id,
-            "traccar_device_id": device.traccar_device_id,
-            "unique_id": device.unique_id,
-            "sim_number": device.sim_number,
-            "user_id": device.user_id,
-            "geofence_id": device.geofence_id,
-        },
-    }
+    return {"ok": True, "device": _device_out(device), "sync": traccar_status(db, "device", device.id)}
 
 
 @router.put("/devices/{device_id}")
@@ -666,7 +597,7 @@ def update_device(device_id: int, data: DeviceUpdateIn, db: Session = Depends(ge
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
     previous_geofence_id = device.geofence_id
-    previous_unique_id = device.unique_id
+    previous_remote = (device.traccar_device_id, device.unique_id, device.name)
     if data.traccar_device_id is not None:
         device.traccar_device_id = data.traccar_device_id
     if data.unique_id is not None:
@@ -686,30 +617,19 @@ def update_device(device_id: int, data: DeviceUpdateIn, db: Session = Depends(ge
                 raise HTTPException(status_code=404, detail="Geofence not found")
         device.geofence_id = data.geofence_id
     try:
-        _sync_traccar_device(device, db=db, previous_unique_id=previous_unique_id)
-        _sync_device_geofence(
-            traccar_device_id=device.traccar_device_id,
-            new_geofence_id=device.geofence_id,
-            previous_geofence_id=previous_geofence_id,
-            db=db,
-        )
+        # only round-trip to Traccar for fields it stores
+        if not device.traccar_device_id or (device.traccar_device_id, device.unique_id, device.name) != previous_remote:
+            enqueue_traccar(db, "device", device.id, "upsert")
+        if device.geofence_id != previous_geofence_id:
+            _enqueue_geofence_link(db, device.id, device.geofence_id, previous_geofence_id=previous_geofence_id)
+        bump_version(db, "devices")
+        log_action(db, "devices", device.id, "update", actor_user_id=current_user.id, details=data.model_dump(exclude_none=True))
         db.commit()
     except Exception:
         db.rollback()
         raise
     db.refresh(device)
-    _log_action(db, "devices", device.id, "update", actor_user_id=current_user.id, details=data.model_dump(exclude_none=True))
-    return {
-        "ok": True,
-        "device": {
-            "id": device.id,
-            "traccar_device_id": device.traccar_device_id,
-            "unique_id": device.unique_id,
-            "sim_number": device.sim_number,
-            "user_id": device.user_id,
-            "geofence_id": device.geofence_id,
-        },
-    }
+    return {"ok": True, "device": _device_out(device), "sync": traccar_status(db, "device", device.id)}
 
 
 @router.delete("/devices/{device_id}")
@@ -720,16 +640,8 @@ def delete_device(device_id: int, delete_user: bool = False, db: Session = Depen
         raise HTTPException(status_code=404, detail="Device not found")
     owner_deleted = False
     try:
-        # remove from Traccar first when configured so we fail fast on connectivity issues
-        if device.traccar_device_id and _traccar_enabled():
-            if not settings.TRACCAR_API_URL or not settings.TRACCAR_API_TOKEN:
-                raise HTTPException(status_code=400, detail="Traccar API URL and token must be configured to manage devices")
-            resp = requests.delete(
-                f"{settings.TRACCAR_API_URL.rstrip('/')}/api/devices/{device.traccar_device_id}",
-                headers={"Authorization": f"Bearer {settings.TRACCAR_API_TOKEN}"},
-                timeout=10,
-            )
-            resp.raise_for_status()
+        # the remote device is removed by the outbox worker once this commits
+        enqueue_traccar(db, "device", device.id, "delete", {"traccar_device_id": device.traccar_device_id, "unique_id": device.unique_id})
 
         owner = None
         if delete_user and device.user_id is not None:
@@ -738,18 +650,20 @@ def delete_device(device_id: int, delete_user: bool = False, db: Session = Depen
         if owner and delete_user:
             db.delete(owner)
             owner_deleted = True
+        bump_version(db, "devices")
+        log_action(db, "devices", device_id, "delete", actor_user_id=current_user.id, details={"owner_deleted": owner_deleted})
         db.commit()
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=502, detail=f"Failed to delete device: {e}")
-    _log_action(db, "devices", device_id, "delete", actor_user_id=current_user.id, details={"owner_deleted": owner_deleted})
-    return {"ok": True, "owner_deleted": owner_deleted}
+    vessel_index.remove(int(device_id))
+    return {"ok": True, "owner_deleted": owner_deleted, "sync": traccar_status(db, "device", device_id)}
 
 
 # Geofence CRUD
 
 
-@router.post("/geofences/upload", response_model=GeofenceOut)
+@router.post("/geofences/upload", response_model=GeofenceSyncOut)
 async def upload_geofence(
     file: UploadFile = File(...),
     name: Optional[str] = Form(None),
@@ -764,16 +678,16 @@ async def upload_geofence(
     if text:
         try:
             payload = json.loads(text)
-            area_wkt = _geojson_polygon_to_wkt(payload)
+            area_wkt = geojson_to_wkt(payload)
         except Exception:
             area_wkt = None
         if not area_wkt:
-            area_wkt = _gpx_to_wkt(text) or text
+            area_wkt = gpx_to_wkt(text) or text
 
     if not area_wkt or "polygon" not in area_wkt.lower():
         raise HTTPException(status_code=400, detail="Invalid geofence file; provide a GeoJSON polygon or WKT POLYGON text")
 
-    normalized = _normalize_wkt_polygon(area_wkt)
+    normalized = normalize_wkt_polygon(area_wkt)
     if not normalized:
         raise HTTPException(status_code=400, detail="Invalid geofence polygon format")
 
@@ -781,34 +695,32 @@ async def upload_geofence(
     db.add(g)
     db.flush()
 
-    if _traccar_enabled():
-        if not settings.TRACCAR_API_URL or not settings.TRACCAR_API_TOKEN:
-            db.rollback()
-            raise HTTPException(status_code=400, detail="Traccar API URL and token must be configured to manage geofences")
-        try:
-            resp = requests.post(
-                f"{settings.TRACCAR_API_URL.rstrip('/')}/api/geofences",
-                json={"name": g.name, "description": g.description, "area": g.area},
-                headers={"Authorization": f"Bearer {settings.TRACCAR_API_TOKEN}"},
-                timeout=10,
-            )
-            resp.raise_for_status()
-            traccar_data = resp.json()
-            if isinstance(traccar_data, dict) and traccar_data.get("id"):
-                g.traccar_id = traccar_data.get("id")
-        except Exception as e:
-            db.rollback()
-            raise HTTPException(status_code=502, detail=f"Failed to create geofence in Traccar: {e}")
+    if _traccar_enabled() and (not settings.TRACCAR_API_URL or not settings.TRACCAR_API_TOKEN):
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Traccar API URL and token must be configured to manage geofences")
 
+    enqueue_traccar(db, "geofence", g.id, "upsert")
+    bump_version(db, "geofences")
     db.commit()
     db.refresh(g)
-    return g
+    return _geofence_out(db, g)
 
 
 @router.get("/geofences", response_model=list[GeofenceOut])
-def list_geofences(db: Session = Depends(get_db), _=Depends(require_admin)):
-    geofences = db.query(Geofence).all()
-    return geofences
+def list_geofences(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    db: Session = Depends(get_db),
+    _=Depends(require_admin),
+):
+    etag = table_etag(db, "geofences", request)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+    return paginate_by_id(db.query(Geofence), Geofence.id, cursor, limit, response)
 
 
 @router.get("/geofences/{geofence_id}", response_model=GeofenceOut)
@@ -819,7 +731,18 @@ def get_geofence(geofence_id: int, db: Session = Depends(get_db), _=Depends(requ
     return g
 
 
-@router.post("/geofences", response_model=GeofenceOut)
+@router.get("/geofences/{geofence_id}/geometry")
+def get_geofence_geometry(geofence_id: int, db: Session = Depends(get_db), _=Depends(require_admin)):
+    """Bounding box, area (m²), centroid and ring counts of the compiled geofence polygon."""
+    compiled = geofence_cache.get(db, geofence_id)
+    if compiled is None:
+        if not db.query(Geofence.id).filter(Geofence.id == int(geofence_id)).first():
+            raise HTTPException(status_code=404, detail="Geofence not found")
+        raise HTTPException(status_code=422, detail="Geofence area is not a valid polygon")
+    return {"id": int(geofence_id), **compiled.summary()}
+
+
+@router.post("/geofences", response_model=GeofenceSyncOut)
 def create_geofence(data: GeofenceCreate, db: Session = Depends(get_db), _=Depends(require_admin)):
     # respect TESTING env or explicit skip
     env_testing = os.environ.get("TESTING") in ("1", "true", "True")
@@ -827,7 +750,7 @@ def create_geofence(data: GeofenceCreate, db: Session = Depends(get_db), _=Depen
     if not (settings.TESTING or env_testing or env_skip) and (not settings.TRACCAR_API_URL or not settings.TRACCAR_API_TOKEN):
         raise HTTPException(status_code=400, detail="Traccar API URL and token must be configured to manage geofences")
 
-    normalized = _normalize_wkt_polygon(data.area)
+    normalized = normalize_wkt_polygon(data.area)
     if not normalized:
         raise HTTPException(status_code=400, detail="Invalid geofence polygon format")
 
@@ -835,29 +758,15 @@ def create_geofence(data: GeofenceCreate, db: Session = Depends(get_db), _=Depen
     db.add(g)
     db.flush()
 
-    # create geofence in Traccar when configured
-    if not (settings.TESTING or env_testing or env_skip):
-        try:
-            resp = requests.post(
-                f"{settings.TRACCAR_API_URL.rstrip('/')}/api/geofences",
-                json={"name": data.name, "description": data.description, "area": normalized},
-                headers={"Authorization": f"Bearer {settings.TRACCAR_API_TOKEN}"},
-                timeout=10,
-            )
-            resp.raise_for_status()
-            traccar_data = resp.json()
-            if isinstance(traccar_data, dict) and traccar_data.get("id"):
-                g.traccar_id = traccar_data.get("id")
-        except Exception as e:
-            db.rollback()
-            raise HTTPException(status_code=502, detail=f"Failed to create geofence in Traccar: {e}")
-
+    # created in Traccar by the outbox worker once this commits
+    enqueue_traccar(db, "geofence", g.id, "upsert")
+    bump_version(db, "geofences")
     db.commit()
     db.refresh(g)
-    return g
+    return _geofence_out(db, g)
 
 
-@router.put("/geofences/{geofence_id}", response_model=GeofenceOut)
+@router.put("/geofences/{geofence_id}", response_model=GeofenceSyncOut)
 def update_geofence(geofence_id: int, data: GeofenceUpdate, db: Session = Depends(get_db), _=Depends(require_admin)):
     g = db.query(Geofence).filter(Geofence.id == int(geofence_id)).first()
     if not g:
@@ -867,42 +776,16 @@ def update_geofence(geofence_id: int, data: GeofenceUpdate, db: Session = Depend
     if data.description is not None:
         g.description = data.description
     if data.area is not None:
-        normalized = _normalize_wkt_polygon(data.area)
+        normalized = normalize_wkt_polygon(data.area)
         if not normalized:
             raise HTTPException(status_code=400, detail="Invalid geofence polygon format")
         g.area = normalized
-    # Traccar sync
-    env_testing = os.environ.get("TESTING") in ("1", "true", "True")
-    env_skip = os.environ.get("BANTAY_SKIP_TRACCAR") in ("1", "true", "True")
-    if not (settings.TESTING or env_testing or env_skip):
-        try:
-            if g.traccar_id:
-                resp = requests.put(
-                    f"{settings.TRACCAR_API_URL.rstrip('/')}/api/geofences/{g.traccar_id}",
-                    json={"name": g.name, "description": g.description, "area": g.area},
-                    headers={"Authorization": f"Bearer {settings.TRACCAR_API_TOKEN}"},
-                    timeout=10,
-                )
-                resp.raise_for_status()
-            else:
-                # create remote geofence if missing
-                resp = requests.post(
-                    f"{settings.TRACCAR_API_URL.rstrip('/')}/api/geofences",
-                    json={"name": g.name, "description": g.description, "area": g.area},
-                    headers={"Authorization": f"Bearer {settings.TRACCAR_API_TOKEN}"},
-                    timeout=10,
-                )
-                resp.raise_for_status()
-                traccar_data = resp.json()
-                if isinstance(traccar_data, dict) and traccar_data.get("id"):
-                    g.traccar_id = traccar_data.get("id")
-        except Exception as e:
-            db.rollback()
-            raise HTTPException(status_code=502, detail=f"Failed to sync geofence with Traccar: {e}")
-
+    # Traccar sync (creates the remote geofence if it is missing)
+    enqueue_traccar(db, "geofence", g.id, "upsert")
+    bump_version(db, "geofences")
     db.commit()
     db.refresh(g)
-    return g
+    return _geofence_out(db, g)
 
 
 @router.delete("/geofences/{geofence_id}")
@@ -911,36 +794,32 @@ def delete_geofence(geofence_id: int, db: Session = Depends(get_db), _=Depends(r
     if not g:
         raise HTTPException(status_code=404, detail="Geofence not found")
     try:
-        # attempt to delete from Traccar first when configured
-        env_testing = os.environ.get("TESTING") in ("1", "true", "True")
-        env_skip = os.environ.get("BANTAY_SKIP_TRACCAR") in ("1", "true", "True")
-        if g.traccar_id and not (settings.TESTING or env_testing or env_skip):
-            resp = requests.delete(
-                f"{settings.TRACCAR_API_URL.rstrip('/')}/api/geofences/{g.traccar_id}",
-                headers={"Authorization": f"Bearer {settings.TRACCAR_API_TOKEN}"},
-                timeout=10,
-            )
-            resp.raise_for_status()
-
+        # the remote geofence (and its permissions) is removed by the outbox worker
+        enqueue_traccar(db, "geofence", g.id, "delete", {"traccar_id": g.traccar_id})
         db.delete(g)
+        bump_version(db, "geofences")
         db.commit()
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=502, detail=f"Failed to delete geofence: {e}")
-    return {"ok": True}
+    return {"ok": True, "sync": traccar_status(db, "geofence", geofence_id)}
 
 
 @router.get("/alerts", response_model=list[AlertOut])
 def list_alerts(
+    response: Response,
     q: Optional[str] = None,
     event_type: Optional[str] = None,
     device_id: Optional[int] = None,
     owner_id: Optional[int] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    cursor: Optional[str] = None,
     limit: int = 200,
     db: Session = Depends(get_db),
     _=Depends(require_admin),
 ):
-    limit = min(max(limit, 1), 500)
+    """List alerts newest first; follow `X-Next-Cursor` to page further back."""
     Owner = aliased(User)
     query = (
         db.query(
@@ -960,10 +839,20 @@ def list_alerts(
     if owner_id:
         query = query.filter(Device.user_id == owner_id)
     if q:
-        like = f"%{q}%"
-        query = query.filter(or_(Event.event_type.ilike(like), Device.name.ilike(like), Owner.name.ilike(like)))
+        device_ids = matching_ids(db, Device.id, [Device.name], q)
+        owner_ids = matching_ids(db, User.id, [User.name], q)
+        query = query.filter(
+            or_(
+                text_match(db, "events", Event.id, [Event.event_type], q),
+                Event.device_id.in_(device_ids),
+                Device.user_id.in_(owner_ids),
+            )
+        )
 
-    rows = query.order_by(Event.timestamp.desc()).limit(limit).all()
+    rows = paginate_by_time(
+        query, Event.timestamp, Event.id, cursor, limit, response,
+        since=parse_time_filter(since, "since"), until=parse_time_filter(until, "until"), entity=lambda row: row[0],
+    )
     return [
         {
             "id": ev.id,
@@ -980,15 +869,19 @@ def list_alerts(
 
 @router.get("/reports", response_model=list[ReportWithDevice])
 def list_reports_admin(
+    response: Response,
     q: Optional[str] = None,
     resolution: Optional[str] = None,
     device_id: Optional[int] = None,
     owner_id: Optional[int] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    cursor: Optional[str] = None,
     limit: int = 200,
     db: Session = Depends(get_db),
     _=Depends(require_admin),
 ):
-    limit = min(max(limit, 1), 500)
+    """List reports newest first; follow `X-Next-Cursor` to page further back."""
     Reporter = aliased(User)
     Owner = aliased(User)
     query = (
@@ -1014,19 +907,22 @@ def list_reports_admin(
     if owner_id:
         query = query.filter(Device.user_id == owner_id)
     if q:
-        like = f"%{q}%"
+        device_ids = matching_ids(db, Device.id, [Device.name], q)
+        user_ids = matching_ids(db, User.id, [User.name], q)
         query = query.filter(
             or_(
-                Report.resolution.ilike(like),
-                Report.notes.ilike(like),
-                Device.name.ilike(like),
-                Owner.name.ilike(like),
-                Reporter.name.ilike(like),
-                Event.event_type.ilike(like),
+                text_match(db, "reports", Report.id, [Report.resolution, Report.notes], q),
+                text_match(db, "events", Event.id, [Event.event_type], q),
+                Event.device_id.in_(device_ids),
+                Device.user_id.in_(user_ids),
+                Report.user_id.in_(user_ids),
             )
         )
 
-    rows = query.order_by(Report.timestamp.desc()).limit(limit).all()
+    rows = paginate_by_time(
+        query, Report.timestamp, Report.id, cursor, limit, response,
+        since=parse_time_filter(since, "since"), until=parse_time_filter(until, "until"), entity=lambda row: row[0],
+    )
     return [
         {
             "id": r.id,
@@ -1048,16 +944,20 @@ def list_reports_admin(
 
 @router.get("/logs", response_model=list[LogOut])
 def list_logs(
+    response: Response,
     table: Optional[str] = None,
     action: Optional[str] = None,
     actor_user_id: Optional[int] = None,
     actor_role: Optional[str] = None,
     q: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    cursor: Optional[str] = None,
     limit: int = 200,
     db: Session = Depends(get_db),
     _=Depends(require_admin),
 ):
-    limit = min(max(limit, 1), 500)
+    """List audit logs newest first; follow `X-Next-Cursor` to page further back."""
     Actor = aliased(User)
     RoleAlias = aliased(Role)
     query = (
@@ -1075,10 +975,12 @@ def list_logs(
     if actor_role:
         query = query.filter(RoleAlias.name.ilike(f"%{actor_role}%"))
     if q:
-        like = f"%{q}%"
-        query = query.filter(or_(Log.table_name.ilike(like), Log.action.ilike(like)))
+        query = query.filter(text_match(db, "logs", Log.id, [Log.table_name, Log.action], q))
 
-    rows = query.order_by(Log.timestamp.desc()).limit(limit).all()
+    rows = paginate_by_time(
+        query, Log.timestamp, Log.id, cursor, limit, response,
+        since=parse_time_filter(since, "since"), until=parse_time_filter(until, "until"), entity=lambda row: row[0],
+    )
     return [
         {
             "id": log.id,
@@ -1093,3 +995,152 @@ def list_logs(
         }
         for (log, actor_name, actor_role) in rows
     ]
+
+
+@router.get("/audit/metrics")
+def get_audit_metrics(_=Depends(require_admin)):
+    """Audit writer counters: enlist cost, batch sizes and flush latency."""
+    return audit_metrics.snapshot()
+
+
+@router.get("/traccar/metrics")
+def get_traccar_metrics(_=Depends(require_admin)):
+    """Per-call latency, error counts and circuit breaker state of the Traccar client."""
+    return get_traccar_client().metrics()
+
+
+@router.get("/timing/routes")
+def get_route_timings(limit: int = 20, sort: str = "p95", _=Depends(require_admin)):
+    """Slowest routes by latency percentile, with their average query count, DB and serialization time."""
+    if sort not in ROUTE_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(ROUTE_SORTS)}")
+    return timing_store.route_stats(limit=max(1, min(limit, 200)), sort=sort)
+
+
+@router.get("/timing/queries")
+def get_query_timings(limit: int = 20, sort: str = "total", _=Depends(require_admin)):
+    """Most expensive SQL statements (total, max or average time) and the route of the slowest run."""
+    if sort not in QUERY_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(QUERY_SORTS)}")
+    return timing_store.query_stats(limit=max(1, min(limit, 200)), sort=sort)
+
+
+@router.delete("/timing")
+def reset_timings(_=Depends(require_admin)):
+    """Clear the route and query timing aggregates."""
+    timing_store.reset()
+    return {"ok": True}
+
+
+@router.get("/ingest/latency")
+def get_ingest_latency(_=Depends(require_admin)):
+    """Ingest latency percentiles per kind and stage, from device fix to websocket fan-out."""
+    return ingest_latency.snapshot()
+
+
+@router.delete("/ingest/latency")
+def reset_ingest_latency(_=Depends(require_admin)):
+    """Clear the ingest latency samples (the Prometheus histogram keeps counting)."""
+    ingest_latency.reset()
+    return {"ok": True}
+
+
+@router.get("/sos/escalations")
+def get_sos_escalations(days: int = 30, db: Session = Depends(get_db), _=Depends(require_admin)):
+    """Open SOS alarms by escalation level, and time-to-acknowledge of alarms acknowledged in the last `days`."""
+    since = datetime.now(timezone.utc) - timedelta(days=max(1, min(days, 365)))
+    waits = sorted(
+        s for (s,) in db.query(SosEscalation.ack_seconds).filter(SosEscalation.acknowledged_at >= since) if s is not None
+    )
+
+    def pick(q: float):
+        return waits[min(len(waits) - 1, int(q * len(waits)))] if waits else None
+
+    return {
+        "scheduler": sos_escalations.stats(),
+        "acknowledged": {"count": len(waits), "p50_s": pick(0.50), "p95_s": pick(0.95), "max_s": waits[-1] if waits else None},
+    }
+
+
+@router.post("/profile")
+async def profile_worker(
+    seconds: float = 5.0,
+    interval_ms: float = 10.0,
+    format: str = "collapsed",
+    include_idle: bool = False,
+    lines: bool = False,
+    current_user: User = Depends(require_admin),
+):
+    """Sample this worker's thread stacks for `seconds`.
+
+    Returns collapsed stacks (`text/plain`, for flamegraph.pl or speedscope) or
+    JSON. One profile runs at a time, with a cooldown between runs (429 with
+    Retry-After). The request is served by one worker process only.
+    """
+    if not settings.PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler is disabled")
+    if not 0 < seconds <= settings.PROFILER_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {settings.PROFILER_MAX_SECONDS:g}]")
+    if not 1 <= interval_ms <= 1000:
+        raise HTTPException(status_code=400, detail="interval_ms must be between 1 and 1000")
+    if format not in ("collapsed", "json"):
+        raise HTTPException(status_code=400, detail="format must be collapsed or json")
+    logger.info("Profiling worker for %.1fs (requested by user %s)", seconds, current_user.id)
+    try:
+        # sample from a worker thread so the event loop keeps serving (and shows up in the profile)
+        result = await run_in_threadpool(stack_sampler.profile, seconds, interval_ms / 1000.0, include_idle, lines)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+    if format == "collapsed":
+        return PlainTextResponse(to_collapsed(result["stacks"]))
+    return {
+        "seconds": result["seconds"],
+        "samples": result["samples"],
+        "stacks": [{"stack": stack, "count": count} for stack, count in result["stacks"].most_common()],
+    }
+
+
+@router.get("/traccar/sync")
+def get_traccar_sync_summary(db: Session = Depends(get_db), _=Depends(require_admin)):
+    """Outbox row counts by status and background worker counters."""
+    return traccar_queue_summary(db)
+
+
+@router.get("/traccar/sync/{entity_type}/{entity_id}")
+def get_traccar_sync_status(entity_type: str, entity_id: int, db: Session = Depends(get_db), _=Depends(require_admin)):
+    """Poll whether a device or geofence change has reached Traccar."""
+    if entity_type not in SYNC_ENTITY_TYPES:
+        raise HTTPException(status_code=404, detail="Unknown entity type")
+    model = Device if entity_type == "device" else Geofence
+    row = db.get(model, int(entity_id))
+    traccar_id = None
+    if row is not None:
+        traccar_id = row.traccar_device_id if entity_type == "device" else row.traccar_id
+    return {"entity_type": entity_type, "entity_id": int(entity_id), "traccar_id": traccar_id, **traccar_status(db, entity_type, entity_id)}
+
+
+@router.post("/traccar/reconcile")
+def reconcile_traccar(dry_run: bool = False, incremental: bool = False, delete_orphans: bool = False, db: Session = Depends(get_db), _=Depends(require_admin)):
+    """Diff devices, geofences and permissions against Traccar and fix the drift.
+
+    `dry_run` only reports. `incremental` re-checks permissions only for devices
+    changed since the last run. Remote records without a local counterpart are
+    deleted only with `delete_orphans`.
+    """
+    if not _traccar_enabled():
+        raise HTTPException(status_code=400, detail="Traccar sync is disabled")
+    if not settings.TRACCAR_API_URL or not settings.TRACCAR_API_TOKEN:
+        raise HTTPException(status_code=400, detail="Traccar API URL and token must be configured to reconcile")
+    try:
+        return reconcile_with_traccar(db, dry_run=dry_run, incremental=incremental, delete_orphans=delete_orphans)
+    except TraccarError as e:
+        db.rollback()
+        raise HTTPException(status_code=502, detail=f"Failed to reach Traccar: {e}")
+
+
+@router.post("/traccar/sync/retry")
+def retry_traccar_sync_failures(entity_type: Optional[str] = None, entity_id: Optional[int] = None, db: Session = Depends(get_db), _=Depends(require_admin)):
+    """Re-queue failed outbox rows, optionally for a single entity."""
+    if entity_type is not None and entity_type not in SYNC_ENTITY_TYPES:
+        raise HTTPException(status_code=404, detail="Unknown entity type")
+    return {"ok": True, "requeued": retry_traccar_sync(db, entity_type, entity_id)}
@@ -8,22 +8,12 @@ from fastapi.security import OAuth2PasswordBearer
 from schemas.auth import LoginIn, Token, RegisterIn, PasswordChangeIn
 from schemas.user import UserOut, UserCreate
 from models.user import User
-from models.log import Log
 from core.config import settings
+from core.audit import log_action
 
 router = APIRouter()
 
 
-def _log_action(db: Session, table: str, record_id: int, action: str, actor_user_id: Optional[int] = None, details: Optional[dict] = None):
-    try:
-        entry = Log(table_name=table, record_id=record_id, action=action, actor_user_id=actor_user_id, details=details)
-        db.add(entry)
-        db.flush()
-        db.commit()
-    except Exception:
-        db.rollback()
-        raise
-
 # Optional OAuth2 scheme for checking an optional token without auto error
 optional_oauth2 = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
 
@@ -110,6 +100,6 @@ def change_password(payload: PasswordChangeIn, db: Session = Depends(get_db), cu
         raise HTTPException(status_code=400, detail="Password must be at least 6 characters")
     user.password_hash = hash_password(payload.new_password)
     db.add(user)
+    log_action(db, "users", user.id, "update", actor_user_id=current_user.id, details={"changed_password": True})
     db.commit()
-    _log_action(db, "users", user.id, "update", actor_user_id=current_user.id, details={"changed_password": True})
     return {"ok": True}
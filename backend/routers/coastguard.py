@@ -1,39 +1,52 @@
 from datetime import datetime, timedelta, timezone
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import func
 from sqlalchemy.orm import Session, aliased
 
+from core.audit import log_action
 from core.security import can_view_medical, get_current_user, get_db, require_coast_guard, verify_password
 from models.device import Device
 from models.event import Event
 from models.report import Report
-from models.log import Log
 from models.user import User
 from models.fisherfolk import Fisherfolk
 from models.geofence import Geofence
+from models.position_rollup import PositionRollup
+from models.sos_escalation import SosEscalation
+from models.trip import Trip
 from schemas.device import DeviceOut
 from schemas.report import ReportCreate, ReportOut, ReportWithDevice
 from schemas.user import UserOut
 from schemas.geofence import GeofenceOut
+from core.config import settings
+from utils.etag import not_modified, table_etag
+from utils.nearby import MAX_K, nearest_vessels
+from utils.pagination import paginate_by_id, paginate_by_time, parse_time_filter
+from utils.retention import history_rows
+from utils.rollups import BUCKETS, default_window, rollup_out
+from utils.sos_escalation import acknowledge, escalation_out, escalations
+from utils.trips import trip_out
 
 router = APIRouter()
 
 
-def _log_action(db: Session, table: str, record_id: int, action: str, actor_user_id: Optional[int] = None, details: Optional[dict] = None):
-  try:
-    entry = Log(table_name=table, record_id=record_id, action=action, actor_user_id=actor_user_id, details=details)
-    db.add(entry)
-    db.flush()
-    db.commit()
-  except Exception:
-    db.rollback()
-    raise
-
-
 @router.get("/devices", response_model=List[DeviceOut])
-def list_devices(db: Session = Depends(get_db), _=Depends(require_coast_guard)):
-  return db.query(Device).all()
+def list_devices(
+  request: Request,
+  response: Response,
+  cursor: Optional[str] = None,
+  limit: Optional[int] = None,
+  db: Session = Depends(get_db),
+  _=Depends(require_coast_guard),
+):
+  etag = table_etag(db, "devices", request)
+  cached = not_modified(request, etag)
+  if cached:
+    return cached
+  response.headers["ETag"] = etag
+  return paginate_by_id(db.query(Device), Device.id, cursor, limit, response)
 
 
 @router.get("/users", response_model=List[UserOut])
@@ -71,8 +84,136 @@ def list_users(user_id: Optional[int] = None, email: Optional[str] = None, db: S
 
 
 @router.get("/geofences", response_model=List[GeofenceOut])
-def list_geofences(db: Session = Depends(get_db), _=Depends(require_coast_guard)):
-  return db.query(Geofence).all()
+def list_geofences(
+  request: Request,
+  response: Response,
+  cursor: Optional[str] = None,
+  limit: Optional[int] = None,
+  db: Session = Depends(get_db),
+  _=Depends(require_coast_guard),
+):
+  etag = table_etag(db, "geofences", request)
+  cached = not_modified(request, etag)
+  if cached:
+    return cached
+  response.headers["ETag"] = etag
+  return paginate_by_id(db.query(Geofence), Geofence.id, cursor, limit, response)
+
+
+@router.get("/nearby")
+def nearby_vessels(
+  lat: float,
+  lon: float,
+  k: int = 5,
+  max_age: Optional[int] = None,
+  exclude_device_id: Optional[int] = None,
+  db: Session = Depends(get_db),
+  _=Depends(require_coast_guard),
+):
+  """The `k` vessels whose latest position is closest to `lat`/`lon`.
+
+  `max_age` (seconds, default `NEARBY_MAX_AGE_SECONDS`, 0 for no limit) drops devices
+  that have not reported recently; `exclude_device_id` leaves out e.g. the vessel in distress.
+  """
+  if not (-90.0 <= lat <= 90.0) or not (-180.0 <= lon <= 180.0):
+    raise HTTPException(status_code=400, detail="Invalid coordinates")
+  if k < 1 or k > MAX_K:
+    raise HTTPException(status_code=400, detail=f"k must be between 1 and {MAX_K}")
+  if max_age is None:
+    max_age = settings.NEARBY_MAX_AGE_SECONDS
+  exclude = {int(exclude_device_id)} if exclude_device_id is not None else None
+  return nearest_vessels(db, lat, lon, k, max_age if max_age > 0 else None, exclude=exclude)
+
+
+@router.get("/trips")
+def list_trips(
+  response: Response,
+  device_id: Optional[int] = None,
+  status: Optional[str] = None,
+  since: Optional[str] = None,
+  until: Optional[str] = None,
+  cursor: Optional[str] = None,
+  limit: int = 100,
+  db: Session = Depends(get_db),
+  _=Depends(require_coast_guard),
+):
+  """Trips newest first (by departure); follow `X-Next-Cursor` to page further back."""
+  query = db.query(Trip)
+  if device_id is not None:
+    query = query.filter(Trip.device_id == int(device_id))
+  if status:
+    query = query.filter(Trip.status == status)
+  rows = paginate_by_time(
+    query, Trip.start_at, Trip.id, cursor, limit, response,
+    since=parse_time_filter(since, "since"), until=parse_time_filter(until, "until"),
+  )
+  return [trip_out(t) for t in rows]
+
+
+def _rollup_window(bucket: str, since: Optional[str], until: Optional[str]):
+  if bucket not in BUCKETS:
+    raise HTTPException(status_code=400, detail=f"bucket must be one of {', '.join(BUCKETS)}")
+  return default_window(bucket, parse_time_filter(since, "since"), parse_time_filter(until, "until"))
+
+
+@router.get("/rollups")
+def list_rollups(
+  device_id: Optional[int] = None,
+  bucket: str = "day",
+  since: Optional[str] = None,
+  until: Optional[str] = None,
+  db: Session = Depends(get_db),
+  _=Depends(require_coast_guard),
+):
+  """Per-device hourly/daily activity (default: last 30 days or 48 hours), oldest bucket first."""
+  start, end = _rollup_window(bucket, since, until)
+  query = db.query(PositionRollup).filter(
+    PositionRollup.bucket == bucket,
+    PositionRollup.bucket_start >= start,
+    PositionRollup.bucket_start <= end,
+  )
+  if device_id is not None:
+    query = query.filter(PositionRollup.device_id == int(device_id))
+  return [rollup_out(r) for r in query.order_by(PositionRollup.bucket_start, PositionRollup.device_id).all()]
+
+
+@router.get("/rollups/summary")
+def rollup_summary(
+  bucket: str = "day",
+  since: Optional[str] = None,
+  until: Optional[str] = None,
+  db: Session = Depends(get_db),
+  _=Depends(require_coast_guard),
+):
+  """Fleet totals per bucket: fixes, distance, active devices and speeds."""
+  start, end = _rollup_window(bucket, since, until)
+  R = PositionRollup
+  rows = (
+    db.query(
+      R.bucket_start,
+      func.sum(R.count),
+      func.sum(R.distance_m),
+      func.count(R.device_id),
+      func.max(R.max_speed),
+      func.sum(R.speed_sum),
+      func.sum(R.speed_count),
+    )
+    .filter(R.bucket == bucket, R.bucket_start >= start, R.bucket_start <= end)
+    .group_by(R.bucket_start)
+    .order_by(R.bucket_start)
+    .all()
+  )
+  return [
+    {
+      "bucket_start": r[0],
+      "count": r[1],
+      "distance_m": round(r[2] or 0.0, 1),
+      "active_devices": r[3],
+      "max_speed": r[4],
+      "avg_speed": (r[5] / r[6]) if r[6] else None,
+    }
+    for r in rows
+  ]
 
 
 def _ensure_access_to_device(current_user: User, device: Device):
@@ -120,32 +261,7 @@ def get_history(
   if start_dt > end_dt:
     start_dt, end_dt = end_dt, start_dt
 
-  from models.position import Position
-
-  history = (
-    db.query(Position)
-    .filter(Position.device_id == device_id)
-    .filter(Position.timestamp.isnot(None))
-    .filter(Position.timestamp >= start_dt)
-    .filter(Position.timestamp <= end_dt)
-    .order_by(Position.timestamp.asc())
-    .all()
-  )
-
-  return [
-    {
-      "id": p.id,
-      "device_id": p.device_id,
-      "latitude": p.latitude,
-      "longitude": p.longitude,
-      "speed": p.speed,
-      "course": p.course,
-      "timestamp": p.timestamp.isoformat() if p.timestamp else None,
-      "battery_percent": p.battery_percent,
-      "attributes": p.attributes,
-    }
-    for p in history
-  ]
+  return history_rows(db, device.id, start_dt, end_dt)
 
 
 def _is_sos_event(ev: Event) -> bool:
@@ -188,12 +304,45 @@ def create_report(payload: ReportCreate, db: Session = Depends(get_db), current_
   )
   report.mark_dismissed_now()
   db.add(report)
+  db.flush()
+  log_action(db, "reports", report.id, "create", actor_user_id=current_user.id, details={"event_id": ev.id, "resolution": resolution_text, "notes": notes})
+  # filing the report acknowledges the alarm if nobody has yet
+  escalation = db.get(SosEscalation, ev.id)
+  acked = escalation is not None and acknowledge(escalation, current_user.id, report.dismissal_time)
   db.commit()
+  if acked:
+    escalations.acknowledged(escalation)
   db.refresh(report)
-  _log_action(db, "reports", report.id, "create", actor_user_id=current_user.id, details={"event_id": ev.id, "resolution": resolution_text, "notes": notes})
   return report
 
 
+@router.get("/alarms")
+def list_open_alarms(limit: int = 100, db: Session = Depends(get_db), _=Depends(require_coast_guard)):
+  """Unacknowledged SOS alarms, most escalated first, then oldest first."""
+  limit = min(max(limit, 1), 500)
+  rows = (
+    db.query(SosEscalation)
+    .filter(SosEscalation.acknowledged_at.is_(None))
+    .order_by(SosEscalation.level.desc(), SosEscalation.opened_at.asc())
+    .limit(limit)
+    .all()
+  )
+  return [escalation_out(r) for r in rows]
+
+
+@router.post("/alarms/{event_id}/ack")
+def acknowledge_alarm(event_id: int, db: Session = Depends(get_db), current_user: User = Depends(require_coast_guard)):
+  """Stop escalating an SOS alarm; repeating the call returns the first acknowledgement."""
+  escalation = db.get(SosEscalation, event_id)
+  if not escalation:
+    raise HTTPException(status_code=404, detail="Alarm not found")
+  if acknowledge(escalation, current_user.id):
+    log_action(db, "sos_escalations", event_id, "acknowledge", actor_user_id=current_user.id, details={"ack_seconds": escalation.ack_seconds, "level": escalation.level})
+    db.commit()
+    escalations.acknowledged(escalation)
+  return escalation_out(escalation)
+
+
 @router.get("/reports", response_model=List[ReportWithDevice])
 def list_reports(limit: int = 100, db: Session = Depends(get_db), _=Depends(require_coast_guard)):
   limit = min(max(limit, 1), 500)
@@ -1,18 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from core.security import get_current_user, require_coast_guard, get_db
 from models.device import Device
 from schemas.device import DeviceOut
+from utils.etag import not_modified, table_etag
+from utils.pagination import paginate_by_id
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[DeviceOut])
-def list_devices(db: Session = Depends(get_db)):
-    devices = db.query(Device).all()
-    return devices
+def list_devices(request: Request, response: Response, cursor: Optional[str] = None, limit: Optional[int] = None, db: Session = Depends(get_db)):
+    etag = table_etag(db, "devices", request)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+    return paginate_by_id(db.query(Device), Device.id, cursor, limit, response)
 
 
 @router.get("/{device_id}", response_model=DeviceOut)
@@ -0,0 +1,225 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session, aliased
+
+from core.security import get_current_user, get_db
+from db.session import SessionLocal
+from models.device import Device
+from models.event import Event
+from models.position import Position
+from models.report import Report
+from models.user import User
+from utils.export import (
+    MEDIA_TYPES,
+    encode_csv,
+    encode_geojson,
+    encode_gpx,
+    encode_parquet,
+    gzip_stream,
+    parquet_available,
+    stream_rows,
+)
+from utils.pagination import parse_time_filter
+from utils.retention import iter_history
+
+router = APIRouter()
+
+POSITION_FIELDS = [
+    ("id", "int"),
+    ("device_id", "int"),
+    ("latitude", "float"),
+    ("longitude", "float"),
+    ("speed", "float"),
+    ("course", "float"),
+    ("timestamp", "ts"),
+    ("battery_percent", "int"),
+    ("attributes", "json"),
+]
+
+ALERT_FIELDS = [
+    ("id", "int"),
+    ("device_id", "int"),
+    ("device_name", "str"),
+    ("owner_name", "str"),
+    ("event_type", "str"),
+    ("timestamp", "ts"),
+    ("attributes", "json"),
+]
+
+REPORT_FIELDS = [
+    ("id", "int"),
+    ("event_id", "int"),
+    ("device_id", "int"),
+    ("device_name", "str"),
+    ("owner_name", "str"),
+    ("filed_by_name", "str"),
+    ("resolution", "str"),
+    ("notes", "str"),
+    ("event_timestamp", "ts"),
+    ("timestamp", "ts"),
+    ("dismissal_time", "ts"),
+]
+
+
+def _require_staff(current_user: User):
+    if current_user.role not in ("administrator", "coast_guard"):
+        raise HTTPException(status_code=403, detail="Coast guard or administrator privileges required")
+
+
+def _stream(stmt, fields, fmt: str, gzip: bool, filename: str, track_name: str = "Bantay export", source=None):
+    """Stream `stmt` encoded as `fmt`; `source(db, rows)` may wrap the database rows (e.g. to add archived ones)."""
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be one of: " + ", ".join(MEDIA_TYPES))
+    if fmt == "gpx" and fields is not POSITION_FIELDS:
+        raise HTTPException(status_code=400, detail="GPX export is only available for position history")
+    if fmt == "parquet" and not parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet export requires the optional pyarrow package")
+
+    def body():
+        # own session: the request-scoped one may be closed before the stream finishes
+        db = SessionLocal()
+        try:
+            rows = stream_rows(db, stmt)
+            if source is not None:
+                rows = source(db, rows)
+            if fmt == "csv":
+                chunks = encode_csv(rows, fields)
+            elif fmt == "geojson":
+                chunks = encode_geojson(rows, fields)
+            elif fmt == "gpx":
+                chunks = encode_gpx(rows, track_name)
+            else:
+                chunks = encode_parquet(rows, fields)
+            yield from gzip_stream(chunks) if gzip else chunks
+        finally:
+            db.close()
+
+    ext = "json" if fmt == "geojson" else fmt
+    name = f"{filename}.{ext}" + (".gz" if gzip else "")
+    media_type = "application/gzip" if gzip else MEDIA_TYPES[fmt]
+    return StreamingResponse(body(), media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{name}"'})
+
+
+@router.get("/history")
+def export_history(
+    device_id: int,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    format: str = "csv",
+    gzip: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Stream a device's position history; without `start`/`end` the whole track is exported."""
+    device = db.query(Device).filter(Device.id == device_id).first()
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+    if current_user.role not in ("administrator", "coast_guard") and device.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized for this device")
+
+    stmt = (
+        select(*[getattr(Position, name) for name, _ in POSITION_FIELDS])
+        .where(Position.device_id == device_id, Position.timestamp.isnot(None))
+        .order_by(Position.timestamp.asc(), Position.id.asc())
+    )
+    start_dt = parse_time_filter(start, "start")
+    end_dt = parse_time_filter(end, "end")
+    if start_dt is not None:
+        stmt = stmt.where(Position.timestamp >= start_dt)
+    if end_dt is not None:
+        stmt = stmt.where(Position.timestamp <= end_dt)
+    return _stream(
+        stmt,
+        POSITION_FIELDS,
+        format,
+        gzip,
+        f"history-{device_id}",
+        track_name=device.name or device.unique_id or str(device_id),
+        # fixes moved out by retention come from the archive files
+        source=lambda session, rows: iter_history(session, device_id, start_dt, end_dt, rows),
+    )
+
+
+@router.get("/alerts")
+def export_alerts(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    device_id: Optional[int] = None,
+    event_type: Optional[str] = None,
+    format: str = "csv",
+    gzip: bool = False,
+    current_user: User = Depends(get_current_user),
+):
+    _require_staff(current_user)
+    Owner = aliased(User)
+    stmt = (
+        select(
+            Event.id,
+            Event.device_id,
+            Device.name.label("device_name"),
+            Owner.name.label("owner_name"),
+            Event.event_type,
+            Event.timestamp,
+            Event.attributes,
+        )
+        .join(Device, Device.id == Event.device_id)
+        .join(Owner, Owner.id == Device.user_id, isouter=True)
+        .order_by(Event.timestamp.asc(), Event.id.asc())
+    )
+    since_dt = parse_time_filter(since, "since")
+    until_dt = parse_time_filter(until, "until")
+    if since_dt is not None:
+        stmt = stmt.where(Event.timestamp >= since_dt)
+    if until_dt is not None:
+        stmt = stmt.where(Event.timestamp <= until_dt)
+    if device_id:
+        stmt = stmt.where(Event.device_id == device_id)
+    if event_type:
+        stmt = stmt.where(Event.event_type == event_type)
+    return _stream(stmt, ALERT_FIELDS, format, gzip, "alerts")
+
+
+@router.get("/reports")
+def export_reports(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    device_id: Optional[int] = None,
+    format: str = "csv",
+    gzip: bool = False,
+    current_user: User = Depends(get_current_user),
+):
+    _require_staff(current_user)
+    Reporter = aliased(User)
+    Owner = aliased(User)
+    stmt = (
+        select(
+            Report.id,
+            Report.event_id,
+            Event.device_id,
+            Device.name.label("device_name"),
+            Owner.name.label("owner_name"),
+            Reporter.name.label("filed_by_name"),
+            Report.resolution,
+            Report.notes,
+            Event.timestamp.label("event_timestamp"),
+            Report.timestamp,
+            Report.dismissal_time,
+        )
+        .join(Event, Event.id == Report.event_id)
+        .join(Device, Device.id == Event.device_id)
+        .join(Owner, Owner.id == Device.user_id, isouter=True)
+        .join(Reporter, Reporter.id == Report.user_id, isouter=True)
+        .order_by(Report.timestamp.asc(), Report.id.asc())
+    )
+    since_dt = parse_time_filter(since, "since")
+    until_dt = parse_time_filter(until, "until")
+    if since_dt is not None:
+        stmt = stmt.where(Report.timestamp >= since_dt)
+    if until_dt is not None:
+        stmt = stmt.where(Report.timestamp <= until_dt)
+    if device_id:
+        stmt = stmt.where(Event.device_id == device_id)
+    return _stream(stmt, REPORT_FIELDS, format, gzip, "reports")
@@ -1,34 +1,28 @@
 from datetime import datetime, timezone, timedelta
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional
 
+from core.audit import log_action
 from core.security import require_fisherfolk, get_db, get_current_user
 from models.device import Device
 from models.fisherfolk import Fisherfolk
-from models.position import Position
 from models.user import User
-from models.log import Log
 from models.geofence import Geofence
+from models.position_rollup import PositionRollup
+from models.trip import Trip
 from schemas.device import DeviceOut
 from schemas.fisherfolk import FisherfolkOut, MedicalRecordIn
 from schemas.geofence import GeofenceOut
+from utils.pagination import paginate_by_time, parse_time_filter
+from utils.retention import history_rows
+from utils.rollups import BUCKETS, default_window, rollup_out
+from utils.trips import trip_out
 
 router = APIRouter()
 
 
-def _log_action(db: Session, table: str, record_id: int, action: str, actor_user_id: Optional[int] = None, details: Optional[dict] = None):
-    try:
-        entry = Log(table_name=table, record_id=record_id, action=action, actor_user_id=actor_user_id, details=details)
-        db.add(entry)
-        db.flush()
-        db.commit()
-    except Exception:
-        db.rollback()
-        raise
-
-
 class HistoryPermissionIn(BaseModel):
     allow_history_access: bool
 
@@ -49,9 +43,10 @@ def set_history_permission(payload: HistoryPermissionIn, current_user: User = De
         db.add(settings)
     else:
         settings.allow_history_access = payload.allow_history_access
+    db.flush()
+    log_action(db, "fisherfolk", settings.id, "update", actor_user_id=current_user.id, details={"allow_history_access": settings.allow_history_access})
     db.commit()
     db.refresh(settings)
-    _log_action(db, "fisherfolk", settings.id, "update", actor_user_id=current_user.id, details={"allow_history_access": settings.allow_history_access})
     return {"ok": True, "allow_history_access": settings.allow_history_access, "medical_record": settings.medical_record}
 
 
@@ -71,9 +66,10 @@ def set_medical_record(payload: MedicalRecordIn, current_user: User = Depends(re
         db.add(settings)
     else:
         settings.medical_record = payload.medical_record
+    db.flush()
+    log_action(db, "fisherfolk", settings.id, "update", actor_user_id=current_user.id, details={"medical_record": settings.medical_record})
     db.commit()
     db.refresh(settings)
-    _log_action(db, "fisherfolk", settings.id, "update", actor_user_id=current_user.id, details={"medical_record": settings.medical_record})
     return {"ok": True, "medical_record": settings.medical_record}
 
 
@@ -123,27 +119,56 @@ def history(
     end_dt = parse_ts(end) or datetime.now(timezone.utc)
     start_dt = parse_ts(start) or (end_dt - timedelta(hours=hours or 12))
 
-    history = (
-        db.query(Position)
-        .filter(Position.device_id == device.id)
-        .filter(Position.timestamp.isnot(None))
-        .filter(Position.timestamp >= start_dt)
-        .filter(Position.timestamp <= end_dt)
-        .order_by(Position.timestamp.asc())
-        .all()
+    return history_rows(db, device.id, start_dt, end_dt)
+
+
+@router.get("/trips")
+def my_trips(
+    response: Response,
+    device_id: Optional[int] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_fisherfolk),
+):
+    """Trips of the caller's own devices, newest departure first."""
+    query = db.query(Trip).join(Device, Device.id == Trip.device_id).filter(Device.user_id == current_user.id)
+    if device_id is not None:
+        query = query.filter(Trip.device_id == int(device_id))
+    rows = paginate_by_time(
+        query, Trip.start_at, Trip.id, cursor, limit, response,
+        since=parse_time_filter(since, "since"), until=parse_time_filter(until, "until"),
     )
+    return [trip_out(t) for t in rows]
+
 
-    return [
-        {
-            "id": p.id,
-            "device_id": p.device_id,
-            "latitude": p.latitude,
-            "longitude": p.longitude,
-            "speed": p.speed,
-            "course": p.course,
-            "timestamp": p.timestamp.isoformat() if p.timestamp else None,
-            "battery_percent": p.battery_percent,
-            "attributes": p.attributes,
-        }
-        for p in history
-    ]
+@router.get("/rollups")
+def my_rollups(
+    device_id: int,
+    bucket: str = "day",
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_fisherfolk),
+):
+    """Hourly/daily activity of one of the caller's devices, oldest bucket first."""
+    device = db.query(Device).filter(Device.id == int(device_id), Device.user_id == current_user.id).first()
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found or not owned by you")
+    if bucket not in BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of {', '.join(BUCKETS)}")
+    start, end = default_window(bucket, parse_time_filter(since, "since"), parse_time_filter(until, "until"))
+    rows = (
+        db.query(PositionRollup)
+        .filter(
+            PositionRollup.device_id == device.id,
+            PositionRollup.bucket == bucket,
+            PositionRollup.bucket_start >= start,
+            PositionRollup.bucket_start <= end,
+        )
+        .order_by(PositionRollup.bucket_start)
+        .all()
+    )
+    return [rollup_out(r) for r in rows]
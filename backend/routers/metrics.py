@@ -0,0 +1,27 @@
+"""Prometheus scrape endpoint, mounted at `/metrics` (outside `/api`)."""
+
+import hmac
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from core import config
+from core.metrics import REGISTRY
+
+router = APIRouter()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics(authorization: str = Header(None)):
+    """Ingest, websocket, database pool, Traccar client and audit metrics in the Prometheus text format.
+
+    Disabled (404) until METRICS_TOKEN is set; scrapers send it as `Authorization: Bearer <token>`.
+    """
+    token = config.settings.METRICS_TOKEN
+    if not token:
+        raise HTTPException(status_code=404, detail="Metrics are disabled; set METRICS_TOKEN")
+    if not hmac.compare_digest(authorization or "", f"Bearer {token}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
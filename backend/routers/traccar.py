@@ -1,17 +1,89 @@
+import logging
+import time
+
 from fastapi import APIRouter, Header, HTTPException, Depends, Body
 from sqlalchemy.orm import Session
 from typing import Any, List
 from datetime import datetime, timezone
 
 from core.config import settings
+from core.logging_config import Sampler, SummaryCounter, log_fields
+from core.metrics import Counter, Histogram
 from db.session import get_db, SessionLocal
 from models.device import Device
 from models.position import Position
 from models.event import Event
+from utils.ingest_latency import IngestBatch
 from utils.websocket_manager import manager
-from sqlalchemy import func
+from utils.nearby import nearest_vessels, vessel_index
+from utils.proximity import APPROACH_EVENT, monitor as proximity_monitor
+from utils.rollups import rollup_positions
+from utils.sos_escalation import escalations, feed_fields, is_sos, new_escalation
+from utils.trips import segment_positions
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# per-item debug lines are sampled; totals go out at INFO once per LOG_SUMMARY_INTERVAL_SECONDS
+_sample_item = Sampler()
+_positions_summary = SummaryCounter(logger, "traccar positions")
+_events_summary = SummaryCounter(logger, "traccar events")
+
+INGEST_ITEMS = Counter("bantay_ingest_items_total", "Items received from Traccar.", ["kind"])
+INGEST_ACCEPTED = Counter("bantay_ingest_accepted_total", "Items stored.", ["kind"])
+INGEST_DUPLICATES = Counter(
+    "bantay_ingest_duplicates_total", "Items repeating an earlier one (same device and fix/event time); stored anyway.", ["kind"]
+)
+INGEST_UNKNOWN = Counter("bantay_ingest_unknown_device_total", "Items for Traccar devices not registered here.", ["kind"])
+INGEST_REJECTED = Counter("bantay_ingest_rejected_total", "Items skipped as malformed or of an unsupported type.", ["kind"])
+INGEST_FAILED_BATCHES = Counter("bantay_ingest_failed_batches_total", "Batches rolled back after an error.", ["kind"])
+INGEST_BATCH_ITEMS = Histogram(
+    "bantay_ingest_batch_items", "Items per Traccar request.", ["kind"], buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+INGEST_DERIVED_FAILED = Counter(
+    "bantay_ingest_derived_failed_total", "Position batches stored without a derived update (trips, rollups, proximity) after an error.", ["feature"]
+)
+INGEST_COMMIT_SECONDS = Histogram("bantay_ingest_commit_seconds", "Time to commit an ingest batch.", ["kind"])
+INGEST_BATCH_SECONDS = Histogram("bantay_ingest_batch_seconds", "Time to handle an ingest request, fan-out included.", ["kind"])
+
+
+def _observe_batch(kind: str, started: float, received: int, saved: int, duplicates: int, unknown: int, rejected: int):
+    INGEST_ITEMS.labels(kind).inc(received)
+    INGEST_ACCEPTED.labels(kind).inc(saved)
+    if duplicates:
+        INGEST_DUPLICATES.labels(kind).inc(duplicates)
+    if unknown:
+        INGEST_UNKNOWN.labels(kind).inc(unknown)
+    if rejected:
+        INGEST_REJECTED.labels(kind).inc(rejected)
+    INGEST_BATCH_ITEMS.labels(kind).observe(received)
+    INGEST_BATCH_SECONDS.labels(kind).observe(time.perf_counter() - started)
+
+
+def _is_repeat_fix(device_id: int, ts: Any, lat: Any, lon: Any, seen: set) -> bool:
+    """Whether a fix repeats one earlier in the batch or the device's latest known fix."""
+    if ts is None:
+        return False
+    ts = ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+    key = (device_id, ts)
+    if key in seen:
+        return True
+    seen.add(key)
+    latest = vessel_index.latest(device_id)
+    return latest is not None and latest[2] == ts and (latest[0], latest[1]) == (lat, lon)
+
+
+def _parse_time(value: Any) -> Any:
+    """Traccar sends times as epoch milliseconds/seconds or ISO strings."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # if large number assume milliseconds
+        return datetime.fromtimestamp(value / 1000.0 if value > 1e12 else value, tz=timezone.utc)
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    return None
 
 
 def verify_shared_secret(authorization: str = Header(None)):
@@ -46,14 +118,31 @@ def _parse_battery(it: dict) -> Any:
     return None
 
 
-@router.post("/positions")
-async def receive_positions(payload: Any = Body(...), db: Session = Depends(get_db), _=Depends(verify_shared_secret)):
-    # Debug: log incoming payload summary
+def _with_nearby_vessels(db: Session, device_id: int, it: dict, attrs: Any) -> Any:
+    """Attach the closest other vessels to an SOS event's attributes."""
+    attrs = dict(attrs) if isinstance(attrs, dict) else {}
     try:
-        print("[traccar] receive_positions called; payload type:", type(payload), "len?", len(payload) if hasattr(payload, '__len__') else None)
-        print(payload)
+        lat, lon = it.get("latitude"), it.get("longitude")
+        if lat is None or lon is None:
+            vessel_index.ensure_loaded(db)
+            latest = vessel_index.latest(device_id)
+            if latest is None:
+                return attrs
+            lat, lon = latest[0], latest[1]
+        attrs["nearby"] = nearest_vessels(
+            db, float(lat), float(lon), settings.SOS_NEARBY_COUNT, settings.NEARBY_MAX_AGE_SECONDS, exclude={device_id}
+        )
+        attrs["nearbyOrigin"] = {"latitude": float(lat), "longitude": float(lon)}
     except Exception:
-        print("[traccar] receive_positions called; unable to determine payload length")
+        logger.exception("Nearby vessel lookup failed for device %s", device_id)
+    return attrs
+
+
+@router.post("/positions")
+async def receive_positions(payload: Any = Body(...), db: Session = Depends(get_db), _=Depends(verify_shared_secret)):
+    started = time.perf_counter()
+    batch = IngestBatch("positions")
+    debug = logger.isEnabledFor(logging.DEBUG)
 
     # Traccar can forward a list or a single object; handle simple cases
     items = []
@@ -72,42 +161,36 @@ async def receive_positions(payload: Any = Body(...), db: Session = Depends(get_
         raise HTTPException(status_code=400, detail="Invalid payload")
 
     saved = []
+    samples = []
+    seen = set()
+    invalid = unknown = duplicates = 0
     for it in items:
         # support both plain Traccar position dict and wrapper formats
         if not isinstance(it, dict):
-            print(f"[traccar] unexpected item type: {type(it)}; skipping")
+            invalid += 1
+            if debug and _sample_item():
+                logger.debug("Skipping position item of type %s", type(it).__name__)
             continue
         device_id = it.get("deviceId") or it.get("device_id")
         # if still missing, attempt to extract from nested 'device' structure
         if device_id is None and "device" in it and isinstance(it.get("device"), dict):
             device_id = it.get("device", {}).get("id")
-        print(f"[traccar] processing position item deviceId={device_id}")
         if device_id is None:
-            print("[traccar] position item missing deviceId; skipping")
+            invalid += 1
+            if debug and _sample_item():
+                logger.debug("Skipping position item without deviceId: %r", it)
             continue
         dev = db.query(Device).filter(Device.traccar_device_id == device_id).first()
         if not dev:
             # ignore unknown devices for now
-            print(f"[traccar] unknown device with traccar id {device_id}; skipping")
+            unknown += 1
+            if debug and _sample_item():
+                logger.debug("Skipping position for unknown traccar device %s", device_id)
             continue
         # normalize timestamp: Traccar may send milliseconds since epoch or ISO string
         ts = it.get("fixTime") or it.get("fix_time") or it.get("timestamp") or it.get("serverTime") or it.get("deviceTime")
-        ts_dt = None
-        if isinstance(ts, (int, float)):
-            # if large number assume milliseconds
-            if ts > 1e12:
-                ts_dt = datetime.fromtimestamp(ts / 1000.0, tz=timezone.utc)
-            else:
-                ts_dt = datetime.fromtimestamp(ts, tz=timezone.utc)
-        else:
-            try:
-                if isinstance(ts, str) and ts:
-                    ts_dt = datetime.fromisoformat(ts)
-            except Exception:
-                ts_dt = None
+        ts_dt = _parse_time(ts)
 
-        # log types to detect type mismatches
-        print(f"[traccar] item types: latitude={type(it.get('latitude'))}, longitude={type(it.get('longitude'))}, speed={type(it.get('speed'))}, fixTime={type(ts)}")
         pos = Position(
             device_id=dev.id,
             latitude=it.get("latitude"),
@@ -117,40 +200,74 @@ async def receive_positions(payload: Any = Body(...), db: Session = Depends(get_
             timestamp=ts_dt,
             battery_percent=_parse_battery(it),
             attributes=it.get("attributes"),
+            received_at=batch.received_at,
         )
-        print(f"[traccar] creating Position: device_id={dev.id}, lat={pos.latitude}, lon={pos.longitude}, ts={pos.timestamp}")
+        if _is_repeat_fix(dev.id, ts_dt, pos.latitude, pos.longitude, seen):
+            duplicates += 1
+        if debug and _sample_item():
+            logger.debug(
+                "Position device_id=%s lat=%r lon=%r speed=%r fixTime=%r -> %s",
+                dev.id, pos.latitude, pos.longitude, pos.speed, ts, pos.timestamp,
+            )
         try:
             db.add(pos)
             saved.append(pos)
-        except Exception as e:
-            print(f"[traccar] exception adding pos to session: {e}")
+            samples.append((dev.id, dev.geofence_id, pos.latitude, pos.longitude))
+            batch.item(ts_dt, _parse_time(it.get("serverTime")))
+        except Exception:
+            logger.exception("Adding position for device %s failed", dev.id)
             db.rollback()
             continue
+    # distance-to-boundary alerts for the whole batch, committed with the positions; like trips and
+    # rollups below, a failure is rolled back to its savepoint and the positions are still stored
+    approach_events = []
+    proximity_changes = {}
     try:
-        before_count = db.query(Position).count()
+        with db.begin_nested():
+            alerts, proximity_changes = proximity_monitor.check(db, samples)
+            for alert in alerts:
+                ev = Event(device_id=alert["device_id"], event_type=APPROACH_EVENT, attributes=alert["attributes"])
+                db.add(ev)
+                approach_events.append(ev)
+            db.flush()
+    except Exception:
+        logger.exception("Geofence proximity check failed")
+        approach_events, proximity_changes = [], {}
+        INGEST_DERIVED_FAILED.labels("proximity").inc()
+    # trips and rollups are derived data: a failure there is rolled back to the savepoint, not the positions
+    if saved:
+        feature = "trips"
+        try:
+            with db.begin_nested():
+                segment_positions(db, saved)
+                feature = "rollups"
+                rollup_positions(db, saved)
+        except Exception:
+            logger.exception(
+                "Trip/rollup update failed in %s; storing %d positions without them (rebuild with manage.py backfill-rollups)",
+                feature, len(saved),
+            )
+            INGEST_DERIVED_FAILED.labels(feature).inc()
+    try:
+        commit_started = time.perf_counter()
         db.commit()
-        print(f"[traccar] committed {len(saved)} positions (attempted)")
-    except Exception as e:
-        print(f"[traccar] commit failed: {e}")
+        INGEST_COMMIT_SECONDS.labels("positions").observe(time.perf_counter() - commit_started)
+        batch.committed()
+    except Exception:
+        logger.exception("Committing %d positions failed", len(saved))
         db.rollback()
+        _positions_summary.add(batches=1, received=len(items), failed=len(saved))
+        INGEST_FAILED_BATCHES.labels("positions").inc()
         return {"ok": False, "saved": 0}
+    # only now: a lost commit must leave the device armed so the alert is raised again
+    proximity_monitor.apply(proximity_changes)
 
-    # verify persistence in a fresh session
-    try:
-        vdb = SessionLocal()
-        try:
-            after_count = vdb.query(Position).count()
-            print(f"[traccar] positions table rows before={before_count} after={after_count}")
-            last_rows = vdb.query(Position).order_by(Position.id.desc()).limit(5).all()
-            for r in last_rows:
-                print(f"[traccar] stored pos id={r.id} device_id={r.device_id} lat={r.latitude} lon={r.longitude} ts={r.timestamp}")
-        finally:
-            vdb.close()
-    except Exception as e:
-        print(f"[traccar] verification query failed: {e}")
     # refresh saved positions and build a positions list
     for pos in saved:
         db.refresh(pos)
+        vessel_index.update(pos.device_id, pos.latitude, pos.longitude, pos.timestamp, pos.speed, pos.course)
+    for ev in approach_events:
+        db.refresh(ev)
 
     positions_payload = []
     for pos in saved:
@@ -164,7 +281,17 @@ async def receive_positions(payload: Any = Body(...), db: Session = Depends(get_
             "timestamp": pos.timestamp.isoformat() if pos.timestamp else None,
             "battery_percent": pos.battery_percent,
             "attributes": pos.attributes,
+            "server_received_at": batch.received_iso,
         })
+    events_payload = [{
+        "id": ev.id,
+        "device_id": ev.device_id,
+        "event_type": ev.event_type,
+        "timestamp": ev.timestamp.isoformat() if ev.timestamp else None,
+        "attributes": ev.attributes,
+        "resolved": False,
+        "server_received_at": batch.received_iso,
+    } for ev in approach_events]
 
     # Broadcast combined message to connected socket clients, filtering per-user in this router
     try:
@@ -174,7 +301,7 @@ async def receive_positions(payload: Any = Body(...), db: Session = Depends(get_
             role = entry.get("role")
             user_id = entry.get("user_id")
             if role in ("administrator", "coast_guard"):
-                msg = {"positions": positions_payload, "events": []}
+                msg = {"positions": positions_payload, "events": events_payload}
                 await manager.send_to_user(ws, msg)
             else:
                 # fisherfolk: only positions for their devices
@@ -182,26 +309,36 @@ async def receive_positions(payload: Any = Body(...), db: Session = Depends(get_
                 try:
                     device_ids = [d.id for d in db2.query(Device).filter(Device.user_id == int(user_id)).all()]
                     fp = [p for p in positions_payload if p["device_id"] in device_ids]
-                    msg = {"positions": fp, "events": []}
+                    fe = [e for e in events_payload if e["device_id"] in device_ids]
+                    msg = {"positions": fp, "events": fe}
                     await manager.send_to_user(ws, msg)
                 finally:
                     db2.close()
     except Exception:
-        pass
+        logger.exception("Broadcasting positions failed")
+    batch.fanned_out()
 
-    return {"ok": True, "saved": len(saved)}
+    log_fields(
+        logger, logging.DEBUG, "traccar positions batch",
+        received=len(items), saved=len(saved), duplicates=duplicates, unknown=unknown, invalid=invalid,
+        approach_events=len(approach_events), ms=round((time.perf_counter() - started) * 1000, 1),
+    )
+    _positions_summary.add(
+        batches=1, received=len(items), saved=len(saved), duplicates=duplicates, unknown=unknown, invalid=invalid,
+        approach_events=len(approach_events),
+    )
+    _observe_batch("positions", started, len(items), len(saved), duplicates, unknown, invalid)
+    return {"ok": True, "saved": len(saved), "events": len(approach_events)}
 
 
 @router.post("/events")
 async def receive_events(payload: Any = Body(...), db: Session = Depends(get_db), _=Depends(verify_shared_secret)):
-    # Debug: inspect incoming events
-    try:
-        print("[traccar] receive_events called; payload type:", type(payload), "len?", len(payload) if hasattr(payload, '__len__') else None)
-        print(payload)
-    except Exception:
-        print("[traccar] receive_events called; unable to determine payload length")
+    started = time.perf_counter()
+    batch = IngestBatch("events")
+    debug = logger.isEnabledFor(logging.DEBUG)
 
     items = []
+    wrapper_position = None
     if isinstance(payload, list):
         items = payload
     elif isinstance(payload, dict):
@@ -210,26 +347,36 @@ async def receive_events(payload: Any = Body(...), db: Session = Depends(get_db)
             items = payload.get("events")
         elif "event" in payload and isinstance(payload.get("event"), dict):
             items = [payload.get("event")]
+            # the wrapper carries the position that triggered the event; its fixTime is the device's clock
+            if isinstance(payload.get("position"), dict):
+                wrapper_position = payload.get("position")
         else:
             items = [payload]
     else:
         raise HTTPException(status_code=400, detail="Invalid payload")
 
     saved = []
+    seen = set()
+    invalid = unknown = unsupported = duplicates = 0
     for it in items:
         if not isinstance(it, dict):
-            print(f"[traccar] unexpected event item type: {type(it)}; skipping")
+            invalid += 1
+            if debug and _sample_item():
+                logger.debug("Skipping event item of type %s", type(it).__name__)
             continue
         device_id = it.get("deviceId") or it.get("device_id")
         if device_id is None and "device" in it and isinstance(it.get("device"), dict):
             device_id = it.get("device", {}).get("id")
-        print(f"[traccar] processing event item deviceId={device_id}")
         if device_id is None:
-            print("[traccar] event item missing deviceId; skipping")
+            invalid += 1
+            if debug and _sample_item():
+                logger.debug("Skipping event item without deviceId: %r", it)
             continue
         dev = db.query(Device).filter(Device.traccar_device_id == device_id).first()
         if not dev:
-            print(f"[traccar] unknown device for event with traccar id {device_id}; skipping")
+            unknown += 1
+            if debug and _sample_item():
+                logger.debug("Skipping event for unknown traccar device %s", device_id)
             continue
         # determine event type and filter allowed types
         raw_type = it.get("type") or it.get("eventType")
@@ -249,38 +396,65 @@ async def receive_events(payload: Any = Body(...), db: Session = Depends(get_db)
                 if av in ("sos", "lowbattery", "low_battery", "lowbatteryalarm", "low-battery"):
                     store_type = f"alarm:{alarm_val}"
         if not store_type:
-            print(f"[traccar] skipping unsupported event type: {raw_type} attrs={attrs}")
+            unsupported += 1
+            if debug and _sample_item():
+                logger.debug("Skipping unsupported event type %s attrs=%r", raw_type, attrs)
             continue
+        event_key = (dev.id, store_type, it.get("eventTime") or it.get("id"))
+        if event_key[2] is not None:
+            if event_key in seen:
+                duplicates += 1
+            seen.add(event_key)
+        if store_type.lower() == "alarm:sos":
+            attrs = _with_nearby_vessels(db, dev.id, it, attrs)
 
         ev = Event(device_id=dev.id, event_type=store_type, attributes=attrs)
         try:
             db.add(ev)
             saved.append(ev)
-        except Exception as e:
-            print(f"[traccar] exception adding event to session: {e}")
+            fix = _parse_time((wrapper_position or {}).get("fixTime"))
+            batch.item(fix, _parse_time(it.get("eventTime") or it.get("serverTime")), "sos" if store_type.lower() == "alarm:sos" else None)
+        except Exception:
+            logger.exception("Adding event for device %s failed", dev.id)
             db.rollback()
             continue
+    escalation_rows = []
     try:
+        commit_started = time.perf_counter()
+        sos_events = [ev for ev in saved if is_sos(ev.event_type)]
+        if sos_events:
+            # event ids for the escalation rows, committed with the events
+            db.flush()
+            escalation_rows = [new_escalation(ev, batch.received_at) for ev in sos_events]
+            db.add_all(escalation_rows)
         db.commit()
-        print(f"[traccar] committed {len(saved)} events (attempted)")
-    except Exception as e:
-        print(f"[traccar] commit failed for events: {e}")
+        INGEST_COMMIT_SECONDS.labels("events").observe(time.perf_counter() - commit_started)
+        batch.committed()
+    except Exception:
+        logger.exception("Committing %d events failed", len(saved))
         db.rollback()
+        _events_summary.add(batches=1, received=len(items), failed=len(saved))
+        INGEST_FAILED_BATCHES.labels("events").inc()
         return {"ok": False, "saved": 0}
 
     for ev in saved:
         db.refresh(ev)
+    escalations.track(escalation_rows)
 
     events_payload = []
     for ev in saved:
-        events_payload.append({
+        item = {
             "id": ev.id,
             "device_id": ev.device_id,
             "event_type": ev.event_type,
             "timestamp": ev.timestamp.isoformat() if ev.timestamp else None,
             "attributes": ev.attributes,
             "resolved": False,
-        })
+            "server_received_at": batch.received_iso,
+        }
+        if is_sos(ev.event_type):
+            item.update(feed_fields(0, batch.received, batch.received))
+        events_payload.append(item)
 
     try:
         for entry in list(manager.active):
@@ -300,6 +474,17 @@ async def receive_events(payload: Any = Body(...), db: Session = Depends(get_db)
                 finally:
                     db2.close()
     except Exception:
-        pass
+        logger.exception("Broadcasting events failed")
+    batch.fanned_out()
 
+    log_fields(
+        logger, logging.DEBUG, "traccar events batch",
+        received=len(items), saved=len(saved), duplicates=duplicates, unknown=unknown, invalid=invalid,
+        unsupported=unsupported, ms=round((time.perf_counter() - started) * 1000, 1),
+    )
+    _events_summary.add(
+        batches=1, received=len(items), saved=len(saved), duplicates=duplicates, unknown=unknown, invalid=invalid,
+        unsupported=unsupported,
+    )
+    _observe_batch("events", started, len(items), len(saved), duplicates, unknown, invalid + unsupported)
     return {"ok": True, "saved": len(saved)}
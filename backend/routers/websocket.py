@@ -1,8 +1,11 @@
+import logging
+
 from fastapi import APIRouter, WebSocket, Depends, Query
 from fastapi import WebSocketDisconnect
 from typing import Optional
 
 from core.security import decode_token
+from utils.sos_escalation import feed_fields, unacknowledged
 from utils.websocket_manager import manager
 from db.session import SessionLocal
 from sqlalchemy.orm import Session
@@ -14,6 +17,7 @@ from sqlalchemy import func
 from datetime import datetime
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 @router.websocket("/socket")
@@ -43,6 +47,12 @@ async def ws_socket(websocket: WebSocket, token: Optional[str] = Query(None)):
 
         # recent events (most recent 100, chronological)
         recent_events = db.query(Event).order_by(Event.id.desc()).limit(100).all()[::-1]
+        # unacknowledged SOS alarms stay in the feed however old they are; read from the table
+        # (ix_sos_escalations_open), since this worker's timers miss alarms stored by other workers
+        open_alarms = unacknowledged(db)
+        older = set(open_alarms) - {e.id for e in recent_events}
+        if older:
+            recent_events = sorted(recent_events + db.query(Event).filter(Event.id.in_(older)).all(), key=lambda e: e.id)
         reported_ids = {rid for (rid,) in db.query(Report.event_id).all()}
 
         # filter according to role/user
@@ -57,21 +67,27 @@ async def ws_socket(websocket: WebSocket, token: Optional[str] = Query(None)):
                 "timestamp": p.timestamp.isoformat() if p.timestamp else None,
                 "battery_percent": p.battery_percent,
                 "attributes": p.attributes,
+                "server_received_at": p.received_at.isoformat() if p.received_at else None,
             }
 
         def ev_to_dict(e: Event):
-            return {
+            out = {
                 "id": e.id,
                 "device_id": e.device_id,
                 "event_type": e.event_type,
                 "timestamp": e.timestamp.isoformat() if e.timestamp else None,
                 "attributes": e.attributes,
                 "resolved": e.id in reported_ids,
+                # events are stamped by the server on insert
+                "server_received_at": e.timestamp.isoformat() if e.timestamp else None,
             }
+            if e.id in open_alarms:
+                out.update(feed_fields(*open_alarms[e.id]))
+            return out
 
         if role in ("administrator", "coast_guard"):
             msg = {"positions": [pos_to_dict(p) for p in latest_positions], "events": [ev_to_dict(e) for e in recent_events]}
-            print(f"[ws socket] sending initial snapshot to role={role}; positions={len(latest_positions)} events={len(recent_events)}")
+            logger.debug("Sending initial snapshot to role=%s; positions=%d events=%d", role, len(latest_positions), len(recent_events))
             await manager.send_to_user(websocket, msg)
         else:
             # fisherfolk: only positions/events for their devices
@@ -79,7 +95,7 @@ async def ws_socket(websocket: WebSocket, token: Optional[str] = Query(None)):
             fp = [p for p in latest_positions if p.device_id in device_ids]
             fe = [e for e in recent_events if e.device_id in device_ids]
             msg = {"positions": [pos_to_dict(p) for p in fp], "events": [ev_to_dict(e) for e in fe]}
-            print(f"[ws socket] sending initial snapshot to user_id={user_id}; positions={len(fp)} events={len(fe)}")
+            logger.debug("Sending initial snapshot to user_id=%s; positions=%d events=%d", user_id, len(fp), len(fe))
             await manager.send_to_user(websocket, msg)
     finally:
         db.close()
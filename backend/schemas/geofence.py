@@ -13,6 +13,11 @@ class GeofenceOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class GeofenceSyncOut(GeofenceOut):
+    # Traccar sync state after a mutation; poll /api/admin/traccar/sync/geofence/{id}
+    sync: Optional[dict] = None
+
+
 class GeofenceCreate(BaseModel):
     name: str
     description: Optional[str] = None
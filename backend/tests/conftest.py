@@ -7,6 +7,7 @@ os.environ.setdefault("TESTING", "1")
 os.environ.setdefault("DATABASE_URL", "sqlite:///./test_bantay.db")
 os.environ.setdefault("TRACCAR_SHARED_SECRET", "test-traccar-secret")
 os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("METRICS_TOKEN", "test-metrics-token")
 # Skip outbound Traccar sync during tests
 os.environ.setdefault("BANTAY_SKIP_TRACCAR", "1")
 
@@ -24,6 +24,7 @@ def test_register_device_flow(client, admin_user, db_session, monkeypatch):
         def __init__(self, data, status=200):
             self._data = data
             self.status_code = status
+            self.content = b"{}"
 
         def raise_for_status(self):
             if not (200 <= self.status_code < 300):
@@ -32,10 +33,11 @@ def test_register_device_flow(client, admin_user, db_session, monkeypatch):
         def json(self):
             return self._data
 
-    def fake_post(url, json=None, headers=None, timeout=None):
+    def fake_request(self, method, url, json=None, params=None, timeout=None, **kwargs):
         return DummyResp({"id": payload["traccar_device_id"]})
 
-    monkeypatch.setattr(requests, "post", fake_post)
+    # the shared Traccar client sends everything through a pooled requests.Session
+    monkeypatch.setattr(requests.Session, "request", fake_request)
 
     headers = _auth_header(client)
     resp = client.post("/api/admin/register", json=payload, headers=headers)
@@ -0,0 +1,60 @@
+from core import audit
+from db.session import SessionLocal
+from models.log import Log
+
+
+def _auth_header(client, email="admin@example.com", password="adminpass"):
+    resp = client.post("/api/auth/login", json={"email": email, "password": password})
+    assert resp.status_code == 200
+    token = resp.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_mutation_writes_log_in_same_transaction(client, admin_user):
+    headers = _auth_header(client)
+    resp = client.post("/api/admin/register_coastguard", json={"name": "CG Audit", "email": "cg-audit@example.com", "password": "cgpass123"}, headers=headers)
+    assert resp.status_code == 200
+    user_id = resp.json()["user"]["id"]
+
+    db = SessionLocal()
+    try:
+        entry = db.query(Log).filter(Log.table_name == "users", Log.record_id == user_id, Log.action == "create").first()
+        assert entry is not None
+        assert entry.actor_user_id == admin_user.id
+    finally:
+        db.close()
+
+
+def test_buffered_mode_flushes_only_committed_entries(monkeypatch, admin_user):
+    monkeypatch.setattr(audit.settings, "AUDIT_MODE", "buffered")
+    db = SessionLocal()
+    try:
+        audit.log_action(db, "audit_test", 1, "rolled_back", actor_user_id=admin_user.id)
+        db.rollback()
+        audit.log_action(db, "audit_test", 2, "committed", actor_user_id=admin_user.id)
+        # a savepoint rolling back does not drop the outer transaction's entries
+        try:
+            with db.begin_nested():
+                raise RuntimeError("derived update failed")
+        except RuntimeError:
+            pass
+        # nothing reaches the table until the writer flushes
+        db.commit()
+        audit.writer.stop()
+        actions = {a for (a,) in db.query(Log.action).filter(Log.table_name == "audit_test").all()}
+    finally:
+        db.close()
+    assert actions == {"committed"}
+    snap = audit.metrics.snapshot()
+    assert snap["batches"] >= 1
+    assert snap["buffered"] == 0
+
+
+def test_audit_metrics_endpoint_requires_admin(client, admin_user, fisher_user):
+    headers = _auth_header(client)
+    resp = client.get("/api/admin/audit/metrics", headers=headers)
+    assert resp.status_code == 200
+    assert "flush_seconds_avg" in resp.json()
+
+    fisher_headers = _auth_header(client, email="fisher@example.com", password="fishpass")
+    assert client.get("/api/admin/audit/metrics", headers=fisher_headers).status_code == 403
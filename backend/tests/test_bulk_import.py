@@ -0,0 +1,68 @@
+import json
+
+from models.device import Device
+from models.user import User
+
+
+def _auth_header(client, email="admin@example.com", password="adminpass"):
+    resp = client.post("/api/auth/login", json={"email": email, "password": password})
+    assert resp.status_code == 200
+    token = resp.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+CSV = (
+    "unique_id,name,fisher_name,fisher_email,fisher_password,medical_record\n"
+    "BULK-1,Boat One,Fisher B1,bulk1@example.com,pw1,\n"
+    "BULK-2,Boat Two,Fisher B2,bulk2@example.com,pw2,asthma\n"
+)
+
+
+def test_bulk_dry_run_writes_nothing(client, admin_user, db_session, monkeypatch):
+    monkeypatch.setenv("BANTAY_SKIP_TRACCAR", "1")
+    headers = _auth_header(client)
+    resp = client.post("/api/admin/register/bulk", files={"file": ("fishers.csv", CSV)}, data={"dry_run": "true"}, headers=headers)
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    assert body["ok"] is True and body["valid"] == 2 and body["created"] == 0
+    assert [r["status"] for r in body["rows"]] == ["valid", "valid"]
+    assert db_session.query(User).filter(User.email == "bulk1@example.com").first() is None
+
+
+def test_bulk_import_creates_rows_and_rejects_bad_files(client, admin_user, db_session, monkeypatch):
+    monkeypatch.setenv("BANTAY_SKIP_TRACCAR", "1")
+    headers = _auth_header(client)
+    resp = client.post("/api/admin/register/bulk", files={"file": ("fishers.csv", CSV)}, headers=headers)
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    assert body["created"] == 2
+    assert all(r["status"] == "created" for r in body["rows"])
+    device = db_session.query(Device).filter(Device.unique_id == "BULK-2").first()
+    assert device is not None and device.user_id == body["rows"][1]["user_id"]
+
+    # the same rows again, plus a duplicate within the file: nothing is written
+    rows = [
+        {"unique_id": "BULK-1", "fisher_name": "Again", "fisher_email": "bulk1@example.com", "fisher_password": "x", "name": None},
+        {"unique_id": "BULK-3", "fisher_name": "Three", "fisher_email": "bulk3@example.com", "fisher_password": "x", "name": None},
+        {"unique_id": "BULK-3", "fisher_name": "Four", "fisher_email": "bulk4@example.com", "fisher_password": "x", "name": None, "geofence_id": 999999},
+    ]
+    resp = client.post("/api/admin/register/bulk", files={"file": ("fishers.json", json.dumps(rows))}, headers=headers)
+    body = resp.json()
+    assert body["ok"] is False and body["created"] == 0
+    assert "fisher_email: already registered" in body["rows"][0]["errors"]
+    assert body["rows"][1]["errors"] == ["unique_id: duplicated in file"]
+    assert "geofence_id: geofence not found" in body["rows"][2]["errors"]
+
+    # skip_invalid imports whatever is valid
+    rows[1]["unique_id"] = "BULK-5"
+    resp = client.post("/api/admin/register/bulk", files={"file": ("fishers.json", json.dumps(rows))}, data={"skip_invalid": "true"}, headers=headers)
+    body = resp.json()
+    assert body["created"] == 1
+    assert [r["status"] for r in body["rows"]] == ["error", "created", "error"]
+
+    for email in ("bulk1@example.com", "bulk2@example.com", "bulk3@example.com"):
+        user = db_session.query(User).filter(User.email == email).first()
+        if user:
+            db_session.query(Device).filter(Device.user_id == user.id).delete()
+            db_session.delete(user)
+    db_session.commit()
@@ -0,0 +1,75 @@
+import csv
+import gzip
+import io
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from db.session import SessionLocal
+from models.device import Device
+from models.position import Position
+from utils.export import parquet_available
+from utils.geometry import gpx_to_wkt
+
+
+def _auth_header(client, email, password):
+    resp = client.post("/api/auth/login", json={"email": email, "password": password})
+    assert resp.status_code == 200
+    token = resp.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _seed_track(owner_id: int, points: int = 5) -> int:
+    db = SessionLocal()
+    try:
+        dev = Device(unique_id=f"DEV-{uuid.uuid4()}", name="Export Boat", user_id=owner_id)
+        db.add(dev)
+        db.commit()
+        db.refresh(dev)
+        base = datetime(2024, 5, 1, tzinfo=timezone.utc)
+        db.add_all([
+            Position(device_id=dev.id, latitude=14.5 + i * 0.01, longitude=120.9 + i * 0.01, speed=3.0, timestamp=base + timedelta(minutes=i), attributes={"i": i})
+            for i in range(points)
+        ])
+        db.commit()
+        return dev.id
+    finally:
+        db.close()
+
+
+def test_history_export_formats(client, coast_guard_user, fisher_user):
+    device_id = _seed_track(fisher_user.id)
+    headers = _auth_header(client, coast_guard_user.email, "cgpass")
+
+    resp = client.get("/api/export/history", params={"device_id": device_id, "format": "csv"}, headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(resp.text)))
+    assert len(rows) == 5
+    assert json.loads(rows[0]["attributes"]) == {"i": 0}
+
+    resp = client.get("/api/export/history", params={"device_id": device_id, "format": "geojson", "gzip": "true"}, headers=headers)
+    assert resp.status_code == 200
+    fc = json.loads(gzip.decompress(resp.content))
+    assert fc["type"] == "FeatureCollection"
+    assert len(fc["features"]) == 5
+    assert fc["features"][0]["geometry"]["coordinates"] == [120.9, 14.5]
+
+    resp = client.get("/api/export/history", params={"device_id": device_id, "format": "gpx"}, headers=headers)
+    assert resp.status_code == 200
+    assert gpx_to_wkt(resp.text).startswith("POLYGON((14.500000 120.900000")
+
+
+def test_history_export_access_and_format_errors(client, fisher_user, coast_guard_user):
+    other_device = _seed_track(coast_guard_user.id, points=1)
+    fisher_headers = _auth_header(client, fisher_user.email, "fishpass")
+    resp = client.get("/api/export/history", params={"device_id": other_device}, headers=fisher_headers)
+    assert resp.status_code == 403
+    assert client.get("/api/export/alerts", headers=fisher_headers).status_code == 403
+
+    cg_headers = _auth_header(client, coast_guard_user.email, "cgpass")
+    resp = client.get("/api/export/alerts", params={"format": "gpx"}, headers=cg_headers)
+    assert resp.status_code == 400
+    if not parquet_available():
+        resp = client.get("/api/export/reports", params={"format": "parquet"}, headers=cg_headers)
+        assert resp.status_code == 400
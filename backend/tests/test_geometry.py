@@ -0,0 +1,87 @@
+import pytest
+
+from db.session import SessionLocal
+from models.geofence import Geofence
+from utils.etag import bump_version
+from utils.geometry import compile_area, geofence_cache, geojson_to_wkt, gpx_to_wkt, normalize_wkt_polygon, traccar_area
+
+SQUARE = [[120.0, 14.0], [120.1, 14.0], [120.1, 14.1], [120.0, 14.1], [120.0, 14.0]]
+HOLE = [[120.04, 14.04], [120.06, 14.04], [120.06, 14.06], [120.04, 14.06], [120.04, 14.04]]
+
+
+def _auth_header(client, email="admin@example.com", password="adminpass"):
+    resp = client.post("/api/auth/login", json={"email": email, "password": password})
+    assert resp.status_code == 200
+    token = resp.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_normalize_keeps_stored_format():
+    # lon lat input, stored as lat lon and closed
+    assert normalize_wkt_polygon("POLYGON((120.9 14.5, 121.0 14.5, 121.0 14.6))") == (
+        "POLYGON((14.500000 120.900000, 14.500000 121.000000, 14.600000 121.000000, 14.500000 120.900000))"
+    )
+    stored = normalize_wkt_polygon("POLYGON((14.5 120.9, 14.5 121.0, 14.6 121.0, 14.5 120.9))")
+    assert normalize_wkt_polygon(stored) == stored
+    assert normalize_wkt_polygon("POLYGON((1 2, 3 4))") is None
+    assert normalize_wkt_polygon("POINT(1 2)") is None
+
+
+def test_holes_and_multipolygons_survive_conversion():
+    wkt = geojson_to_wkt({"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [SQUARE, HOLE]}})
+    assert wkt.startswith("POLYGON((") and wkt.count("(") == 3
+    compiled = compile_area(wkt)
+    assert compiled.part_count == 1 and sum(compiled.ring_holes) == 1
+    # ~11.1 km x ~10.8 km square minus a 2.2 km x 2.2 km hole
+    assert compiled.area_m2 == pytest.approx(1.195e8 - 4.78e6, rel=0.02)
+    assert compiled.contains(14.02, 120.02)
+    assert not compiled.contains(14.05, 120.05)
+    assert not compiled.contains(14.2, 120.05)
+    assert compiled.centroid == pytest.approx((14.05, 120.05), abs=1e-4)
+
+    far = [[121.0, 15.0], [121.01, 15.0], [121.01, 15.01], [121.0, 15.0]]
+    multi = geojson_to_wkt({"type": "MultiPolygon", "coordinates": [[SQUARE, HOLE], [far]]})
+    assert multi.startswith("MULTIPOLYGON(((")
+    assert normalize_wkt_polygon(multi) is not None
+    compiled = compile_area(multi)
+    assert compiled.part_count == 2 and compiled.contains(15.002, 121.008)
+    # Traccar gets the outer ring of the largest part only
+    assert traccar_area(multi) == normalize_wkt_polygon("POLYGON((" + ", ".join(f"{x} {y}" for x, y in SQUARE) + "))")
+
+
+def test_gpx_track_becomes_ring():
+    gpx = '<gpx><trk><trkseg><trkpt lat="14.0" lon="120.0"/><trkpt lat="14.0" lon="120.1"/><trkpt lat="14.1" lon="120.1"/></trkseg></trk></gpx>'
+    assert gpx_to_wkt(gpx) == "POLYGON((14.000000 120.000000, 14.000000 120.100000, 14.100000 120.100000, 14.000000 120.000000))"
+
+
+def test_cache_recompiles_only_after_change(client, admin_user):
+    db = SessionLocal()
+    try:
+        g = Geofence(name="Cached", area=geojson_to_wkt({"type": "Polygon", "coordinates": [SQUARE]}))
+        db.add(g)
+        bump_version(db, "geofences")
+        db.commit()
+        first = geofence_cache.get(db, g.id)
+        assert geofence_cache.get(db, g.id) is first
+
+        # unrelated geofence write: revalidated, same object kept
+        bump_version(db, "geofences")
+        db.commit()
+        assert geofence_cache.get(db, g.id) is first
+
+        g.area = geojson_to_wkt({"type": "Polygon", "coordinates": [SQUARE, HOLE]})
+        bump_version(db, "geofences")
+        db.commit()
+        second = geofence_cache.get(db, g.id)
+        assert second is not first and sum(second.ring_holes) == 1
+
+        resp = client.get(f"/api/admin/geofences/{g.id}/geometry", headers=_auth_header(client))
+        assert resp.status_code == 200
+        assert resp.json()["holes"] == 1
+
+        db.delete(g)
+        bump_version(db, "geofences")
+        db.commit()
+        assert geofence_cache.get(db, g.id) is None
+    finally:
+        db.close()
@@ -0,0 +1,31 @@
+import json
+import os
+import subprocess
+import sys
+
+from bench.common import BACKEND
+from bench.importtime import breakdown, fastest, parse_importtime
+
+SAMPLE = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 | _io
+import time:       900 |       1500 |   sqlalchemy.sql
+import time:       300 |       1800 | sqlalchemy
+"""
+
+
+def test_parse_and_breakdown():
+    rows = parse_importtime(SAMPLE)
+    assert [r["module"] for r in rows] == ["_io", "sqlalchemy.sql", "sqlalchemy"]
+    assert rows[1]["depth"] == 1
+    slower = [dict(r, self_us=r["self_us"] * 2) for r in rows]
+    report = breakdown(fastest([slower, rows]), top=5)
+    assert report["by_package_ms"] == {"sqlalchemy": 1.2, "_io": 0.1}
+    assert next(iter(report["slowest_cumulative_ms"])) == "sqlalchemy"
+
+
+def test_import_main_defers_optional_dependencies(tmp_path):
+    heavy = ["requests", "passlib.context", "xml.etree.ElementTree", "numpy"]
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'import.db'}", BANTAY_SKIP_TRACCAR="1")
+    code = f"import json, sys, main; print(json.dumps([m for m in {heavy!r} if m in sys.modules]))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND, env=env, capture_output=True, text=True, check=True)
+    assert json.loads(out.stdout.strip().splitlines()[-1]) == []
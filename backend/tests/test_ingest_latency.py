@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta, timezone
+
+from db.session import SessionLocal
+from models.device import Device
+from models.position import Position
+from utils.ingest_latency import tracker
+
+HEADERS = {"Authorization": "Bearer test-traccar-secret"}
+METRICS_HEADERS = {"Authorization": "Bearer test-metrics-token"}
+
+
+def _auth_header(client, email="admin@example.com", password="adminpass"):
+    resp = client.post("/api/auth/login", json={"email": email, "password": password})
+    assert resp.status_code == 200
+    token = resp.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_ingest_latency_stages_and_received_at(client, admin_user, coast_guard_user, fisher_user):
+    db = SessionLocal()
+    try:
+        device = Device(unique_id="LAT-1", name="Latency", user_id=fisher_user.id, traccar_device_id=45001)
+        db.add(device)
+        db.commit()
+        device_id = device.id
+    finally:
+        db.close()
+    tracker.reset()
+
+    now = datetime.now(timezone.utc)
+    fix = {
+        "deviceId": 45001,
+        "latitude": 14.5,
+        "longitude": 121.0,
+        "fixTime": (now - timedelta(seconds=30)).isoformat(),
+        "serverTime": int((now - timedelta(seconds=10)).timestamp() * 1000),
+    }
+    assert client.post("/api/traccar/positions", json=[fix], headers=HEADERS).json()["saved"] == 1
+    sos = {
+        "event": {"deviceId": 45001, "type": "alarm", "attributes": {"alarm": "sos"}, "eventTime": (now + timedelta(seconds=5)).isoformat()},
+        "position": {"fixTime": (now - timedelta(seconds=20)).isoformat()},
+    }
+    assert client.post("/api/traccar/events", json=sos, headers=HEADERS).json()["saved"] == 1
+
+    db = SessionLocal()
+    try:
+        pos = db.query(Position).filter(Position.device_id == device_id).one()
+        assert pos.received_at is not None
+    finally:
+        db.close()
+
+    headers = _auth_header(client)
+    latency = client.get("/api/admin/ingest/latency", headers=headers).json()
+    positions = latency["positions"]
+    assert list(positions) == ["device_to_traccar", "traccar_to_receive", "receive_to_commit", "commit_to_fanout", "end_to_end"]
+    assert 19 <= positions["device_to_traccar"]["p50_s"] <= 21
+    assert 9 <= positions["traccar_to_receive"]["p50_s"] <= 15
+    assert positions["end_to_end"]["p99_s"] >= 30 and positions["end_to_end"]["count"] == 1
+    # the event time is ahead of our clock: clamped to zero and counted as skew
+    assert latency["sos"]["traccar_to_receive"] == {**latency["sos"]["traccar_to_receive"], "p50_s": 0.0, "skewed": 1}
+    assert latency["sos"]["end_to_end"]["p50_s"] >= 20
+    assert latency["events"]["receive_to_commit"]["count"] == 1
+
+    metrics = client.get("/metrics", headers=METRICS_HEADERS).text
+    assert 'bantay_ingest_latency_seconds_count{kind="sos",stage="end_to_end"} 1' in metrics
+
+    cg = _auth_header(client, "cg@example.com", "cgpass")
+    assert client.get("/api/admin/ingest/latency", headers=cg).status_code == 403
+    assert client.delete("/api/admin/ingest/latency", headers=headers).json() == {"ok": True}
+    assert client.get("/api/admin/ingest/latency", headers=headers).json() == {}
@@ -0,0 +1,102 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from db.session import SessionLocal
+from models.device import Device
+from models.event import Event
+
+
+def _auth_header(client, email="admin@example.com", password="adminpass"):
+    resp = client.post("/api/auth/login", json={"email": email, "password": password})
+    assert resp.status_code == 200
+    token = resp.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_alerts_cursor_walks_past_page_cap(client, admin_user):
+    base = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    db = SessionLocal()
+    try:
+        dev = Device(unique_id=f"DEV-{uuid.uuid4()}", name="Keyset Device")
+        db.add(dev)
+        db.commit()
+        db.refresh(dev)
+        # two events share a timestamp to exercise the id tie-breaker
+        stamps = [base + timedelta(minutes=i // 2) for i in range(7)]
+        db.add_all([Event(device_id=dev.id, event_type="deviceOnline", timestamp=ts) for ts in stamps])
+        db.commit()
+        device_id = dev.id
+    finally:
+        db.close()
+
+    headers = _auth_header(client)
+    seen = []
+    cursor = None
+    while True:
+        params = {"device_id": device_id, "limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        resp = client.get("/api/admin/alerts", params=params, headers=headers)
+        assert resp.status_code == 200
+        seen.extend(a["id"] for a in resp.json())
+        cursor = resp.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert len(seen) == 7
+    assert len(set(seen)) == 7
+    assert seen == sorted(seen, reverse=True)
+
+    window = client.get(
+        "/api/admin/alerts",
+        params={"device_id": device_id, "since": "2020-01-01T00:01:00Z", "until": "2020-01-01T00:02:00Z"},
+        headers=headers,
+    )
+    assert window.status_code == 200
+    assert len(window.json()) == 4
+    # the same window written with an offset is converted to UTC, not taken as UTC wall time
+    offset = client.get(
+        "/api/admin/alerts",
+        params={"device_id": device_id, "since": "2020-01-01T08:01:00+08:00", "until": "2020-01-01T08:02:00+08:00"},
+        headers=headers,
+    )
+    assert [a["id"] for a in offset.json()] == [a["id"] for a in window.json()]
+
+    bad = client.get("/api/admin/alerts", params={"since": "yesterday"}, headers=headers)
+    assert bad.status_code == 400
+
+
+def test_alerts_cursor_with_server_default_and_null_timestamps(client, admin_user):
+    db = SessionLocal()
+    try:
+        dev = Device(unique_id=f"DEV-{uuid.uuid4()}", name="Keyset Defaults")
+        db.add(dev)
+        db.commit()
+        db.refresh(dev)
+        # CURRENT_TIMESTAMP has no fraction, unlike values SQLAlchemy writes
+        db.add_all([Event(device_id=dev.id, event_type="deviceOnline") for _ in range(7)])
+        db.add(Event(device_id=dev.id, event_type="deviceOnline", timestamp=datetime.now(timezone.utc)))
+        db.commit()
+        db.execute(Event.__table__.update().where(Event.id.in_(
+            [e.id for e in db.query(Event).filter(Event.device_id == dev.id).order_by(Event.id).limit(2)]
+        )).values(timestamp=None))
+        db.commit()
+        device_id = dev.id
+    finally:
+        db.close()
+
+    headers = _auth_header(client)
+    seen, cursors = [], []
+    cursor = None
+    while len(cursors) < 10:
+        params = {"device_id": device_id, "limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        resp = client.get("/api/admin/alerts", params=params, headers=headers)
+        assert resp.status_code == 200
+        seen.extend(a["id"] for a in resp.json())
+        cursor = resp.headers.get("x-next-cursor")
+        if not cursor:
+            break
+        cursors.append(cursor)
+    assert len(cursors) == len(set(cursors)) == 2
+    assert sorted(seen) == sorted(set(seen)) and len(seen) == 8
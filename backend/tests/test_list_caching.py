@@ -0,0 +1,63 @@
+import uuid
+
+from db.session import SessionLocal
+from models.device import Device
+
+
+def _auth_header(client, email="admin@example.com", password="adminpass"):
+    resp = client.post("/api/auth/login", json={"email": email, "password": password})
+    assert resp.status_code == 200
+    token = resp.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_device_list_etag_and_not_modified(client, admin_user, monkeypatch):
+    monkeypatch.setenv("BANTAY_SKIP_TRACCAR", "1")
+    headers = _auth_header(client)
+    first = client.get("/api/admin/devices", headers=headers)
+    assert first.status_code == 200
+    etag = first.headers.get("etag")
+    assert etag and etag.startswith('"')
+
+    again = client.get("/api/admin/devices", headers={**headers, "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+
+    # an admin mutation bumps the counter and invalidates the tag
+    resp = client.post("/api/admin/devices", json={"unique_id": f"DEV-{uuid.uuid4()}", "name": "Etag Device"}, headers=headers)
+    assert resp.status_code == 200
+    changed = client.get("/api/admin/devices", headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers.get("etag") != etag
+
+
+def test_device_list_keyset_pagination(client, admin_user):
+    headers = _auth_header(client)
+    db = SessionLocal()
+    try:
+        for i in range(3):
+            db.add(Device(unique_id=f"DEV-{uuid.uuid4()}", name=f"Page Device {i}"))
+        db.commit()
+        total = db.query(Device).count()
+    finally:
+        db.close()
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        resp = client.get("/api/admin/devices", params=params, headers=headers)
+        assert resp.status_code == 200
+        page = resp.json()
+        assert len(page) <= 2
+        seen.extend(d["id"] for d in page)
+        cursor = resp.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert seen == sorted(seen)
+    assert len(seen) == total
+
+    bad = client.get("/api/admin/devices", params={"cursor": "!!!"}, headers=headers)
+    assert bad.status_code == 400
@@ -0,0 +1,50 @@
+import io
+import json
+import logging
+
+from core.logging_config import Sampler, SummaryCounter, configure_logging, log_fields, shutdown_logging
+
+HEADERS = {"Authorization": "Bearer test-traccar-secret"}
+
+
+def test_sampler_and_summary_counter(caplog):
+    sample = Sampler(every=3)
+    assert [sample() for _ in range(7)] == [True, False, False, True, False, False, True]
+
+    logger = logging.getLogger("tests.summary")
+    summary = SummaryCounter(logger, "ingest", interval_seconds=3600)
+    with caplog.at_level(logging.INFO, logger="tests.summary"):
+        summary.add(saved=2)
+        summary.add(saved=3, unknown=1)
+        assert caplog.records == []
+        summary._interval = 0
+        summary.add(saved=1)
+    (record,) = caplog.records
+    assert record.fields["saved"] == 6 and record.fields["unknown"] == 1
+    assert record.getMessage().startswith("ingest seconds=")
+
+
+def test_json_output_through_queue():
+    root = logging.getLogger()
+    level = root.level
+    stream = io.StringIO()
+    configure_logging(level="DEBUG", fmt="json", stream=stream)
+    try:
+        log_fields(logging.getLogger("tests.json"), logging.INFO, "batch", saved=3)
+        logging.getLogger("tests.json").debug("plain %s", "line")
+    finally:
+        shutdown_logging()
+        root.setLevel(level)
+    first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert first["event"] == "batch" and first["saved"] == 3 and first["level"] == "INFO"
+    assert second["message"] == "plain line" and second["logger"] == "tests.json"
+
+
+def test_ingest_logs_batch_summary_instead_of_printing(client, capsys, caplog):
+    payload = [{"deviceId": 99999001, "latitude": 14.0, "longitude": 121.0}, "junk"]
+    with caplog.at_level(logging.DEBUG, logger="routers.traccar"):
+        resp = client.post("/api/traccar/positions", json=payload, headers=HEADERS)
+    assert resp.status_code == 200 and resp.json()["saved"] == 0
+    assert capsys.readouterr().out == ""
+    (batch,) = [r for r in caplog.records if getattr(r, "fields", {}).get("event") == "traccar positions batch"]
+    assert batch.fields["received"] == 2 and batch.fields["unknown"] == 1 and batch.fields["invalid"] == 1
@@ -0,0 +1,100 @@
+import gc
+import threading
+
+from core import config
+from core.metrics import Counter, Histogram, Registry
+from db.session import SessionLocal
+from models.device import Device
+
+HEADERS = {"Authorization": "Bearer test-traccar-secret"}
+METRICS_HEADERS = {"Authorization": "Bearer test-metrics-token"}
+
+
+def _scrape(client) -> dict:
+    resp = client.get("/metrics", headers=METRICS_HEADERS)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    values = {}
+    for line in resp.text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            values[name] = float(value)
+    return values
+
+
+def test_per_thread_counters_and_histogram_rendering():
+    registry = Registry()
+    hits = Counter("hits_total", "Hits.", ["kind"], registry=registry)
+    latency = Histogram("work_seconds", "Work.", buckets=(0.1, 1.0), registry=registry)
+
+    def work():
+        for _ in range(1000):
+            hits.labels("a").inc()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    hits.labels(kind="b").inc(2.5)
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE hits_total counter" in lines
+    assert 'hits_total{kind="a"} 4000' in lines and 'hits_total{kind="b"} 2.5' in lines
+    assert 'work_seconds_bucket{le="0.1"} 2' in lines
+    assert 'work_seconds_bucket{le="1"} 3' in lines and 'work_seconds_bucket{le="+Inf"} 4' in lines
+    assert "work_seconds_sum 3.65" in lines and "work_seconds_count 4" in lines
+
+
+def test_cells_of_finished_threads_are_folded():
+    from concurrent.futures import ThreadPoolExecutor
+
+    registry = Registry()
+    latency = Histogram("pool_seconds", "Pool work.", ["route"], buckets=(1.0,), registry=registry)
+    # a fresh executor per pass, like the outbox worker and reconcile
+    for _ in range(20):
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(lambda i: latency.labels("GET /x").observe(0.5), range(8)))
+    gc.collect()
+    child = latency.labels("GET /x")
+    assert child._cells.live_cells() <= 1
+    assert 'pool_seconds_count{route="GET /x"} 160' in registry.render().splitlines()
+
+
+def test_ingest_and_pool_metrics(client, fisher_user, monkeypatch):
+    db = SessionLocal()
+    try:
+        db.add(Device(unique_id="MET-1", name="Counter", user_id=fisher_user.id, traccar_device_id=55801))
+        db.commit()
+    finally:
+        db.close()
+
+    before = _scrape(client)
+    fix = {"deviceId": 55801, "latitude": 14.0, "longitude": 121.0, "fixTime": "2026-04-01T00:00:00+00:00"}
+    payload = [fix, dict(fix), {"deviceId": 55899, "latitude": 1.0, "longitude": 1.0}, "junk"]
+    assert client.post("/api/traccar/positions", json=payload, headers=HEADERS).json()["saved"] == 2
+    # Traccar retrying the same fix
+    assert client.post("/api/traccar/positions", json=[fix], headers=HEADERS).json()["saved"] == 1
+    after = _scrape(client)
+
+    def delta(name):
+        return after.get(name, 0.0) - before.get(name, 0.0)
+
+    assert delta('bantay_ingest_items_total{kind="positions"}') == 5
+    assert delta('bantay_ingest_accepted_total{kind="positions"}') == 3
+    assert delta('bantay_ingest_duplicates_total{kind="positions"}') == 2
+    assert delta('bantay_ingest_unknown_device_total{kind="positions"}') == 1
+    assert delta('bantay_ingest_rejected_total{kind="positions"}') == 1
+    assert delta('bantay_ingest_commit_seconds_count{kind="positions"}') == 2
+    assert delta('bantay_ingest_batch_items_bucket{kind="positions",le="5"}') == 2
+    assert "bantay_db_pool_checked_out" in after and "bantay_audit_buffered" in after
+
+    monkeypatch.setattr(config.settings, "METRICS_TOKEN", "scrape-me")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers=METRICS_HEADERS).status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-me"}).status_code == 200
+    # no token configured: the endpoint is off rather than open
+    monkeypatch.setattr(config.settings, "METRICS_TOKEN", "")
+    assert client.get("/metrics").status_code == 404
@@ -0,0 +1,95 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+from db.session import SessionLocal
+from models.device import Device
+from models.event import Event
+from utils.nearby import VesselIndex, haversine_m, vessel_index
+
+
+def _auth_header(client, email="admin@example.com", password="adminpass"):
+    resp = client.post("/api/auth/login", json={"email": email, "password": password})
+    assert resp.status_code == 200
+    token = resp.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_index_matches_brute_force():
+    rng = random.Random(7)
+    now = datetime.now(timezone.utc)
+    index = VesselIndex()
+    points = {}
+    for device_id in range(1, 400):
+        # a dense cluster plus a few far-away stragglers
+        if device_id % 50:
+            lat, lon = 14.0 + rng.uniform(-0.5, 0.5), 121.0 + rng.uniform(-0.5, 0.5)
+        else:
+            lat, lon = rng.uniform(-40, 40), rng.uniform(-170, 170)
+        ts = now - timedelta(minutes=rng.choice([1, 5, 90]))
+        index.update(device_id, lat, lon, ts)
+        points[device_id] = (lat, lon, ts)
+    # moves replace the old cell; a stale fix does not overwrite a newer one
+    index.update(1, 14.01, 121.01, now)
+    index.update(1, 30.0, 30.0, now - timedelta(days=1))
+    points[1] = (14.01, 121.01, now)
+
+    for lat, lon in [(14.0, 121.0), (14.4, 120.6), (0.0, 0.0)]:
+        for max_age in (None, 600):
+            got = index.nearest(lat, lon, k=7, max_age_seconds=max_age, exclude={2}, now=now)
+            expected = sorted(
+                (haversine_m(lat, lon, p[0], p[1]), d)
+                for d, p in points.items()
+                if d != 2 and (max_age is None or (now - p[2]).total_seconds() <= max_age)
+            )[:7]
+            assert [g["device_id"] for g in got] == [d for _, d in expected]
+
+
+def test_nearby_endpoint_and_sos_enrichment(client, admin_user, coast_guard_user, fisher_user):
+    vessel_index.clear()
+    db = SessionLocal()
+    try:
+        devices = []
+        for n in range(3):
+            dev = Device(unique_id=f"NEAR-{n}", name=f"Boat {n}", user_id=fisher_user.id, traccar_device_id=99300 + n)
+            db.add(dev)
+            devices.append(dev)
+        db.commit()
+        ids = [d.id for d in devices]
+    finally:
+        db.close()
+
+    fix = datetime.now(timezone.utc).isoformat()
+    payload = [
+        {"deviceId": 99300, "latitude": 5.000, "longitude": 125.000, "fixTime": fix},
+        {"deviceId": 99301, "latitude": 5.020, "longitude": 125.000, "fixTime": fix},
+        {"deviceId": 99302, "latitude": 5.100, "longitude": 125.100, "fixTime": fix},
+    ]
+    traccar = {"Authorization": "Bearer test-traccar-secret"}
+    assert client.post("/api/traccar/positions", json=payload, headers=traccar).status_code == 200
+
+    headers = _auth_header(client, "cg@example.com", "cgpass")
+    resp = client.get("/api/coastguard/nearby", params={"lat": 5.001, "lon": 125.0, "k": 2}, headers=headers)
+    assert resp.status_code == 200
+    body = resp.json()
+    assert [v["device_id"] for v in body] == ids[:2]
+    assert body[0]["name"] == "Boat 0" and body[0]["distance_m"] < 200
+
+    resp = client.get(
+        "/api/coastguard/nearby", params={"lat": 5.0, "lon": 125.0, "k": 1, "exclude_device_id": ids[0]}, headers=headers
+    )
+    assert [v["device_id"] for v in resp.json()] == [ids[1]]
+    assert client.get("/api/coastguard/nearby", params={"lat": 95, "lon": 0}, headers=headers).status_code == 400
+    fisher = _auth_header(client, "fisher@example.com", "fishpass")
+    assert client.get("/api/coastguard/nearby", params={"lat": 5, "lon": 125}, headers=fisher).status_code == 403
+
+    sos = {"type": "alarm", "deviceId": 99300, "attributes": {"alarm": "sos"}}
+    assert client.post("/api/traccar/events", json=sos, headers=traccar).json()["saved"] == 1
+    db = SessionLocal()
+    try:
+        ev = db.query(Event).filter(Event.device_id == ids[0]).order_by(Event.id.desc()).first()
+        assert ev.attributes["alarm"] == "sos"
+        nearby = [v["device_id"] for v in ev.attributes["nearby"]]
+        assert nearby[:2] == [ids[1], ids[2]]
+        assert ev.attributes["nearbyOrigin"] == {"latitude": 5.0, "longitude": 125.0}
+    finally:
+        db.close()
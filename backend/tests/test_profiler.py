@@ -0,0 +1,46 @@
+import threading
+
+from core import config
+from core.profiler import sampler
+
+
+def _auth_header(client, email="admin@example.com", password="adminpass"):
+    resp = client.post("/api/auth/login", json={"email": email, "password": password})
+    assert resp.status_code == 200
+    token = resp.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _spin_for_profile(stop: threading.Event):
+    n = 0
+    while not stop.is_set():
+        n += 1
+
+
+def test_profile_endpoint_samples_busy_thread(client, admin_user, coast_guard_user, monkeypatch):
+    headers = _auth_header(client)
+    monkeypatch.setattr(config.settings, "PROFILER_COOLDOWN_SECONDS", 60.0)
+    monkeypatch.setattr(sampler, "_finished_at", None)
+    stop = threading.Event()
+    busy = threading.Thread(target=_spin_for_profile, args=(stop,), name="busy-worker")
+    busy.start()
+    try:
+        resp = client.post("/api/admin/profile", params={"seconds": 0.3, "interval_ms": 5}, headers=headers)
+    finally:
+        stop.set()
+        busy.join()
+    assert resp.status_code == 200 and resp.headers["content-type"].startswith("text/plain")
+    lines = resp.text.splitlines()
+    spin = [line for line in lines if line.startswith("busy-worker;") and "test_profiler:_spin_for_profile" in line]
+    assert spin and all(int(line.rsplit(" ", 1)[1]) > 0 for line in spin)
+
+    again = client.post("/api/admin/profile", params={"seconds": 0.1}, headers=headers)
+    assert again.status_code == 429 and int(again.headers["retry-after"]) > 0
+
+    monkeypatch.setattr(config.settings, "PROFILER_COOLDOWN_SECONDS", 0.0)
+    body = client.post("/api/admin/profile", params={"seconds": 0.05, "format": "json"}, headers=headers).json()
+    assert body["samples"] >= 1 and isinstance(body["stacks"], list)
+
+    assert client.post("/api/admin/profile", params={"seconds": 600}, headers=headers).status_code == 400
+    cg = _auth_header(client, "cg@example.com", "cgpass")
+    assert client.post("/api/admin/profile", params={"seconds": 0.1}, headers=cg).status_code == 403
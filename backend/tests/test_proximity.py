@@ -0,0 +1,168 @@
+import math
+
+import pytest
+from sqlalchemy.orm import Session
+
+from db.session import SessionLocal
+from models.device import Device
+from models.event import Event
+from models.geofence import Geofence
+from models.position import Position
+from utils import proximity
+from utils.etag import bump_version
+from utils.geometry import compile_area, geojson_to_wkt
+
+SQUARE = [[120.0, 14.0], [120.1, 14.0], [120.1, 14.1], [120.0, 14.1], [120.0, 14.0]]
+HOLE = [[120.04, 14.04], [120.06, 14.04], [120.06, 14.06], [120.04, 14.06], [120.04, 14.04]]
+# one degree of latitude in metres
+DEG = 111195.08
+
+BACKENDS = ["python"] + (["numpy"] if proximity.np is not None else [])
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch):
+    if request.param == "python":
+        monkeypatch.setattr(proximity, "np", None)
+    return request.param
+
+
+def test_signed_distance_to_boundary_and_holes(backend):
+    compiled = compile_area(geojson_to_wkt({"type": "Polygon", "coordinates": [SQUARE, HOLE]}))
+    points = [
+        (14.015, 120.02),  # inside, nearest to the south edge
+        (13.99, 120.05),  # south of the square
+        (14.05, 120.05),  # centre of the hole
+        (14.095, 120.05),  # just inside the north edge
+    ]
+    got = proximity.signed_distances(compiled, points)
+    assert got[0] == pytest.approx(0.015 * DEG, rel=0.01)
+    assert got[1] == pytest.approx(-0.01 * DEG, rel=0.01)
+    # the hole is square in degrees, so its east/west edges are nearer in metres
+    assert got[2] == pytest.approx(-0.01 * DEG * math.cos(math.radians(14.05)), rel=0.01)
+    assert got[3] == pytest.approx(0.005 * DEG, rel=0.01)
+    assert proximity.signed_distance(compiled, 14.05, 119.9) < 0
+
+
+def test_many_vertices_match_brute_force(backend):
+    # a jagged ring with enough edges to span several segment blocks
+    ring = [[120.0 + i * 0.001, 14.0 + (0.002 if i % 2 else 0.0)] for i in range(101)]
+    ring += [[120.1, 14.1], [120.0, 14.1], [120.0, 14.0]]
+    compiled = compile_area(geojson_to_wkt({"type": "Polygon", "coordinates": [ring]}))
+    assert compiled.planar().block_count > 3
+    points = [(14.0 + 0.0013 * k, 120.0 + 0.0077 * k) for k in range(-3, 17)]
+
+    pl = compiled.planar()
+
+    def brute(lat, lon):
+        x, y = pl.project(lat, lon)
+        best = min(
+            _segment_distance(x, y, pl.xs[j], pl.ys[j], pl.xs[j + 1], pl.ys[j + 1])
+            for j in range(len(pl.xs) - 1)
+        )
+        return best if compiled.contains(lat, lon) else -best
+
+    assert proximity.signed_distances(compiled, points) == pytest.approx([brute(*p) for p in points], abs=1e-6)
+
+
+def _segment_distance(x, y, ax, ay, bx, by):
+    ex, ey = bx - ax, by - ay
+    t = max(0.0, min(1.0, ((x - ax) * ex + (y - ay) * ey) / (ex * ex + ey * ey)))
+    return ((ax + t * ex - x) ** 2 + (ay + t * ey - y) ** 2) ** 0.5
+
+
+def test_ingest_emits_one_approach_event_per_pass(client, fisher_user, monkeypatch):
+    from core import config
+
+    monkeypatch.setattr(config.settings, "GEOFENCE_APPROACH_METERS", 500.0)
+    proximity.monitor.reset()
+    db = SessionLocal()
+    try:
+        g = Geofence(name="Approach", area=geojson_to_wkt({"type": "Polygon", "coordinates": [SQUARE]}))
+        db.add(g)
+        db.flush()
+        bump_version(db, "geofences")
+        dev = Device(unique_id="approach-dev", traccar_device_id=88101, user_id=fisher_user.id, geofence_id=g.id)
+        db.add(dev)
+        db.commit()
+        device_id = dev.id
+    finally:
+        db.close()
+
+    headers = {"Authorization": "Bearer test-traccar-secret"}
+
+    def send(*coords):
+        payload = [{"deviceId": 88101, "latitude": lat, "longitude": lon} for lat, lon in coords]
+        resp = client.post("/api/traccar/positions", json=payload, headers=headers)
+        assert resp.status_code == 200
+        return resp.json()["events"]
+
+    # centre, then ~330 m inside the north edge twice: one alert
+    assert send((14.05, 120.05), (14.097, 120.05), (14.0975, 120.05)) == 1
+    # crossing while still near does not repeat
+    assert send((14.102, 120.05)) == 0
+    # moving well away re-arms; coming back alerts again from outside
+    assert send((14.2, 120.05)) == 0
+    assert send((14.103, 120.05)) == 1
+
+    db = SessionLocal()
+    try:
+        events = (
+            db.query(Event)
+            .filter(Event.device_id == device_id, Event.event_type == "geofenceApproach")
+            .order_by(Event.id)
+            .all()
+        )
+        assert len(events) == 2
+        first, second = events[0].attributes, events[1].attributes
+        assert first["inside"] is True and 0 < first["distance"] <= 500
+        assert second["inside"] is False and -500 <= second["distance"] < 0
+    finally:
+        db.close()
+
+
+def test_proximity_failure_keeps_positions_and_lost_commit_keeps_device_armed(client, fisher_user, monkeypatch):
+    from core import config
+
+    monkeypatch.setattr(config.settings, "GEOFENCE_APPROACH_METERS", 500.0)
+    proximity.monitor.reset()
+    db = SessionLocal()
+    try:
+        g = Geofence(name="Approach 2", area=geojson_to_wkt({"type": "Polygon", "coordinates": [SQUARE]}))
+        db.add(g)
+        db.flush()
+        bump_version(db, "geofences")
+        dev = Device(unique_id="approach-dev-2", traccar_device_id=88102, user_id=fisher_user.id, geofence_id=g.id)
+        db.add(dev)
+        db.commit()
+        device_id = dev.id
+    finally:
+        db.close()
+
+    headers = {"Authorization": "Bearer test-traccar-secret"}
+
+    def send(lat, lon):
+        return client.post("/api/traccar/positions", json=[{"deviceId": 88102, "latitude": lat, "longitude": lon}], headers=headers).json()
+
+    def broken(db, ids):
+        raise RuntimeError("geofence lookup failed")
+
+    with monkeypatch.context() as m:
+        m.setattr(proximity.geofence_cache, "get_many", broken)
+        body = send(14.097, 120.05)
+        assert body["saved"] == 1 and body["events"] == 0
+    # the commit that would store the alert fails: the device must not be marked near
+    with monkeypatch.context() as m:
+
+        def failing_commit(self):
+            raise RuntimeError("database went away")
+
+        m.setattr(Session, "commit", failing_commit)
+        assert send(14.097, 120.05)["saved"] == 0
+    assert send(14.097, 120.05)["events"] == 1
+
+    db = SessionLocal()
+    try:
+        assert db.query(Position).filter(Position.device_id == device_id).count() == 2
+    finally:
+        db.close()
@@ -0,0 +1,166 @@
+import gzip
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from core import config
+from db.session import SessionLocal
+from models.device import Device
+from models.position import Position
+from utils import retention
+from utils.retention import LeaseLost, acquire_lease, run_retention
+
+T0 = datetime(2020, 1, 1, 0, 0, tzinfo=timezone.utc)
+NOW = T0 + timedelta(days=10)
+
+
+def _auth_header(client, email="admin@example.com", password="adminpass"):
+    resp = client.post("/api/auth/login", json={"email": email, "password": password})
+    assert resp.status_code == 200
+    token = resp.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _timestamps(device_id):
+    db = SessionLocal()
+    try:
+        rows = db.query(Position.timestamp).filter(Position.device_id == device_id).order_by(Position.timestamp).all()
+        return [(r.timestamp - T0.replace(tzinfo=None)).total_seconds() for r in rows]
+    finally:
+        db.close()
+
+
+def test_downsample_archive_and_history(client, coast_guard_user, fisher_user, monkeypatch, tmp_path):
+    monkeypatch.setattr(config.settings, "RETENTION_RAW_DAYS", 1)
+    monkeypatch.setattr(config.settings, "RETENTION_DOWNSAMPLE_SECONDS", 60)
+    monkeypatch.setattr(config.settings, "RETENTION_ARCHIVE_DAYS", 20)
+    monkeypatch.setattr(config.settings, "RETENTION_ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(config.settings, "RETENTION_BATCH_SIZE", 7)
+
+    db = SessionLocal()
+    try:
+        dev = Device(unique_id="RET-1", name="Keeper", user_id=fisher_user.id)
+        db.add(dev)
+        db.commit()
+        device_id = dev.id
+        # a fix every 10 s for five minutes, with one alarm in the middle
+        for i in range(30):
+            db.add(Position(device_id=device_id, latitude=14.0 + i * 1e-4, longitude=121.0, timestamp=T0 + timedelta(seconds=10 * i)))
+        db.add(Position(device_id=device_id, latitude=14.5, longitude=121.0, timestamp=T0 + timedelta(seconds=125), attributes={"alarm": "sos"}))
+        # three weeks older: past the archive window
+        for m in range(3):
+            db.add(Position(device_id=device_id, latitude=13.0, longitude=121.0 + m * 0.01, timestamp=T0 - timedelta(days=17, minutes=-m)))
+        db.commit()
+    finally:
+        db.close()
+
+    db = SessionLocal()
+    try:
+        preview = run_retention(db, now=NOW, dry_run=True)
+    finally:
+        db.close()
+    assert preview["downsample"]["deleted"] == 25 and preview["archive"]["archived"] == 3
+    assert len(_timestamps(device_id)) == 34 and not os.listdir(tmp_path)
+
+    db = SessionLocal()
+    try:
+        report = run_retention(db, now=NOW)
+    finally:
+        db.close()
+    assert report["downsample"]["deleted"] == 25
+    assert report["archive"] == {"until": (NOW - timedelta(days=20)).isoformat(), "archived": 3, "files": 1}
+    # first fix of each minute plus the alarm point survive
+    assert _timestamps(device_id) == [0, 60, 120, 125, 180, 240]
+
+    path = tmp_path / "positions" / str(device_id) / "2019-12.ndjson.gz"
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        archived = [json.loads(line) for line in fh]
+    assert [a["longitude"] for a in archived] == [121.0, 121.01, 121.02]
+
+    # a second run has nothing left to do
+    db = SessionLocal()
+    try:
+        again = run_retention(db, now=NOW)
+    finally:
+        db.close()
+    assert again["downsample"]["deleted"] == 0 and again["archive"]["archived"] == 0
+
+    window = {"start": (T0 - timedelta(days=18)).isoformat(), "end": (T0 + timedelta(hours=1)).isoformat()}
+    headers = _auth_header(client, "cg@example.com", "cgpass")
+    resp = client.get("/api/coastguard/history", params={"device_id": device_id, **window}, headers=headers)
+    assert resp.status_code == 200
+    body = resp.json()
+    assert len(body) == 9
+    assert [p["latitude"] for p in body[:3]] == [13.0, 13.0, 13.0] and body[3]["latitude"] == 14.0
+
+    fisher = _auth_header(client, "fisher@example.com", "fishpass")
+    mine = client.get("/api/fisherfolk/history", params={"device_id": device_id, **window}, headers=fisher)
+    assert mine.status_code == 200 and [p["id"] for p in mine.json()] == [p["id"] for p in body]
+
+    # exports include the archived fixes too, with or without a window
+    exported = client.get("/api/export/history", params={"device_id": device_id, "format": "geojson", **window}, headers=headers)
+    assert [f["properties"]["id"] for f in exported.json()["features"]] == [p["id"] for p in body]
+    whole = client.get("/api/export/history", params={"device_id": device_id}, headers=headers).text.splitlines()
+    assert len(whole) == 1 + 9 and whole[1].split(",")[2] == "13.0"
+
+
+def test_retention_lease_allows_one_run_at_a_time(monkeypatch, tmp_path):
+    monkeypatch.setattr(config.settings, "RETENTION_ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(config.settings, "RETENTION_LEASE_SECONDS", 600)
+    now = datetime.now(timezone.utc)
+    db = SessionLocal()
+    try:
+        lease = acquire_lease(db, "worker-1", now=now)
+        assert lease is not None
+        assert acquire_lease(db, "worker-2", now=now + timedelta(seconds=1)) is None
+        # the scheduler in another worker skips its run while the lease is held
+        assert retention.scheduler.run_once()["skipped"] is True
+        # renewing pushes the expiry forward
+        lease.renew(now=now + timedelta(seconds=500))
+        assert acquire_lease(db, "worker-2", now=now + timedelta(seconds=700)) is None
+        lease.release()
+        assert acquire_lease(db, "worker-2", now=now + timedelta(seconds=2)) is not None
+        # a holder that died is taken over once the lease expires
+        late = acquire_lease(db, "worker-3", now=now + timedelta(seconds=700))
+        assert late is not None
+        late.release()
+    finally:
+        db.close()
+
+
+def test_run_stops_when_the_lease_is_taken_over(fisher_user, monkeypatch, tmp_path):
+    monkeypatch.setattr(config.settings, "RETENTION_RAW_DAYS", 0)
+    monkeypatch.setattr(config.settings, "RETENTION_ARCHIVE_DAYS", 20)
+    monkeypatch.setattr(config.settings, "RETENTION_ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(config.settings, "RETENTION_BATCH_SIZE", 2)
+    monkeypatch.setattr(config.settings, "RETENTION_LEASE_SECONDS", 600)
+    db = SessionLocal()
+    try:
+        dev = Device(unique_id="RET-LEASE", name="Overrun", user_id=fisher_user.id)
+        db.add(dev)
+        db.commit()
+        device_id = dev.id
+        for m in range(5):
+            db.add(Position(device_id=device_id, latitude=13.0, longitude=121.0, timestamp=T0 - timedelta(days=400, minutes=-m)))
+        db.commit()
+    finally:
+        db.close()
+
+    now = datetime.now(timezone.utc)
+    db = SessionLocal()
+    other = SessionLocal()
+    try:
+        # the run outlives its lease and a second worker takes over
+        lease = acquire_lease(db, "slow-worker", now=now - timedelta(seconds=700))
+        assert acquire_lease(other, "worker-2", now=now) is not None
+        with pytest.raises(LeaseLost):
+            run_retention(db, now=NOW, lease=lease)
+        # nothing after the first batch was touched, and the new owner's lease stands
+        assert len(_timestamps(device_id)) >= 3
+        lease.release()
+        assert acquire_lease(other, "worker-3", now=now + timedelta(seconds=1)) is None
+    finally:
+        db.close()
+        other.close()
@@ -0,0 +1,133 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import manage
+from db.session import SessionLocal
+from models.device import Device
+from models.position_rollup import PositionRollup
+from utils.geometry import haversine_m
+
+T0 = datetime(2026, 2, 10, 22, 40, tzinfo=timezone.utc)
+HEADERS = {"Authorization": "Bearer test-traccar-secret"}
+METRICS_HEADERS = {"Authorization": "Bearer test-metrics-token"}
+
+
+def _auth_header(client, email="admin@example.com", password="adminpass"):
+    resp = client.post("/api/auth/login", json={"email": email, "password": password})
+    assert resp.status_code == 200
+    token = resp.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _send(client, traccar_id, *points):
+    payload = [
+        {
+            "deviceId": traccar_id,
+            "latitude": lat,
+            "longitude": lon,
+            "speed": speed,
+            "batteryPercent": battery,
+            "fixTime": (T0 + timedelta(minutes=m)).isoformat(),
+        }
+        for m, lat, lon, speed, battery in points
+    ]
+    resp = client.post("/api/traccar/positions", json=payload, headers=HEADERS)
+    assert resp.status_code == 200 and resp.json()["ok"] is True
+
+
+def _rollups(device_id):
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(PositionRollup)
+            .filter(PositionRollup.device_id == device_id)
+            .order_by(PositionRollup.bucket, PositionRollup.bucket_start)
+            .all()
+        )
+        return {(r.bucket, r.bucket_start.strftime("%d %H")): r for r in rows}
+    finally:
+        db.close()
+
+
+def test_ingest_rollups_backfill_and_endpoints(client, coast_guard_user, fisher_user, capsys):
+    db = SessionLocal()
+    try:
+        dev = Device(unique_id="ROLL-1", name="Roller", user_id=fisher_user.id, traccar_device_id=66401)
+        db.add(dev)
+        db.commit()
+        device_id = dev.id
+    finally:
+        db.close()
+
+    # 22:40 and 22:50 on the 10th, then 23:10 and 00:20 on the 11th, over two batches
+    points = [(0, 14.0, 121.0, 4.0, 90), (10, 14.01, 121.0, 6.0, 88), (30, 14.02, 121.01, 8.0, 87), (100, 14.03, 121.01, 2.0, 80)]
+    _send(client, 66401, *points[:2])
+    _send(client, 66401, *points[2:])
+
+    rows = _rollups(device_id)
+    assert sorted(rows) == [("day", "10 00"), ("day", "11 00"), ("hour", "10 22"), ("hour", "10 23"), ("hour", "11 00")]
+    h22 = rows[("hour", "10 22")]
+    assert h22.count == 2 and h22.max_speed == 6.0 and h22.min_battery == 88
+    assert h22.distance_m == pytest.approx(haversine_m(14.0, 121.0, 14.01, 121.0))
+    assert (h22.first_latitude, h22.last_latitude) == (14.0, 14.01)
+    # the step across the batch boundary is attributed to the later fix
+    h23 = rows[("hour", "10 23")]
+    assert h23.count == 1 and h23.distance_m == pytest.approx(haversine_m(14.01, 121.0, 14.02, 121.01))
+    day10 = rows[("day", "10 00")]
+    assert day10.count == 3 and day10.speed_sum / day10.speed_count == pytest.approx(6.0)
+    assert [day10.min_latitude, day10.max_latitude, day10.max_longitude] == [14.0, 14.02, 121.01]
+    before = {k: (r.count, round(r.distance_m, 6), r.min_battery) for k, r in rows.items()}
+
+    capsys.readouterr()
+    assert manage.main(["backfill-rollups", "--device-id", str(device_id)]) == 0
+    report = json.loads(capsys.readouterr().out)
+    assert report["positions"] == 4 and report["rollups_deleted"] == 5
+    assert {k: (r.count, round(r.distance_m, 6), r.min_battery) for k, r in _rollups(device_id).items()} == before
+
+    headers = _auth_header(client, "cg@example.com", "cgpass")
+    window = {"since": "2026-02-10T00:00:00+00:00", "until": "2026-02-12T00:00:00+00:00"}
+    resp = client.get("/api/coastguard/rollups", params={"device_id": device_id, "bucket": "hour", **window}, headers=headers)
+    assert resp.status_code == 200
+    assert [r["count"] for r in resp.json()] == [2, 1, 1]
+    assert resp.json()[0]["avg_speed"] == pytest.approx(5.0)
+
+    resp = client.get("/api/coastguard/rollups/summary", params={"bucket": "day", **window}, headers=headers)
+    assert resp.status_code == 200
+    assert [(r["count"], r["active_devices"]) for r in resp.json()] == [(3, 1), (1, 1)]
+    assert client.get("/api/coastguard/rollups", params={"bucket": "week"}, headers=headers).status_code == 400
+
+    fisher = _auth_header(client, "fisher@example.com", "fishpass")
+    mine = client.get("/api/fisherfolk/rollups", params={"device_id": device_id, **window}, headers=fisher)
+    assert mine.status_code == 200 and [r["count"] for r in mine.json()] == [3, 1]
+
+
+def test_rollup_failure_keeps_positions(client, fisher_user, monkeypatch):
+    import routers.traccar as traccar_router
+    from models.position import Position
+    from models.trip_state import TripState
+
+    db = SessionLocal()
+    try:
+        dev = Device(unique_id="ROLLUP-FAIL", name="Rollup Fail", user_id=fisher_user.id, traccar_device_id=88201)
+        db.add(dev)
+        db.commit()
+        device_id = dev.id
+    finally:
+        db.close()
+
+    def broken(db, positions):
+        raise RuntimeError("rollup bug")
+
+    monkeypatch.setattr(traccar_router, "rollup_positions", broken)
+    _send(client, 88201, (0, 14.0, 121.0, 0.0, 90), (5, 14.01, 121.0, 6.0, 89))
+    db = SessionLocal()
+    try:
+        assert db.query(Position).filter(Position.device_id == device_id).count() == 2
+        # the savepoint holds trips and rollups together: both roll back
+        assert db.query(TripState).filter(TripState.device_id == device_id).count() == 0
+    finally:
+        db.close()
+    assert _rollups(device_id) == {}
+    assert 'bantay_ingest_derived_failed_total{feature="rollups"}' in client.get("/metrics", headers=METRICS_HEADERS).text
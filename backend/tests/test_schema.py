@@ -0,0 +1,39 @@
+import pathlib
+
+import pytest
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, text
+
+from core import config
+from db.schema import HEAD_REVISION, SchemaOutOfDate, current_revision, verify_head
+from db.seed import seed_defaults
+from models.role import Role
+
+ALEMBIC_DIR = pathlib.Path(__file__).resolve().parents[2] / "alembic"
+
+
+def test_head_revision_matches_migrations():
+    assert ScriptDirectory(str(ALEMBIC_DIR)).get_heads() == [HEAD_REVISION]
+
+
+def test_verify_head(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'schema.db'}")
+    assert current_revision(engine) is None
+    with pytest.raises(SchemaOutOfDate, match="missing"):
+        verify_head(engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)"))
+        conn.execute(text("INSERT INTO alembic_version VALUES ('0012_position_rollups')"))
+    with pytest.raises(SchemaOutOfDate, match="0012_position_rollups"):
+        verify_head(engine)
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE alembic_version SET version_num = :head"), {"head": HEAD_REVISION})
+    assert verify_head(engine) == HEAD_REVISION
+
+
+def test_seed_defaults_is_idempotent(db_session, admin_user, monkeypatch):
+    monkeypatch.setattr(config.settings, "ADMIN_EMAIL", "admin@example.com")
+    report = seed_defaults(db_session)
+    assert report["roles"] == ["administrator", "coast_guard", "fisherfolk"] and report["admin"] == "exists"
+    assert seed_defaults(db_session, create_admin=False)["admin"] == "skipped"
+    assert db_session.query(Role).count() == 3
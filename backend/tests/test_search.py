@@ -0,0 +1,138 @@
+import importlib.util
+import pathlib
+import subprocess
+import sys
+import uuid
+from datetime import datetime, timezone
+
+from db.search import rebuild_ddl, search_backend, search_ddl
+from db.session import SessionLocal
+from models.device import Device
+from models.event import Event
+from models.log import Log
+
+
+def _auth_header(client, email="admin@example.com", password="adminpass"):
+    resp = client.post("/api/auth/login", json={"email": email, "password": password})
+    assert resp.status_code == 200
+    token = resp.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_sqlite_uses_fts_backend(db_session):
+    assert search_backend(db_session) == "fts5"
+
+
+def test_migration_ddl_matches_create_mode():
+    path = pathlib.Path(__file__).resolve().parents[2] / "alembic" / "versions" / "0007_search_indexes.py"
+    spec = importlib.util.spec_from_file_location("search_migration", path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    assert migration.SQLITE_UPGRADE == search_ddl("sqlite") + rebuild_ddl("sqlite")
+    assert migration.POSTGRESQL_UPGRADE == list(dict.fromkeys(search_ddl("postgresql")))
+
+
+def test_alert_search_matches_substrings_and_device_names(client, admin_user, fisher_user):
+    marker = uuid.uuid4().hex[:8]
+    db = SessionLocal()
+    try:
+        dev = Device(unique_id=f"DEV-{uuid.uuid4()}", name=f"Bangka {marker}", user_id=fisher_user.id)
+        db.add(dev)
+        db.commit()
+        db.refresh(dev)
+        ev = Event(device_id=dev.id, event_type=f"alarm:Custom{marker}", timestamp=datetime.now(timezone.utc))
+        other = Event(device_id=dev.id, event_type="deviceOnline", timestamp=datetime.now(timezone.utc))
+        db.add_all([ev, other])
+        db.commit()
+        ev_id, other_id = ev.id, other.id
+    finally:
+        db.close()
+
+    headers = _auth_header(client)
+    # case-insensitive substring of the event type
+    resp = client.get("/api/admin/alerts", params={"q": f"CUSTOM{marker.upper()}"}, headers=headers)
+    assert resp.status_code == 200
+    assert {a["id"] for a in resp.json()} == {ev_id}
+
+    # device name matches return every alert of that device
+    resp = client.get("/api/admin/alerts", params={"q": f"bangka {marker}"}, headers=headers)
+    assert {a["id"] for a in resp.json()} == {ev_id, other_id}
+
+
+def test_log_search_follows_updates_and_deletes(client, admin_user):
+    marker = uuid.uuid4().hex[:8]
+    db = SessionLocal()
+    try:
+        entry = Log(table_name=f"tbl_{marker}", record_id=1, action="create")
+        db.add(entry)
+        db.commit()
+        entry_id = entry.id
+    finally:
+        db.close()
+
+    headers = _auth_header(client)
+    resp = client.get("/api/admin/logs", params={"q": marker}, headers=headers)
+    assert [l["id"] for l in resp.json()] == [entry_id]
+
+    db = SessionLocal()
+    try:
+        db.query(Log).filter(Log.id == entry_id).update({Log.table_name: "renamed"})
+        db.commit()
+    finally:
+        db.close()
+    resp = client.get("/api/admin/logs", params={"q": marker}, headers=headers)
+    assert resp.json() == []
+
+
+def test_create_mode_indexes_existing_rows(tmp_path):
+    from sqlalchemy import create_engine, text
+
+    from db.base import Base
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        # a database from before the search indexes: rows exist, shadow tables do not
+        for suffix in ("ai", "ad", "au"):
+            conn.execute(text(f"DROP TRIGGER events_fts_{suffix}"))
+        conn.execute(text("DROP TABLE events_fts"))
+        conn.execute(text("INSERT INTO devices (unique_id, name) VALUES ('LEGACY-1', 'Legacy')"))
+        conn.execute(text("INSERT INTO events (device_id, event_type) VALUES (1, 'alarm:sos')"))
+    Base.metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT rowid FROM events_fts WHERE events_fts MATCH '\"sos\"'")).fetchall() == [(1,)]
+
+
+def test_create_all_builds_indexes_without_importing_search(tmp_path):
+    code = (
+        "import sys; from sqlalchemy import create_engine, text; from db.base import Base; from manage import _load_models; _load_models(); "
+        f"engine = create_engine('sqlite:///{tmp_path / 'fresh.db'}'); Base.metadata.create_all(bind=engine); "
+        "names = engine.connect().execute(text(\"SELECT name FROM sqlite_master WHERE name LIKE '%_fts'\")).scalars().all(); "
+        "print(sorted(names), 'db.search' in sys.modules)"
+    )
+    backend = pathlib.Path(__file__).resolve().parents[1]
+    out = subprocess.run([sys.executable, "-c", code], cwd=backend, capture_output=True, text=True, check=True)
+    assert out.stdout.strip().splitlines()[-1] == "['events_fts', 'logs_fts', 'reports_fts'] True"
+
+
+def test_like_backend_is_cached_until_the_tables_exist(tmp_path):
+    from sqlalchemy import create_engine, event, text
+    from sqlalchemy.orm import Session
+
+    from db.base import Base
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'nofts.db'}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for table in ("events", "reports", "logs"):
+            for suffix in ("ai", "ad", "au"):
+                conn.execute(text(f"DROP TRIGGER {table}_fts_{suffix}"))
+            conn.execute(text(f"DROP TABLE {table}_fts"))
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, stmt, *args: statements.append(stmt))
+    with Session(engine) as db:
+        assert search_backend(db) == "like"
+        seen = len(statements)
+        assert search_backend(db) == "like" and len(statements) == seen
+        Base.metadata.create_all(bind=engine)
+        assert search_backend(db) == "fts5"
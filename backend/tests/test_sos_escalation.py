@@ -0,0 +1,209 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+
+from core import config
+from db.session import SessionLocal
+from models.device import Device
+from models.sos_escalation import SosEscalation
+from utils.sos_escalation import escalations
+from utils.websocket_manager import manager
+
+HEADERS = {"Authorization": "Bearer test-traccar-secret"}
+METRICS_HEADERS = {"Authorization": "Bearer test-metrics-token"}
+
+
+def _auth_header(client, email="admin@example.com", password="adminpass"):
+    resp = client.post("/api/auth/login", json={"email": email, "password": password})
+    assert resp.status_code == 200
+    token = resp.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+class _Socket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+    def escalated(self, event_id):
+        return [e["escalation"]["level"] for m in self.sent for e in m["events"] if e["id"] == event_id]
+
+
+def _sos(client, traccar_id):
+    event = {"event": {"deviceId": traccar_id, "type": "alarm", "attributes": {"alarm": "sos"}}}
+    assert client.post("/api/traccar/events", json=event, headers=HEADERS).json()["saved"] == 1
+    db = SessionLocal()
+    try:
+        device = db.query(Device).filter(Device.traccar_device_id == traccar_id).one()
+        return db.query(SosEscalation).filter(SosEscalation.device_id == device.id).order_by(SosEscalation.event_id.desc()).first().event_id
+    finally:
+        db.close()
+
+
+def test_sos_escalates_until_acknowledged(client, admin_user, coast_guard_user, fisher_user, monkeypatch):
+    monkeypatch.setattr(config.settings, "SOS_ESCALATION_INTERVALS_SECONDS", "60,120")
+    db = SessionLocal()
+    try:
+        db.add(Device(unique_id="SOS-ESC-1", name="Escalation", user_id=fisher_user.id, traccar_device_id=46001))
+        db.commit()
+    finally:
+        db.close()
+    escalations.reset()
+    socket = _Socket()
+    manager.active.append({"ws": socket, "user_id": coast_guard_user.id, "role": "coast_guard"})
+    db_threads = []
+    escalate_rows = escalations._escalate_rows
+
+    def tracked(*args):
+        db_threads.append(threading.current_thread())
+        return escalate_rows(*args)
+
+    monkeypatch.setattr(escalations, "_escalate_rows", tracked)
+    try:
+        event_id = _sos(client, 46001)
+        assert escalations.open_alarms()[event_id][0] == 0
+        now = time.time()
+        assert asyncio.run(escalations.run_due(now + 30)) == 0
+        assert asyncio.run(escalations.run_due(now + 61)) == 1
+        assert asyncio.run(escalations.run_due(now + 121)) == 0
+        assert asyncio.run(escalations.run_due(now + 182)) == 1
+        # the last interval repeats
+        assert asyncio.run(escalations.run_due(now + 303)) == 1
+        assert socket.escalated(event_id) == [0, 1, 2, 3]
+        assert socket.sent[-1]["events"][0]["priority"] == 4
+        # stamped with the re-send time; the database update ran off the event loop's thread
+        assert socket.sent[-1]["events"][0]["server_received_at"] == datetime.fromtimestamp(now + 303, tz=timezone.utc).isoformat()
+        assert db_threads and threading.main_thread() not in db_threads
+
+        # a restart rebuilds the timers from the table
+        escalations.reset()
+        db = SessionLocal()
+        try:
+            escalations.load(db)
+        finally:
+            db.close()
+        assert escalations.open_alarms()[event_id][0] == 3
+
+        cg = _auth_header(client, "cg@example.com", "cgpass")
+        alarms = client.get("/api/coastguard/alarms", headers=cg).json()
+        assert alarms[0]["event_id"] == event_id and alarms[0]["priority"] == 4
+
+        ack = client.post(f"/api/coastguard/alarms/{event_id}/ack", headers=cg).json()
+        assert ack["acknowledged_by"] == coast_guard_user.id and ack["priority"] == 0 and ack["ack_seconds"] >= 0
+        assert client.post(f"/api/coastguard/alarms/{event_id}/ack", headers=cg).json()["acknowledged_at"] == ack["acknowledged_at"]
+        assert client.post("/api/coastguard/alarms/999999/ack", headers=cg).status_code == 404
+        assert event_id not in escalations.open_alarms()
+        asyncio.run(escalations.run_due(now + 10000))
+        assert socket.escalated(event_id) == [0, 1, 2, 3]
+
+        # filing the report acknowledges too
+        second = _sos(client, 46001)
+        report = {"event_id": second, "resolution": "rescued", "password": "cgpass"}
+        assert client.post("/api/coastguard/reports", json=report, headers=cg).status_code == 200
+        assert second not in escalations.open_alarms()
+        db = SessionLocal()
+        try:
+            assert db.get(SosEscalation, second).acknowledged_by == coast_guard_user.id
+        finally:
+            db.close()
+
+        stats = client.get("/api/admin/sos/escalations", headers=_auth_header(client)).json()
+        assert stats["acknowledged"]["count"] >= 2 and stats["scheduler"]["running"] is False
+        assert "bantay_sos_escalations_total" in client.get("/metrics", headers=METRICS_HEADERS).text
+    finally:
+        manager.disconnect(socket)
+        escalations.reset()
+
+
+def test_scheduler_task_fires_reloaded_alarms(client, fisher_user, monkeypatch):
+    monkeypatch.setattr(config.settings, "SOS_ESCALATION_INTERVALS_SECONDS", "60")
+    db = SessionLocal()
+    try:
+        db.add(Device(unique_id="SOS-ESC-2", name="Escalation 2", user_id=fisher_user.id, traccar_device_id=46002))
+        db.commit()
+    finally:
+        db.close()
+    escalations.reset()
+    event_id = _sos(client, 46002)
+    db = SessionLocal()
+    try:
+        # overdue while the server was down
+        db.get(SosEscalation, event_id).next_at = datetime.now(timezone.utc)
+        db.commit()
+    finally:
+        db.close()
+    escalations.reset()
+    socket = _Socket()
+
+    async def run():
+        manager.active.append({"ws": socket, "user_id": None, "role": "administrator"})
+        escalations.start()
+        try:
+            for _ in range(50):
+                if socket.escalated(event_id):
+                    break
+                await asyncio.sleep(0.02)
+        finally:
+            escalations.stop()
+            manager.disconnect(socket)
+
+    try:
+        asyncio.run(run())
+        assert socket.escalated(event_id) == [1]
+        assert escalations.stats()["by_level"].get(1, 0) >= 1
+    finally:
+        escalations.reset()
+
+
+def test_snapshot_and_escalation_respect_other_workers(client, coast_guard_user, fisher_user, monkeypatch):
+    from utils import sos_escalation
+
+    monkeypatch.setattr(config.settings, "SOS_ESCALATION_INTERVALS_SECONDS", "60")
+    db = SessionLocal()
+    try:
+        db.add(Device(unique_id="SOS-ESC-3", name="Escalation 3", user_id=fisher_user.id, traccar_device_id=46003))
+        db.commit()
+    finally:
+        db.close()
+    escalations.reset()
+    event_id = _sos(client, 46003)
+    # stored by "another worker": this process has no timer for it
+    escalations.reset()
+    token = client.post("/api/auth/login", json={"email": "cg@example.com", "password": "cgpass"}).json()["access_token"]
+    with client.websocket_connect(f"/api/ws/socket?token={token}") as ws:
+        snapshot = ws.receive_json()
+    alarm = next(e for e in snapshot["events"] if e["id"] == event_id)
+    assert alarm["priority"] == 1 and alarm["escalation"]["level"] == 0
+
+    # acknowledged elsewhere between the escalation's read and its update
+    db = SessionLocal()
+    try:
+        escalations.track([db.get(SosEscalation, event_id)])
+    finally:
+        db.close()
+    real_interval = sos_escalation.interval
+
+    def ack_first(level):
+        other = SessionLocal()
+        try:
+            row = other.get(SosEscalation, event_id)
+            sos_escalation.acknowledge(row, coast_guard_user.id)
+            other.commit()
+        finally:
+            other.close()
+        return real_interval(level)
+
+    monkeypatch.setattr(sos_escalation, "interval", ack_first)
+    try:
+        assert asyncio.run(escalations.run_due(time.time() + 61)) == 0
+    finally:
+        escalations.reset()
+    db = SessionLocal()
+    try:
+        row = db.get(SosEscalation, event_id)
+        assert row.acknowledged_at is not None and row.level == 0 and row.next_at is None
+    finally:
+        db.close()
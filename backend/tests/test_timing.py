@@ -0,0 +1,53 @@
+import logging
+
+from core import config
+from core.timing import MAX_STATEMENTS, TimingStore, store
+
+
+def _auth_header(client, email="admin@example.com", password="adminpass"):
+    resp = client.post("/api/auth/login", json={"email": email, "password": password})
+    assert resp.status_code == 200
+    token = resp.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_server_timing_route_stats_and_slow_queries(client, admin_user, coast_guard_user, monkeypatch, caplog):
+    headers = _auth_header(client)
+    store.reset()
+    monkeypatch.setattr(config.settings, "SLOW_QUERY_MS", 0.0)
+    with caplog.at_level(logging.WARNING, logger="core.timing"):
+        for _ in range(3):
+            resp = client.get("/api/admin/users", headers=headers)
+            assert resp.status_code == 200
+    timing = resp.headers["server-timing"]
+    assert timing.startswith("db;dur=") and "queries" in timing and "serialize;dur=" in timing and "total;dur=" in timing
+    slow = [r.getMessage() for r in caplog.records if r.getMessage().startswith("Slow query")]
+    assert any("GET /api/admin/users:" in m and "SELECT" in m for m in slow)
+
+    routes = client.get("/api/admin/timing/routes", params={"sort": "max"}, headers=headers).json()
+    users = next(r for r in routes if r["route"] == "GET /api/admin/users")
+    assert users["count"] == 3 and users["queries_avg"] >= 1
+    assert users["p50_ms"] <= users["p99_ms"] <= users["max_ms"]
+
+    queries = client.get("/api/admin/timing/queries", params={"limit": 5}, headers=headers).json()
+    assert 0 < len(queries) <= 5
+    assert queries == sorted(queries, key=lambda q: q["total_ms"], reverse=True)
+    assert any(q["slowest_route"] == "GET /api/admin/users" for q in client.get("/api/admin/timing/queries", params={"limit": 200}, headers=headers).json())
+
+    assert client.get("/api/admin/timing/routes", params={"sort": "median"}, headers=headers).status_code == 400
+    cg = _auth_header(client, "cg@example.com", "cgpass")
+    assert client.get("/api/admin/timing/routes", headers=cg).status_code == 403
+    assert client.delete("/api/admin/timing", headers=headers).json() == {"ok": True}
+
+
+def test_statement_keys_collapse_batches_and_stay_bounded():
+    timings = TimingStore()
+    for n in range(1, 40):
+        timings.record_statement("SELECT * FROM trip_states WHERE device_id IN (" + ", ".join(["?"] * n) + ")", 0.001, "-")
+        timings.record_statement("INSERT INTO t (a, b) VALUES " + ", ".join(["(?, ?)"] * n), 0.001, "-")
+    keys = [row["statement"] for row in timings.query_stats(limit=200)]
+    assert sorted(keys) == ["INSERT INTO t (a, b) VALUES (...)", "INSERT INTO t (a, b) VALUES (...), ...", "SELECT * FROM trip_states WHERE device_id IN (...)"]
+
+    for i in range(3 * MAX_STATEMENTS):
+        timings.record_statement(f"SELECT {i}", 0.001 * (i % 7), "-")
+    assert len(timings._statements) <= MAX_STATEMENTS + MAX_STATEMENTS // 4
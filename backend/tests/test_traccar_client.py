@@ -0,0 +1,84 @@
+import pytest
+import requests
+
+from utils.traccar_client import CircuitBreaker, CircuitOpenError, TraccarClient, TraccarError
+
+
+class DummyResp:
+    def __init__(self, status, data=None):
+        self.status_code = status
+        self._data = data
+        self.content = b"{}" if data is not None else b""
+
+    def json(self):
+        return self._data
+
+
+def _client(monkeypatch, responses, **kw):
+    calls = []
+
+    def fake_request(self, method, url, json=None, params=None, timeout=None, **kwargs):
+        calls.append((method, url))
+        resp = responses.pop(0)
+        if isinstance(resp, Exception):
+            raise resp
+        return resp
+
+    monkeypatch.setattr(requests.Session, "request", fake_request)
+    kw.setdefault("backoff", 0)
+    return TraccarClient("http://traccar.test", "token", **kw), calls
+
+
+def test_idempotent_call_is_retried(monkeypatch):
+    client, calls = _client(monkeypatch, [requests.ConnectionError("down"), DummyResp(503), DummyResp(200, {"id": 7})])
+    assert client.put("/api/devices/7", json={"id": 7}) == {"id": 7}
+    assert len(calls) == 3
+    stats = client.metrics()["calls"]["PUT /api/devices/{id}"]
+    assert stats["calls"] == 3 and stats["errors"] == 2
+
+
+def test_post_is_not_retried_by_default(monkeypatch):
+    client, calls = _client(monkeypatch, [DummyResp(503), DummyResp(200, {"id": 1})])
+    with pytest.raises(TraccarError):
+        client.post("/api/devices", json={})
+    assert len(calls) == 1
+
+
+def test_breaker_opens_and_fails_fast(monkeypatch):
+    breaker = CircuitBreaker(threshold=2, reset_after=60)
+    client, calls = _client(monkeypatch, [DummyResp(500), DummyResp(500)], max_retries=0, breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(TraccarError):
+            client.get("/api/devices")
+    assert client.metrics()["breaker"] == "open"
+    with pytest.raises(CircuitOpenError):
+        client.get("/api/devices")
+    assert len(calls) == 2
+
+
+def test_half_open_trial_is_settled_when_the_slot_wait_times_out(monkeypatch):
+    breaker = CircuitBreaker(threshold=1, reset_after=0)
+    responses = [DummyResp(500), DummyResp(200, {"id": 1})]
+    client, calls = _client(monkeypatch, responses, max_retries=0, breaker=breaker, max_connections=1, timeout=0.01)
+    with pytest.raises(TraccarError):
+        client.get("/api/devices")
+    assert breaker.state == "half_open"
+    # the trial call cannot get a connection
+    assert client._slots.acquire(timeout=0)
+    with pytest.raises(TraccarError, match="free Traccar connection"):
+        client.get("/api/devices")
+    client._slots.release()
+    assert client.metrics()["calls"]["GET /api/devices"]["errors"] == 2
+    # the failed trial released its claim, so the next one goes through
+    assert client.get("/api/devices") == {"id": 1}
+    assert breaker.state == "closed" and len(calls) == 2
+
+
+def test_unexpected_error_settles_the_trial(monkeypatch):
+    breaker = CircuitBreaker(threshold=1, reset_after=0)
+    client, calls = _client(monkeypatch, [DummyResp(500), RuntimeError("bug"), DummyResp(200, {"id": 1})], max_retries=0, breaker=breaker)
+    with pytest.raises(TraccarError):
+        client.get("/api/devices")
+    with pytest.raises(RuntimeError):
+        client.get("/api/devices")
+    assert client.get("/api/devices") == {"id": 1} and len(calls) == 3
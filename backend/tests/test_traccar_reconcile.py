@@ -0,0 +1,79 @@
+import pytest
+
+from core import config
+from db.session import SessionLocal
+from models.device import Device
+from models.geofence import Geofence
+from traccar_stub import StubTraccar
+
+AREA = "POLYGON((14.5 120.9, 14.5 121.0, 14.6 121.0, 14.6 120.9, 14.5 120.9))"
+
+
+def _auth_header(client, email="admin@example.com", password="adminpass"):
+    resp = client.post("/api/auth/login", json={"email": email, "password": password})
+    assert resp.status_code == 200
+    token = resp.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = StubTraccar().start()
+    monkeypatch.setenv("TESTING", "0")
+    monkeypatch.setenv("BANTAY_SKIP_TRACCAR", "0")
+    monkeypatch.setattr(config.settings, "TESTING", False)
+    monkeypatch.setattr(config.settings, "TRACCAR_API_URL", server.url)
+    monkeypatch.setattr(config.settings, "TRACCAR_API_TOKEN", "stub-token")
+    yield server
+    server.stop()
+
+
+def test_reconcile_dry_run_then_fix(client, admin_user, stub):
+    db = SessionLocal()
+    try:
+        # local rows written without going through the outbox, as after a half-finished sync
+        g = Geofence(name="Drift zone", area=AREA)
+        db.add(g)
+        db.flush()
+        adopted = Device(unique_id="DRIFT-1", name="Adopt me", geofence_id=g.id)
+        missing = Device(unique_id="DRIFT-2", name="Create me", traccar_device_id=654321)
+        db.add_all([adopted, missing])
+        db.commit()
+        ids = (g.id, adopted.id, missing.id)
+    finally:
+        db.close()
+    remote = stub.handle("POST", "/api/devices", {}, {"name": "Adopt me", "uniqueId": "DRIFT-1"})[1]
+    orphan = stub.handle("POST", "/api/devices", {}, {"name": "Nobody", "uniqueId": "ORPHAN-1"})[1]
+
+    headers = _auth_header(client)
+    report = client.post("/api/admin/traccar/reconcile?dry_run=true", headers=headers).json()
+    assert {"id": ids[1], "traccar_id": remote["id"]} in report["devices"]["relink"]
+    assert {"id": ids[2], "unique_id": "DRIFT-2"} in report["devices"]["create"]
+    assert {"id": ids[0], "name": "Drift zone"} in report["geofences"]["create"]
+    assert orphan["id"] in report["devices"]["orphans"]
+    assert len(stub.devices) == 2 and stub.geofences == {}
+
+    report = client.post("/api/admin/traccar/reconcile", headers=headers).json()
+    assert report["errors"] == []
+    db = SessionLocal()
+    try:
+        g, adopted, missing = db.get(Geofence, ids[0]), db.get(Device, ids[1]), db.get(Device, ids[2])
+        assert adopted.traccar_device_id == remote["id"]
+        assert stub.devices[missing.traccar_device_id]["uniqueId"] == "DRIFT-2"
+        assert stub.geofences[g.traccar_id]["attributes"] == {"bantayId": g.id}
+        assert (adopted.traccar_device_id, g.traccar_id) in stub.permissions
+        # the orphan is only reported
+        assert orphan["id"] in stub.devices
+
+        # nothing left to do
+        report = client.post("/api/admin/traccar/reconcile?incremental=true", headers=headers).json()
+        assert report["since"] is not None
+        assert report["devices"]["create"] == [] and report["devices"]["relink"] == []
+        assert report["permissions"]["link"] == [] and report["permissions"]["unlink"] == []
+
+        db.delete(adopted)
+        db.delete(missing)
+        db.delete(g)
+        db.commit()
+    finally:
+        db.close()
@@ -57,6 +57,7 @@ class DummyResp:
     def __init__(self, data, status=200):
         self._data = data
         self.status_code = status
+        self.content = b"{}"
 
     def raise_for_status(self):
         if not (200 <= self.status_code < 300):
@@ -85,13 +86,14 @@ def test_traccar_registration_flow(monkeypatch):
 
     client = TestClient(app)
 
-    # mock requests.post to simulate Traccar API creating a device
-    def fake_post(url, json=None, headers=None, timeout=None):
+    # mock the pooled session used by the Traccar client to simulate creating a device
+    def fake_request(self, method, url, json=None, params=None, timeout=None, **kwargs):
+        assert method == "POST"
         assert url.endswith('/api/devices')
         # return a fake created device id
         return DummyResp({"id": 12345})
 
-    monkeypatch.setattr(requests, "post", fake_post)
+    monkeypatch.setattr(requests.Session, "request", fake_request)
 
     # login
     r = client.post("/api/auth/login", json={"email": "admin@example.com", "password": "adminpass"})
@@ -0,0 +1,130 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from core import config
+from db.session import SessionLocal
+from models.device import Device
+from models.geofence import Geofence
+from models.traccar_outbox import TraccarOutbox
+from traccar_stub import StubTraccar
+from utils.traccar_sync import worker
+
+AREA = "POLYGON((14.5 120.9, 14.5 121.0, 14.6 121.0, 14.6 120.9, 14.5 120.9))"
+
+
+def _auth_header(client, email="admin@example.com", password="adminpass"):
+    resp = client.post("/api/auth/login", json={"email": email, "password": password})
+    assert resp.status_code == 200
+    token = resp.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = StubTraccar().start()
+    monkeypatch.setenv("TESTING", "0")
+    monkeypatch.setenv("BANTAY_SKIP_TRACCAR", "0")
+    monkeypatch.setattr(config.settings, "TESTING", False)
+    monkeypatch.setattr(config.settings, "TRACCAR_API_URL", server.url)
+    monkeypatch.setattr(config.settings, "TRACCAR_API_TOKEN", "stub-token")
+    monkeypatch.setattr(config.settings, "TRACCAR_MAX_RETRIES", 0)
+    yield server
+    server.stop()
+
+
+def _make_due():
+    db = SessionLocal()
+    try:
+        db.query(TraccarOutbox).filter(TraccarOutbox.status == "pending").update(
+            {"next_attempt_at": datetime.now(timezone.utc)}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_admin_mutations_return_before_traccar_and_sync_in_order(client, admin_user, stub):
+    headers = _auth_header(client)
+    resp = client.post("/api/admin/geofences", json={"name": "Sync zone", "area": AREA}, headers=headers)
+    assert resp.status_code == 200, resp.text
+    geofence = resp.json()
+    assert geofence["traccar_id"] is None
+    assert geofence["sync"]["status"] == "pending"
+
+    resp = client.post("/api/admin/devices", json={"unique_id": "SYNC-1", "name": "Sync boat", "geofence_id": geofence["id"]}, headers=headers)
+    assert resp.status_code == 200, resp.text
+    device_id = resp.json()["device"]["id"]
+    assert resp.json()["sync"]["status"] == "pending"
+    assert stub.calls == []
+
+    worker.process_once()
+
+    status = client.get(f"/api/admin/traccar/sync/device/{device_id}", headers=headers).json()
+    assert status["status"] == "synced"
+    remote_device = stub.devices[status["traccar_id"]]
+    assert remote_device["uniqueId"] == "SYNC-1"
+    db = SessionLocal()
+    try:
+        g = db.get(Geofence, geofence["id"])
+        assert (status["traccar_id"], g.traccar_id) in stub.permissions
+    finally:
+        db.close()
+
+    resp = client.delete(f"/api/admin/devices/{device_id}", headers=headers)
+    assert resp.status_code == 200
+    worker.process_once()
+    assert status["traccar_id"] not in stub.devices
+
+    client.delete(f"/api/admin/geofences/{geofence['id']}", headers=headers)
+    worker.process_once()
+    assert stub.geofences == {}
+
+
+def test_failed_call_is_retried_and_blocks_later_changes(client, admin_user, stub):
+    headers = _auth_header(client)
+    stub.fail_next("POST", "/api/devices", 503)
+    resp = client.post("/api/admin/devices", json={"unique_id": "SYNC-2", "name": "Retry boat"}, headers=headers)
+    device_id = resp.json()["device"]["id"]
+    client.put(f"/api/admin/devices/{device_id}", json={"name": "Renamed boat"}, headers=headers)
+
+    worker.process_once()
+    status = client.get(f"/api/admin/traccar/sync/device/{device_id}", headers=headers).json()
+    assert status["status"] == "pending"
+    assert "503" in status["last_error"]
+    # the rename waits behind the failed create
+    assert [c for c in stub.calls if c[0] == "PUT"] == []
+
+    _make_due()
+    worker.process_once()
+    status = client.get(f"/api/admin/traccar/sync/device/{device_id}", headers=headers).json()
+    assert status["status"] == "synced"
+    assert stub.devices[status["traccar_id"]]["name"] == "Renamed boat"
+
+    db = SessionLocal()
+    try:
+        db.delete(db.get(Device, device_id))
+        db.commit()
+    finally:
+        db.close()
+
+
+
+def test_savepoint_rollback_keeps_the_outer_wake(monkeypatch):
+    from utils import traccar_sync
+
+    woken = []
+    monkeypatch.setattr(worker, "wake", lambda: woken.append(True))
+    db = SessionLocal()
+    try:
+        db.begin()
+        db.info[traccar_sync._DIRTY_KEY] = True
+        try:
+            with db.begin_nested():
+                raise RuntimeError("derived update failed")
+        except RuntimeError:
+            pass
+        db.commit()
+    finally:
+        db.close()
+    assert woken == [True]
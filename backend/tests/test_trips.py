@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from db.session import SessionLocal
+from models.device import Device
+from models.trip import Trip
+from models.trip_state import TripState
+from utils.geometry import haversine_m
+
+T0 = datetime(2026, 3, 1, 4, 0, tzinfo=timezone.utc)
+HEADERS = {"Authorization": "Bearer test-traccar-secret"}
+METRICS_HEADERS = {"Authorization": "Bearer test-metrics-token"}
+
+
+def _auth_header(client, email="admin@example.com", password="adminpass"):
+    resp = client.post("/api/auth/login", json={"email": email, "password": password})
+    assert resp.status_code == 200
+    token = resp.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _send(client, traccar_id, *points):
+    payload = [
+        {"deviceId": traccar_id, "latitude": lat, "longitude": lon, "speed": speed, "fixTime": (T0 + timedelta(minutes=m)).isoformat()}
+        for m, lat, lon, speed in points
+    ]
+    resp = client.post("/api/traccar/positions", json=payload, headers=HEADERS)
+    assert resp.status_code == 200 and resp.json()["ok"] is True
+
+
+def _trips(device_id):
+    db = SessionLocal()
+    try:
+        return db.query(Trip).filter(Trip.device_id == device_id).order_by(Trip.id).all()
+    finally:
+        db.close()
+
+
+def test_departure_return_and_gap(client, coast_guard_user, fisher_user):
+    db = SessionLocal()
+    try:
+        dev = Device(unique_id="TRIP-1", name="Voyager", user_id=fisher_user.id, traccar_device_id=77501)
+        db.add(dev)
+        db.commit()
+        device_id = dev.id
+    finally:
+        db.close()
+
+    # moored at home, then heads out; batches are split to exercise the stored state
+    _send(client, 77501, (0, 14.0, 121.0, 0.0), (5, 14.0001, 121.0, 0.0), (10, 14.02, 121.0, 8.0))
+    _send(client, 77501, (20, 14.05, 121.02, 11.0))
+    (trip,) = _trips(device_id)
+    assert trip.status == "open" and trip.point_count == 3
+
+    _send(client, 77501, (30, 14.02, 121.0, 6.0), (40, 14.0005, 121.0, 0.2), (45, 14.0004, 121.0, 0.0))
+    (trip,) = _trips(device_id)
+    assert trip.status == "closed" and trip.end_reason == "returned"
+    assert trip.start_latitude == pytest.approx(14.0001)
+    assert trip.max_speed == 11.0
+    expected = (
+        haversine_m(14.0001, 121.0, 14.02, 121.0)
+        + haversine_m(14.02, 121.0, 14.05, 121.02)
+        + haversine_m(14.05, 121.02, 14.02, 121.0)
+        + haversine_m(14.02, 121.0, 14.0005, 121.0)
+    )
+    assert trip.distance_m == pytest.approx(expected, rel=1e-6)
+    assert [trip.min_latitude, trip.max_latitude, trip.max_longitude] == pytest.approx([14.0001, 14.05, 121.02])
+
+    # out again, then silence for three hours: the trip ends at the last fix before the gap
+    _send(client, 77501, (60, 14.03, 121.0, 9.0), (70, 14.06, 121.0, 9.0), (250, 14.3, 121.2, 9.0))
+    trips = _trips(device_id)
+    assert [t.end_reason for t in trips] == ["returned", "gap", None]
+    assert trips[1].end_latitude == 14.06 and trips[2].start_latitude == 14.3
+
+    # a replayed old fix is ignored
+    _send(client, 77501, (65, 14.0, 121.0, 0.0))
+    assert len(_trips(device_id)) == 3
+    db = SessionLocal()
+    try:
+        assert db.get(TripState, device_id).open_trip_id == trips[2].id
+    finally:
+        db.close()
+
+    headers = _auth_header(client, "cg@example.com", "cgpass")
+    resp = client.get("/api/coastguard/trips", params={"device_id": device_id, "limit": 2}, headers=headers)
+    assert resp.status_code == 200
+    body = resp.json()
+    assert [t["id"] for t in body] == [trips[2].id, trips[1].id]
+    assert "X-Next-Cursor" in resp.headers
+    resp = client.get(
+        "/api/coastguard/trips",
+        params={"device_id": device_id, "cursor": resp.headers["X-Next-Cursor"]},
+        headers=headers,
+    )
+    first = resp.json()[0]
+    assert first["end_reason"] == "returned" and first["duration_seconds"] == (40 - 5) * 60
+    assert len(first["bbox"]) == 4
+
+    fisher = _auth_header(client, "fisher@example.com", "fishpass")
+    mine = client.get("/api/fisherfolk/trips", params={"device_id": device_id}, headers=fisher)
+    assert mine.status_code == 200 and len(mine.json()) == 3
+    assert client.get("/api/coastguard/trips", headers=fisher).status_code == 403
+
+
+def test_trip_failure_keeps_positions_and_state_insert_is_race_safe(client, fisher_user, monkeypatch):
+    import routers.traccar as traccar_router
+    import utils.trips as trips
+    from models.position import Position
+
+    db = SessionLocal()
+    try:
+        dev = Device(unique_id="TRIP-RACE", name="Racer", user_id=fisher_user.id, traccar_device_id=77601)
+        db.add(dev)
+        db.commit()
+        device_id = dev.id
+        # another batch created the state between our lookup and our insert
+        db.add(TripState(device_id=device_id))
+        db.commit()
+    finally:
+        db.close()
+    real = trips._locked_states
+    calls = []
+
+    def racing(db, device_ids):
+        calls.append(list(device_ids))
+        return {} if len(calls) == 1 else real(db, device_ids)
+
+    monkeypatch.setattr(trips, "_locked_states", racing)
+    _send(client, 77601, (0, 14.0, 121.0, 0.0))
+    assert len(calls) == 2
+
+    def broken(db, positions):
+        raise RuntimeError("segmenter bug")
+
+    monkeypatch.setattr(traccar_router, "segment_positions", broken)
+    _send(client, 77601, (5, 14.02, 121.0, 8.0))
+    db = SessionLocal()
+    try:
+        assert db.query(Position).filter(Position.device_id == device_id).count() == 2
+        assert db.query(TripState).filter(TripState.device_id == device_id).count() == 1
+    finally:
+        db.close()
+    assert 'bantay_ingest_derived_failed_total{feature="trips"}' in client.get("/metrics", headers=METRICS_HEADERS).text
@@ -0,0 +1,135 @@
+"""Minimal in-process Traccar REST API for exercising outbound sync.
+
+Implements the subset Bantay calls: /api/devices, /api/geofences and
+/api/permissions. Queue one-off failures with `fail_next(method, path, status)`.
+"""
+
+import itertools
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# shared across instances so remote ids never collide with ones stored by earlier tests
+_ids = itertools.count(700001)
+
+
+class StubTraccar:
+    def __init__(self):
+        self.devices = {}
+        self.geofences = {}
+        self.permissions = set()  # (deviceId, geofenceId)
+        self.calls = []
+        self._failures = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def fail_next(self, method: str, path: str, status: int = 503):
+        with self._lock:
+            self._failures.append((method, path, status))
+
+    def _new_id(self) -> int:
+        return next(_ids)
+
+    def handle(self, method: str, path: str, query: dict, body):
+        with self._lock:
+            self.calls.append((method, path))
+            for i, (m, p, status) in enumerate(self._failures):
+                if m == method and p == path:
+                    del self._failures[i]
+                    return status, {"error": "injected failure"}
+
+            parts = path.strip("/").split("/")  # ['api', collection, id?]
+            collection = parts[1] if len(parts) > 1 else ""
+            item_id = int(parts[2]) if len(parts) > 2 else None
+
+            if collection == "permissions":
+                if method == "POST":
+                    self.permissions.add((body["deviceId"], body["geofenceId"]))
+                    return 204, None
+                if method == "DELETE":
+                    key = (int(query["deviceId"][0]), int(query["geofenceId"][0]))
+                    if key not in self.permissions:
+                        return 404, None
+                    self.permissions.discard(key)
+                    return 204, None
+
+            store = {"devices": self.devices, "geofences": self.geofences}.get(collection)
+            if store is None:
+                return 404, None
+            if method == "GET" and item_id is None:
+                items = list(store.values())
+                if "uniqueId" in query:
+                    items = [d for d in items if d.get("uniqueId") == query["uniqueId"][0]]
+                if collection == "geofences" and "deviceId" in query:
+                    device_id = int(query["deviceId"][0])
+                    items = [g for g in items if (device_id, g["id"]) in self.permissions]
+                return 200, items
+            if method == "POST" and item_id is None:
+                if collection == "devices" and any(d["uniqueId"] == body.get("uniqueId") for d in store.values()):
+                    return 400, {"error": "duplicate uniqueId"}
+                item = {**body, "id": self._new_id()}
+                store[item["id"]] = item
+                return 200, item
+            if item_id not in store:
+                return 404, None
+            if method == "GET":
+                return 200, store[item_id]
+            if method == "PUT":
+                store[item_id] = {**store[item_id], **body, "id": item_id}
+                return 200, store[item_id]
+            if method == "DELETE":
+                del store[item_id]
+                if collection == "devices":
+                    self.permissions = {p for p in self.permissions if p[0] != item_id}
+                else:
+                    self.permissions = {p for p in self.permissions if p[1] != item_id}
+                return 204, None
+            return 405, None
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _dispatch(self, method):
+                parsed = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                status, payload = stub.handle(method, parsed.path, parse_qs(parsed.query), body)
+                data = json.dumps(payload).encode() if payload is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def do_PUT(self):
+                self._dispatch("PUT")
+
+            def do_DELETE(self):
+                self._dispatch("DELETE")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,129 @@
+"""Parsing, validation and password hashing for bulk fisherfolk/device onboarding.
+
+Rows are validated in full before anything is written: field-level checks run
+through the same pydantic model as `/register`, duplicates are detected within
+the file, and collisions with existing users, devices and geofences are found
+with one `IN (...)` query per table rather than per row.
+"""
+
+import csv
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.orm import Session
+
+from models.device import Device
+from models.geofence import Geofence
+from models.user import User
+
+BULK_FIELDS = (
+    "unique_id",
+    "name",
+    "sim_number",
+    "fisher_name",
+    "fisher_email",
+    "fisher_password",
+    "medical_record",
+    "geofence_id",
+)
+
+
+def parse_rows(raw: bytes, filename: Optional[str] = None) -> List[dict]:
+    """Read a CSV file (header row required) or a JSON list / `{"rows": [...]}`."""
+    text = raw.decode("utf-8-sig", errors="replace").strip()
+    if not text:
+        return []
+    is_json = (filename or "").lower().endswith(".json") or text[0] in "[{"
+    if is_json:
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+        if isinstance(data, dict):
+            data = data.get("rows")
+        if not isinstance(data, list) or not all(isinstance(r, dict) for r in data):
+            raise ValueError("JSON must be a list of row objects or {\"rows\": [...]}")
+        return data
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames:
+        raise ValueError("CSV header row is missing")
+    # blank cells mean "not provided"
+    return [{(k or "").strip(): (v.strip() or None) if isinstance(v, str) else v for k, v in row.items()} for row in reader]
+
+
+def _field_errors(e: ValidationError) -> List[str]:
+    return [f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()]
+
+
+def validate_rows(db: Session, rows: List[dict], schema: type, require_unique_id: bool) -> Tuple[list, list]:
+    """Return (report, valid) where `valid` holds (index, parsed) for rows without errors.
+
+    `report` has one entry per input row with `row` (1-based), `status` and `errors`.
+    """
+    report = []
+    parsed: List[Optional[BaseModel]] = []
+    for i, row in enumerate(rows):
+        entry = {"row": i + 1, "status": "valid", "errors": [], "fisher_email": row.get("fisher_email"), "unique_id": row.get("unique_id")}
+        data = None
+        try:
+            data = schema.model_validate({k: row.get(k) for k in BULK_FIELDS})
+        except ValidationError as e:
+            entry["errors"].extend(_field_errors(e))
+        if data is not None:
+            if not data.fisher_password:
+                entry["errors"].append("fisher_password: must not be empty")
+            if require_unique_id and not data.unique_id:
+                entry["errors"].append("unique_id: required to register the device with Traccar")
+        report.append(entry)
+        parsed.append(data)
+
+    emails = _duplicates((d.fisher_email.lower() for d in parsed if d is not None))
+    uniques = _duplicates((d.unique_id for d in parsed if d is not None and d.unique_id))
+    email_set = {d.fisher_email for d in parsed if d is not None}
+    unique_set = {d.unique_id for d in parsed if d is not None and d.unique_id}
+    geofence_set = {int(d.geofence_id) for d in parsed if d is not None and d.geofence_id is not None}
+
+    taken_emails = {e for (e,) in db.query(User.email).filter(User.email.in_(email_set)).all()} if email_set else set()
+    taken_uniques = {u for (u,) in db.query(Device.unique_id).filter(Device.unique_id.in_(unique_set)).all()} if unique_set else set()
+    known_geofences = {g for (g,) in db.query(Geofence.id).filter(Geofence.id.in_(geofence_set)).all()} if geofence_set else set()
+
+    valid = []
+    for entry, data in zip(report, parsed):
+        if data is not None:
+            if data.fisher_email.lower() in emails:
+                entry["errors"].append("fisher_email: duplicated in file")
+            if data.fisher_email in taken_emails:
+                entry["errors"].append("fisher_email: already registered")
+            if data.unique_id and data.unique_id in uniques:
+                entry["errors"].append("unique_id: duplicated in file")
+            if data.unique_id and data.unique_id in taken_uniques:
+                entry["errors"].append("unique_id: already registered")
+            if data.geofence_id is not None and int(data.geofence_id) not in known_geofences:
+                entry["errors"].append("geofence_id: geofence not found")
+        if entry["errors"]:
+            entry["status"] = "error"
+        else:
+            valid.append((entry["row"] - 1, data))
+    return report, valid
+
+
+def _duplicates(values: Iterable) -> set:
+    seen, dupes = set(), set()
+    for v in values:
+        if v in seen:
+            dupes.add(v)
+        seen.add(v)
+    return dupes
+
+
+def hash_passwords(passwords: List[str], workers: int) -> List[str]:
+    """Hash in a thread pool; bcrypt/argon2 release the GIL while hashing."""
+    from core import security
+
+    if workers <= 1 or len(passwords) < 2:
+        return [security.hash_password(p) for p in passwords]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk-hash") as pool:
+        return list(pool.map(security.hash_password, passwords))
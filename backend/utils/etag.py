@@ -0,0 +1,49 @@
+"""Per-table version counters and conditional GET helpers.
+
+Mutation endpoints call `bump_version` in the same transaction as their
+change; list endpoints derive a strong ETag from the counter so unchanged
+polls can answer 304 without loading or serializing any rows.
+"""
+
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlalchemy.orm import Session
+
+from models.table_version import TableVersion
+
+
+def get_version(db: Session, table: str) -> int:
+    row = db.query(TableVersion.version).filter(TableVersion.table_name == table).first()
+    return int(row[0]) if row else 0
+
+
+def bump_version(db: Session, *tables: str):
+    """Increment the counters for `tables`; the caller commits."""
+    for table in tables:
+        updated = (
+            db.query(TableVersion)
+            .filter(TableVersion.table_name == table)
+            .update({TableVersion.version: TableVersion.version + 1}, synchronize_session=False)
+        )
+        if not updated:
+            db.add(TableVersion(table_name=table, version=1))
+
+
+def table_etag(db: Session, table: str, request: Request) -> str:
+    # the path and query string are part of the tag so each page/filter gets its own validator
+    version = get_version(db, table)
+    key = f"{table}:{version}:{request.url.path}?{request.url.query}"
+    return '"' + hashlib.sha1(key.encode("utf-8")).hexdigest() + '"'
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """Return a 304 response when `If-None-Match` matches `etag`, else None."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    candidates = {c.strip().removeprefix("W/") for c in header.split(",")}
+    if "*" in candidates or etag in candidates:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
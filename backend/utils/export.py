@@ -0,0 +1,175 @@
+"""Streaming encoders for bulk exports.
+
+Each encoder consumes an iterator of row dicts and yields `bytes` chunks, so
+an export never holds more than one chunk of rows in memory. Rows come from a
+server-side cursor (`stream_rows`) and the chunks are sent with chunked
+transfer-encoding by `StreamingResponse`.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator, List, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+from sqlalchemy.orm import Session
+
+CHUNK_ROWS = 1000
+
+# (column name, kind) where kind is one of int/float/str/ts/json
+Fields = List[Tuple[str, str]]
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "geojson": "application/geo+json",
+    "gpx": "application/gpx+xml",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def stream_rows(db: Session, stmt, chunk_rows: int = CHUNK_ROWS) -> Iterator[dict]:
+    """Yield result rows as dicts using a server-side cursor where the driver supports it."""
+    result = db.execute(stmt.execution_options(stream_results=True, yield_per=chunk_rows))
+    for partition in result.mappings().partitions(chunk_rows):
+        for row in partition:
+            yield dict(row)
+
+
+def _cell(value, kind: str):
+    if value is None:
+        return None
+    if kind == "ts":
+        return value.isoformat() if isinstance(value, datetime) else str(value)
+    if kind == "json":
+        return json.dumps(value, separators=(",", ":"), default=str)
+    return value
+
+
+def _chunks(rows: Iterable[dict], size: int = CHUNK_ROWS) -> Iterator[list]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def encode_csv(rows: Iterable[dict], fields: Fields) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([name for name, _ in fields])
+    for batch in _chunks(rows):
+        for row in batch:
+            writer.writerow(["" if (v := _cell(row.get(name), kind)) is None else v for name, kind in fields])
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def encode_geojson(rows: Iterable[dict], fields: Fields) -> Iterator[bytes]:
+    """FeatureCollection; rows without latitude/longitude get a null geometry."""
+    yield b'{"type":"FeatureCollection","features":['
+    first = True
+    for batch in _chunks(rows):
+        parts = []
+        for row in batch:
+            lat, lon = row.get("latitude"), row.get("longitude")
+            geometry = {"type": "Point", "coordinates": [lon, lat]} if lat is not None and lon is not None else None
+            props = {
+                name: _cell(row.get(name), kind) if kind == "ts" else row.get(name)
+                for name, kind in fields
+                if name not in ("latitude", "longitude")
+            }
+            feature = {"type": "Feature", "geometry": geometry, "properties": props}
+            parts.append(("" if first else ",") + json.dumps(feature, separators=(",", ":"), default=str))
+            first = False
+        yield "".join(parts).encode("utf-8")
+    yield b"]}"
+
+
+def encode_gpx(rows: Iterable[dict], track_name: str) -> Iterator[bytes]:
+    """GPX 1.1 track, the format `geometry.gpx_to_wkt` reads back (trk/trkseg/trkpt)."""
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<gpx version="1.1" creator="Bantay" xmlns="http://www.topografix.com/GPX/1/1">\n'
+        f"<trk><name>{escape(track_name)}</name><trkseg>\n"
+    ).encode("utf-8")
+    for batch in _chunks(rows):
+        parts = []
+        for row in batch:
+            if row.get("latitude") is None or row.get("longitude") is None:
+                continue
+            pt = f'<trkpt lat={quoteattr(repr(row["latitude"]))} lon={quoteattr(repr(row["longitude"]))}>'
+            if row.get("timestamp") is not None:
+                pt += f"<time>{escape(_cell(row['timestamp'], 'ts'))}</time>"
+            pt += "</trkpt>\n"
+            parts.append(pt)
+        yield "".join(parts).encode("utf-8")
+    yield b"</trkseg></trk>\n</gpx>\n"
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose contents can be taken out between row groups."""
+
+    def __init__(self):
+        self._parts = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._parts.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except Exception:
+        return False
+    return True
+
+
+def encode_parquet(rows: Iterable[dict], fields: Fields) -> Iterator[bytes]:
+    """One Parquet row group per chunk; requires the optional `pyarrow` package."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string(), "ts": pa.string(), "json": pa.string()}
+    schema = pa.schema([(name, types[kind]) for name, kind in fields])
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        for batch in _chunks(rows):
+            columns = {name: [_cell(r.get(name), kind) for r in batch] for name, kind in fields}
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
@@ -0,0 +1,496 @@
+"""Geofence geometry: WKT/GeoJSON/GPX conversion and compiled polygons.
+
+Geofence areas are stored as WKT in Traccar's coordinate order, `lat lon` per
+vertex, e.g. `POLYGON((14.5 120.9, 14.5 121.0, ...))`. Holes are extra rings
+after the outer ring and several parts are written as `MULTIPOLYGON`.
+
+`compile_area` parses a stored area once into a `CompiledPolygon`: flat
+`array('d')` coordinate buffers plus ring offsets, a bounding box, the area in
+square metres and the centroid. `geofence_cache` keeps one compiled polygon
+per geofence and revalidates it against the `geofences` table version, so
+every consumer (admin validation, proximity checks, ...) parses each area at
+most once per change.
+"""
+
+import math
+import threading
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+EARTH_RADIUS_M = 6371008.8
+_CLOSE_EPS = 1e-9
+
+# (lat, lon) vertices; a polygon is [outer, hole, ...]; an area is [polygon, ...]
+Ring = List[Tuple[float, float]]
+Polygon = List[Ring]
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+# --- WKT text ------------------------------------------------------------
+
+
+def _nest(body: str) -> list:
+    """Split a parenthesised WKT body into nested lists of coordinate strings."""
+    stack: list = [[]]
+    buf: list = []
+
+    def flush():
+        tok = "".join(buf).strip()
+        buf.clear()
+        if tok:
+            stack[-1].append(tok)
+
+    for ch in body:
+        if ch == "(":
+            flush()
+            stack.append([])
+        elif ch == ")":
+            flush()
+            done = stack.pop()
+            stack[-1].append(done)
+        elif ch == ",":
+            flush()
+        else:
+            buf.append(ch)
+    flush()
+    if len(stack) != 1:
+        raise ValueError("unbalanced parentheses")
+    return stack[0]
+
+
+def _is_ring(node) -> bool:
+    return isinstance(node, list) and all(isinstance(t, str) for t in node)
+
+
+def _split_wkt(text: Optional[str]) -> Optional[List[List[List[str]]]]:
+    """Return polygons -> rings -> raw `a b` vertex strings, or None."""
+    if not text:
+        return None
+    s = text.strip()
+    start = s.find("(")
+    end = s.rfind(")")
+    if "polygon" not in s.lower() or start == -1 or end <= start:
+        return None
+    try:
+        top = _nest(s[start:end + 1])
+    except (IndexError, ValueError):
+        return None
+    if len(top) != 1 or not isinstance(top[0], list):
+        return None
+    node = top[0]
+    if _is_ring(node):  # POLYGON(a b, c d, ...) with single parentheses
+        return [[node]]
+    if all(_is_ring(r) for r in node):  # POLYGON((...), (...))
+        return [node]
+    if all(isinstance(p, list) and all(_is_ring(r) for r in p) for p in node):  # MULTIPOLYGON
+        return node
+    return None
+
+
+def _pair(tok: str) -> Optional[Tuple[float, float]]:
+    parts = tok.split()
+    if len(parts) < 2:
+        return None
+    return float(parts[0]), float(parts[1])
+
+
+def _close(ring: Ring) -> Optional[Ring]:
+    if len(ring) < 3:
+        return None
+    if abs(ring[0][0] - ring[-1][0]) > _CLOSE_EPS or abs(ring[0][1] - ring[-1][1]) > _CLOSE_EPS:
+        ring = ring + [ring[0]]
+    return ring
+
+
+def _format(polygons: List[Polygon]) -> str:
+    def ring_text(ring: Ring) -> str:
+        return "(" + ", ".join(f"{lat:.6f} {lon:.6f}" for lat, lon in ring) + ")"
+
+    def poly_text(poly: Polygon) -> str:
+        return "(" + ", ".join(ring_text(r) for r in poly) + ")"
+
+    if len(polygons) == 1:
+        return "POLYGON" + poly_text(polygons[0])
+    return "MULTIPOLYGON(" + ", ".join(poly_text(p) for p in polygons) + ")"
+
+
+def _build(raw_polygons: Iterable[Iterable[Iterable]], to_lat_lon) -> Optional[List[Polygon]]:
+    polygons = []
+    for raw_poly in raw_polygons:
+        rings = []
+        for raw_ring in raw_poly:
+            ring = []
+            for vertex in raw_ring:
+                pt = to_lat_lon(vertex)
+                if pt is not None:
+                    ring.append(pt)
+            closed = _close(ring)
+            if closed is None:
+                return None
+            rings.append(closed)
+        if rings:
+            polygons.append(rings)
+    return polygons or None
+
+
+def normalize_wkt_polygon(area_wkt: Optional[str]) -> Optional[str]:
+    """Normalise user supplied WKT to the stored `lat lon` form, or None if invalid.
+
+    Input vertices are read as `lon lat` unless the first value fits a latitude
+    and the second cannot (|value| > 90), in which case they are swapped.
+    """
+    raw = _split_wkt(area_wkt)
+    if raw is None:
+        return None
+
+    def lat_lon(tok: str):
+        pair = _pair(tok)
+        if pair is None:
+            return None
+        lon, lat = pair
+        if abs(lon) <= 90 and abs(lat) > 90:
+            lon, lat = lat, lon
+        return lat, lon
+
+    try:
+        polygons = _build(raw, lat_lon)
+    except ValueError:
+        return None
+    return _format(polygons) if polygons else None
+
+
+def geojson_to_wkt(payload: dict) -> Optional[str]:
+    """First Polygon/MultiPolygon geometry of a GeoJSON object as stored WKT (holes kept)."""
+
+    def extract(obj):
+        if not isinstance(obj, dict):
+            return None
+        t = obj.get("type")
+        if t == "FeatureCollection":
+            for feat in obj.get("features", []):
+                found = extract(feat)
+                if found:
+                    return found
+        if t == "Feature":
+            return extract(obj.get("geometry"))
+        if t == "Polygon":
+            return [obj.get("coordinates") or []]
+        if t == "MultiPolygon":
+            return obj.get("coordinates") or []
+        return None
+
+    raw = extract(payload)
+    if not raw or not all(isinstance(p, list) for p in raw):
+        return None
+
+    def lat_lon(pt):
+        if not isinstance(pt, (list, tuple)) or len(pt) < 2:
+            raise ValueError("invalid position")
+        return float(pt[1]), float(pt[0])
+
+    try:
+        polygons = _build(raw, lat_lon)
+    except (TypeError, ValueError):
+        return None
+    return _format(polygons) if polygons else None
+
+
+def gpx_to_wkt(text: str) -> Optional[str]:
+    """Track/route/waypoint points of a GPX document as a single closed ring."""
+    if not text or "<gpx" not in text.lower():
+        return None
+    # only geofence uploads parse XML; keep the parser out of worker startup
+    import xml.etree.ElementTree as ET
+
+    try:
+        root = ET.fromstring(text)
+    except Exception:
+        return None
+    ns = ""
+    if root.tag.startswith("{") and "}" in root.tag:
+        ns = root.tag.split("}")[0] + "}"
+    pts = []
+    for tag in ["trkpt", "rtept", "wpt"]:
+        for el in root.findall(f".//{ns}{tag}"):
+            lat = el.attrib.get("lat")
+            lon = el.attrib.get("lon")
+            if lat is None or lon is None:
+                continue
+            try:
+                pts.append((float(lat), float(lon)))
+            except ValueError:
+                continue
+    ring = _close(pts)
+    return _format([[ring]]) if ring else None
+
+
+def parse_area(area: Optional[str]) -> Optional[List[Polygon]]:
+    """Parse a stored area into polygons of (lat, lon) rings."""
+    raw = _split_wkt(area)
+    if raw is None:
+        return None
+
+    def lat_lon(tok: str):
+        pair = _pair(tok)
+        if pair is None:
+            return None
+        lat, lon = pair
+        # rows written before normalisation may be in `lon lat` order
+        if abs(lat) > 90 and abs(lon) <= 90:
+            lat, lon = lon, lat
+        return lat, lon
+
+    try:
+        return _build(raw, lat_lon)
+    except ValueError:
+        return None
+
+
+# --- compiled polygons ---------------------------------------------------
+
+
+class CompiledPolygon:
+    """Array-backed (multi)polygon with holes.
+
+    All rings are stored back to back in `lats`/`lons`; ring `i` spans
+    `ring_offsets[i]:ring_offsets[i + 1]` and is closed (first vertex repeated).
+    `ring_parts[i]` is the polygon index and `ring_holes[i]` marks holes.
+    `bbox` is `(min_lat, min_lon, max_lat, max_lon)`, `centroid` is `(lat, lon)`
+    and `area_m2` is the area net of holes on a local equirectangular projection.
+    """
+
+    __slots__ = (
+        "lats", "lons", "ring_offsets", "ring_parts", "ring_holes", "ring_bboxes", "bbox", "area_m2", "centroid", "_planar",
+    )
+
+    def __init__(self, polygons: List[Polygon]):
+        self.lats = array("d")
+        self.lons = array("d")
+        offsets = [0]
+        parts, holes, bboxes = [], [], []
+        for part_index, poly in enumerate(polygons):
+            for ring_index, ring in enumerate(poly):
+                self.lats.extend(lat for lat, _ in ring)
+                self.lons.extend(lon for _, lon in ring)
+                offsets.append(len(self.lats))
+                parts.append(part_index)
+                holes.append(ring_index > 0)
+                ring_lats = [lat for lat, _ in ring]
+                ring_lons = [lon for _, lon in ring]
+                bboxes.append((min(ring_lats), min(ring_lons), max(ring_lats), max(ring_lons)))
+        self.ring_offsets = array("l", offsets)
+        self.ring_parts = tuple(parts)
+        self.ring_holes = tuple(holes)
+        self.ring_bboxes = tuple(bboxes)
+        self.bbox = (min(self.lats), min(self.lons), max(self.lats), max(self.lons))
+        self.area_m2, self.centroid = self._area_centroid()
+        self._planar = None
+
+    @property
+    def ring_count(self) -> int:
+        return len(self.ring_offsets) - 1
+
+    @property
+    def part_count(self) -> int:
+        return (self.ring_parts[-1] + 1) if self.ring_parts else 0
+
+    def ring(self, i: int) -> Ring:
+        start, end = self.ring_offsets[i], self.ring_offsets[i + 1]
+        return list(zip(self.lats[start:end], self.lons[start:end]))
+
+    def _area_centroid(self) -> Tuple[float, Tuple[float, float]]:
+        lat0 = (self.bbox[0] + self.bbox[2]) / 2.0
+        lon0 = (self.bbox[1] + self.bbox[3]) / 2.0
+        ky = math.radians(1.0) * EARTH_RADIUS_M
+        kx = ky * math.cos(math.radians(lat0))
+        total = cx = cy = 0.0
+        for i in range(self.ring_count):
+            start, end = self.ring_offsets[i], self.ring_offsets[i + 1]
+            a = sx = sy = 0.0
+            for j in range(start, end - 1):
+                x0, y0 = (self.lons[j] - lon0) * kx, (self.lats[j] - lat0) * ky
+                x1, y1 = (self.lons[j + 1] - lon0) * kx, (self.lats[j + 1] - lat0) * ky
+                cross = x0 * y1 - x1 * y0
+                a += cross
+                sx += (x0 + x1) * cross
+                sy += (y0 + y1) * cross
+            a /= 2.0
+            if a == 0:
+                continue
+            # holes subtract whatever their winding
+            weight = -abs(a) if self.ring_holes[i] else abs(a)
+            total += weight
+            cx += weight * (sx / (6.0 * a))
+            cy += weight * (sy / (6.0 * a))
+        if total <= 0:
+            return 0.0, (lat0, lon0)
+        return total, (lat0 + (cy / total) / ky, lon0 + (cx / total) / kx)
+
+    def contains(self, lat: float, lon: float) -> bool:
+        """Even-odd point in polygon test over all rings (holes excluded)."""
+        min_lat, min_lon, max_lat, max_lon = self.bbox
+        if lat < min_lat or lat > max_lat or lon < min_lon or lon > max_lon:
+            return False
+        inside = False
+        lats, lons = self.lats, self.lons
+        for i in range(self.ring_count):
+            r_min_lat, r_min_lon, r_max_lat, r_max_lon = self.ring_bboxes[i]
+            if lat < r_min_lat or lat > r_max_lat or lon < r_min_lon or lon > r_max_lon:
+                continue
+            for j in range(self.ring_offsets[i], self.ring_offsets[i + 1] - 1):
+                y0, y1 = lats[j], lats[j + 1]
+                if (y0 > lat) != (y1 > lat):
+                    x_cross = lons[j] + (lat - y0) * (lons[j + 1] - lons[j]) / (y1 - y0)
+                    if lon < x_cross:
+                        inside = not inside
+        return inside
+
+    def planar(self) -> "PlanarRings":
+        """Vertices projected to metres around the centroid, built on first use."""
+        if self._planar is None:
+            self._planar = PlanarRings(self)
+        return self._planar
+
+    def summary(self) -> dict:
+        return {
+            "bbox": list(self.bbox),
+            "area_m2": self.area_m2,
+            "centroid": list(self.centroid),
+            "parts": self.part_count,
+            "holes": sum(self.ring_holes),
+            "vertices": len(self.lats) - self.ring_count,
+        }
+
+
+class PlanarRings:
+    """Local equirectangular projection of a `CompiledPolygon`.
+
+    `xs`/`ys` are metres east/north of the polygon centroid, laid out like the
+    source `lats`/`lons`. Edges are grouped into blocks of at most
+    `SEGMENT_BLOCK` consecutive segments of one ring: block `b` covers the
+    segments starting at vertices `block_starts[b]:block_stops[b]` and its
+    bounding box is `(block_x0[b], block_y0[b], block_x1[b], block_y1[b])`, so a
+    nearest-edge search can skip whole blocks. Across a geofence (tens of
+    kilometres) the projection error stays well below the GPS error.
+    """
+
+    SEGMENT_BLOCK = 32
+
+    __slots__ = (
+        "lat0", "lon0", "kx", "ky", "xs", "ys",
+        "block_starts", "block_stops", "block_x0", "block_y0", "block_x1", "block_y1", "scratch",
+    )
+
+    def __init__(self, compiled: CompiledPolygon):
+        self.lat0, self.lon0 = compiled.centroid
+        self.ky = math.radians(1.0) * EARTH_RADIUS_M
+        self.kx = self.ky * math.cos(math.radians(self.lat0))
+        self.xs = array("d", ((lon - self.lon0) * self.kx for lon in compiled.lons))
+        self.ys = array("d", ((lat - self.lat0) * self.ky for lat in compiled.lats))
+        self.block_starts, self.block_stops = array("l"), array("l")
+        self.block_x0, self.block_y0 = array("d"), array("d")
+        self.block_x1, self.block_y1 = array("d"), array("d")
+        offsets = compiled.ring_offsets
+        for i in range(compiled.ring_count):
+            last = offsets[i + 1] - 1
+            for start in range(offsets[i], last, self.SEGMENT_BLOCK):
+                stop = min(start + self.SEGMENT_BLOCK, last)
+                bx = self.xs[start:stop + 1]
+                by = self.ys[start:stop + 1]
+                self.block_starts.append(start)
+                self.block_stops.append(stop)
+                self.block_x0.append(min(bx))
+                self.block_y0.append(min(by))
+                self.block_x1.append(max(bx))
+                self.block_y1.append(max(by))
+        # derived arrays owned by consumers (e.g. numpy views in utils.proximity)
+        self.scratch: dict = {}
+
+    @property
+    def block_count(self) -> int:
+        return len(self.block_starts)
+
+    def project(self, lat: float, lon: float) -> Tuple[float, float]:
+        return (lon - self.lon0) * self.kx, (lat - self.lat0) * self.ky
+
+
+def compile_area(area: Optional[str]) -> Optional[CompiledPolygon]:
+    polygons = parse_area(area)
+    return CompiledPolygon(polygons) if polygons else None
+
+
+def traccar_area(area: str) -> str:
+    """The area as Traccar can store it: a single polygon without holes.
+
+    Traccar geofences are plain polygons, so a multipolygon is sent as the
+    outer ring of its largest part and holes are left out.
+    """
+    polygons = parse_area(area)
+    if not polygons or (len(polygons) == 1 and len(polygons[0]) == 1):
+        return area
+    largest = max(polygons, key=lambda p: CompiledPolygon([[p[0]]]).area_m2)
+    return _format([[largest[0]]])
+
+
+# --- shared cache --------------------------------------------------------
+
+
+class GeofenceCache:
+    """Compiled polygons by geofence id, revalidated against the `geofences` table version.
+
+    A version bump (any geofence write) only costs one query for the areas of
+    the requested ids; polygons whose WKT did not change are kept.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[int, Tuple[int, str, Optional[CompiledPolygon]]] = {}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, db, geofence_id: int) -> Optional[CompiledPolygon]:
+        return self.get_many(db, [geofence_id]).get(int(geofence_id))
+
+    def get_many(self, db, geofence_ids: Iterable[int]) -> Dict[int, CompiledPolygon]:
+        from models.geofence import Geofence
+        from utils.etag import get_version
+
+        ids = {int(i) for i in geofence_ids if i is not None}
+        if not ids:
+            return {}
+        version = get_version(db, "geofences")
+        result, stale = {}, set()
+        with self._lock:
+            for gid in ids:
+                entry = self._entries.get(gid)
+                if entry is not None and entry[0] == version:
+                    if entry[2] is not None:
+                        result[gid] = entry[2]
+                else:
+                    stale.add(gid)
+        if not stale:
+            return result
+        rows = dict(db.query(Geofence.id, Geofence.area).filter(Geofence.id.in_(stale)).all())
+        with self._lock:
+            for gid in stale:
+                area = rows.get(gid)
+                if area is None:
+                    self._entries.pop(gid, None)
+                    continue
+                entry = self._entries.get(gid)
+                compiled = entry[2] if entry is not None and entry[1] == area else compile_area(area)
+                self._entries[gid] = (version, area, compiled)
+                if compiled is not None:
+                    result[gid] = compiled
+        return result
+
+
+geofence_cache = GeofenceCache()
@@ -0,0 +1,151 @@
+"""End-to-end ingest latency: device fix -> Traccar -> Bantay -> database -> websocket.
+
+Every Traccar request opens an `IngestBatch`, which stamps the receive time.
+Each item adds its device `fixTime` and Traccar `serverTime` (for events,
+`eventTime`). The batch then records these stages, in seconds:
+
+- `device_to_traccar`: serverTime - fixTime (device buffering, cellular delay)
+- `traccar_to_receive`: received - serverTime (Traccar's forwarder)
+- `receive_to_commit`: commit finished - received (our ingest and database)
+- `commit_to_fanout`: websocket sends finished - commit
+- `end_to_end`: websocket sends finished - fixTime (or serverTime without a fix)
+
+Item stages are recorded once per item and batch stages once per batch.
+SOS alarms are tracked under their own kind ("sos"), next to "positions"
+and "events". Device, Traccar and server clocks can disagree. A negative
+stage is therefore recorded as 0 and counted as `skewed`.
+
+Each stage feeds the `bantay_ingest_latency_seconds` histogram. A bounded
+sample of recent values backs the percentiles at
+`GET /api/admin/ingest/latency`.
+"""
+
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional, Tuple
+
+from core.metrics import Histogram
+
+STAGES = ("device_to_traccar", "traccar_to_receive", "receive_to_commit", "commit_to_fanout", "end_to_end")
+SAMPLE_SIZE = 2048
+
+LATENCY_SECONDS = Histogram(
+    "bantay_ingest_latency_seconds",
+    "Ingest latency by stage (device fix to websocket fan-out).",
+    ["kind", "stage"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600),
+)
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class _StageStats:
+    __slots__ = ("count", "skewed", "seconds_max", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.skewed = 0
+        self.seconds_max = 0.0
+        self.samples: Deque[float] = deque(maxlen=SAMPLE_SIZE)
+
+
+class LatencyTracker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[Tuple[str, str], _StageStats] = {}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def record(self, kind: str, stage: str, seconds: float):
+        skewed = seconds < 0
+        seconds = max(seconds, 0.0)
+        LATENCY_SECONDS.labels(kind, stage).observe(seconds)
+        with self._lock:
+            stats = self._stats.get((kind, stage))
+            if stats is None:
+                stats = self._stats[(kind, stage)] = _StageStats()
+            stats.count += 1
+            stats.skewed += skewed
+            stats.seconds_max = max(stats.seconds_max, seconds)
+            stats.samples.append(seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            rows = [(kind, stage, s.count, s.skewed, s.seconds_max, sorted(s.samples)) for (kind, stage), s in self._stats.items()]
+        out: Dict[str, dict] = {}
+        for kind, stage, count, skewed, seconds_max, ordered in rows:
+            out.setdefault(kind, {})[stage] = {
+                "count": count,
+                "skewed": skewed,
+                "p50_s": round(_percentile(ordered, 0.50), 3),
+                "p95_s": round(_percentile(ordered, 0.95), 3),
+                "p99_s": round(_percentile(ordered, 0.99), 3),
+                "max_s": round(seconds_max, 3),
+            }
+        for stages in out.values():
+            # keep the pipeline order
+            ordered_stages = {stage: stages[stage] for stage in STAGES if stage in stages}
+            stages.clear()
+            stages.update(ordered_stages)
+        return out
+
+
+tracker = LatencyTracker()
+
+
+def _epoch(ts: Optional[datetime]) -> Optional[float]:
+    if ts is None:
+        return None
+    return (ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)).timestamp()
+
+
+class IngestBatch:
+    """Timestamps of one Traccar request; create it as soon as the request arrives."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.received = time.time()
+        self.received_at = datetime.fromtimestamp(self.received, tz=timezone.utc)
+        self.received_iso = self.received_at.isoformat()
+        self.committed_at: Optional[float] = None
+        self._origins: List[Tuple[str, Optional[float]]] = []
+
+    def item(self, fix_time: Optional[datetime], server_time: Optional[datetime], kind: Optional[str] = None):
+        """Record the device and Traccar stages of one stored item."""
+        kind = kind or self.kind
+        fix, server = _epoch(fix_time), _epoch(server_time)
+        if fix is not None and server is not None:
+            tracker.record(kind, "device_to_traccar", server - fix)
+        if server is not None:
+            tracker.record(kind, "traccar_to_receive", self.received - server)
+        origin = fix if fix is not None else server
+        if origin is not None:
+            self._origins.append((kind, origin))
+        elif kind != self.kind:
+            # still report the batch stages for this kind
+            self._origins.append((kind, None))
+
+    def _kinds(self) -> set:
+        return {self.kind} | {kind for kind, _ in self._origins}
+
+    def committed(self):
+        self.committed_at = time.time()
+        for kind in self._kinds():
+            tracker.record(kind, "receive_to_commit", self.committed_at - self.received)
+
+    def fanned_out(self):
+        done = time.time()
+        if self.committed_at is not None:
+            for kind in self._kinds():
+                tracker.record(kind, "commit_to_fanout", done - self.committed_at)
+        for kind, origin in self._origins:
+            if origin is not None:
+                tracker.record(kind, "end_to_end", done - origin)
@@ -0,0 +1,292 @@
+"""In-memory index of the latest position per device for nearest-vessel queries.
+
+Positions are bucketed into a fixed lat/lon grid (`CELL_DEGREES` per side,
+about 5.5 km at the equator). `VesselIndex.nearest` searches rings of cells
+outwards from the query cell and stops as soon as the k-th best distance is
+closer than anything an unvisited ring could hold, so a query touches a few
+cells instead of every device. When the rings would outgrow the number of
+occupied cells or `MAX_RING_CELLS` (a sparse fleet far from the query), the search switches to
+1-degree coarse cells and visits their occupied fine cells nearest box first.
+
+The index is warmed from the database (latest position per device) on first
+use and updated by `receive_positions` after each commit. It is per process;
+a restarted worker rebuilds it on its next query or ingest.
+"""
+
+import math
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from utils.geometry import EARTH_RADIUS_M, haversine_m
+
+CELL_DEGREES = 0.05
+# fine cells per coarse cell side (1 degree); coarse cells list their occupied fine cells
+COARSE_FACTOR = 20
+# past this many fine cells (about 40 km out) the ring search hands over to the coarse grid
+MAX_RING_CELLS = 256
+MAX_K = 100
+_M_PER_DEG = math.radians(1.0) * EARTH_RADIUS_M
+
+Cell = Tuple[int, int]
+
+
+def bearing_deg(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dl = math.radians(lon2 - lon1)
+    y = math.sin(dl) * math.cos(p2)
+    x = math.cos(p1) * math.sin(p2) - math.sin(p1) * math.cos(p2) * math.cos(dl)
+    return (math.degrees(math.atan2(y, x)) + 360.0) % 360.0
+
+
+def _cell(lat: float, lon: float) -> Cell:
+    return int(math.floor(lat / CELL_DEGREES)), int(math.floor(lon / CELL_DEGREES))
+
+
+def _coarse(cell: Cell) -> Cell:
+    return cell[0] // COARSE_FACTOR, cell[1] // COARSE_FACTOR
+
+
+def _box_gap(lat: float, lon: float, row: int, col: int, size: float) -> float:
+    """Lower bound (metres) on the distance from the point to grid box `(row, col)` of `size` degrees."""
+    lat_lo, lon_lo = row * size, col * size
+    lat_hi, lon_hi = lat_lo + size, lon_lo + size
+    dy = max(lat_lo - lat, 0.0, lat - lat_hi) * _M_PER_DEG
+    dx = max(lon_lo - lon, 0.0, lon - lon_hi)
+    widest_lat = min(89.9, max(abs(lat), abs(lat_lo), abs(lat_hi)))
+    dx = min(dx, 360.0 - dx) * _M_PER_DEG * math.cos(math.radians(widest_lat))
+    # slack for the flat-earth approximation against haversine distances
+    return 0.99 * math.hypot(dx, dy)
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _as_utc(ts: Optional[datetime]) -> datetime:
+    if ts is None:
+        return datetime.now(timezone.utc)
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+class VesselIndex:
+    """Latest `(lat, lon, timestamp, speed, course)` per device in a grid of cells."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._latest: Dict[int, tuple] = {}
+        self._cells: Dict[Cell, Set[int]] = {}
+        self._coarse: Dict[Cell, Set[Cell]] = {}
+
+    def __len__(self) -> int:
+        return len(self._latest)
+
+    def clear(self):
+        with self._lock:
+            self._latest.clear()
+            self._cells.clear()
+            self._coarse.clear()
+            self._loaded = False
+
+    def ensure_loaded(self, db):
+        """Warm the index with the newest position of every device (once per process)."""
+        if self._loaded:
+            return
+        from sqlalchemy import func
+
+        from models.position import Position
+
+        newest = db.query(func.max(Position.id)).group_by(Position.device_id).subquery()
+        rows = db.query(Position).filter(Position.id.in_(db.query(newest))).all()
+        with self._lock:
+            if self._loaded:
+                return
+            for p in rows:
+                # positions without a fix time never count as recent
+                self._put(p.device_id, p.latitude, p.longitude, p.timestamp or _EPOCH, p.speed, p.course)
+            self._loaded = True
+
+    def update(self, device_id: int, lat: float, lon: float, timestamp=None, speed=None, course=None):
+        """Record a new position; older fixes than the one already held are ignored."""
+        if lat is None or lon is None:
+            return
+        with self._lock:
+            self._put(device_id, float(lat), float(lon), timestamp, speed, course)
+
+    def _put(self, device_id, lat, lon, timestamp, speed, course):
+        ts = _as_utc(timestamp)
+        current = self._latest.get(device_id)
+        if current is not None:
+            if current[2] > ts:
+                return
+            self._unlink(device_id, current)
+        self._latest[device_id] = (lat, lon, ts, speed, course)
+        cell = _cell(lat, lon)
+        members = self._cells.get(cell)
+        if members is None:
+            members = self._cells[cell] = set()
+            self._coarse.setdefault(_coarse(cell), set()).add(cell)
+        members.add(device_id)
+
+    def _unlink(self, device_id, current):
+        cell = _cell(current[0], current[1])
+        members = self._cells.get(cell)
+        if members is None:
+            return
+        members.discard(device_id)
+        if not members:
+            del self._cells[cell]
+            fine = self._coarse.get(_coarse(cell))
+            if fine is not None:
+                fine.discard(cell)
+                if not fine:
+                    del self._coarse[_coarse(cell)]
+
+    def remove(self, device_id: int):
+        with self._lock:
+            current = self._latest.pop(device_id, None)
+            if current is not None:
+                self._unlink(device_id, current)
+
+    def latest(self, device_id: int) -> Optional[tuple]:
+        return self._latest.get(device_id)
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int = 5,
+        max_age_seconds: Optional[float] = None,
+        exclude: Optional[Set[int]] = None,
+        now: Optional[datetime] = None,
+    ) -> List[dict]:
+        """The `k` devices closest to `(lat, lon)`, nearest first.
+
+        Devices whose latest fix is older than `max_age_seconds` are skipped.
+        """
+        if k <= 0:
+            return []
+        now = _as_utc(now)
+        exclude = exclude or set()
+        cy, cx = _cell(lat, lon)
+        best: List[Tuple[float, int]] = []
+        with self._lock:
+            total = len(self._latest)
+            seen = 0
+            ring = 0
+            while seen < total:
+                if len(best) >= k and best[-1][0] <= self._ring_clearance(lat, lon, cy, cx, ring):
+                    break
+                if (2 * ring + 1) ** 2 > min(len(self._cells), MAX_RING_CELLS):
+                    # sparse grid: visit the occupied cells left, nearest box first
+                    self._scan_remaining(lat, lon, cy, cx, ring, k, max_age_seconds, exclude, now, best)
+                    break
+                for cell in self._ring_cells(cy, cx, ring):
+                    for device_id in self._cells.get(cell, ()):
+                        seen += 1
+                        if device_id in exclude:
+                            continue
+                        d_lat, d_lon, ts, _, _ = self._latest[device_id]
+                        if max_age_seconds is not None and (now - ts).total_seconds() > max_age_seconds:
+                            continue
+                        best.append((haversine_m(lat, lon, d_lat, d_lon), device_id))
+                best.sort()
+                del best[k:]
+                ring += 1
+            snapshot = {device_id: self._latest[device_id] for _, device_id in best}
+        result = []
+        for distance, device_id in best:
+            d_lat, d_lon, ts, speed, course = snapshot[device_id]
+            result.append({
+                "device_id": device_id,
+                "latitude": d_lat,
+                "longitude": d_lon,
+                "speed": speed,
+                "course": course,
+                "timestamp": ts.isoformat(),
+                "age_seconds": max(0.0, (now - ts).total_seconds()),
+                "distance_m": round(distance, 1),
+                "bearing_deg": round(bearing_deg(lat, lon, d_lat, d_lon), 1),
+            })
+        return result
+
+    def _scan_remaining(self, lat, lon, cy, cx, ring, k, max_age_seconds, exclude, now, best):
+        coarse_size = CELL_DEGREES * COARSE_FACTOR
+        coarse = sorted((_box_gap(lat, lon, c[0], c[1], coarse_size), c) for c in self._coarse)
+        for coarse_gap, coarse_cell in coarse:
+            if len(best) >= k and best[-1][0] <= coarse_gap:
+                break
+            fine = sorted(
+                (_box_gap(lat, lon, c[0], c[1], CELL_DEGREES), c)
+                for c in self._coarse[coarse_cell]
+                # cells inside the rings already searched
+                if max(abs(c[0] - cy), abs(c[1] - cx)) >= ring
+            )
+            for gap, cell in fine:
+                if len(best) >= k and best[-1][0] <= gap:
+                    break
+                for device_id in self._cells[cell]:
+                    if device_id in exclude:
+                        continue
+                    d_lat, d_lon, ts, _, _ = self._latest[device_id]
+                    if max_age_seconds is not None and (now - ts).total_seconds() > max_age_seconds:
+                        continue
+                    best.append((haversine_m(lat, lon, d_lat, d_lon), device_id))
+                best.sort()
+                del best[k:]
+
+    @staticmethod
+    def _ring_cells(cy: int, cx: int, ring: int):
+        if ring == 0:
+            yield cy, cx
+            return
+        for dx in range(-ring, ring + 1):
+            yield cy - ring, cx + dx
+            yield cy + ring, cx + dx
+        for dy in range(-ring + 1, ring):
+            yield cy + dy, cx - ring
+            yield cy + dy, cx + ring
+
+    @staticmethod
+    def _ring_clearance(lat: float, lon: float, cy: int, cx: int, ring: int) -> float:
+        """Lower bound (metres) on the distance to any cell in ring `ring` or beyond."""
+        if ring == 0:
+            return 0.0
+        lat_lo, lat_hi = (cy - ring + 1) * CELL_DEGREES, (cy + ring) * CELL_DEGREES
+        lon_lo, lon_hi = (cx - ring + 1) * CELL_DEGREES, (cx + ring) * CELL_DEGREES
+        # meridians converge, so use the narrowest latitude of the searched box
+        widest_lat = min(89.9, max(abs(lat_lo), abs(lat_hi)))
+        kx = _M_PER_DEG * math.cos(math.radians(widest_lat))
+        return min((lat - lat_lo) * _M_PER_DEG, (lat_hi - lat) * _M_PER_DEG, (lon - lon_lo) * kx, (lon_hi - lon) * kx)
+
+
+vessel_index = VesselIndex()
+
+
+def with_device_details(db, hits: List[dict]) -> List[dict]:
+    """Add device name/owner to `nearest` results and drop devices deleted since indexing."""
+    if not hits:
+        return hits
+    from models.device import Device
+
+    rows = {
+        d.id: d
+        for d in db.query(Device.id, Device.name, Device.unique_id, Device.user_id).filter(
+            Device.id.in_([h["device_id"] for h in hits])
+        )
+    }
+    result = []
+    for hit in hits:
+        d = rows.get(hit["device_id"])
+        if d is None:
+            continue
+        result.append({**hit, "name": d.name, "unique_id": d.unique_id, "user_id": d.user_id})
+    return result
+
+
+def nearest_vessels(db, lat: float, lon: float, k: int, max_age_seconds: Optional[float], exclude: Optional[Set[int]] = None) -> List[dict]:
+    """kNN over `vessel_index` with device details; over-fetches to cover deleted devices."""
+    vessel_index.ensure_loaded(db)
+    k = min(max(int(k), 1), MAX_K)
+    hits = vessel_index.nearest(lat, lon, k=k + 5, max_age_seconds=max_age_seconds, exclude=exclude)
+    return with_device_details(db, hits)[:k]
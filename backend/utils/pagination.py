@@ -0,0 +1,138 @@
+"""Opaque cursor helpers for keyset pagination.
+
+Cursors are url-safe base64 encoded JSON arrays so clients treat them as
+opaque tokens; the next cursor is returned in the `X-Next-Cursor` header so
+list endpoints keep returning plain JSON arrays.
+"""
+
+import base64
+import json
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException, Response
+from sqlalchemy import String, and_, or_, type_coerce
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(*values: Any) -> str:
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def paginate_by_id(query, id_column, cursor: Optional[str], limit: Optional[int], response: Response):
+    """Apply ascending keyset pagination on `id_column`.
+
+    Without `limit` or `cursor` the full result is returned (legacy behaviour).
+    """
+    if limit is None and cursor is None:
+        return query.order_by(id_column.asc()).all()
+    limit = min(max(limit or MAX_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+    if cursor:
+        values = decode_cursor(cursor)
+        try:
+            after_id = int(values[0])
+        except (IndexError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(id_column > after_id)
+    rows = query.order_by(id_column.asc()).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].id)
+    return rows
+
+
+def parse_time_filter(value: Optional[str], name: str) -> Optional[datetime]:
+    """Parse an ISO-8601 `since`/`until` query value as UTC (naive values are UTC)."""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} timestamp")
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    # SQLite's DateTime binding drops the offset, so convert rather than pass it through
+    return dt.astimezone(timezone.utc)
+
+
+def paginate_by_time(
+    query,
+    ts_column,
+    id_column,
+    cursor: Optional[str],
+    limit: int,
+    response: Response,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    entity: Callable = lambda row: row,
+):
+    """Newest-first keyset pagination on (`ts_column`, `id_column`).
+
+    Each page is an index range scan on the matching composite index, so the
+    cost does not grow with how far back the caller has paged. `entity`
+    extracts the ORM object from a result row when the query selects tuples.
+
+    SQLite stores datetimes as text in whatever format the writer used:
+    `CURRENT_TIMESTAMP` defaults have no fraction, while SQLAlchemy writes
+    microseconds. A re-formatted bound value would then never equal the
+    stored one. So on SQLite the cursor carries the stored text and is
+    compared as text, the same order the index and `ORDER BY` use. NULL
+    timestamps sort last on SQLite and first on PostgreSQL; a page ending on
+    one gets an id-only cursor.
+    """
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
+    dialect = query.session.get_bind().dialect.name
+    stored_text = dialect == "sqlite"
+    nulls_first = dialect == "postgresql"
+    if since is not None:
+        query = query.filter(ts_column >= since)
+    if until is not None:
+        query = query.filter(ts_column <= until)
+    if cursor:
+        values = decode_cursor(cursor)
+        try:
+            last_ts = values[0]
+            last_id = int(values[1])
+            if last_ts is not None:
+                parsed = datetime.fromisoformat(last_ts)
+                if not stored_text:
+                    last_ts = parsed
+        except (IndexError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if last_ts is None:
+            after = and_(ts_column.is_(None), id_column < last_id)
+            if nulls_first:
+                after = or_(ts_column.isnot(None), after)
+        else:
+            column = type_coerce(ts_column, String) if stored_text else ts_column
+            after = or_(column < last_ts, and_(column == last_ts, id_column < last_id))
+            if not nulls_first:
+                after = or_(after, ts_column.is_(None))
+        query = query.filter(after)
+    rows = query.order_by(ts_column.desc(), id_column.desc()).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = entity(rows[-1])
+        last_id = getattr(last, id_column.key)
+        last_ts = getattr(last, ts_column.key)
+        if last_ts is not None:
+            if stored_text:
+                last_ts = query.session.query(type_coerce(ts_column, String)).filter(id_column == last_id).scalar()
+            else:
+                last_ts = last_ts.isoformat()
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last_ts, last_id)
+    return rows
@@ -0,0 +1,264 @@
+"""Distance to geofence boundaries and `geofenceApproach` events.
+
+Traccar only reports `geofenceEnter`/`geofenceExit` once a boat has crossed
+the line. For every ingested position this module computes the signed
+distance (metres, positive inside) from the point to the boundary of the
+device's assigned geofence, and `ProximityMonitor.check` turns distances at or
+below `GEOFENCE_APPROACH_METERS` into approach alerts.
+
+Distances use the polygon's `PlanarRings` projection. Edges are grouped into
+blocks with bounding boxes; a block is only searched when its box is closer
+than the nearest block vertex, which leaves a handful of candidate segments
+per point. With numpy installed a whole batch is evaluated in array
+operations (all points of one geofence at once); without it the same pruned
+search runs point by point in pure Python, roughly ten times slower. numpy is
+pinned in requirements.txt so deployed images take the vectorized path; it is
+imported on the first distance computation (or first access to `np`), not at
+import.
+"""
+
+import math
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from core import config
+from utils.geometry import CompiledPolygon, PlanarRings, geofence_cache
+
+_NOT_LOADED = object()
+
+
+def _numpy():
+    """numpy, or None when it is not installed; loaded once and kept as the module global `np`."""
+    module = globals().get("np", _NOT_LOADED)
+    if module is _NOT_LOADED:
+        try:
+            import numpy as module
+        except ImportError:  # optional: pure-Python fallback below
+            module = None
+        globals()["np"] = module
+    return module
+
+
+def __getattr__(name):
+    # `proximity.np` from outside (tests switch backends by setting it to None)
+    if name == "np":
+        return _numpy()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+APPROACH_EVENT = "geofenceApproach"
+# a device must move this much further than the threshold from the boundary
+# before it can raise another approach alert (stops flapping on GPS jitter)
+REARM_FACTOR = 1.25
+
+
+# --- pure Python ---------------------------------------------------------
+
+
+def _block_gap2(pl: PlanarRings, b: int, x: float, y: float) -> float:
+    dx = max(pl.block_x0[b] - x, 0.0, x - pl.block_x1[b])
+    dy = max(pl.block_y0[b] - y, 0.0, y - pl.block_y1[b])
+    return dx * dx + dy * dy
+
+
+def _signed_distance_py(pl: PlanarRings, x: float, y: float) -> float:
+    xs, ys = pl.xs, pl.ys
+    gaps = sorted((_block_gap2(pl, b, x, y), b) for b in range(pl.block_count))
+    best = math.inf
+    for gap, b in gaps:
+        if gap >= best:
+            break
+        for j in range(pl.block_starts[b], pl.block_stops[b]):
+            ax, ay = xs[j], ys[j]
+            ex, ey = xs[j + 1] - ax, ys[j + 1] - ay
+            length2 = ex * ex + ey * ey
+            t = ((x - ax) * ex + (y - ay) * ey) / length2 if length2 else 0.0
+            t = 0.0 if t < 0.0 else (1.0 if t > 1.0 else t)
+            px, py = ax + t * ex - x, ay + t * ey - y
+            d = px * px + py * py
+            if d < best:
+                best = d
+    inside = False
+    for b in range(pl.block_count):
+        if y < pl.block_y0[b] or y > pl.block_y1[b] or x > pl.block_x1[b]:
+            continue
+        for j in range(pl.block_starts[b], pl.block_stops[b]):
+            y0, y1 = ys[j], ys[j + 1]
+            if (y0 > y) != (y1 > y):
+                if x < xs[j] + (y - y0) * (xs[j + 1] - xs[j]) / (y1 - y0):
+                    inside = not inside
+    distance = math.sqrt(best)
+    return distance if inside else -distance
+
+
+# --- numpy ---------------------------------------------------------------
+
+
+def _np_blocks(pl: PlanarRings) -> dict:
+    """Per-polygon numpy views: block boxes and a padded block -> segment index."""
+    cached = pl.scratch.get("numpy")
+    if cached is not None:
+        return cached
+    starts = np.array(pl.block_starts, dtype=np.int64)
+    stops = np.array(pl.block_stops, dtype=np.int64)
+    width = PlanarRings.SEGMENT_BLOCK
+    seg = starts[:, None] + np.arange(width)[None, :]
+    valid = seg < stops[:, None]
+    # padding repeats the last real segment: harmless for a minimum, masked for crossings
+    seg = np.where(valid, seg, (stops - 1)[:, None])
+    xs = np.frombuffer(pl.xs, dtype=np.float64)
+    ys = np.frombuffer(pl.ys, dtype=np.float64)
+    cached = {
+        "x0": np.frombuffer(pl.block_x0, dtype=np.float64),
+        "y0": np.frombuffer(pl.block_y0, dtype=np.float64),
+        "x1": np.frombuffer(pl.block_x1, dtype=np.float64),
+        "y1": np.frombuffer(pl.block_y1, dtype=np.float64),
+        "vx": xs[starts],
+        "vy": ys[starts],
+        "ax": xs[seg],
+        "ay": ys[seg],
+        "ex": xs[seg + 1] - xs[seg],
+        "ey": ys[seg + 1] - ys[seg],
+        "valid": valid,
+    }
+    pl.scratch["numpy"] = cached
+    return cached
+
+
+def _signed_distances_np(pl: PlanarRings, x, y):
+    blk = _np_blocks(pl)
+    px, py = x[:, None], y[:, None]
+    gx = np.maximum(np.maximum(blk["x0"] - px, 0.0), px - blk["x1"])
+    gy = np.maximum(np.maximum(blk["y0"] - py, 0.0), py - blk["y1"])
+    gap2 = gx * gx + gy * gy
+    # every block's first vertex lies on the boundary, so it bounds the answer
+    upper = ((blk["vx"] - px) ** 2 + (blk["vy"] - py) ** 2).min(axis=1)
+    pi, bi = np.nonzero(gap2 <= upper[:, None])
+
+    ax, ay, ex, ey = blk["ax"][bi], blk["ay"][bi], blk["ex"][bi], blk["ey"][bi]
+    qx, qy = x[pi][:, None], y[pi][:, None]
+    length2 = ex * ex + ey * ey
+    t = np.clip(np.divide((qx - ax) * ex + (qy - ay) * ey, length2, out=np.zeros_like(length2), where=length2 > 0), 0.0, 1.0)
+    d2 = ((ax + t * ex - qx) ** 2 + (ay + t * ey - qy) ** 2).min(axis=1)
+    best = np.full(x.shape[0], np.inf)
+    np.minimum.at(best, pi, d2)
+
+    ci, cb = np.nonzero((py >= blk["y0"]) & (py <= blk["y1"]) & (px <= blk["x1"]))
+    ay, ey, ax, ex = blk["ay"][cb], blk["ey"][cb], blk["ax"][cb], blk["ex"][cb]
+    qx, qy = x[ci][:, None], y[ci][:, None]
+    straddles = ((ay > qy) != (ay + ey > qy)) & blk["valid"][cb]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cross_x = ax + (qy - ay) * ex / ey
+    hits = (straddles & (qx < cross_x)).sum(axis=1)
+    crossings = np.bincount(ci, weights=hits, minlength=x.shape[0])
+    distance = np.sqrt(best)
+    return np.where(crossings % 2 == 1, distance, -distance)
+
+
+# --- public API ----------------------------------------------------------
+
+
+def signed_distances(compiled: CompiledPolygon, points: Sequence[Tuple[float, float]]) -> List[float]:
+    """Signed distance in metres from each `(lat, lon)` to the polygon boundary.
+
+    Positive inside, negative outside; holes count as outside and their rings
+    as boundary.
+    """
+    if not points:
+        return []
+    pl = compiled.planar()
+    if _numpy() is not None:
+        lat = np.fromiter((p[0] for p in points), dtype=np.float64, count=len(points))
+        lon = np.fromiter((p[1] for p in points), dtype=np.float64, count=len(points))
+        return _signed_distances_np(pl, (lon - pl.lon0) * pl.kx, (lat - pl.lat0) * pl.ky).tolist()
+    return [_signed_distance_py(pl, *pl.project(lat, lon)) for lat, lon in points]
+
+
+def signed_distance(compiled: CompiledPolygon, lat: float, lon: float) -> float:
+    return signed_distances(compiled, [(lat, lon)])[0]
+
+
+class ProximityMonitor:
+    """Turns per-position boundary distances into `geofenceApproach` alerts.
+
+    A device raises one alert when it comes within the threshold of its
+    geofence boundary (from either side) and is re-armed once it is more than
+    `REARM_FACTOR` times the threshold away or its geofence assignment changes.
+    The armed state is per process and starts armed after a restart. `check`
+    only proposes state changes; the caller applies them with `apply` once the
+    alerts are committed, so a failed commit does not swallow the alert.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # device id -> geofence id it is currently "near"
+        self._near: Dict[int, int] = {}
+
+    def reset(self):
+        with self._lock:
+            self._near.clear()
+
+    def apply(self, changes: Dict[int, Optional[int]]):
+        """Record the state changes `check` proposed (device id -> near geofence id, or None when re-armed)."""
+        with self._lock:
+            for device_id, geofence_id in changes.items():
+                if geofence_id is None:
+                    self._near.pop(device_id, None)
+                else:
+                    self._near[device_id] = geofence_id
+
+    def check(self, db, samples: Iterable[Tuple[int, Optional[int], Optional[float], Optional[float]]]) -> Tuple[List[dict], Dict[int, Optional[int]]]:
+        """Evaluate `(device_id, geofence_id, lat, lon)` samples in ingest order.
+
+        Returns one dict per alert with `device_id` and event `attributes`, and
+        the state changes to pass to `apply` after the alerts are committed.
+        """
+        threshold = float(config.settings.GEOFENCE_APPROACH_METERS or 0)
+        if threshold <= 0:
+            return [], {}
+        by_fence: Dict[int, List[int]] = {}
+        samples = [s for s in samples if s[1] is not None and s[2] is not None and s[3] is not None]
+        for index, (_, geofence_id, _, _) in enumerate(samples):
+            by_fence.setdefault(int(geofence_id), []).append(index)
+        if not by_fence:
+            return [], {}
+        polygons = geofence_cache.get_many(db, by_fence.keys())
+        distances: Dict[int, float] = {}
+        for geofence_id, indexes in by_fence.items():
+            compiled = polygons.get(geofence_id)
+            if compiled is None:
+                continue
+            points = [(float(samples[i][2]), float(samples[i][3])) for i in indexes]
+            distances.update(zip(indexes, signed_distances(compiled, points)))
+
+        alerts = []
+        changes: Dict[int, Optional[int]] = {}
+        rearm = threshold * REARM_FACTOR
+        with self._lock:
+            for index, (device_id, geofence_id, lat, lon) in enumerate(samples):
+                distance = distances.get(index)
+                if distance is None:
+                    continue
+                geofence_id = int(geofence_id)
+                current = changes[device_id] if device_id in changes else self._near.get(device_id)
+                near = current == geofence_id
+                if abs(distance) <= threshold:
+                    if near:
+                        continue
+                    changes[device_id] = geofence_id
+                    alerts.append({
+                        "device_id": device_id,
+                        "attributes": {
+                            "geofenceId": geofence_id,
+                            "distance": round(distance, 1),
+                            "inside": distance >= 0,
+                            "threshold": threshold,
+                            "latitude": lat,
+                            "longitude": lon,
+                        },
+                    })
+                elif current is not None and (not near or abs(distance) > rearm):
+                    changes[device_id] = None
+        return alerts, changes
+
+
+monitor = ProximityMonitor()
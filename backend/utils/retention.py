@@ -0,0 +1,379 @@
+"""Retention for raw positions: downsample, archive to disk, delete.
+
+Positions move through three tiers:
+
+1. raw: everything newer than `RETENTION_RAW_DAYS`.
+2. downsampled: older fixes are thinned in place to the first fix per
+   `RETENTION_DOWNSAMPLE_SECONDS` per device. Alarm points (positions whose
+   attributes carry an `alarm`) are always kept.
+3. archived: fixes older than `RETENTION_ARCHIVE_DAYS` are appended to
+   gzipped NDJSON files under `RETENTION_ARCHIVE_DIR`, one file per device
+   and month (`positions/<device_id>/<YYYY-MM>.ndjson.gz`), and then deleted
+   from the database.
+
+Each step works in keyset batches of `RETENTION_BATCH_SIZE` and commits per
+batch, so a run never holds long locks and can be interrupted safely. A
+batch interrupted between writing and deleting is appended again on the next
+run. `read_archive` drops those duplicates by position id. Progress is kept
+in the `retention` job state. `history_rows` serves history endpoints from the
+database and, for windows older than the archive boundary, from the files.
+Hourly/daily rollups are built at ingest and are not affected.
+
+Scheduled runs take the `retention_lease` job state row first, so with several
+API workers (or a concurrent `manage.py retention`) only one run is active. The
+run renews the lease after every batch and stops if another owner took it.
+
+A day setting of 0 disables that tier.
+"""
+
+import gzip
+import json
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import and_, or_
+
+from core import config
+from db.upsert import dialect_insert
+from models.job_state import JobState
+from models.position import Position
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "retention"
+LEASE_NAME = "retention_lease"
+
+
+def _utc(ts: datetime) -> datetime:
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+def position_dict(p) -> dict:
+    return {
+        "id": p.id,
+        "device_id": p.device_id,
+        "latitude": p.latitude,
+        "longitude": p.longitude,
+        "speed": p.speed,
+        "course": p.course,
+        "timestamp": p.timestamp.isoformat() if p.timestamp else None,
+        "battery_percent": p.battery_percent,
+        "attributes": p.attributes,
+    }
+
+
+def _is_alarm(attributes) -> bool:
+    return isinstance(attributes, dict) and bool(attributes.get("alarm"))
+
+
+def _state(db) -> JobState:
+    state = db.get(JobState, JOB_NAME)
+    if state is None:
+        state = JobState(name=JOB_NAME, details={})
+        db.add(state)
+    return state
+
+
+def _boundary(db, key: str) -> Optional[datetime]:
+    state = db.get(JobState, JOB_NAME)
+    value = (state.details or {}).get(key) if state is not None else None
+    return datetime.fromisoformat(value) if value else None
+
+
+def _set_boundary(db, key: str, value: datetime):
+    state = _state(db)
+    # reassign so the JSON column is flagged dirty
+    state.details = {**(state.details or {}), key: value.isoformat()}
+    state.last_run_at = datetime.now(timezone.utc)
+
+
+class LeaseLost(RuntimeError):
+    """Another owner took the retention lease; the run stops before its next batch."""
+
+
+class RetentionLease:
+    """A held retention lease, identified by the stamp last written to the `retention_lease` row."""
+
+    def __init__(self, db, stamp: datetime):
+        self.db = db
+        self.stamp = stamp
+
+    def renew(self, now: Optional[datetime] = None):
+        """Move the stamp forward; raises LeaseLost when the row no longer carries ours."""
+        now = now or datetime.now(timezone.utc)
+        renewed = (
+            self.db.query(JobState)
+            .filter(JobState.name == LEASE_NAME, JobState.last_run_at == self.stamp)
+            .update({"last_run_at": now}, synchronize_session=False)
+        )
+        self.db.commit()
+        if renewed != 1:
+            raise LeaseLost("retention lease taken over by another worker")
+        self.stamp = now
+
+    def release(self):
+        """Give the lease back, unless it expired and another owner took it meanwhile."""
+        self.db.rollback()
+        self.db.query(JobState).filter(JobState.name == LEASE_NAME, JobState.last_run_at == self.stamp).update(
+            {"last_run_at": None, "details": {}}, synchronize_session=False
+        )
+        self.db.commit()
+
+
+def _batches(db, until: datetime, since: Optional[datetime], batch_size: int) -> Iterator[list]:
+    """Positions with `since <= timestamp < until` in (device, timestamp, id) order, a batch at a time."""
+    after = None
+    while True:
+        query = db.query(Position).filter(Position.timestamp.isnot(None), Position.timestamp < until)
+        if since is not None:
+            query = query.filter(Position.timestamp >= since)
+        if after is not None:
+            query = query.filter(
+                (Position.device_id > after[0])
+                | and_(Position.device_id == after[0], Position.timestamp > after[1])
+                | and_(Position.device_id == after[0], Position.timestamp == after[1], Position.id > after[2])
+            )
+        rows = query.order_by(Position.device_id, Position.timestamp, Position.id).limit(batch_size).all()
+        if not rows:
+            return
+        # taken before the caller commits and expunges the batch
+        last = rows[-1]
+        after = (last.device_id, last.timestamp, last.id)
+        yield rows
+
+
+def _delete_ids(db, ids: List[int]):
+    if ids:
+        db.query(Position).filter(Position.id.in_(ids)).delete(synchronize_session=False)
+
+
+def downsample(db, now: datetime, dry_run: bool = False, lease: Optional[RetentionLease] = None) -> dict:
+    """Thin raw fixes older than the raw window to one per interval per device."""
+    s = config.settings
+    if not s.RETENTION_RAW_DAYS or s.RETENTION_DOWNSAMPLE_SECONDS <= 0:
+        return {"skipped": True}
+    until = now - timedelta(days=s.RETENTION_RAW_DAYS)
+    since = _boundary(db, "downsampled_until")
+    interval = int(s.RETENTION_DOWNSAMPLE_SECONDS)
+    last_bucket: Dict[int, int] = {}
+    scanned = deleted = 0
+    for rows in _batches(db, until, since, s.RETENTION_BATCH_SIZE):
+        drop = []
+        for p in rows:
+            scanned += 1
+            if _is_alarm(p.attributes):
+                continue
+            bucket = int(_utc(p.timestamp).timestamp()) // interval
+            if last_bucket.get(p.device_id) == bucket:
+                drop.append(p.id)
+            else:
+                last_bucket[p.device_id] = bucket
+        deleted += len(drop)
+        if not dry_run:
+            _delete_ids(db, drop)
+            db.commit()
+        # release the batch; the next keyset page reloads what it needs
+        db.expunge_all()
+        if lease is not None:
+            lease.renew()
+    if not dry_run:
+        _set_boundary(db, "downsampled_until", until)
+        db.commit()
+    return {"until": until.isoformat(), "scanned": scanned, "deleted": deleted}
+
+
+def _archive_path(device_id: int, month: str) -> str:
+    return os.path.join(config.settings.RETENTION_ARCHIVE_DIR, "positions", str(int(device_id)), f"{month}.ndjson.gz")
+
+
+def archive(db, now: datetime, dry_run: bool = False, lease: Optional[RetentionLease] = None) -> dict:
+    """Append positions older than the archive window to per-device monthly files, then delete them."""
+    s = config.settings
+    if not s.RETENTION_ARCHIVE_DAYS:
+        return {"skipped": True}
+    until = now - timedelta(days=s.RETENTION_ARCHIVE_DAYS)
+    archived = 0
+    files = set()
+    for rows in _batches(db, until, None, s.RETENTION_BATCH_SIZE):
+        groups: Dict[tuple, list] = {}
+        for p in rows:
+            groups.setdefault((p.device_id, _utc(p.timestamp).strftime("%Y-%m")), []).append(position_dict(p))
+        archived += len(rows)
+        if dry_run:
+            files.update(groups)
+            db.expunge_all()
+            continue
+        for (device_id, month), items in groups.items():
+            path = _archive_path(device_id, month)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = "".join(json.dumps(item, separators=(",", ":")) + "\n" for item in items).encode("utf-8")
+            # each append is a complete gzip member; readers see one continuous stream
+            with open(path, "ab") as raw:
+                raw.write(gzip.compress(data))
+                raw.flush()
+                os.fsync(raw.fileno())
+            files.add((device_id, month))
+        # the files are synced before the rows go, so a crash can only duplicate, never lose
+        _delete_ids(db, [p.id for p in rows])
+        db.commit()
+        db.expunge_all()
+        if lease is not None:
+            lease.renew()
+    if not dry_run:
+        _set_boundary(db, "archived_until", until)
+        db.commit()
+    return {"until": until.isoformat(), "archived": archived, "files": len(files)}
+
+
+def run_retention(db, now: Optional[datetime] = None, dry_run: bool = False, lease: Optional[RetentionLease] = None) -> dict:
+    """Downsample, then archive; with `lease`, renew it after every batch (LeaseLost stops the run)."""
+    now = now or datetime.now(timezone.utc)
+    report = {"now": now.isoformat(), "dry_run": dry_run}
+    report["downsample"] = downsample(db, now, dry_run=dry_run, lease=lease)
+    report["archive"] = archive(db, now, dry_run=dry_run, lease=lease)
+    return report
+
+
+def _archive_months(device_id: int) -> List[str]:
+    directory = os.path.join(config.settings.RETENTION_ARCHIVE_DIR, "positions", str(int(device_id)))
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name[: -len(".ndjson.gz")] for name in os.listdir(directory) if name.endswith(".ndjson.gz"))
+
+
+def read_archive(device_id: int, start: Optional[datetime], end: Optional[datetime]) -> List[dict]:
+    """Archived fixes of one device with `start <= timestamp <= end` (None is unbounded), oldest first."""
+    start = _utc(start) if start is not None else None
+    end = _utc(end) if end is not None else None
+    seen = {}
+    for month in _archive_months(device_id):
+        if (start is not None and month < start.strftime("%Y-%m")) or (end is not None and month > end.strftime("%Y-%m")):
+            continue
+        path = _archive_path(device_id, month)
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            try:
+                for line in fh:
+                    item = json.loads(line)
+                    ts = _utc(datetime.fromisoformat(item["timestamp"]))
+                    if (start is None or start <= ts) and (end is None or ts <= end):
+                        seen[item["id"]] = (ts, item)
+            except (EOFError, ValueError):
+                # a member cut short by a crash; its rows were not deleted from the database
+                logger.warning("Truncated position archive %s", path)
+    return [item for _, item in sorted(seen.values(), key=lambda row: (row[0], row[1]["id"]))]
+
+
+def iter_history(db, device_id: int, start: Optional[datetime], end: Optional[datetime], rows: Iterable[dict]) -> Iterator[dict]:
+    """Archived fixes of the window followed by `rows`, the database fixes of the same window in time order.
+
+    A fix both archived and still in the database (a run interrupted between
+    writing and deleting) is yielded once.
+    """
+    archived_until = _boundary(db, "archived_until")
+    seen = set()
+    if archived_until is not None and (start is None or start < archived_until):
+        for item in read_archive(device_id, start, archived_until if end is None else min(end, archived_until)):
+            seen.add(item["id"])
+            yield item
+    for row in rows:
+        if row["id"] not in seen:
+            yield row
+
+
+def history_rows(db, device_id: int, start: datetime, end: datetime) -> List[dict]:
+    """A device's track for a window: database rows plus archived fixes when the window reaches that far back."""
+    rows = (
+        db.query(Position)
+        .filter(Position.device_id == device_id)
+        .filter(Position.timestamp.isnot(None))
+        .filter(Position.timestamp >= start)
+        .filter(Position.timestamp <= end)
+        .order_by(Position.timestamp.asc())
+        .all()
+    )
+    return list(iter_history(db, device_id, start, end, (position_dict(p) for p in rows)))
+
+
+def acquire_lease(db, owner: str, now: Optional[datetime] = None) -> Optional[RetentionLease]:
+    """Take the retention lease unless another owner holds an unexpired one."""
+    now = now or datetime.now(timezone.utc)
+    insert = dialect_insert(db, "The retention lease")
+    db.execute(insert(JobState.__table__).values(name=LEASE_NAME, details={}).on_conflict_do_nothing(index_elements=["name"]))
+    expired = now - timedelta(seconds=config.settings.RETENTION_LEASE_SECONDS)
+    # a single conditional UPDATE, so two workers cannot both see the lease as free
+    taken = (
+        db.query(JobState)
+        .filter(JobState.name == LEASE_NAME, or_(JobState.last_run_at.is_(None), JobState.last_run_at < expired))
+        .update({"last_run_at": now, "details": {"owner": owner}}, synchronize_session=False)
+    )
+    db.commit()
+    return RetentionLease(db, now) if taken == 1 else None
+
+
+def lease_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class RetentionScheduler:
+    """Runs `run_retention` every RETENTION_INTERVAL_SECONDS from a daemon thread."""
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._last_report: Optional[dict] = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"running": self._thread is not None and self._thread.is_alive(), "last_report": self._last_report}
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="position-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def run_once(self) -> dict:
+        from db.session import SessionLocal
+
+        db = SessionLocal()
+        try:
+            lease = acquire_lease(db, lease_owner())
+            if lease is None:
+                report = {"skipped": True, "reason": "retention lease held by another worker"}
+            else:
+                try:
+                    report = run_retention(db, lease=lease)
+                except LeaseLost as e:
+                    # the new owner carries on from the committed batches
+                    logger.warning("Position retention stopped: %s", e)
+                    report = {"stopped": True, "reason": str(e)}
+                finally:
+                    lease.release()
+        finally:
+            db.close()
+        with self._lock:
+            self._last_report = report
+        return report
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Position retention run failed")
+            self._stop.wait(config.settings.RETENTION_INTERVAL_SECONDS)
+
+
+scheduler = RetentionScheduler()
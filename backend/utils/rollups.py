@@ -0,0 +1,273 @@
+"""Hourly and daily per-device position rollups.
+
+Each `PositionRollup` row aggregates one device's fixes in a UTC hour or day:
+count, distance travelled, speed sum/count (for the average), max speed,
+min battery, bounding box and first/last fix. `rollup_positions` folds each
+ingest batch into the rows with one upsert per bucket (`INSERT ... ON
+CONFLICT DO UPDATE` adding counts and widening min/max), so concurrent
+batches never lose updates and dashboards read a few rows instead of every
+raw position.
+
+Distance is the sum of steps between consecutive fixes and is attributed to
+the later fix's bucket. A fix older than the device's last one still counts
+towards its bucket's totals but adds no distance; `backfill` rebuilds
+buckets from raw positions when exact figures are needed.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, case, func
+
+from db.upsert import dialect_insert
+from models.position import Position
+from models.position_rollup import PositionRollup
+from utils.geometry import haversine_m
+
+BUCKETS = ("hour", "day")
+Fix = Tuple[datetime, float, float]
+
+
+def _utc(ts: datetime) -> datetime:
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+def bucket_start(bucket: str, ts: datetime) -> datetime:
+    ts = _utc(ts).astimezone(timezone.utc)
+    if bucket == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class _Agg:
+    __slots__ = (
+        "count", "distance_m", "speed_sum", "speed_count", "max_speed", "min_battery",
+        "min_lat", "min_lon", "max_lat", "max_lon", "first", "last",
+    )
+
+    def __init__(self, ts: datetime, lat: float, lon: float):
+        self.count = 0
+        self.distance_m = 0.0
+        self.speed_sum = 0.0
+        self.speed_count = 0
+        self.max_speed = None
+        self.min_battery = None
+        self.min_lat = self.max_lat = lat
+        self.min_lon = self.max_lon = lon
+        self.first = self.last = (ts, lat, lon)
+
+    def add(self, ts, lat, lon, speed, battery, step_m):
+        self.count += 1
+        self.distance_m += step_m
+        if speed is not None:
+            self.speed_sum += speed
+            self.speed_count += 1
+            self.max_speed = speed if self.max_speed is None else max(self.max_speed, speed)
+        if battery is not None:
+            self.min_battery = battery if self.min_battery is None else min(self.min_battery, battery)
+        self.min_lat, self.max_lat = min(self.min_lat, lat), max(self.max_lat, lat)
+        self.min_lon, self.max_lon = min(self.min_lon, lon), max(self.max_lon, lon)
+        if ts < self.first[0]:
+            self.first = (ts, lat, lon)
+        if ts >= self.last[0]:
+            self.last = (ts, lat, lon)
+
+
+def _least(current, new):
+    return case((current.is_(None), new), (new.is_(None), current), (new < current, new), else_=current)
+
+
+def _greatest(current, new):
+    return case((current.is_(None), new), (new.is_(None), current), (new > current, new), else_=current)
+
+
+class RollupAccumulator:
+    """Aggregates fixes in memory and upserts them into `position_rollups` on `flush`."""
+
+    def __init__(self):
+        self._aggs: Dict[Tuple[int, str, datetime], _Agg] = {}
+        self._last: Dict[int, Fix] = {}
+
+    def seed(self, device_id: int, fix: Fix):
+        """The device's previous fix, so the first step of this batch is counted."""
+        self._last[device_id] = (_utc(fix[0]), fix[1], fix[2])
+
+    def add(self, device_id: int, ts: datetime, lat: float, lon: float, speed=None, battery=None):
+        ts = _utc(ts)
+        prev = self._last.get(device_id)
+        step = 0.0
+        if prev is None or ts >= prev[0]:
+            if prev is not None:
+                step = haversine_m(prev[1], prev[2], lat, lon)
+            self._last[device_id] = (ts, lat, lon)
+        for bucket in BUCKETS:
+            key = (device_id, bucket, bucket_start(bucket, ts))
+            agg = self._aggs.get(key)
+            if agg is None:
+                agg = self._aggs[key] = _Agg(ts, lat, lon)
+            agg.add(ts, lat, lon, speed, battery, step)
+
+    def __len__(self) -> int:
+        return len(self._aggs)
+
+    def flush(self, db) -> int:
+        """Upsert the pending buckets (inside the caller's transaction); returns rows written."""
+        if not self._aggs:
+            return 0
+        rows = [
+            {
+                "device_id": device_id,
+                "bucket": bucket,
+                "bucket_start": start,
+                "count": a.count,
+                "distance_m": a.distance_m,
+                "speed_sum": a.speed_sum,
+                "speed_count": a.speed_count,
+                "max_speed": a.max_speed,
+                "min_battery": a.min_battery,
+                "min_latitude": a.min_lat,
+                "min_longitude": a.min_lon,
+                "max_latitude": a.max_lat,
+                "max_longitude": a.max_lon,
+                "first_at": a.first[0],
+                "first_latitude": a.first[1],
+                "first_longitude": a.first[2],
+                "last_at": a.last[0],
+                "last_latitude": a.last[1],
+                "last_longitude": a.last[2],
+            }
+            for (device_id, bucket, start), a in self._aggs.items()
+        ]
+        self._aggs.clear()
+        t = PositionRollup.__table__.c
+        stmt = dialect_insert(db, "position rollups")(PositionRollup.__table__)
+        ex = stmt.excluded
+        earlier, later = ex.first_at < t.first_at, ex.last_at >= t.last_at
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["device_id", "bucket", "bucket_start"],
+            set_={
+                "count": t.count + ex.count,
+                "distance_m": t.distance_m + ex.distance_m,
+                "speed_sum": t.speed_sum + ex.speed_sum,
+                "speed_count": t.speed_count + ex.speed_count,
+                "max_speed": _greatest(t.max_speed, ex.max_speed),
+                "min_battery": _least(t.min_battery, ex.min_battery),
+                "min_latitude": _least(t.min_latitude, ex.min_latitude),
+                "min_longitude": _least(t.min_longitude, ex.min_longitude),
+                "max_latitude": _greatest(t.max_latitude, ex.max_latitude),
+                "max_longitude": _greatest(t.max_longitude, ex.max_longitude),
+                "first_at": case((earlier, ex.first_at), else_=t.first_at),
+                "first_latitude": case((earlier, ex.first_latitude), else_=t.first_latitude),
+                "first_longitude": case((earlier, ex.first_longitude), else_=t.first_longitude),
+                "last_at": case((later, ex.last_at), else_=t.last_at),
+                "last_latitude": case((later, ex.last_latitude), else_=t.last_latitude),
+                "last_longitude": case((later, ex.last_longitude), else_=t.last_longitude),
+            },
+        )
+        db.execute(stmt, rows)
+        return len(rows)
+
+
+def _previous_fixes(db, device_ids: Sequence[int], before: Optional[datetime] = None) -> Dict[int, Fix]:
+    """Each device's latest fix according to its newest hourly rollup (optionally before a time)."""
+    R = PositionRollup
+    newest = db.query(R.device_id, func.max(R.bucket_start).label("start")).filter(R.bucket == "hour")
+    if device_ids is not None:
+        newest = newest.filter(R.device_id.in_(device_ids))
+    if before is not None:
+        newest = newest.filter(R.bucket_start < before)
+    newest = newest.group_by(R.device_id).subquery()
+    rows = (
+        db.query(R.device_id, R.last_at, R.last_latitude, R.last_longitude)
+        .join(newest, and_(R.device_id == newest.c.device_id, R.bucket_start == newest.c.start))
+        .filter(R.bucket == "hour")
+        .all()
+    )
+    return {r.device_id: (r.last_at, r.last_latitude, r.last_longitude) for r in rows}
+
+
+def rollup_positions(db, positions: Iterable[Position]) -> int:
+    """Fold newly added positions into their hourly/daily rollups (same transaction)."""
+    fixes = [p for p in positions if p.timestamp is not None and p.latitude is not None and p.longitude is not None]
+    if not fixes:
+        return 0
+    acc = RollupAccumulator()
+    for device_id, fix in _previous_fixes(db, list({p.device_id for p in fixes})).items():
+        acc.seed(device_id, fix)
+    for p in sorted(fixes, key=lambda p: (p.device_id, _utc(p.timestamp))):
+        acc.add(p.device_id, p.timestamp, float(p.latitude), float(p.longitude), p.speed, p.battery_percent)
+    return acc.flush(db)
+
+
+def backfill(db, device_ids: Optional[Sequence[int]] = None, since: Optional[datetime] = None, chunk_size: int = 5000) -> dict:
+    """Rebuild rollups from raw positions, committing every `chunk_size` positions.
+
+    `since` is rounded down to a UTC day so every rebuilt bucket is complete;
+    buckets before it are kept and seed the distance of the first step.
+    """
+    if since is not None:
+        since = bucket_start("day", since)
+    delete = db.query(PositionRollup)
+    if device_ids is not None:
+        delete = delete.filter(PositionRollup.device_id.in_(device_ids))
+    if since is not None:
+        delete = delete.filter(PositionRollup.bucket_start >= since)
+    deleted = delete.delete(synchronize_session=False)
+
+    acc = RollupAccumulator()
+    if since is not None:
+        for device_id, fix in _previous_fixes(db, device_ids, before=since).items():
+            acc.seed(device_id, fix)
+
+    query = db.query(
+        Position.device_id, Position.timestamp, Position.latitude, Position.longitude, Position.speed, Position.battery_percent
+    ).filter(Position.timestamp.isnot(None))
+    if device_ids is not None:
+        query = query.filter(Position.device_id.in_(device_ids))
+    if since is not None:
+        query = query.filter(Position.timestamp >= since)
+    # materialise one chunk at a time so the upserts don't interleave with an open cursor
+    scanned = written = 0
+    after = None
+    while True:
+        page = query
+        if after is not None:
+            page = page.filter(
+                (Position.device_id > after[0])
+                | and_(Position.device_id == after[0], Position.timestamp > after[1])
+                | and_(Position.device_id == after[0], Position.timestamp == after[1], Position.id > after[2])
+            )
+        rows = page.add_columns(Position.id).order_by(Position.device_id, Position.timestamp, Position.id).limit(chunk_size).all()
+        if not rows:
+            break
+        for r in rows:
+            acc.add(r.device_id, r.timestamp, float(r.latitude), float(r.longitude), r.speed, r.battery_percent)
+        scanned += len(rows)
+        written += acc.flush(db)
+        db.commit()
+        last = rows[-1]
+        after = (last.device_id, last.timestamp, last.id)
+    db.commit()
+    return {"positions": scanned, "rollups_written": written, "rollups_deleted": deleted, "since": since}
+
+
+def rollup_out(r: PositionRollup) -> dict:
+    return {
+        "device_id": r.device_id,
+        "bucket": r.bucket,
+        "bucket_start": r.bucket_start,
+        "count": r.count,
+        "distance_m": round(r.distance_m or 0.0, 1),
+        "avg_speed": (r.speed_sum / r.speed_count) if r.speed_count else None,
+        "max_speed": r.max_speed,
+        "min_battery": r.min_battery,
+        "bbox": [r.min_latitude, r.min_longitude, r.max_latitude, r.max_longitude],
+        "first": {"at": r.first_at, "latitude": r.first_latitude, "longitude": r.first_longitude},
+        "last": {"at": r.last_at, "latitude": r.last_latitude, "longitude": r.last_longitude},
+    }
+
+
+def default_window(bucket: str, since: Optional[datetime], until: Optional[datetime]) -> Tuple[datetime, datetime]:
+    until = until or datetime.now(timezone.utc)
+    since = since or until - (timedelta(days=30) if bucket == "day" else timedelta(hours=48))
+    return since, until
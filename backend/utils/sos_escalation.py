@@ -0,0 +1,374 @@
+"""Escalation of unacknowledged SOS alarms.
+
+Every stored `alarm:sos` event gets a `sos_escalations` row. It is re-sent to
+administrator and coast guard websockets until a responder acknowledges it,
+either with POST /api/coastguard/alarms/{event_id}/ack or by filing its report.
+Each re-send happens after the next interval in
+`SOS_ESCALATION_INTERVALS_SECONDS` and raises the alarm's level by one. After
+the last interval the alarm keeps repeating at that interval.
+
+Feed entries carry `priority` (0 for ordinary events, 1 + level for open
+alarms) and an `escalation` block. The websocket snapshot always includes open
+alarms, however old.
+
+Timers sit in a heap ordered by due time, so opening, firing and rescheduling
+an alarm each cost O(log n). An acknowledgement only removes the alarm from the
+open map; its heap entry is dropped when it reaches the top. The table is read
+once at startup to reload open alarms, then touched once per escalation by
+primary key. Nothing scans it on a timer.
+
+The scheduler runs as a task on the server's event loop, because websocket
+sends must happen there; the database update runs in the thread pool so it
+never blocks the loop. Each worker escalates the alarms it stored or
+reloaded, to its own clients. Rows are re-read before every escalation, so an
+acknowledgement made through another worker still stops the alarm.
+"""
+
+import asyncio
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from core import config
+from core.metrics import REGISTRY, Counter, Histogram
+from db.session import SessionLocal
+from models.event import Event
+from models.sos_escalation import SosEscalation
+from utils.websocket_manager import manager
+
+logger = logging.getLogger(__name__)
+
+# longest sleep between heap checks; bounds the damage of a wall-clock jump
+_MAX_WAIT_SECONDS = 60.0
+# delay before retrying escalations whose database update failed
+_RETRY_SECONDS = 5.0
+
+SOS_ESCALATIONS = Counter("bantay_sos_escalations_total", "SOS alarms re-sent because nobody acknowledged them.", ["level"])
+SOS_ACK_SECONDS = Histogram(
+    "bantay_sos_ack_seconds", "Time from an SOS alarm to its acknowledgement.",
+    buckets=(15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200),
+)
+
+
+def is_sos(event_type: Optional[str]) -> bool:
+    return (event_type or "").lower() == "alarm:sos"
+
+
+def intervals() -> List[float]:
+    raw = config.settings.SOS_ESCALATION_INTERVALS_SECONDS
+    try:
+        values = [float(part) for part in str(raw).split(",") if part.strip()]
+    except ValueError:
+        values = []
+    if not values or any(v <= 0 for v in values):
+        raise ValueError(f"SOS_ESCALATION_INTERVALS_SECONDS must be positive numbers separated by commas, got {raw!r}")
+    return values
+
+
+def interval(level: int) -> float:
+    """Seconds an alarm waits at `level` before it escalates again."""
+    values = intervals()
+    return values[min(level, len(values) - 1)]
+
+
+def _utc(ts: datetime) -> datetime:
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+def _iso(ts: Optional[datetime]) -> Optional[str]:
+    return _utc(ts).isoformat() if ts is not None else None
+
+
+def new_escalation(event: Event, opened_at: datetime) -> SosEscalation:
+    """Level-0 row for a freshly stored SOS event (the caller adds and commits it)."""
+    opened_at = _utc(opened_at)
+    return SosEscalation(
+        event_id=event.id,
+        device_id=event.device_id,
+        level=0,
+        opened_at=opened_at,
+        next_at=datetime.fromtimestamp(opened_at.timestamp() + interval(0), tz=timezone.utc),
+        last_broadcast_at=opened_at,
+    )
+
+
+def acknowledge(row: SosEscalation, user_id: Optional[int], now: Optional[datetime] = None) -> bool:
+    """Mark an open alarm acknowledged (the caller commits); False if it already was."""
+    if row.acknowledged_at is not None:
+        return False
+    now = now or datetime.now(timezone.utc)
+    row.acknowledged_at = now
+    row.acknowledged_by = user_id
+    row.next_at = None
+    row.ack_seconds = round(max(0.0, (now - _utc(row.opened_at)).total_seconds()), 3)
+    return True
+
+
+def unacknowledged(db) -> Dict[int, Tuple[int, float]]:
+    """event_id -> (level, opened epoch) of every open alarm in the table, whichever worker stored it."""
+    rows = db.query(SosEscalation.event_id, SosEscalation.level, SosEscalation.opened_at).filter(
+        SosEscalation.acknowledged_at.is_(None)
+    )
+    return {event_id: (level, _utc(opened_at).timestamp()) for event_id, level, opened_at in rows}
+
+
+def escalation_out(row: SosEscalation, now: Optional[float] = None) -> dict:
+    now = time.time() if now is None else now
+    opened = _utc(row.opened_at)
+    return {
+        "event_id": row.event_id,
+        "device_id": row.device_id,
+        "level": row.level,
+        "priority": row.level + 1 if row.acknowledged_at is None else 0,
+        "opened_at": opened.isoformat(),
+        "next_at": _iso(row.next_at),
+        "last_broadcast_at": _iso(row.last_broadcast_at),
+        "acknowledged_at": _iso(row.acknowledged_at),
+        "acknowledged_by": row.acknowledged_by,
+        "ack_seconds": row.ack_seconds,
+        "open_seconds": round(max(0.0, now - opened.timestamp()), 1) if row.acknowledged_at is None else None,
+    }
+
+
+def feed_fields(level: int, opened: float, now: Optional[float] = None) -> dict:
+    """`priority` and `escalation` keys for an open alarm's feed entry."""
+    now = time.time() if now is None else now
+    return {
+        "priority": level + 1,
+        "escalation": {
+            "level": level,
+            "opened_at": datetime.fromtimestamp(opened, tz=timezone.utc).isoformat(),
+            "open_seconds": round(max(0.0, now - opened), 1),
+            "acknowledged": False,
+        },
+    }
+
+
+class EscalationScheduler:
+    """Heap of (due, event_id, level) timers for open SOS alarms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heap: List[Tuple[float, int, int]] = []
+        # event_id -> (level, opened epoch); heap entries whose level no longer matches are stale
+        self._open: Dict[int, Tuple[int, float]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._escalated = 0
+
+    def reset(self):
+        with self._lock:
+            self._heap.clear()
+            self._open.clear()
+            self._escalated = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            by_level: Dict[int, int] = {}
+            for level, _ in self._open.values():
+                by_level[level] = by_level.get(level, 0) + 1
+            next_due = self._heap[0][0] if self._heap else None
+            return {
+                "running": self._task is not None and not self._task.done(),
+                "open": len(self._open),
+                "by_level": dict(sorted(by_level.items())),
+                "timers": len(self._heap),
+                "next_due_in_s": round(max(0.0, next_due - time.time()), 1) if next_due is not None else None,
+                "escalated": self._escalated,
+            }
+
+    def open_alarms(self) -> Dict[int, Tuple[int, float]]:
+        """event_id -> (level, opened epoch) of every alarm still escalating."""
+        with self._lock:
+            return dict(self._open)
+
+    def _push(self, event_id: int, level: int, opened: float, due: float):
+        self._open[event_id] = (level, opened)
+        heapq.heappush(self._heap, (due, event_id, level))
+
+    def _wake(self):
+        if self._loop is not None and self._wakeup is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def track(self, rows: List[SosEscalation]):
+        """Start the timers of committed rows."""
+        with self._lock:
+            for row in rows:
+                if row.acknowledged_at is None and row.next_at is not None:
+                    self._push(row.event_id, row.level, _utc(row.opened_at).timestamp(), _utc(row.next_at).timestamp())
+        self._wake()
+
+    def acknowledged(self, row: SosEscalation):
+        """Stop escalating an alarm whose acknowledgement was committed."""
+        with self._lock:
+            self._open.pop(row.event_id, None)
+        if row.ack_seconds is not None:
+            SOS_ACK_SECONDS.observe(row.ack_seconds)
+
+    def load(self, db) -> int:
+        """Rebuild the heap from open rows (once, at startup)."""
+        rows = db.query(SosEscalation).filter(SosEscalation.acknowledged_at.is_(None)).all()
+        with self._lock:
+            self._open = {r.event_id: (r.level, _utc(r.opened_at).timestamp()) for r in rows}
+            self._heap = [
+                (_utc(r.next_at).timestamp() if r.next_at is not None else 0.0, r.event_id, r.level) for r in rows
+            ]
+            heapq.heapify(self._heap)
+        return len(rows)
+
+    def _pop_due(self, now: float) -> List[Tuple[int, int, float]]:
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, event_id, level = heapq.heappop(self._heap)
+                current = self._open.get(event_id)
+                if current is not None and current[0] == level:
+                    due.append((event_id, level, current[1]))
+        return due
+
+    def _escalate_rows(self, due: List[Tuple[int, int, float]], now: float) -> list:
+        """Raise the level of the still-open rows among `due` and commit; returns (level, next due, feed item)."""
+        levels = {event_id: level for event_id, level, _ in due}
+        sent_at = datetime.fromtimestamp(now, tz=timezone.utc)
+        escalated = []
+        db = SessionLocal()
+        try:
+            rows = db.query(SosEscalation).filter(SosEscalation.event_id.in_(list(levels))).all()
+            events = {e.id: e for e in db.query(Event).filter(Event.id.in_(list(levels)))}
+            for row in rows:
+                event = events.get(row.event_id)
+                if row.acknowledged_at is not None or event is None or row.level != levels[row.event_id]:
+                    continue
+                level = row.level + 1
+                next_due = now + interval(level)
+                # conditional: an acknowledgement committed since the read above wins
+                updated = (
+                    db.query(SosEscalation)
+                    .filter(
+                        SosEscalation.event_id == row.event_id,
+                        SosEscalation.acknowledged_at.is_(None),
+                        SosEscalation.level == row.level,
+                    )
+                    .update(
+                        {"level": level, "last_broadcast_at": sent_at, "next_at": datetime.fromtimestamp(next_due, tz=timezone.utc)},
+                        synchronize_session=False,
+                    )
+                )
+                if updated != 1:
+                    continue
+                # plain values: the rows expire on commit
+                escalated.append((level, next_due, {
+                    "id": event.id,
+                    "device_id": event.device_id,
+                    "event_type": event.event_type,
+                    "timestamp": _iso(event.timestamp),
+                    "attributes": event.attributes,
+                    "resolved": False,
+                    # when this copy went out, not when the alarm first arrived
+                    "server_received_at": sent_at.isoformat(),
+                }))
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                for event_id, level, _ in due:
+                    if event_id in self._open:
+                        heapq.heappush(self._heap, (now + _RETRY_SECONDS, event_id, level))
+            raise
+        finally:
+            db.close()
+        return escalated
+
+    async def run_due(self, now: Optional[float] = None) -> int:
+        """Escalate every alarm whose timer has expired; returns how many were re-sent."""
+        now = time.time() if now is None else now
+        due = self._pop_due(now)
+        if not due:
+            return 0
+        escalated = await run_in_threadpool(self._escalate_rows, due, now)
+
+        payload = []
+        with self._lock:
+            live = {item["id"] for _, _, item in escalated}
+            for event_id, _, _ in due:
+                if event_id not in live:
+                    # acknowledged elsewhere, or the event is gone
+                    self._open.pop(event_id, None)
+            for level, next_due, item in escalated:
+                if item["id"] not in self._open:
+                    # acknowledged here while the update ran
+                    continue
+                opened = self._open[item["id"]][1]
+                self._push(item["id"], level, opened, next_due)
+                payload.append({**item, **feed_fields(level, opened, now)})
+            self._escalated += len(payload)
+
+        for item in payload:
+            SOS_ESCALATIONS.labels(item["escalation"]["level"]).inc()
+        if payload:
+            logger.warning(
+                "Escalating %d unacknowledged SOS alarm(s): %s", len(payload),
+                ", ".join(f"event {p['id']} level {p['escalation']['level']}" for p in payload),
+            )
+            msg = {"positions": [], "events": payload}
+            for entry in list(manager.active):
+                if entry.get("role") in ("administrator", "coast_guard"):
+                    await manager.send_to_user(entry.get("ws"), msg)
+        return len(payload)
+
+    def _delay(self) -> Optional[float]:
+        with self._lock:
+            if not self._heap:
+                return None
+            return min(_MAX_WAIT_SECONDS, max(0.0, self._heap[0][0] - time.time()))
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._delay())
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.run_due()
+            except Exception:
+                logger.exception("SOS escalation run failed")
+
+    def start(self) -> int:
+        """Reload open alarms and run the timers on the current event loop; returns the alarms reloaded."""
+        if self._task is not None and not self._task.done():
+            return len(self._open)
+        intervals()
+        db = SessionLocal()
+        try:
+            loaded = self.load(db)
+        finally:
+            db.close()
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = self._loop.create_task(self._run(), name="sos-escalation")
+        if loaded:
+            logger.info("Reloaded %d open SOS alarm(s) for escalation", loaded)
+        return loaded
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._loop = None
+        self._wakeup = None
+
+
+escalations = EscalationScheduler()
+
+
+@REGISTRY.collector
+def _collect_open_alarms():
+    samples = [({"level": str(level)}, count) for level, count in escalations.stats()["by_level"].items()]
+    return [("bantay_sos_open_alarms", "gauge", "Unacknowledged SOS alarms by escalation level.", samples)]
@@ -0,0 +1,260 @@
+"""Shared, pooled client for the Traccar REST API.
+
+All outbound Traccar calls go through `get_client()`, which returns a process
+wide `TraccarClient` built on a keep-alive `requests.Session`. The client
+bounds concurrent requests, retries idempotent calls with exponential
+backoff, trips a circuit breaker after repeated failures so callers fail fast
+while Traccar is down, and records per-call latency. `requests` is imported
+and the session opened on the first call, so workers that never talk to
+Traccar don't pay for either.
+"""
+
+import re
+import threading
+import time
+from typing import Optional
+
+from core import config
+from core.metrics import REGISTRY, Histogram
+
+IDEMPOTENT_METHODS = {"GET", "PUT", "DELETE", "HEAD", "OPTIONS"}
+RETRY_STATUSES = {429, 502, 503, 504}
+
+CALL_SECONDS = Histogram("bantay_traccar_call_seconds", "Latency of Traccar API calls (each attempt).", ["route", "outcome"])
+
+
+class TraccarError(Exception):
+    """Raised when a Traccar call fails after retries."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(TraccarError):
+    """Raised without contacting Traccar while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Open after `threshold` consecutive failures; allow one trial call after `reset_after` seconds."""
+
+    def __init__(self, threshold: int = 5, reset_after: float = 30.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_after:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_after or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+
+class CallStats:
+    """Latency and outcome counters per (method, route)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, key: str, seconds: float, ok: bool):
+        with self._lock:
+            s = self._stats.setdefault(key, {"calls": 0, "errors": 0, "seconds_total": 0.0, "seconds_max": 0.0})
+            s["calls"] += 1
+            s["errors"] += 0 if ok else 1
+            s["seconds_total"] += seconds
+            s["seconds_max"] = max(s["seconds_max"], seconds)
+        CALL_SECONDS.labels(key, "ok" if ok else "error").observe(seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                key: {**s, "seconds_avg": s["seconds_total"] / s["calls"] if s["calls"] else 0.0}
+                for key, s in self._stats.items()
+            }
+
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def _route(method: str, path: str) -> str:
+    return f"{method} {_ID_SEGMENT.sub('/{id}', path)}"
+
+
+class TraccarClient:
+    def __init__(
+        self,
+        base_url: str,
+        token: str,
+        timeout: float = 10.0,
+        max_connections: int = 8,
+        max_retries: int = 3,
+        backoff: float = 0.2,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = CallStats()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._token = token
+        self._max_connections = max_connections
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    def _get_session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    session.headers["Authorization"] = f"Bearer {self._token}"
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self._max_connections)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
+
+    def request(self, method: str, path: str, *, json=None, params=None, retry: Optional[bool] = None):
+        """Send a request and return the decoded JSON body (or None when empty).
+
+        Idempotent methods are retried on connection errors and 429/5xx
+        responses; pass `retry=True` to retry a POST that is safe to repeat.
+        """
+        session = self._get_session()
+        import requests
+
+        method = method.upper()
+        if retry is None:
+            retry = method in IDEMPOTENT_METHODS
+        attempts = 1 + (self.max_retries if retry else 0)
+        route = _route(method, path)
+        last_error: Optional[TraccarError] = None
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(self.backoff * (2 ** (attempt - 1)))
+            if not self.breaker.allow():
+                raise CircuitOpenError("Traccar circuit breaker is open; not calling Traccar")
+            start = time.perf_counter()
+            if not self._slots.acquire(timeout=self.timeout):
+                # every connection stuck on a hung Traccar counts against it too
+                self.stats.record(route, time.perf_counter() - start, ok=False)
+                self.breaker.record_failure()
+                raise TraccarError("Timed out waiting for a free Traccar connection")
+            try:
+                resp = session.request(method, f"{self.base_url}{path}", json=json, params=params, timeout=self.timeout)
+            except requests.RequestException as e:
+                self.stats.record(route, time.perf_counter() - start, ok=False)
+                self.breaker.record_failure()
+                last_error = TraccarError(f"{route} failed: {e}")
+                continue
+            except BaseException:
+                # anything else still settles the attempt, so a half-open trial is never left claimed
+                self.breaker.record_failure()
+                raise
+            finally:
+                self._slots.release()
+            elapsed = time.perf_counter() - start
+            if resp.status_code >= 500 or resp.status_code == 429:
+                self.stats.record(route, elapsed, ok=False)
+                self.breaker.record_failure()
+                last_error = TraccarError(f"{route} returned HTTP {resp.status_code}", status_code=resp.status_code)
+                if resp.status_code in RETRY_STATUSES:
+                    continue
+                raise last_error
+            # any non-5xx answer means Traccar is up, even if it rejected the request
+            self.breaker.record_success()
+            self.stats.record(route, elapsed, ok=resp.status_code < 400)
+            if resp.status_code >= 400:
+                raise TraccarError(f"{route} returned HTTP {resp.status_code}", status_code=resp.status_code)
+            if not resp.content:
+                return None
+            try:
+                return resp.json()
+            except ValueError:
+                return None
+        raise last_error
+
+    def get(self, path: str, **kw):
+        return self.request("GET", path, **kw)
+
+    def post(self, path: str, **kw):
+        return self.request("POST", path, **kw)
+
+    def put(self, path: str, **kw):
+        return self.request("PUT", path, **kw)
+
+    def delete(self, path: str, **kw):
+        return self.request("DELETE", path, **kw)
+
+    def metrics(self) -> dict:
+        return {"base_url": self.base_url, "breaker": self.breaker.state, "calls": self.stats.snapshot()}
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client() -> TraccarClient:
+    """Return the shared client for the currently configured Traccar URL and token."""
+    settings = config.settings
+    key = (settings.TRACCAR_API_URL, settings.TRACCAR_API_TOKEN)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = TraccarClient(
+                    settings.TRACCAR_API_URL,
+                    settings.TRACCAR_API_TOKEN,
+                    timeout=settings.TRACCAR_TIMEOUT_SECONDS,
+                    max_connections=settings.TRACCAR_MAX_CONNECTIONS,
+                    max_retries=settings.TRACCAR_MAX_RETRIES,
+                    backoff=settings.TRACCAR_RETRY_BACKOFF_SECONDS,
+                    breaker=CircuitBreaker(settings.TRACCAR_BREAKER_THRESHOLD, settings.TRACCAR_BREAKER_RESET_SECONDS),
+                )
+                _clients[key] = client
+    return client
+
+
+@REGISTRY.collector
+def _collect_breakers():
+    states = {"closed": 0, "half_open": 1, "open": 2}
+    samples = [({"base_url": client.base_url}, states[client.breaker.state]) for client in list(_clients.values())]
+    return [("bantay_traccar_breaker_state", "gauge", "Traccar circuit breaker: 0 closed, 1 half open, 2 open.", samples)]
@@ -0,0 +1,263 @@
+"""Reconcile Bantay devices and geofences with what Traccar actually holds.
+
+One run fetches every Traccar device and geofence with two list calls, diffs
+them in memory against `Device.traccar_device_id`/`unique_id` and
+`Geofence.traccar_id`, and then:
+
+- relinks local rows to remote records found by `uniqueId` (devices) or the
+  `bantayId` attribute (geofences) with one batched UPDATE per table;
+- creates missing remote records and rewrites drifted names/areas, with
+  calls fanned out over a bounded thread pool;
+- checks each device's geofence permissions (`GET /api/geofences?deviceId=`,
+  Traccar has no bulk permission listing) and links/unlinks the difference.
+  Only geofences Bantay manages are unlinked.
+
+In incremental mode the permission checks, the only per-device calls, are
+limited to devices changed since the previous run plus any device whose
+remote record or geofence was fixed in this run. Remote records no local row
+points at are reported as orphans and only deleted with `delete_orphans`.
+Entities with queued outbox rows are left to the outbox worker.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from core import config
+from models.device import Device
+from models.geofence import Geofence
+from models.job_state import JobState
+from models.traccar_outbox import TraccarOutbox
+from utils.etag import bump_version
+from utils.geometry import traccar_area
+from utils.traccar_client import get_client
+
+JOB_NAME = "traccar_reconcile"
+# updated_at may only have second resolution (SQLite CURRENT_TIMESTAMP); re-check a little
+# before the checkpoint rather than miss a change made in the same second
+CHECKPOINT_OVERLAP = timedelta(seconds=5)
+
+
+def _same_text(a: Optional[str], b: Optional[str]) -> bool:
+    return " ".join((a or "").split()) == " ".join((b or "").split())
+
+
+def _run_parallel(calls: List[Callable], errors: list) -> list:
+    """Run zero-argument callables on a bounded pool; failures are appended to `errors`."""
+
+    def run(call):
+        try:
+            return call()
+        except Exception as e:
+            errors.append(str(e))
+            return None
+
+    if not calls:
+        return []
+    workers = max(1, min(config.settings.TRACCAR_SYNC_CONCURRENCY, len(calls)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="traccar-reconcile") as pool:
+        return list(pool.map(run, calls))
+
+
+def _aware(dt: Optional[datetime]) -> Optional[datetime]:
+    if dt is not None and dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def reconcile(db: Session, dry_run: bool = False, incremental: bool = False, delete_orphans: bool = False) -> dict:
+    """Diff local and remote state and (unless `dry_run`) apply the fixes. Commits."""
+    started = time.perf_counter()
+    started_at = datetime.now(timezone.utc)
+    client = get_client()
+    errors: list = []
+
+    state = db.get(JobState, JOB_NAME)
+    since = _aware(state.last_run_at) if (incremental and state is not None and state.last_run_at) else None
+
+    remote_devices = {d["id"]: d for d in client.get("/api/devices", params={"all": "true"}) or [] if isinstance(d, dict)}
+    remote_geofences = {g["id"]: g for g in client.get("/api/geofences", params={"all": "true"}) or [] if isinstance(g, dict)}
+    remote_by_unique = {d.get("uniqueId"): d for d in remote_devices.values() if d.get("uniqueId")}
+    remote_by_bantay = {
+        (g.get("attributes") or {}).get("bantayId"): g for g in remote_geofences.values() if (g.get("attributes") or {}).get("bantayId") is not None
+    }
+
+    queued = set(
+        db.query(TraccarOutbox.entity_type, TraccarOutbox.entity_id)
+        .filter(TraccarOutbox.status.in_(("pending", "running")))
+        .distinct()
+        .all()
+    )
+
+    report = {
+        "dry_run": dry_run,
+        "incremental": incremental,
+        "since": since.isoformat() if since else None,
+        "remote": {"devices": len(remote_devices), "geofences": len(remote_geofences)},
+        "geofences": {"relink": [], "create": [], "update": [], "orphans": []},
+        "devices": {"relink": [], "create": [], "update": [], "conflicts": [], "orphans": []},
+        "permissions": {"checked": 0, "link": [], "unlink": []},
+        "skipped_queued": [],
+        "errors": errors,
+    }
+
+    # --- geofences -------------------------------------------------------
+    geofences = db.query(Geofence.id, Geofence.name, Geofence.description, Geofence.area, Geofence.traccar_id).all()
+    geofence_remote = {}  # local id -> remote id after this run
+    claimed_geofences = set()
+    geofence_relinks, geofence_creates, geofence_updates = [], [], []
+    for g in geofences:
+        if ("geofence", g.id) in queued:
+            report["skipped_queued"].append({"entity_type": "geofence", "id": g.id})
+            if g.traccar_id:
+                geofence_remote[g.id] = g.traccar_id
+                claimed_geofences.add(g.traccar_id)
+            continue
+        remote = remote_geofences.get(g.traccar_id) if g.traccar_id else None
+        if remote is None:
+            remote = remote_by_bantay.get(g.id)
+            if remote is not None:
+                geofence_relinks.append({"id": g.id, "traccar_id": remote["id"]})
+        if remote is None:
+            geofence_creates.append(g)
+            continue
+        geofence_remote[g.id] = remote["id"]
+        claimed_geofences.add(remote["id"])
+        if not (_same_text(remote.get("name"), g.name) and _same_text(remote.get("description"), g.description) and _same_text(remote.get("area"), traccar_area(g.area))):
+            geofence_updates.append((g, remote["id"]))
+
+    report["geofences"]["relink"] = [{"id": r["id"], "traccar_id": r["traccar_id"]} for r in geofence_relinks]
+    report["geofences"]["create"] = [{"id": g.id, "name": g.name} for g in geofence_creates]
+    report["geofences"]["update"] = [{"id": g.id, "traccar_id": rid} for g, rid in geofence_updates]
+    geofence_orphans = [gid for gid in remote_geofences if gid not in claimed_geofences]
+    report["geofences"]["orphans"] = geofence_orphans
+
+    if not dry_run:
+        def create_geofence(g):
+            data = client.post("/api/geofences", json={"name": g.name, "description": g.description, "area": traccar_area(g.area), "attributes": {"bantayId": g.id}})
+            return {"id": g.id, "traccar_id": data.get("id")} if isinstance(data, dict) and data.get("id") else None
+
+        created = _run_parallel([lambda g=g: create_geofence(g) for g in geofence_creates], errors)
+        _run_parallel(
+            [lambda g=g, rid=rid: client.put(f"/api/geofences/{rid}", json={"name": g.name, "description": g.description, "area": traccar_area(g.area)}) for g, rid in geofence_updates],
+            errors,
+        )
+        new_links = geofence_relinks + [c for c in created if c]
+        for link in new_links:
+            geofence_remote[link["id"]] = link["traccar_id"]
+        if new_links:
+            db.execute(update(Geofence), new_links)
+            bump_version(db, "geofences")
+        if delete_orphans:
+            _run_parallel([lambda gid=gid: client.delete(f"/api/geofences/{gid}") for gid in geofence_orphans], errors)
+    changed_geofences = {r["id"] for r in geofence_relinks} | {g.id for g in geofence_creates}
+    managed_geofences = set(geofence_remote.values())
+
+    # --- devices ---------------------------------------------------------
+    devices = db.query(Device.id, Device.unique_id, Device.name, Device.traccar_device_id, Device.geofence_id, Device.updated_at).all()
+    held_remote_ids = {d.traccar_device_id for d in devices if d.traccar_device_id}
+    device_remote = {}  # local id -> remote id after this run
+    claimed_devices = set()
+    device_relinks, device_creates, device_updates = [], [], []
+    for d in devices:
+        if ("device", d.id) in queued:
+            report["skipped_queued"].append({"entity_type": "device", "id": d.id})
+            if d.traccar_device_id:
+                claimed_devices.add(d.traccar_device_id)
+            continue
+        if not d.unique_id:
+            # not manageable in Traccar without a uniqueId
+            if d.traccar_device_id:
+                claimed_devices.add(d.traccar_device_id)
+            continue
+        remote = remote_devices.get(d.traccar_device_id) if d.traccar_device_id else None
+        if remote is None:
+            remote = remote_by_unique.get(d.unique_id)
+            if remote is not None:
+                if remote["id"] in held_remote_ids:
+                    report["devices"]["conflicts"].append({"id": d.id, "unique_id": d.unique_id, "traccar_id": remote["id"]})
+                    claimed_devices.add(remote["id"])
+                    continue
+                device_relinks.append({"id": d.id, "traccar_device_id": remote["id"]})
+        if remote is None:
+            device_creates.append(d)
+            continue
+        device_remote[d.id] = remote["id"]
+        claimed_devices.add(remote["id"])
+        expected_name = d.name or d.unique_id
+        if remote.get("uniqueId") != d.unique_id or remote.get("name") != expected_name:
+            device_updates.append((d, remote["id"]))
+
+    report["devices"]["relink"] = [{"id": r["id"], "traccar_id": r["traccar_device_id"]} for r in device_relinks]
+    report["devices"]["create"] = [{"id": d.id, "unique_id": d.unique_id} for d in device_creates]
+    report["devices"]["update"] = [{"id": d.id, "traccar_id": rid} for d, rid in device_updates]
+    device_orphans = [rid for rid in remote_devices if rid not in claimed_devices]
+    report["devices"]["orphans"] = device_orphans
+
+    if not dry_run:
+        def create_device(d):
+            data = client.post("/api/devices", json={"name": d.name or d.unique_id, "uniqueId": d.unique_id})
+            return {"id": d.id, "traccar_device_id": data.get("id")} if isinstance(data, dict) and data.get("id") else None
+
+        created = _run_parallel([lambda d=d: create_device(d) for d in device_creates], errors)
+        _run_parallel(
+            [lambda d=d, rid=rid: client.put(f"/api/devices/{rid}", json={"name": d.name or d.unique_id, "uniqueId": d.unique_id}) for d, rid in device_updates],
+            errors,
+        )
+        new_links = device_relinks + [c for c in created if c]
+        for link in new_links:
+            device_remote[link["id"]] = link["traccar_device_id"]
+        if new_links:
+            db.execute(update(Device), new_links)
+            bump_version(db, "devices")
+        if delete_orphans:
+            _run_parallel([lambda rid=rid: client.delete(f"/api/devices/{rid}") for rid in device_orphans], errors)
+    changed_devices = {r["id"] for r in device_relinks} | {d.id for d in device_creates} | {d.id for d, _ in device_updates}
+
+    # --- permissions -----------------------------------------------------
+    to_check = []
+    for d in devices:
+        remote_id = device_remote.get(d.id)
+        if remote_id is None:
+            continue
+        if since is not None:
+            updated = _aware(d.updated_at)
+            fresh = updated is not None and updated > since - CHECKPOINT_OVERLAP
+            if not (fresh or d.id in changed_devices or d.geofence_id in changed_geofences):
+                continue
+        to_check.append((d, remote_id))
+    report["permissions"]["checked"] = len(to_check)
+
+    linked = _run_parallel([lambda rid=rid: client.get("/api/geofences", params={"deviceId": rid}) for _, rid in to_check], errors)
+    link_calls, unlink_calls = [], []
+    for (d, remote_id), current in zip(to_check, linked):
+        if current is None:
+            continue
+        current_ids = {g["id"] for g in current if isinstance(g, dict)}
+        wanted = geofence_remote.get(d.geofence_id) if d.geofence_id else None
+        if wanted and wanted not in current_ids:
+            report["permissions"]["link"].append({"device_id": d.id, "traccar_device_id": remote_id, "traccar_geofence_id": wanted})
+            link_calls.append(lambda rid=remote_id, gid=wanted: client.post("/api/permissions", json={"deviceId": rid, "geofenceId": gid}, retry=True))
+        for gid in sorted(current_ids & managed_geofences):
+            if gid != wanted:
+                report["permissions"]["unlink"].append({"device_id": d.id, "traccar_device_id": remote_id, "traccar_geofence_id": gid})
+                unlink_calls.append(lambda rid=remote_id, gid=gid: client.delete("/api/permissions", params={"deviceId": rid, "geofenceId": gid}))
+
+    if not dry_run:
+        _run_parallel(unlink_calls + link_calls, errors)
+        if state is None:
+            state = JobState(name=JOB_NAME)
+            db.add(state)
+        # keep the old checkpoint after errors so the next incremental run looks again
+        if not errors:
+            state.last_run_at = started_at
+        state.details = {"finished_at": datetime.now(timezone.utc).isoformat(), "errors": len(errors)}
+        db.commit()
+
+    report["duration_seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
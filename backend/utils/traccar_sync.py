@@ -0,0 +1,456 @@
+"""Transactional outbox for pushing device and geofence changes to Traccar.
+
+Admin mutations call `enqueue` inside their own transaction, so the outbox row
+commits (or rolls back) together with the local change and the HTTP response
+never waits on Traccar. `OutboxWorker` applies the rows in the background:
+
+- rows are applied oldest first, and a row only runs once every older row for
+  the same entity (device or geofence) has finished, so a device is created
+  before its geofence permission is linked and a delete never overtakes the
+  create it undoes;
+- operations read the current local state when they run, so retrying an
+  upsert is safe and a later edit simply supersedes an earlier one;
+- different entities are applied concurrently (bounded by
+  TRACCAR_SYNC_CONCURRENCY and the client's connection pool);
+- failures are retried with exponential backoff; client errors that retrying
+  cannot fix, or rows that run out of attempts, are parked as `failed` and
+  can be re-queued from the admin API.
+
+Device permissions are ordered with their device (`link` ops); a link whose
+geofence has not reached Traccar yet waits and is retried.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from core import config
+from models.device import Device
+from models.geofence import Geofence
+from models.traccar_outbox import TraccarOutbox
+from utils.etag import bump_version
+from utils.geometry import traccar_area
+from utils.traccar_client import CircuitOpenError, TraccarError, get_client
+
+logger = logging.getLogger(__name__)
+
+_DIRTY_KEY = "traccar_outbox_dirty"
+ENTITY_TYPES = ("device", "geofence")
+# a row left 'running' this long belongs to a worker that died mid-call
+STALE_RUNNING_SECONDS = 300
+
+
+def traccar_enabled() -> bool:
+    """False in tests or when the explicit BANTAY_SKIP_TRACCAR bypass is set."""
+    env_testing = os.environ.get("TESTING") in ("1", "true", "True")
+    env_skip = os.environ.get("BANTAY_SKIP_TRACCAR") in ("1", "true", "True")
+    return not (config.settings.TESTING or env_testing or env_skip)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def enqueue(db: Session, entity_type: str, entity_id: int, op: str, payload: Optional[dict] = None) -> Optional[TraccarOutbox]:
+    """Stage a Traccar change in the caller's transaction. Never commits."""
+    if not traccar_enabled():
+        return None
+    row = TraccarOutbox(entity_type=entity_type, entity_id=entity_id, op=op, payload=payload, status="pending", attempts=0, next_attempt_at=_now())
+    db.add(row)
+    db.info[_DIRTY_KEY] = True
+    return row
+
+
+def entity_status(db: Session, entity_type: str, entity_id: int) -> dict:
+    """Sync state of one entity: 'synced', 'pending', 'failed' or 'disabled'."""
+    if not traccar_enabled():
+        return {"status": "disabled", "pending": 0, "failed": 0, "last_error": None}
+    counts = dict(
+        db.query(TraccarOutbox.status, func.count(TraccarOutbox.id))
+        .filter(TraccarOutbox.entity_type == entity_type, TraccarOutbox.entity_id == int(entity_id))
+        .filter(TraccarOutbox.status.in_(("pending", "running", "failed")))
+        .group_by(TraccarOutbox.status)
+        .all()
+    )
+    pending = counts.get("pending", 0) + counts.get("running", 0)
+    failed = counts.get("failed", 0)
+    last_error = (
+        db.query(TraccarOutbox.last_error)
+        .filter(TraccarOutbox.entity_type == entity_type, TraccarOutbox.entity_id == int(entity_id))
+        .filter(TraccarOutbox.last_error.isnot(None), TraccarOutbox.status != "done")
+        .order_by(TraccarOutbox.id.desc())
+        .limit(1)
+        .scalar()
+    )
+    status = "failed" if failed else ("pending" if pending else "synced")
+    return {"status": status, "pending": pending, "failed": failed, "last_error": last_error}
+
+
+def queue_summary(db: Session) -> dict:
+    counts = dict(db.query(TraccarOutbox.status, func.count(TraccarOutbox.id)).group_by(TraccarOutbox.status).all())
+    return {"enabled": traccar_enabled(), "counts": counts, "worker": worker.stats()}
+
+
+def retry_failed(db: Session, entity_type: Optional[str] = None, entity_id: Optional[int] = None) -> int:
+    """Put failed rows back in the queue with a fresh attempt budget. Commits."""
+    q = db.query(TraccarOutbox).filter(TraccarOutbox.status == "failed")
+    if entity_type is not None:
+        q = q.filter(TraccarOutbox.entity_type == entity_type)
+    if entity_id is not None:
+        q = q.filter(TraccarOutbox.entity_id == int(entity_id))
+    count = q.update({"status": "pending", "attempts": 0, "next_attempt_at": _now()}, synchronize_session=False)
+    db.commit()
+    if count:
+        worker.wake()
+    return count
+
+
+class NotReady(Exception):
+    """The operation depends on something that has not reached Traccar yet; retry later."""
+
+
+def _find_device(client, unique_id: Optional[str]) -> Optional[dict]:
+    if not unique_id:
+        return None
+    found = client.get("/api/devices", params={"uniqueId": unique_id})
+    for item in found or []:
+        if isinstance(item, dict) and item.get("uniqueId") == unique_id:
+            return item
+    return None
+
+
+def _find_geofence(client, local_id: int) -> Optional[dict]:
+    # geofences created by the worker carry their local id, so a retried create
+    # after a lost response adopts the remote copy instead of duplicating it
+    for item in client.get("/api/geofences") or []:
+        if isinstance(item, dict) and (item.get("attributes") or {}).get("bantayId") == local_id:
+            return item
+    return None
+
+
+def _is_missing(e: TraccarError) -> bool:
+    return e.status_code == 404
+
+
+def _device_upsert(db: Session, client, row: TraccarOutbox):
+    device = db.get(Device, row.entity_id)
+    if device is None or not device.unique_id:
+        # deleted since (its delete op follows) or not manageable in Traccar
+        return
+    payload = {"name": device.name or device.unique_id, "uniqueId": device.unique_id}
+    if device.traccar_device_id:
+        try:
+            client.put(f"/api/devices/{device.traccar_device_id}", json=payload)
+            return
+        except TraccarError as e:
+            if not _is_missing(e):
+                raise
+    existing = _find_device(client, device.unique_id)
+    if existing:
+        client.put(f"/api/devices/{existing['id']}", json=payload)
+        remote_id = existing["id"]
+    else:
+        data = client.post("/api/devices", json=payload)
+        remote_id = data.get("id") if isinstance(data, dict) else None
+    if remote_id and remote_id != device.traccar_device_id:
+        device.traccar_device_id = remote_id
+        bump_version(db, "devices")
+
+
+def _device_link(db: Session, client, row: TraccarOutbox):
+    device = db.get(Device, row.entity_id)
+    if device is None:
+        return
+    if not device.traccar_device_id:
+        raise NotReady("device has not been created in Traccar yet")
+    payload = row.payload or {}
+    new_traccar_id = None
+    if payload.get("geofence_id"):
+        g = db.get(Geofence, int(payload["geofence_id"]))
+        if g is not None:
+            if not g.traccar_id:
+                raise NotReady("geofence has not been created in Traccar yet")
+            new_traccar_id = g.traccar_id
+    old_traccar_id = payload.get("previous_traccar_geofence_id")
+    if not old_traccar_id and payload.get("previous_geofence_id"):
+        old = db.get(Geofence, int(payload["previous_geofence_id"]))
+        old_traccar_id = old.traccar_id if old else None
+
+    if old_traccar_id and old_traccar_id != new_traccar_id:
+        try:
+            client.delete("/api/permissions", params={"deviceId": device.traccar_device_id, "geofenceId": old_traccar_id})
+        except TraccarError as e:
+            if not _is_missing(e):
+                raise
+    if new_traccar_id:
+        # linking an existing permission again is harmless, so allow retries
+        client.post("/api/permissions", json={"deviceId": device.traccar_device_id, "geofenceId": new_traccar_id}, retry=True)
+
+
+def _device_delete(db: Session, client, row: TraccarOutbox):
+    payload = row.payload or {}
+    remote_id = payload.get("traccar_device_id")
+    if not remote_id:
+        existing = _find_device(client, payload.get("unique_id"))
+        remote_id = existing["id"] if existing else None
+    if not remote_id:
+        return
+    try:
+        client.delete(f"/api/devices/{remote_id}")
+    except TraccarError as e:
+        if not _is_missing(e):
+            raise
+
+
+def _geofence_upsert(db: Session, client, row: TraccarOutbox):
+    g = db.get(Geofence, row.entity_id)
+    if g is None:
+        return
+    payload = {"name": g.name, "description": g.description, "area": traccar_area(g.area)}
+    if g.traccar_id:
+        try:
+            client.put(f"/api/geofences/{g.traccar_id}", json=payload)
+            return
+        except TraccarError as e:
+            if not _is_missing(e):
+                raise
+    existing = _find_geofence(client, g.id) if row.attempts > 1 else None
+    if existing:
+        client.put(f"/api/geofences/{existing['id']}", json=payload)
+        remote_id = existing["id"]
+    else:
+        data = client.post("/api/geofences", json={**payload, "attributes": {"bantayId": g.id}})
+        remote_id = data.get("id") if isinstance(data, dict) else None
+    if remote_id and remote_id != g.traccar_id:
+        g.traccar_id = remote_id
+        bump_version(db, "geofences")
+
+
+def _geofence_delete(db: Session, client, row: TraccarOutbox):
+    remote_id = (row.payload or {}).get("traccar_id")
+    if not remote_id:
+        existing = _find_geofence(client, row.entity_id)
+        remote_id = existing["id"] if existing else None
+    if not remote_id:
+        return
+    try:
+        client.delete(f"/api/geofences/{remote_id}")
+    except TraccarError as e:
+        if not _is_missing(e):
+            raise
+
+
+HANDLERS = {
+    ("device", "upsert"): _device_upsert,
+    ("device", "link"): _device_link,
+    ("device", "delete"): _device_delete,
+    ("geofence", "upsert"): _geofence_upsert,
+    ("geofence", "delete"): _geofence_delete,
+}
+
+
+def _permanent(e: Exception) -> bool:
+    # the request itself was rejected; sending it again will not help
+    return isinstance(e, TraccarError) and e.status_code is not None and 400 <= e.status_code < 500 and e.status_code not in (408, 429)
+
+
+class OutboxWorker:
+    """Apply pending outbox rows from a daemon thread (or synchronously via `process_once`)."""
+
+    def __init__(self):
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"applied": 0, "retried": 0, "failed": 0, "last_run_at": None}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "running": self._thread is not None and self._thread.is_alive()}
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def wake(self):
+        self._wake.set()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="traccar-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                handled = self.process_once()
+            except Exception:
+                logger.exception("Traccar outbox pass failed")
+                handled = 0
+            if handled < config.settings.TRACCAR_SYNC_BATCH_SIZE:
+                self._wake.wait(config.settings.TRACCAR_SYNC_POLL_SECONDS)
+                self._wake.clear()
+
+    def process_once(self) -> int:
+        """Run one pass over due rows; returns how many rows were attempted.
+
+        Rows are grouped by entity. Each group runs in order on its own session,
+        and up to TRACCAR_SYNC_CONCURRENCY groups run at once.
+        """
+        from db.session import SessionLocal
+
+        settings = config.settings
+        now = _now()
+        with self._lock:
+            self._stats["last_run_at"] = now.isoformat()
+        db = SessionLocal()
+        try:
+            db.query(TraccarOutbox).filter(
+                TraccarOutbox.status == "running",
+                TraccarOutbox.updated_at < now - timedelta(seconds=STALE_RUNNING_SECONDS),
+            ).update({"status": "pending"}, synchronize_session=False)
+            db.commit()
+            due = (
+                db.query(TraccarOutbox.id, TraccarOutbox.entity_type, TraccarOutbox.entity_id)
+                .filter(TraccarOutbox.status == "pending", TraccarOutbox.next_attempt_at <= now)
+                .order_by(TraccarOutbox.id)
+                .limit(settings.TRACCAR_SYNC_BATCH_SIZE)
+                .all()
+            )
+        finally:
+            db.close()
+
+        groups = {}
+        for row_id, entity_type, entity_id in due:
+            groups.setdefault((entity_type, entity_id), []).append(row_id)
+        if not groups:
+            return 0
+
+        client = get_client()
+        breaker_open = threading.Event()
+
+        def run_group(row_ids: list) -> int:
+            handled = 0
+            session = SessionLocal()
+            try:
+                for row_id in row_ids:
+                    if breaker_open.is_set():
+                        break
+                    outcome = self._process_row(session, client, row_id)
+                    if outcome is None or outcome == "retry":
+                        # the rest of this entity's rows wait behind it
+                        if outcome:
+                            handled += 1
+                        break
+                    handled += 1
+                    if outcome == "breaker_open":
+                        breaker_open.set()
+            finally:
+                session.close()
+            return handled
+
+        # geofences first: device links wait on their geofence's Traccar id
+        handled = 0
+        for entity_type in ("geofence", "device"):
+            phase = [ids for (etype, _), ids in groups.items() if etype == entity_type]
+            workers = max(1, min(settings.TRACCAR_SYNC_CONCURRENCY, len(phase)))
+            if workers == 1:
+                handled += sum(run_group(ids) for ids in phase)
+                continue
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="traccar-outbox") as pool:
+                handled += sum(pool.map(run_group, phase))
+        return handled
+
+    def _process_row(self, db: Session, client, row_id: int) -> Optional[str]:
+        row = db.get(TraccarOutbox, row_id)
+        if row is None or row.status != "pending":
+            return None
+        older = (
+            db.query(TraccarOutbox.id)
+            .filter(
+                TraccarOutbox.entity_type == row.entity_type,
+                TraccarOutbox.entity_id == row.entity_id,
+                TraccarOutbox.status.in_(("pending", "running")),
+                TraccarOutbox.id < row.id,
+            )
+            .first()
+        )
+        if older is not None:
+            # keep per-entity order: wait for the earlier change
+            return None
+        # claim the row so a second worker process skips it
+        claimed = (
+            db.query(TraccarOutbox)
+            .filter(TraccarOutbox.id == row.id, TraccarOutbox.status == "pending")
+            .update({"status": "running", "attempts": TraccarOutbox.attempts + 1}, synchronize_session=False)
+        )
+        db.commit()
+        if not claimed:
+            return None
+        row = db.get(TraccarOutbox, row_id, populate_existing=True)
+        handler = HANDLERS.get((row.entity_type, row.op))
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown outbox operation {row.entity_type}/{row.op}")
+            handler(db, client, row)
+            row.status = "done"
+            row.last_error = None
+            db.commit()
+            self._count("applied")
+            return "done"
+        except Exception as e:
+            db.rollback()
+            row = db.get(TraccarOutbox, row_id, populate_existing=True)
+            row.last_error = str(e)[:2000]
+            settings = config.settings
+            if isinstance(e, CircuitOpenError):
+                # Traccar is known to be down; wait for the breaker without spending an attempt
+                row.status = "pending"
+                row.attempts = max(row.attempts - 1, 0)
+                row.next_attempt_at = _now() + timedelta(seconds=settings.TRACCAR_BREAKER_RESET_SECONDS)
+                db.commit()
+                return "breaker_open"
+            if handler is None or _permanent(e) or row.attempts >= settings.TRACCAR_SYNC_MAX_ATTEMPTS:
+                row.status = "failed"
+                db.commit()
+                self._count("failed")
+                logger.warning("Traccar sync of %s %s (%s) failed: %s", row.entity_type, row.entity_id, row.op, e)
+                return "failed"
+            delay = min(settings.TRACCAR_SYNC_BACKOFF_SECONDS * (2 ** (row.attempts - 1)), settings.TRACCAR_SYNC_BACKOFF_MAX_SECONDS)
+            row.status = "pending"
+            row.next_attempt_at = _now() + timedelta(seconds=delay)
+            db.commit()
+            self._count("retried")
+            return "retry"
+
+
+worker = OutboxWorker()
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_worker(session):
+    if session.info.pop(_DIRTY_KEY, None):
+        worker.wake()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_dirty(session, previous_transaction):
+    # a savepoint rolling back (begin_nested) leaves the outer transaction's outbox rows alive
+    if previous_transaction.nested:
+        return
+    session.info.pop(_DIRTY_KEY, None)
@@ -0,0 +1,209 @@
+"""Incremental trip (voyage) segmentation driven by position ingest.
+
+Each device has a `TripState` checkpoint: its home point, the last position
+seen and a dwell anchor. `segment_positions` advances that state with every
+newly ingested position in fix-time order, so old positions are never read
+again:
+
+- departure: no open trip, the boat is moving and more than
+  `TRIP_HOME_RADIUS_METERS` from home. The trip starts at the previous point
+  when that was still at home, otherwise at the current one.
+- return: the boat is back within the home radius and no longer moving.
+- dwell: the boat has stayed within the home radius of one spot, not moving,
+  for `TRIP_DWELL_MINUTES` away from home (landed at another port). The trip
+  ends where the dwell began and that spot becomes the new home.
+- gap: no report for `TRIP_GAP_MINUTES`. The open trip ends at the last point
+  before the gap.
+
+"Moving" means the reported speed (knots) or, without one, the speed implied
+by the last two fixes is at least `TRIP_MOVING_KNOTS`. Fixes older than the
+last one seen are ignored. A trip whose device stops reporting stays open
+until the next position arrives.
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from core import config
+from db.upsert import dialect_insert
+from models.trip import Trip
+from models.trip_state import TripState
+from utils.geometry import haversine_m
+
+MS_TO_KNOTS = 1.943844
+
+
+def _utc(ts: Optional[datetime]) -> datetime:
+    if ts is None:
+        return datetime.now(timezone.utc)
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+def _start_trip(db, device_id: int, lat: float, lon: float, at: datetime) -> Trip:
+    trip = Trip(
+        device_id=device_id,
+        status="open",
+        start_at=at,
+        start_latitude=lat,
+        start_longitude=lon,
+        distance_m=0.0,
+        min_latitude=lat,
+        min_longitude=lon,
+        max_latitude=lat,
+        max_longitude=lon,
+        point_count=1,
+    )
+    db.add(trip)
+    return trip
+
+
+def _extend(trip: Trip, lat: float, lon: float, speed: Optional[float], step_m: float):
+    trip.distance_m = (trip.distance_m or 0.0) + step_m
+    if speed is not None:
+        trip.max_speed = speed if trip.max_speed is None else max(trip.max_speed, speed)
+    trip.min_latitude = min(trip.min_latitude, lat)
+    trip.min_longitude = min(trip.min_longitude, lon)
+    trip.max_latitude = max(trip.max_latitude, lat)
+    trip.max_longitude = max(trip.max_longitude, lon)
+    trip.point_count = (trip.point_count or 0) + 1
+
+
+def _close(trip: Trip, lat: float, lon: float, at: datetime, reason: str):
+    trip.status = "closed"
+    trip.end_reason = reason
+    trip.end_at = at
+    trip.end_latitude = lat
+    trip.end_longitude = lon
+
+
+def _advance(db, state: TripState, trip: Optional[Trip], lat: float, lon: float, at: datetime, speed: Optional[float]) -> Optional[Trip]:
+    """Apply one position to a device's state; returns the trip left open (if any)."""
+    s = config.settings
+    radius = float(s.TRIP_HOME_RADIUS_METERS)
+    if state.home_latitude is None:
+        state.home_latitude, state.home_longitude = lat, lon
+        state.last_latitude, state.last_longitude, state.last_at = lat, lon, at
+        state.dwell_latitude, state.dwell_longitude, state.dwell_since = lat, lon, at
+        return trip
+
+    last_at = _utc(state.last_at)
+    step = haversine_m(state.last_latitude, state.last_longitude, lat, lon)
+    elapsed = (at - last_at).total_seconds()
+    gap = elapsed > float(s.TRIP_GAP_MINUTES) * 60
+    if trip is not None and gap:
+        _close(trip, state.last_latitude, state.last_longitude, last_at, "gap")
+        trip = None
+
+    if speed is None:
+        implied = step / elapsed * MS_TO_KNOTS if elapsed > 0 else 0.0
+        moving = implied >= float(s.TRIP_MOVING_KNOTS)
+    else:
+        moving = speed >= float(s.TRIP_MOVING_KNOTS)
+
+    if not moving and state.dwell_since is not None and haversine_m(state.dwell_latitude, state.dwell_longitude, lat, lon) <= radius:
+        dwell_since = _utc(state.dwell_since)
+    else:
+        state.dwell_latitude, state.dwell_longitude, state.dwell_since = lat, lon, at
+        dwell_since = at
+    from_home = haversine_m(state.home_latitude, state.home_longitude, lat, lon)
+    dwelled = (at - dwell_since).total_seconds() >= float(s.TRIP_DWELL_MINUTES) * 60
+
+    if trip is None:
+        if moving and from_home > radius:
+            last_home = haversine_m(state.home_latitude, state.home_longitude, state.last_latitude, state.last_longitude)
+            if not gap and last_home <= radius:
+                trip = _start_trip(db, state.device_id, state.last_latitude, state.last_longitude, last_at)
+                _extend(trip, lat, lon, speed, step)
+            else:
+                trip = _start_trip(db, state.device_id, lat, lon, at)
+                if speed is not None:
+                    trip.max_speed = speed
+        elif dwelled and from_home > radius:
+            # moored somewhere else without a recorded trip (e.g. after a gap)
+            state.home_latitude, state.home_longitude = state.dwell_latitude, state.dwell_longitude
+    else:
+        _extend(trip, lat, lon, speed, step)
+        if not moving and from_home <= radius:
+            _close(trip, lat, lon, at, "returned")
+            trip = None
+        elif dwelled:
+            _close(trip, state.dwell_latitude, state.dwell_longitude, dwell_since, "dwell")
+            state.home_latitude, state.home_longitude = state.dwell_latitude, state.dwell_longitude
+            trip = None
+
+    state.last_latitude, state.last_longitude, state.last_at = lat, lon, at
+    return trip
+
+
+def _locked_states(db, device_ids) -> Dict[int, TripState]:
+    # FOR UPDATE on PostgreSQL; SQLite serializes writers anyway and omits the clause
+    rows = db.query(TripState).filter(TripState.device_id.in_(list(device_ids))).with_for_update()
+    return {s.device_id: s for s in rows}
+
+
+def segment_positions(db, positions: Iterable) -> List[Trip]:
+    """Advance the trip segmenter with newly added (not yet committed) positions.
+
+    Runs inside the ingest transaction (in a savepoint) so trips commit
+    atomically with their positions. State rows are locked for the rest of the
+    transaction, so concurrent batches for one device apply one after the
+    other. Returns the trips opened, extended or closed by this batch.
+    """
+    by_device: Dict[int, list] = {}
+    for p in positions:
+        if p.latitude is None or p.longitude is None:
+            continue
+        by_device.setdefault(p.device_id, []).append((_utc(p.timestamp), float(p.latitude), float(p.longitude), p.speed))
+    if not by_device:
+        return []
+
+    states = _locked_states(db, by_device.keys())
+    missing = [device_id for device_id in by_device if device_id not in states]
+    if missing:
+        # two batches for a new device may both get here; the second insert is a no-op
+        insert = dialect_insert(db, "trip segmentation")
+        db.execute(
+            insert(TripState.__table__).values([{"device_id": d} for d in missing]).on_conflict_do_nothing(index_elements=["device_id"])
+        )
+        states.update(_locked_states(db, missing))
+    open_ids = [s.open_trip_id for s in states.values() if s.open_trip_id is not None]
+    open_trips = {t.id: t for t in db.query(Trip).filter(Trip.id.in_(open_ids))} if open_ids else {}
+
+    touched: List[Trip] = []
+    left_open: Dict[int, Optional[Trip]] = {}
+    for device_id, points in by_device.items():
+        state = states[device_id]
+        trip = open_trips.get(state.open_trip_id) if state.open_trip_id is not None else None
+        for at, lat, lon, speed in sorted(points, key=lambda row: row[0]):
+            if state.last_at is not None and at <= _utc(state.last_at):
+                continue
+            before = trip
+            trip = _advance(db, state, trip, lat, lon, at, speed)
+            for t in (before, trip):
+                if t is not None and t not in touched:
+                    touched.append(t)
+        left_open[device_id] = trip
+    if touched:
+        # new trips need their ids before the states can point at them
+        db.flush()
+    for device_id, trip in left_open.items():
+        states[device_id].open_trip_id = trip.id if trip is not None else None
+    return touched
+
+
+def trip_out(t: Trip) -> dict:
+    return {
+        "id": t.id,
+        "device_id": t.device_id,
+        "status": t.status,
+        "end_reason": t.end_reason,
+        "start_at": t.start_at,
+        "end_at": t.end_at,
+        "start": {"latitude": t.start_latitude, "longitude": t.start_longitude},
+        "end": {"latitude": t.end_latitude, "longitude": t.end_longitude} if t.end_latitude is not None else None,
+        "distance_m": round(t.distance_m or 0.0, 1),
+        "max_speed": t.max_speed,
+        "bbox": [t.min_latitude, t.min_longitude, t.max_latitude, t.max_longitude],
+        "point_count": t.point_count,
+        "duration_seconds": (_utc(t.end_at) - _utc(t.start_at)).total_seconds() if t.end_at and t.start_at else None,
+    }
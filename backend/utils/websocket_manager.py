@@ -1,6 +1,18 @@
+import logging
+import time
 from typing import List, Dict, Any
 from fastapi import WebSocket
 
+from core.metrics import REGISTRY, Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+WS_SEND_SECONDS = Histogram(
+    "bantay_ws_send_seconds", "Time to hand one frame to a websocket.", buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+)
+WS_FRAMES_SENT = Counter("bantay_ws_frames_sent_total", "Frames sent to websocket clients.")
+WS_FRAMES_DROPPED = Counter("bantay_ws_frames_dropped_total", "Frames that failed to send; the connection is dropped.")
+
 
 class ConnectionManager:
     def __init__(self):
@@ -14,16 +26,32 @@ class ConnectionManager:
     def disconnect(self, websocket: WebSocket):
         self.active = [a for a in self.active if a.get("ws") is not websocket]
 
+    async def _send(self, websocket: WebSocket, message: dict):
+        started = time.perf_counter()
+        try:
+            await websocket.send_json(message)
+        except Exception:
+            WS_FRAMES_DROPPED.inc()
+            raise
+        WS_SEND_SECONDS.observe(time.perf_counter() - started)
+        WS_FRAMES_SENT.inc()
+
+    def connection_counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for entry in list(self.active):
+            role = entry.get("role") or "unknown"
+            counts[role] = counts.get(role, 0) + 1
+        return counts
+
     async def broadcast(self, message: dict):
         # message is expected to be {"positions": [...], "events": [...]}
         conns = list(self.active)
         for entry in conns:
             ws = entry.get("ws")
             try:
-                print(f"[ws manager] broadcasting message to one connection; keys={list(message.keys())}")
-                await ws.send_json(message)
-            except Exception:
-                print("[ws manager] send error during broadcast; removing connection")
+                await self._send(ws, message)
+            except Exception as e:
+                logger.info("Dropping websocket connection after broadcast error: %s", e)
                 try:
                     self.active.remove(entry)
                 except ValueError:
@@ -31,12 +59,17 @@ class ConnectionManager:
 
     async def send_to_user(self, websocket: WebSocket, message: dict):
         try:
-            print(f"[ws manager] send_to_user: sending message with keys={list(message.keys())}")
-            await websocket.send_json(message)
+            await self._send(websocket, message)
         except Exception as e:
-            print(f"[ws manager] send_to_user error: {e}")
+            logger.info("Dropping websocket connection after send error: %s", e)
             # best-effort: remove broken connection(s)
             self.active = [a for a in self.active if a.get("ws") is not websocket]
 
 
 manager = ConnectionManager()
+
+
+@REGISTRY.collector
+def _collect_connections():
+    samples = [({"role": role}, count) for role, count in sorted(manager.connection_counts().items())]
+    return [("bantay_ws_connections", "gauge", "Open websocket connections by role.", samples)]